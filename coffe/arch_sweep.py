@@ -0,0 +1,296 @@
+# This file runs architecture sweeps: COFFE is run for every point of a grid of architecture parameters
+# (e.g. N, K, W, L, Fcin, Fcout, switch_type) on top of a base architecture file.
+#
+# The points run on a pool of worker processes. Each point gets a fresh worker process, since COFFE
+# keeps state between runs in class attributes. All of them share a limit on the number of simulations
+# running at the same time, so the number of workers and the number of concurrent HSPICE jobs of each
+# point (-j) can be raised without oversubscribing the machine. Each point gets its own directory in the sweep directory, with its
+# architecture file, its COFFE log (instead of the terminal) and its usual COFFE outputs. The results
+# of every point are added to a CSV table (SWEEP_RESULTS_FILENAME) as soon as the point is done.
+#
+# Usage: python coffe_sweep.py <base arch file> -sg N=8,10 -sg K=4,6 [sweep options] [COFFE options]
+# The COFFE options (e.g. -i 2 -j 4 -b hspice) are the ones of coffe.py and apply to every point.
+
+import os
+import sys
+import csv
+import time
+import yaml
+import argparse
+import itertools
+import traceback
+import contextlib
+import multiprocessing
+from . import fpga_flow
+from . import utils
+
+# Results table written in the sweep directory
+SWEEP_RESULTS_FILENAME = "sweep_results.csv"
+
+# Name of the architecture file and of the COFFE log in the directory of each point
+POINT_LOG_FILENAME = "coffe.log"
+
+# Columns of the results table that every point has. They are followed by the swept parameters
+# and then by the delay of each subcircuit, in ps.
+SWEEP_RESULTS_COLUMNS = ["point", "status", "tile_area_um2", "rep_crit_path_ps", "spice_simulations", "runtime_s", "error"]
+
+# Semaphore shared by the worker processes to bound the number of simulations running at the same time
+_simulator_slots = None
+
+
+def parse_grid(grid_options):
+    """
+    Parses the parameter grids given on the command line, each as "<param>=<value>,<value>,...".
+    Returns a list of (param, list of values) pairs, in the order they were given.
+    """
+
+    grid = []
+    for grid_option in grid_options:
+        if "=" not in grid_option:
+            raise ValueError("Invalid parameter grid (expected <param>=<value>,<value>,...): " + grid_option)
+        param, values = grid_option.split("=", 1)
+        values = [value.strip() for value in values.split(",") if value.strip() != ""]
+        if param.strip() == "" or len(values) == 0:
+            raise ValueError("Invalid parameter grid (expected <param>=<value>,<value>,...): " + grid_option)
+        grid.append((param.strip(), values))
+
+    return grid
+
+
+def expand_grid(grid):
+    """ Returns every point of 'grid' (see parse_grid) as a dictionary {param: value}. The last parameter varies fastest. """
+
+    params = [param for param, values in grid]
+    return [dict(zip(params, point_values)) for point_values in itertools.product(*[values for param, values in grid])]
+
+
+def write_point_arch_file(base_arch_path, point, point_dir):
+    """
+    Writes the architecture file of 'point' in 'point_dir' and returns its path. It is the base
+    architecture file with the values of 'point', and with 'point_dir' as the output folder.
+    Both the YAML and the older text formats are supported (see utils.load_params).
+    """
+
+    point = dict(point)
+    point["arch_out_folder"] = point_dir
+
+    if base_arch_path.endswith(".yaml") or base_arch_path.endswith(".yml"):
+        with open(base_arch_path, 'r') as base_file:
+            arch_params = yaml.safe_load(base_file)
+        for param, value in point.items():
+            # Let YAML type the values given on the command line (8 -> int, true -> bool, etc.)
+            arch_params["fpga_arch_params"][param] = yaml.safe_load(value) if param != "arch_out_folder" else value
+        point_arch_path = os.path.join(point_dir, "arch.yaml")
+        with open(point_arch_path, 'w') as point_file:
+            yaml.safe_dump(arch_params, point_file, default_flow_style=None, sort_keys=False)
+        return point_arch_path
+
+    # Text format: one "<param>=<value>" per line
+    point_lines = []
+    written_params = set()
+    with open(base_arch_path, 'r') as base_file:
+        for line in base_file:
+            param = line.split("=", 1)[0].strip()
+            if not line.startswith("#") and "=" in line and param in point:
+                if param in written_params:
+                    continue
+                line = param + "=" + point[param] + "\n"
+                written_params.add(param)
+            point_lines.append(line)
+    if len(point_lines) > 0 and not point_lines[-1].endswith("\n"):
+        point_lines[-1] += "\n"
+    for param, value in point.items():
+        if param not in written_params:
+            point_lines.append(param + "=" + value + "\n")
+
+    point_arch_path = os.path.join(point_dir, "arch.txt")
+    with open(point_arch_path, 'w') as point_file:
+        point_file.writelines(point_lines)
+
+    return point_arch_path
+
+
+def get_point_results(fpga_inst):
+    """ Returns the results of a point for the results table: tile area, critical path, subcircuit delays and simulations. """
+
+    results = {"tile_area_um2": fpga_inst.area_dict["tile"]/1e6,
+               "rep_crit_path_ps": fpga_inst.delay_dict["rep_crit_path"]*1e12,
+               "spice_simulations": fpga_inst.spice_interface.get_num_simulations_performed()}
+    for subcircuit_name, delay in fpga_inst.delay_dict.items():
+        if subcircuit_name != "rep_crit_path":
+            results[subcircuit_name + "_delay_ps"] = delay*1e12
+
+    return results
+
+
+def _init_worker(simulator_slots):
+    """ Initializes a worker process of the sweep pool. """
+
+    global _simulator_slots
+    _simulator_slots = simulator_slots
+
+
+def run_point(point_name, point_arch_path, coffe_argv):
+    """
+    Runs COFFE for the architecture file of a point with the COFFE options 'coffe_argv' (as on the
+    coffe.py command line, without the architecture file). This is what the sweep workers execute.
+    The output of COFFE goes to the log of the point. Returns the row of the point in the results table.
+    """
+
+    start_dir = os.getcwd()
+    start_time = time.time()
+    results = {"point": point_name, "status": "done", "error": ""}
+
+    log_path = os.path.join(os.path.dirname(point_arch_path), POINT_LOG_FILENAME)
+    with open(log_path, 'w') as log_file, contextlib.redirect_stdout(log_file), contextlib.redirect_stderr(log_file):
+        spice_interface = None
+        try:
+            args = fpga_flow.get_arg_parser().parse_args(coffe_argv + [point_arch_path])
+            coffe_params = utils.load_params(point_arch_path, args)
+            arch_folder = utils.create_output_dir(point_arch_path, coffe_params["fpga_arch_params"]['arch_out_folder'], args.resume)
+            spice_interface = fpga_flow.create_spice_interface(args, _simulator_slots)
+            fpga_inst = fpga_flow.run_fpga_flow(args, coffe_params, arch_folder, spice_interface)
+            results.update(get_point_results(fpga_inst))
+        # COFFE exits on invalid parameters and failed simulations
+        except (Exception, SystemExit) as error:
+            traceback.print_exc()
+            results["status"] = "failed"
+            results["error"] = type(error).__name__ + ": " + str(error) + " (see " + log_path + ")"
+        finally:
+            if spice_interface is not None:
+                spice_interface.shutdown()
+            os.chdir(start_dir)
+
+    results["runtime_s"] = round(time.time() - start_time, 1)
+
+    return results
+
+
+def _run_point_args(point_args):
+    """ Runs run_point for a (point name, point architecture file, COFFE options) tuple. """
+
+    return run_point(*point_args)
+
+
+class SweepResultsTable:
+    """
+    CSV table with one row per point of a sweep, written as the points finish. The columns are
+    SWEEP_RESULTS_COLUMNS, then 'param_names', then the subcircuit delays. Points of different
+    architectures don't have the same subcircuits (e.g. LUT inputs), so when a row brings new
+    columns the table is written again with them. Otherwise the row is appended.
+    """
+
+    def __init__(self, path, param_names):
+
+        self.path = path
+        self.columns = SWEEP_RESULTS_COLUMNS + list(param_names)
+        self.rows = []
+        self._write_all()
+
+
+    def _write_all(self):
+        """ Writes the whole table. """
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', newline='') as table_file:
+            writer = csv.DictWriter(table_file, fieldnames=self.columns, restval="")
+            writer.writeheader()
+            writer.writerows(self.rows)
+        os.replace(tmp_path, self.path)
+
+
+    def add(self, row):
+        """ Adds 'row', a dictionary {column: value}, to the table. """
+
+        self.rows.append(row)
+        new_columns = [column for column in row if column not in self.columns]
+        if len(new_columns) > 0:
+            self.columns += new_columns
+            self._write_all()
+            return
+
+        with open(self.path, 'a', newline='') as table_file:
+            csv.DictWriter(table_file, fieldnames=self.columns, restval="").writerow(row)
+
+
+def run_sweep(base_arch_path, grid, sweep_dir, coffe_argv, num_workers, simulator_limit):
+    """
+    Runs COFFE for every point of 'grid' (see parse_grid) on top of the architecture file at
+    'base_arch_path', on 'num_workers' worker processes that never run more than 'simulator_limit'
+    simulations at the same time in total. 'coffe_argv' are the COFFE options of every point.
+    Each point runs in its own directory of 'sweep_dir' and its results are added to the results
+    table of 'sweep_dir' as soon as it is done. Returns the rows of the results table.
+    """
+
+    sweep_dir = os.path.abspath(sweep_dir)
+    if not os.path.exists(sweep_dir):
+        os.makedirs(sweep_dir)
+
+    # Write the architecture file of each point
+    points = expand_grid(grid)
+    point_jobs = []
+    for point_index, point in enumerate(points):
+        point_name = "point_" + str(point_index).zfill(len(str(len(points) - 1)))
+        point_dir = os.path.join(sweep_dir, point_name)
+        if not os.path.exists(point_dir):
+            os.makedirs(point_dir)
+        point_jobs.append((point_name, point, write_point_arch_file(base_arch_path, point, point_dir)))
+
+    results_table = SweepResultsTable(os.path.join(sweep_dir, SWEEP_RESULTS_FILENAME), [param for param, values in grid])
+    print("Sweeping " + str(len(points)) + " architectures on " + str(num_workers) + " workers (at most " +
+          str(simulator_limit) + " simulations at the same time)")
+    print("Results: " + results_table.path + "\n")
+
+    # COFFE keeps state in module and class attributes (e.g. the initial transistor sizes of the
+    # subcircuits), so each point runs in a fresh process instead of one that ran another point
+    mp_context = multiprocessing.get_context("spawn")
+    simulator_slots = mp_context.BoundedSemaphore(simulator_limit)
+    point_by_name = {point_name: point for point_name, point, point_arch_path in point_jobs}
+    with mp_context.Pool(num_workers, initializer=_init_worker, initargs=(simulator_slots,), maxtasksperchild=1) as pool:
+        point_args = [(point_name, point_arch_path, coffe_argv) for point_name, point, point_arch_path in point_jobs]
+        for num_done, row in enumerate(pool.imap_unordered(_run_point_args, point_args)):
+            point = point_by_name[row["point"]]
+            row.update(point)
+            results_table.add(row)
+            if row["status"] == "done":
+                status = ("tile area " + str(round(row["tile_area_um2"], 2)) + " um^2, critical path " +
+                          str(round(row["rep_crit_path_ps"], 2)) + " ps")
+            else:
+                status = "FAILED: " + row["error"]
+            print("[" + str(num_done + 1) + "/" + str(len(points)) + "] " + row["point"] + " " + str(point) +
+                  ": " + status)
+            sys.stdout.flush()
+
+    return results_table.rows
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Runs COFFE for every point of a grid of architecture parameters. "
+                                     "Options that aren't listed here are passed to COFFE (see coffe.py -h).", allow_abbrev=False)
+    parser.add_argument('base_arch_description', help="architecture file the points are based on")
+    parser.add_argument('-sg', '--sweep_grid', action='append', default=[], help="values of a swept parameter, e.g. N=8,10,12 (repeat for each parameter)")
+    parser.add_argument('-sd', '--sweep_dir', type=str, default="sweep_out", help="directory of the sweep results")
+    parser.add_argument('-sw', '--sweep_workers', type=int, default=0, help="number of architectures run at the same time (default: number of CPUs)")
+    parser.add_argument('-sl', '--simulator_limit', type=int, default=0, help="max number of simulations running at the same time across all architectures (default: number of CPUs)")
+    args, coffe_argv = parser.parse_known_args(argv)
+
+    grid = parse_grid(args.sweep_grid)
+    if len(grid) == 0:
+        parser.error("at least one parameter grid (-sg) is needed")
+
+    # The sweep only runs the FPGA flow
+    coffe_args = fpga_flow.get_arg_parser().parse_args(coffe_argv + [args.base_arch_description])
+    if coffe_args.hardblock_only:
+        parser.error("the hardblock flow (-ho) can't be swept")
+
+    num_points = len(expand_grid(grid))
+    num_workers = args.sweep_workers if args.sweep_workers > 0 else os.cpu_count()
+    num_workers = max(1, min(num_workers, num_points))
+    simulator_limit = args.simulator_limit if args.simulator_limit > 0 else os.cpu_count()
+
+    run_sweep(args.base_arch_description, grid, args.sweep_dir, coffe_argv, num_workers, simulator_limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -41,7 +41,14 @@
 
 import os
 import sys
+import copy
 import math
+import shutil
+import hashlib
+import threading
+import collections.abc
+import concurrent.futures
+import numpy as np
 
 # Subcircuit Modules
 from . import basic_subcircuits
@@ -53,6 +60,7 @@ from . import memory_subcircuits
 from . import utils
 from . import hardblock_functions
 from . import tran_sizing
+from . import sizing_scheduler
 
 # Top level file generation module
 from . import top_level
@@ -81,6 +89,31 @@ DELAY_WEIGHT_GENERAL_BLE_OUTPUT = 0.0326
 DELAY_WEIGHT_RAM = 0.15
 HEIGHT_SPAN = 0.5
 
+# update_delays fits the input pulse of some top-level SPICE files to the last measured delay of
+# the subcircuit: the pulse is ADAPTIVE_WINDOW_MARGIN times that delay, rounded up to a multiple of
+# ADAPTIVE_WINDOW_STEP and at least ADAPTIVE_WINDOW_MIN_PULSE. Pulses of ADAPTIVE_WINDOW_MAX_PULSE
+# or more use the default stimulus. Sweep rows whose delay fails or is more than 
+# ADAPTIVE_WINDOW_MAX_DELAY times the pulse are simulated again with the default stimulus.
+ADAPTIVE_WINDOW_MARGIN = 8
+ADAPTIVE_WINDOW_STEP = 100e-12
+ADAPTIVE_WINDOW_MIN_PULSE = 0.5e-9
+ADAPTIVE_WINDOW_MAX_PULSE = 2e-9
+ADAPTIVE_WINDOW_MAX_DELAY = 0.25
+
+# determine_height looks for the logic tile height with the lowest cost on a grid of heights spaced
+# FLOORPLAN_HEIGHT_STEP (relative to the starting height) apart. It starts with the heights within
+# FLOORPLAN_SEARCH_SPAN steps of the starting height and evaluates FLOORPLAN_CANDIDATES heights
+# inside the bracket around the best height at a time. The bracket is moved at most
+# FLOORPLAN_MAX_ROUNDS times when the best height is on one of its ends.
+FLOORPLAN_HEIGHT_STEP = 0.01
+FLOORPLAN_SEARCH_SPAN = 10
+FLOORPLAN_CANDIDATES = 4
+FLOORPLAN_MAX_ROUNDS = 10
+
+# In the Monte Carlo samples of a variation run, transistor widths and wire RC are scaled by a normal
+# random factor of mean 1 (see FPGA.get_variation_parameter_dict), which is never less than this.
+MONTE_CARLO_MIN_FACTOR = 0.1
+
 # This parameter determines if RAM core uses the low power transistor technology
 # It is strongly suggested to keep it this way since our
 # core RAM modules were designed to operate with low power transistors.
@@ -151,6 +184,10 @@ class _Specs:
         self.metal_stack              = arch_params_dict['metal']
         self.model_path               = arch_params_dict['model_path']
         self.model_library            = arch_params_dict['model_library']
+        self.variation_corners        = arch_params_dict['variation_corners']
+        self.monte_carlo_samples      = arch_params_dict['monte_carlo_samples']
+        self.monte_carlo_sigma        = arch_params_dict['monte_carlo_sigma']
+        self.monte_carlo_seed         = arch_params_dict['monte_carlo_seed']
         self.rest_length_factor       = arch_params_dict['rest_length_factor']
         self.use_tgate                = arch_params_dict['use_tgate']
         self.use_finfet               = arch_params_dict['use_finfet']
@@ -183,6 +220,8 @@ class _SizableCircuit:
     delay_weight = 1
     # Dynamic power for this subcircuit
     power = 1
+    # Input pulse width of the top-level SPICE file, 0 for the default stimulus
+    sim_pulse_width = 0
 
     
     def generate(self):
@@ -210,6 +249,14 @@ class _SizableCircuit:
         """ Update wire lengths and wire layers based on the width of things, obtained from width_dict. """
         msg = "Function 'update_wires' must be overridden in class _SizableCircuit."
         raise NotImplementedError(msg)
+
+
+    def get_sim_window(self):
+        """ Returns the stimulus arguments of the top-level SPICE file generator for 'sim_pulse_width'.
+            The simulation stops one pulse width after the falling edge of the input. """
+        if self.sim_pulse_width == 0:
+            return {}
+        return {"pulse_width": self.sim_pulse_width, "stop_time": 2*self.sim_pulse_width}
                 
   
 class _CompoundCircuit:
@@ -300,7 +347,12 @@ class _SwitchBlockMUX(_SizableCircuit):
         """ Generate top level SPICE file """
         
         print("Generating top-level switch block mux")
-        self.top_spice_path = top_level.generate_switch_block_top(self.name)
+        self.generate_window_top()
+
+
+    def generate_window_top(self):
+        """ Generate top level SPICE file with the current simulation window """
+        self.top_spice_path = top_level.generate_switch_block_top(self.name, **self.get_sim_window())
    
    
     def update_area(self, area_dict, width_dict):
@@ -433,7 +485,12 @@ class _ConnectionBlockMUX(_SizableCircuit):
 
     def generate_top(self):
         print("Generating top-level connection block mux")
-        self.top_spice_path = top_level.generate_connection_block_top(self.name)
+        self.generate_window_top()
+
+
+    def generate_window_top(self):
+        """ Generate top level SPICE file with the current simulation window """
+        self.top_spice_path = top_level.generate_connection_block_top(self.name, **self.get_sim_window())
         
    
     def update_area(self, area_dict, width_dict):
@@ -571,7 +628,12 @@ class _LocalMUX(_SizableCircuit):
 
     def generate_top(self):
         print("Generating top-level local mux")
-        self.top_spice_path = top_level.generate_local_mux_top(self.name)
+        self.generate_window_top()
+
+
+    def generate_window_top(self):
+        """ Generate top level SPICE file with the current simulation window """
+        self.top_spice_path = top_level.generate_local_mux_top(self.name, **self.get_sim_window())
         
    
     def update_area(self, area_dict, width_dict):
@@ -688,9 +750,14 @@ class _LUTInputDriver(_SizableCircuit):
         """ Generate top-level SPICE file based on type of LUT input driver. """
         
         # Generate top level files based on what type of driver this is.
-        self.top_spice_path = top_level.generate_lut_driver_top(self.name, self.type)
+        self.generate_window_top()
         # And, generate the LUT driver + LUT path top level file. We use this file to measure total delay through the LUT.
         top_level.generate_lut_and_driver_top(self.name, self.type, self.use_tgate, self.use_fluts)       
+
+
+    def generate_window_top(self):
+        """ Generate top-level SPICE file of the driver with the current simulation window. """
+        self.top_spice_path = top_level.generate_lut_driver_top(self.name, self.type, **self.get_sim_window())
      
      
     def update_area(self, area_dict, width_dict):
@@ -813,7 +880,12 @@ class _LUTInputNotDriver(_SizableCircuit):
     def generate_top(self):
         """ Generate top-level SPICE file for LUT not driver """
 
-        self.top_spice_path = top_level.generate_lut_driver_not_top(self.name, self.type)
+        self.generate_window_top()
+
+
+    def generate_window_top(self):
+        """ Generate top-level SPICE file for LUT not driver with the current simulation window. """
+        self.top_spice_path = top_level.generate_lut_driver_not_top(self.name, self.type, **self.get_sim_window())
         
     
     def update_area(self, area_dict, width_dict):
@@ -2240,7 +2312,12 @@ class _LocalBLEOutput(_SizableCircuit):
 
     def generate_top(self):
         print("Generating top-level " + self.name)
-        self.top_spice_path = top_level.generate_local_ble_output_top(self.name, self.use_tgate)
+        self.generate_window_top()
+
+
+    def generate_window_top(self):
+        """ Generate top-level SPICE file with the current simulation window """
+        self.top_spice_path = top_level.generate_local_ble_output_top(self.name, self.use_tgate, **self.get_sim_window())
         
         
     def update_area(self, area_dict, width_dict):
@@ -2317,7 +2394,12 @@ class _GeneralBLEOutput(_SizableCircuit):
 
     def generate_top(self):
         print("Generating top-level " + self.name)
-        self.top_spice_path = top_level.generate_general_ble_output_top(self.name, self.use_tgate)
+        self.generate_window_top()
+
+
+    def generate_window_top(self):
+        """ Generate top-level SPICE file with the current simulation window """
+        self.top_spice_path = top_level.generate_general_ble_output_top(self.name, self.use_tgate, **self.get_sim_window())
         
      
     def update_area(self, area_dict, width_dict):
@@ -5277,6 +5359,314 @@ class _hard_block(_CompoundCircuit):
         #    utils.print_and_write(report_file, "  Dedicated output routing:")
         #    self.dedicated.print_details(report_file)
 
+
+# Transistor types of TransistorSizes. The type of a transistor comes from the tag in its name.
+TRAN_TYPE_OTHER = 0
+TRAN_TYPE_PTRAN = 1
+TRAN_TYPE_INV = 2
+TRAN_TYPE_TGATE = 3
+TRAN_TYPE_REST = 4
+TRAN_TYPE_TRAN = 5
+NUM_TRAN_TYPES = 6
+
+
+def get_tran_type(tran_name):
+    """ Returns the type (TRAN_TYPE_*) of the transistor 'tran_name', from the tag in its name. """
+
+    if "inv_" in tran_name:
+        return TRAN_TYPE_INV
+    elif "tgate_" in tran_name:
+        return TRAN_TYPE_TGATE
+    elif "ptran_" in tran_name:
+        return TRAN_TYPE_PTRAN
+    elif "rest_" in tran_name:
+        return TRAN_TYPE_REST
+    elif "tran_" in tran_name:
+        return TRAN_TYPE_TRAN
+    else:
+        return TRAN_TYPE_OTHER
+
+
+class TransistorSizes(collections.abc.MutableMapping):
+    """ The transistor sizes of the FPGA ('name': 'size'). It behaves like a dictionary, but also keeps 
+        the sizes in a float64 array (in insertion order) along with the type of each transistor and the 
+        components (inverters, ptran, tgate, etc.) the transistors make up. Those only change when a 
+        transistor is added, so parameter vectors and areas can be computed without going through the names. """
+
+    def __init__(self, sizes=None):
+        
+        # Transistor names and the sizes as they were set, in insertion order
+        self._names = []
+        self._values = []
+        # Index of each transistor in '_names'
+        self._ids = {}
+        # Sizes as float64. The array has spare room at the end to add transistors.
+        self._sizes = np.zeros(0, dtype=np.float64)
+        # Types and components of the transistors, built the first time they are needed
+        self._index = None
+
+        if sizes is not None:
+            self.update(sizes)
+
+
+    def __getitem__(self, tran_name):
+        return self._values[self._ids[tran_name]]
+
+
+    def __setitem__(self, tran_name, tran_size):
+        tran_id = self._ids.get(tran_name)
+        if tran_id is None:
+            tran_id = len(self._names)
+            if tran_id == len(self._sizes):
+                self._sizes = np.concatenate((self._sizes, np.zeros(max(64, tran_id), dtype=np.float64)))
+            self._ids[sys.intern(tran_name)] = tran_id
+            self._names.append(tran_name)
+            self._values.append(tran_size)
+            self._index = None
+        else:
+            self._values[tran_id] = tran_size
+        self._sizes[tran_id] = tran_size
+
+
+    def __delitem__(self, tran_name):
+        tran_id = self._ids[tran_name]
+        del self._names[tran_id]
+        del self._values[tran_id]
+        self._ids = {name: i for i, name in enumerate(self._names)}
+        self._sizes = np.array(self._values, dtype=np.float64)
+        self._index = None
+
+
+    def __iter__(self):
+        return iter(self._names)
+
+
+    def __len__(self):
+        return len(self._names)
+
+
+    def __contains__(self, tran_name):
+        return tran_name in self._ids
+
+
+    def __repr__(self):
+        return "TransistorSizes(" + repr(dict(zip(self._names, self._values))) + ")"
+
+
+    def copy(self):
+        sizes_copy = TransistorSizes()
+        sizes_copy._names = list(self._names)
+        sizes_copy._values = list(self._values)
+        sizes_copy._ids = dict(self._ids)
+        sizes_copy._sizes = self._sizes.copy()
+        sizes_copy._index = self._index
+        return sizes_copy
+
+
+    @property
+    def names(self):
+        """ Transistor names, in the order of the size array. """
+        return self._names
+
+
+    @property
+    def sizes(self):
+        """ Transistor sizes (xMin width) as a float64 array. """
+        return self._sizes[:len(self._names)]
+
+
+    def get_id(self, tran_name):
+        """ Returns the position of 'tran_name' in the size array. """
+        return self._ids[tran_name]
+
+
+    def get_parameter_values(self, min_tran_width, use_finfet):
+        """ Returns the sizes of the transistors as they go in a SPICE parameter_dict: 
+            the channel width in meters, or the number of fins for FinFETs. """
+
+        if not use_finfet:
+            return (1e-9*self.sizes*min_tran_width).tolist()
+        else:
+            return list(self._values)
+
+
+    def get_types(self):
+        """ Returns the type (TRAN_TYPE_*) of each transistor. """
+        return self._get_index()["types"]
+
+
+    def get_component_names(self):
+        """ Returns the names of the components whose area get_component_areas computes, in order. """
+        return self._get_index()["comp_names"]
+
+
+    def get_component_tran_ids(self, comp_name):
+        """ Returns the positions of the transistors of component 'comp_name' (e.g. inv_sb_mux_1) in the size array. """
+        return self._get_index()["comp_tran_ids"].get(comp_name, [])
+
+
+    def get_tran_areas(self, coefficients, sizes=None):
+        """ Computes transistor areas with the area model area = a + b*size + c*sqrt(size).
+            'coefficients' has one row (a, b, c) per transistor type. 'sizes' defaults to the current
+            sizes. It can also be a matrix with one row of sizes per transistor sizing combination. """
+
+        if sizes is None:
+            sizes = self.sizes
+        tran_coefficients = coefficients[self.get_types()]
+
+        return tran_coefficients[:, 0] + tran_coefficients[:, 1]*sizes + tran_coefficients[:, 2]*np.sqrt(sizes)
+
+
+    def get_component_areas(self, tran_areas):
+        """ Sums the transistor areas (the last axis of 'tran_areas') into component areas.
+            Inverters and transmission gates are made of an NMOS and a PMOS transistor, 
+            pass-transistors, level-restorers and other transistors are components by themselves. """
+
+        index = self._get_index()
+        # Single transistor components use an extra column of zeros as their second transistor
+        padding = np.zeros(tran_areas.shape[:-1] + (1,))
+        tran_areas = np.concatenate((tran_areas, padding), axis=-1)
+
+        return tran_areas[..., index["comp_ids_0"]] + tran_areas[..., index["comp_ids_1"]]
+
+
+    def _get_index(self):
+        """ Builds the transistor types and the components, in the order _update_area_and_width_dicts lists them. """
+
+        if self._index is not None:
+            return self._index
+
+        types = []
+        comp_names = []
+        comp_ids = []
+        comp_tran_ids = {}
+        pending = {}
+        for tran_id, tran_name in enumerate(self._names):
+            tran_type = get_tran_type(tran_name)
+            types.append(tran_type)
+            comp_name = tran_name.replace("_nmos", "")
+            comp_name = comp_name.replace("_pmos", "")
+            comp_tran_ids.setdefault(comp_name, []).append(tran_id)
+            if tran_type == TRAN_TYPE_INV or tran_type == TRAN_TYPE_TGATE:
+                if comp_name in pending:
+                    comp_names.append(comp_name)
+                    comp_ids.append((pending[comp_name], tran_id))
+                else:
+                    pending[comp_name] = tran_id
+            elif tran_type != TRAN_TYPE_OTHER:
+                comp_names.append(comp_name)
+                comp_ids.append((tran_id, len(self._names)))
+
+        comp_ids = np.array(comp_ids, dtype=np.intp).reshape(-1, 2)
+        self._index = {
+            "types": np.array(types, dtype=np.intp),
+            "comp_names": comp_names,
+            "comp_ids_0": comp_ids[:, 0],
+            "comp_ids_1": comp_ids[:, 1],
+            "comp_tran_ids": comp_tran_ids
+        }
+
+        return self._index
+
+
+class _MemoizedSpiceInterface:
+    """ Runs SPICE jobs on 'spice_interface', unless the same deck was already simulated with the same values
+        for all the parameters its netlist uses. In that case, the measurements of that job are returned.
+        The floorplanner uses this so that the subcircuits that don't change with the tile height are only
+        simulated once. The netlists must not change while this is in use. The process data library
+        'process_data_path' can change (the MTJ BRAM decks rewrite it), so its contents are part of the key. """
+
+    def __init__(self, spice_interface, process_data_path):
+        self.spice_interface = spice_interface
+        self.process_data_path = os.path.abspath(process_data_path)
+        self._netlist_names = sizing_scheduler.NetlistNames()
+        # Names of the parameters each deck uses
+        self._param_names = {}
+        # Jobs submitted. Maps (deck, process data hash, columns, fidelity, corners, parameter values) -> future
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+
+    def submit(self, sp_path, parameter_dict, columns=False, fidelity="full", corners=None):
+        sp_path = os.path.abspath(sp_path)
+        param_names = self._param_names.get(sp_path)
+        if param_names is None:
+            netlist_names = self._netlist_names.get(sp_path)
+            param_names = [param_name for param_name in parameter_dict if param_name in netlist_names]
+            self._param_names[sp_path] = param_names
+        with open(self.process_data_path, "rb") as process_data_file:
+            process_data_hash = hashlib.sha1(process_data_file.read()).hexdigest()
+        key = (sp_path, process_data_hash, columns, fidelity, tuple(corners) if corners else None, 
+               tuple(tuple(parameter_dict[param_name]) for param_name in param_names))
+
+        with self._lock:
+            spice_job = self._jobs.get(key)
+            if spice_job is None:
+                spice_job = self.spice_interface.submit(sp_path, parameter_dict, columns, fidelity, corners)
+                self._jobs[key] = spice_job
+
+        return spice_job
+
+
+    def run(self, sp_path, parameter_dict, fidelity="full", corners=None):
+        return self.submit(sp_path, parameter_dict, fidelity=fidelity, corners=corners).result()
+
+
+    def run_columns(self, sp_path, parameter_dict, fidelity="full", corners=None):
+        return self.submit(sp_path, parameter_dict, columns=True, fidelity=fidelity, corners=corners).result()
+
+
+class _DictRecorder:
+    """ Stands in for one of the dictionaries (area_dict, width_dict, etc.) that the FPGA passes to
+        the update_area and update_wires methods of its blocks. Reads and writes go to 'values',
+        and the keys that are read or written are added to 'reads' and 'writes'. 
+        Only d[key] reads and writes can be recorded. Anything else (d.get(key), key in d, iterating
+        over d, etc.) raises a TypeError, since the recorded dependencies would be incomplete and the
+        incremental updates would silently use stale values. """
+
+    def __init__(self, values, reads, writes):
+        self.values = values
+        self.reads = reads
+        self.writes = writes
+
+
+    def __getitem__(self, key):
+        self.reads.add(key)
+        return self.values[key]
+
+
+    def __setitem__(self, key, value):
+        self.writes.add(key)
+        self.values[key] = value
+
+
+    def _unsupported(self, operation):
+        raise TypeError("update_area and update_wires can only use d[key] on the FPGA dictionaries, "
+                        "the dependencies of '" + operation + "' can't be recorded")
+
+
+    def __getattr__(self, name):
+        # Protocol lookups (e.g. copy looking for __deepcopy__) expect an AttributeError
+        if name.startswith("__"):
+            raise AttributeError(name)
+        self._unsupported("." + name)
+
+
+    def __contains__(self, key):
+        self._unsupported("in")
+
+
+    def __iter__(self):
+        self._unsupported("iter")
+
+
+    def __len__(self):
+        self._unsupported("len")
+
+
+    def __delitem__(self, key):
+        self._unsupported("del")
+
   
 class FPGA:
     """ This class describes an FPGA. """
@@ -5402,14 +5792,25 @@ class FPGA:
 
         self.area_opt_weight = run_options.area_opt_weight
         self.delay_opt_weight = run_options.delay_opt_weight
+        # How search_ranges searches the transistor sizing combinations ("grid", "surrogate" or "prune")
+        self.search_mode = run_options.search_mode
+        # Simulation fidelity tier of the search_ranges screening sweeps (see spice.SPICE_FIDELITY_TIERS)
+        self.screening_fidelity = run_options.screening_fidelity
+        # Search for the logic tile height with the lowest cost before sizing (see determine_height)
+        self.floorplan_search = run_options.floorplan
         self.spice_interface = spice_interface        
         # This is a dictionary of all the transistor sizes in the FPGA ('name': 'size')
         # It will contain the data in xMin transistor width, e.g. 'inv_sb_mux_1_nmos': '2'
         # That means inv_sb_mux_1_nmos is a transistor with 2x minimum width
-        self.transistor_sizes = {}
+        # The sizes are also kept in an array, see TransistorSizes.
+        self.transistor_sizes = TransistorSizes()
         # This is a list of tuples containing area information for each transistor in the FPGA
         # Tuple: (tran_name, tran_channel_width_nm, tran_drive_strength, tran_area_min_areas, tran_area_nm, tran_width_nm)
         self.transistor_area_list = []
+        # Area model coefficients (a, b, c) of each transistor type, see _area_model_coefficients
+        self._area_coefficients = None
+        # Transistor areas in nm^2, in the order of transistor_sizes
+        self._tran_areas_nm = None
         
         # A note on the following 5 dictionaries
         # (area_dict, width_dict, wire_lengths, wire_layers, wire_rc_dict)
@@ -5449,11 +5850,37 @@ class FPGA:
         self.wire_layers = {}
         # This dictionary contains wire resistance and capacitance for each wire as a tuple ('wire_name': (R, C))
         self.wire_rc_dict = {}
+        # Dependencies of the blocks whose update_area and update_wires methods the FPGA calls.
+        # For each block: (arguments of the last call, keys it reads, keys it writes). They are recorded
+        # when everything is updated and let later updates skip the blocks whose inputs didn't change.
+        self._area_deps = {}
+        self._wire_deps = {}
+        # Keys of area_dict and width_dict written by update_area itself (tile totals, etc.)
+        self._area_total_keys = set()
+        # Keys of area_dict and width_dict that changed since the start of update_area (None while
+        # the dependencies are recorded) and since the last update_wires (None if any of them may have).
+        self._changed_area_keys = None
+        self._changed_width_keys = None
+        # Wires whose length or layer changed since the last update_wire_rc (None if any of them may have)
+        self._changed_wires = None
+        # Pairs of floorplan stripes whose distance compute_distance measures (see _get_stripe_pairs)
+        self._stripe_pairs = None
         
         # This dictionary contains the delays of all subcircuits (i.e. the max of rise and fall)
         # Contrary to the above 5 dicts, this one is not passed down into the other objects.
         # This dictionary is updated by calling 'update_delays()'
         self.delay_dict = {}
+        # Results of the last update_delays run with variation (None until there is one). 
+        # 'variation_delays' maps the name of each top-level SPICE file to its delay (the max of tfall
+        # and trise) with one row per device model and one column per Monte Carlo sample. The first row
+        # is the nominal model and the first column the nominal sizes. 'variation_crit_path' is the 
+        # representative critical path delay in the same format and 'variation_models' names the rows.
+        self.variation_delays = None
+        self.variation_crit_path = None
+        self.variation_models = None
+        # (tfall, trise) of each top-level SPICE file simulated by the variation run in progress, in the
+        # format of 'variation_delays'. None if no such run is in progress.
+        self._variation_meas = None
         
         # Metal stack. Lowest index is lowest metal layer. COFFE assumes that wire widths increase as we use higher metal layers.
         # For example, wires in metal_stack[1] are assumed to be wider (and/or more spaced) than wires in metal_stack[0]
@@ -5598,18 +6025,47 @@ class FPGA:
         print("")
         
 
-    def update_area(self):
+    def update_area(self, component_areas=None):
         """ This function updates self.area_dict. It passes area_dict to member objects (like sb_mux)
-            to update their area. Then, with an up-to-date area_dict it, calculate total tile area. """
-        
-        # We use the self.transistor_sizes to compute area. This dictionary has the form 'name': 'size'
-        # And it knows the transistor sizes of all transistors in the FPGA
-        # We first need to calculate the area for each transistor.
-        # This function stores the areas in the transistor_area_list
-        self._update_area_per_transistor()
-        # Now, we have to update area_dict and width_dict with the new transistor area values
-        # for the basic subcircuits which are inverteres, ptran, tgate, restorers and transistors
-        self._update_area_and_width_dicts()
+            to update their area. Then, with an up-to-date area_dict it, calculate total tile area. 
+            'component_areas' is an optional (areas, widths) pair of basic component areas and widths
+            computed ahead of time for the current transistor sizes by get_component_areas_batch.
+            When it is given, the per-transistor area computation is skipped (and transistor_area_list
+            is not updated). The basic component areas are then updated in place and only the blocks
+            that read the area of a component (or block) that changed are updated again. When a single 
+            subcircuit is being sized, that leaves most of the FPGA untouched. Otherwise, everything is 
+            recomputed and the dependencies of the blocks are recorded. """
+        
+        if component_areas is None or len(self._area_deps) == 0:
+            self._changed_area_keys = None
+            self._changed_width_keys = None
+            self._area_deps = {}
+        else:
+            self._changed_area_keys = set()
+
+        if component_areas is None:
+            # We use the self.transistor_sizes to compute area. This dictionary has the form 'name': 'size'
+            # And it knows the transistor sizes of all transistors in the FPGA
+            # We first need to calculate the area for each transistor.
+            # This function stores the areas in the transistor_area_list
+            self._update_area_per_transistor()
+            # Now, we have to update area_dict and width_dict with the new transistor area values
+            # for the basic subcircuits which are inverteres, ptran, tgate, restorers and transistors
+            self._update_area_and_width_dicts()
+        elif self._changed_area_keys is None:
+            comp_names = self.transistor_sizes.get_component_names()
+            self.area_dict = dict(zip(comp_names, component_areas[0]))
+            self.width_dict = dict(zip(comp_names, component_areas[1]))
+        else:
+            comp_names = self.transistor_sizes.get_component_names()
+            area_dict = self.area_dict
+            width_dict = self.width_dict
+            for comp_name, comp_area, comp_width in zip(comp_names, component_areas[0], component_areas[1]):
+                if area_dict[comp_name] != comp_area:
+                    area_dict[comp_name] = comp_area
+                    width_dict[comp_name] = comp_width
+                    self._changed_area_keys.add(comp_name)
+        comp_keys = set(self.area_dict) if self._changed_area_keys is None else None
         #I found that printing width_dict here and comparing against golden results was helpful
         #self.debug_print("width_dict")
 
@@ -5624,26 +6080,32 @@ class FPGA:
 
         # carry chain:
         if self.specs.enable_carry_chain == 1:
-            self.carrychainperf.update_area(self.area_dict, self.width_dict)
-            self.carrychainmux.update_area(self.area_dict, self.width_dict)
-            self.carrychaininter.update_area(self.area_dict, self.width_dict)
-            self.carrychain.update_area(self.area_dict, self.width_dict)
+            self._update_block_area(self.carrychainperf)
+            self._update_block_area(self.carrychainmux)
+            self._update_block_area(self.carrychaininter)
+            self._update_block_area(self.carrychain)
             if self.specs.carry_chain_type == "skip":
-                self.carrychainand.update_area(self.area_dict, self.width_dict)
-                self.carrychainskipmux.update_area(self.area_dict, self.width_dict)
+                self._update_block_area(self.carrychainand)
+                self._update_block_area(self.carrychainskipmux)
 
 
         # Call area calculation functions of sub-blocks
-        self.sb_mux.update_area(self.area_dict, self.width_dict)
-        self.cb_mux.update_area(self.area_dict, self.width_dict)
-        self.logic_cluster.update_area(self.area_dict, self.width_dict)
+        self._update_block_area(self.sb_mux)
+        self._update_block_area(self.cb_mux)
+        self._update_block_area(self.logic_cluster)
         
 
         for hardblock in self.hardblocklist:
-            hardblock.update_area(self.area_dict, self.width_dict)
+            self._update_block_area(hardblock)
         
         if self.specs.enable_bram_block == 1:
-            self.RAM.update_area(self.area_dict, self.width_dict)
+            self._update_block_area(self.RAM)
+
+        # The totals below are always computed again. They change whenever any area does.
+        if self._changed_area_keys is not None and len(self._changed_area_keys) > 0:
+            self._changed_area_keys.update(self._area_total_keys)
+            if self._changed_width_keys is not None:
+                self._changed_width_keys.update(self._changed_area_keys)
         
         # Calculate total area of switch block
         switch_block_area = self.sb_mux.num_per_tile*self.area_dict[self.sb_mux.name + "_sram"]
@@ -5846,6 +6308,12 @@ class FPGA:
             self.area_dict["ram_core"] = RAM_area - RAM_SB_area - RAM_CB_area
             self.width_dict["ram"] = math.sqrt(RAM_area) 
         
+        if self._changed_area_keys is None:
+            # Everything that isn't a basic component or written by a block is a total
+            self._area_total_keys = set(self.area_dict).union(self.width_dict).difference(comp_keys)
+            for args, reads, writes in self._area_deps.values():
+                self._area_total_keys.difference_update(writes)
+
         if self.lb_height != 0.0:  
             self.compute_distance()
 
@@ -5931,92 +6399,13 @@ class FPGA:
         self.d_ffble_to_ic = 0.0
 
         # worst-case distance between two stripes:
-        for index1, item1 in enumerate(self.stripe_order):
-            for index2, item2 in enumerate(self.stripe_order):
-                if item1 != item2:
-                    if (item1 == "cb" and item2 == "ic") or (item1 == "ic" and item2 == "cb"):
-                        if index1 < index2:
-                            distance_temp = self.dict_real_widths[self.stripe_order[index1]]/self.span_stripe_fraction
-                            for i in range(index1 + 1, index2):
-                                distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[i]]/self.span_stripe_fraction
-                            distance_temp = distance_temp +  self.dict_real_widths[self.stripe_order[index2]]/self.span_stripe_fraction
-                        else:
-                            distance_temp = self.dict_real_widths[self.stripe_order[index2]]/self.span_stripe_fraction
-                            for i in range(index2 + 1, index1):
-                                distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[i]]/self.span_stripe_fraction
-                            distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[index1]]/self.span_stripe_fraction
-                        if self.d_cb_to_ic < distance_temp:
-                            self.d_cb_to_ic = distance_temp
-
-                    if (item1 == "lut" and item2 == "ic") or (item1 == "ic" and item2 == "lut"):
-                        if index1 < index2:
-                            distance_temp = self.dict_real_widths[self.stripe_order[index1]]/self.span_stripe_fraction
-                            for i in range(index1 + 1, index2):
-                                distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[i]]/self.span_stripe_fraction
-                            distance_temp = distance_temp +  self.dict_real_widths[self.stripe_order[index2]]/self.span_stripe_fraction
-                        else:
-                            distance_temp = self.dict_real_widths[self.stripe_order[index2]]/self.span_stripe_fraction
-                            for i in range(index2 + 1, index1):
-                                distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[i]]/self.span_stripe_fraction
-                            distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[index1]]/self.span_stripe_fraction
-                        if self.d_ic_to_lut < distance_temp:
-                            self.d_ic_to_lut = distance_temp
-
-                    if (item1 == "lut" and item2 == "cc") or (item1 == "cc" and item2 == "lut"):
-                        if index1 < index2:
-                            distance_temp = self.dict_real_widths[self.stripe_order[index1]]/self.span_stripe_fraction
-                            for i in range(index1 + 1, index2):
-                                distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[i]]/self.span_stripe_fraction
-                            distance_temp = distance_temp +  self.dict_real_widths[self.stripe_order[index2]]/self.span_stripe_fraction
-                        else:
-                            distance_temp = self.dict_real_widths[self.stripe_order[index2]]/self.span_stripe_fraction
-                            for i in range(index2 + 1, index1):
-                                distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[i]]/self.span_stripe_fraction
-                            distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[index1]]/self.span_stripe_fraction
-                        if self.d_lut_to_cc < distance_temp:
-                            self.d_lut_to_cc = distance_temp
-
-                    if (item1 == "ffble" and item2 == "cc") or (item1 == "cc" and item2 == "ffble"):
-                        if index1 < index2:
-                            distance_temp = self.dict_real_widths[self.stripe_order[index1]]/self.span_stripe_fraction
-                            for i in range(index1 + 1, index2):
-                                distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[i]]/self.span_stripe_fraction
-                            distance_temp = distance_temp +  self.dict_real_widths[self.stripe_order[index2]]/self.span_stripe_fraction
-                        else:
-                            distance_temp = self.dict_real_widths[self.stripe_order[index2]]/self.span_stripe_fraction
-                            for i in range(index2 + 1, index1):
-                                distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[i]]/self.span_stripe_fraction
-                            distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[index1]]/self.span_stripe_fraction
-                        if self.d_cc_to_ffble < distance_temp:
-                            self.d_cc_to_ffble = distance_temp                                                                                    
-
-                    if (item1 == "ffble" and item2 == "sb") or (item1 == "sb" and item2 == "ffble"):
-                        if index1 < index2:
-                            distance_temp = self.dict_real_widths[self.stripe_order[index1]]/self.span_stripe_fraction
-                            for i in range(index1 + 1, index2):
-                                distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[i]]/self.span_stripe_fraction
-                            distance_temp = distance_temp +  self.dict_real_widths[self.stripe_order[index2]]/self.span_stripe_fraction
-                        else:
-                            distance_temp = self.dict_real_widths[self.stripe_order[index2]]/self.span_stripe_fraction
-                            for i in range(index2 + 1, index1):
-                                distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[i]]/self.span_stripe_fraction
-                            distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[index1]]/self.span_stripe_fraction
-                        if self.d_ffble_to_sb < distance_temp:
-                            self.d_ffble_to_sb = distance_temp
-
-                    if (item1 == "ffble" and item2 == "ic") or (item1 == "ic" and item2 == "ffble"):
-                        if index1 < index2:
-                            distance_temp = self.dict_real_widths[self.stripe_order[index1]]/self.span_stripe_fraction
-                            for i in range(index1 + 1, index2):
-                                distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[i]]/self.span_stripe_fraction
-                            distance_temp = distance_temp +  self.dict_real_widths[self.stripe_order[index2]]/self.span_stripe_fraction
-                        else:
-                            distance_temp = self.dict_real_widths[self.stripe_order[index2]]/self.span_stripe_fraction
-                            for i in range(index2 + 1, index1):
-                                distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[i]]/self.span_stripe_fraction
-                            distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[index1]]/self.span_stripe_fraction
-                        if self.d_ffble_to_ic < distance_temp:
-                            self.d_ffble_to_ic = distance_temp       
+        for distance_name, index1, index2 in self._get_stripe_pairs():
+            distance_temp = self.dict_real_widths[self.stripe_order[index1]]/self.span_stripe_fraction
+            for i in range(index1 + 1, index2):
+                distance_temp = distance_temp + self.dict_real_widths[self.stripe_order[i]]/self.span_stripe_fraction
+            distance_temp = distance_temp +  self.dict_real_widths[self.stripe_order[index2]]/self.span_stripe_fraction
+            if getattr(self, distance_name) < distance_temp:
+                setattr(self, distance_name, distance_temp)
         
         #print str(self.dict_real_widths["sb"])
         #print str(self.dict_real_widths["cb"])
@@ -6027,58 +6416,150 @@ class FPGA:
         #print str(self.lb_height)
 
 
+    def _get_stripe_pairs(self):
+        """ Returns the pairs of stripes whose distance compute_distance measures, as (name of the distance
+            attribute, index of the left stripe, index of the right stripe) tuples. They only depend on
+            self.stripe_order, so they are only found again when it changes. """
+
+        if self._stripe_pairs is not None and self._stripe_pairs[0] == self.stripe_order:
+            return self._stripe_pairs[1]
+
+        distance_stripes = [("d_cb_to_ic", "cb", "ic"), ("d_ic_to_lut", "ic", "lut"), ("d_lut_to_cc", "lut", "cc"),
+                            ("d_cc_to_ffble", "cc", "ffble"), ("d_ffble_to_sb", "ffble", "sb"), ("d_ffble_to_ic", "ffble", "ic")]
+        stripe_pairs = []
+        for index1, item1 in enumerate(self.stripe_order):
+            for index2 in range(index1 + 1, len(self.stripe_order)):
+                item2 = self.stripe_order[index2]
+                for distance_name, stripe1, stripe2 in distance_stripes:
+                    if (item1 == stripe1 and item2 == stripe2) or (item1 == stripe2 and item2 == stripe1):
+                        stripe_pairs.append((distance_name, index1, index2))
+
+        self._stripe_pairs = (list(self.stripe_order), stripe_pairs)
+
+        return stripe_pairs
+
+
     def determine_height(self):
+        """ Searches for the logic tile height with the lowest cost (see FLOORPLAN_HEIGHT_STEP). The cost
+            is assumed to be unimodal in the height, so each round only evaluates a few heights inside the
+            bracket around the best height found so far and then narrows the bracket down to the heights
+            next to the best one. The heights of a round are evaluated at the same time, on copies of the
+            FPGA, when SPICE jobs can run concurrently. Subcircuits whose parameters don't change with the
+            height are simulated only once. Area and wires are updated for the best height, delays aren't. """
 
         # if no previous floorplan exists, get an initial height:
         if self.lb_height == 0.0:
             self.lb_height = math.sqrt(self.area_dict["tile"])
 
-        is_done = False
-        current_iteration = 0
-        max_iteration = 10
-        # tweak the current height to find a better one, possibly:
-        while is_done == False and current_iteration < max_iteration:
-            print("searching for a height for the logic tile " + str(self.lb_height))
-            old_height = self.lb_height
-            current_best_index = 0
-            self.update_area()
-            self.update_wires()
-            self.update_wire_rc()
-            self.update_delays(self.spice_interface)
-            old_cost = tran_sizing.cost_function(tran_sizing.get_eval_area(self, "global", self.sb_mux, 0, 0), tran_sizing.get_current_delay(self, 0), self.area_opt_weight, self.delay_opt_weight)
-            for i in range (-10,11):
-                self.lb_height = old_height + ((0.01 * (i))* old_height)
-                self.update_area()
-                self.update_wires()
-                self.update_wire_rc()
-                self.update_delays(self.spice_interface)
-                new_cost = tran_sizing.cost_function(tran_sizing.get_eval_area(self, "global", self.sb_mux, 0, 0), tran_sizing.get_current_delay(self, 0), self.area_opt_weight, self.delay_opt_weight)
-                if new_cost < old_cost:
-                    old_cost = new_cost
-                    current_best_index = i
-            self.lb_height = (0.01 * (current_best_index))* old_height + old_height
-            current_iteration = current_iteration + 1
-            if current_best_index == 0:
-                is_done = True
+        start_height = self.lb_height
+        spice_interface = _MemoizedSpiceInterface(self.spice_interface, self.process_data_filename)
+        # Cost of each height evaluated, by grid index
+        costs = {}
+        # Heights must stay positive
+        min_index = -int(round(1/FLOORPLAN_HEIGHT_STEP)) + 1
+
+        low = max(-FLOORPLAN_SEARCH_SPAN, min_index)
+        high = FLOORPLAN_SEARCH_SPAN
+        current_round = 0
+        while True:
+            print("searching for a height for the logic tile between " + str(start_height*(1 + FLOORPLAN_HEIGHT_STEP*low)) +
+                  " and " + str(start_height*(1 + FLOORPLAN_HEIGHT_STEP*high)))
+            # Evaluate the ends of the bracket and FLOORPLAN_CANDIDATES heights evenly spread inside it
+            # (and the starting height, which is kept unless another height is better)
+            candidates = set([0])
+            for i in range(FLOORPLAN_CANDIDATES + 2):
+                candidates.add(low + int(round((high - low)*i/(FLOORPLAN_CANDIDATES + 1))))
+            candidates = sorted(index for index in candidates if index not in costs)
+            heights = [start_height*(1 + FLOORPLAN_HEIGHT_STEP*index) for index in candidates]
+            costs.update(zip(candidates, self._evaluate_heights(heights, spice_interface)))
+
+            # Best height in the bracket. On ties, the one closest to the starting height wins.
+            bracket = sorted(index for index in costs if low <= index <= high)
+            best_index = min(bracket, key=lambda index: (costs[index], abs(index)))
+            position = bracket.index(best_index)
+            current_round = current_round + 1
+
+            # If the best height is on one end of the bracket, the lowest cost might be further away
+            if best_index == high and current_round < FLOORPLAN_MAX_ROUNDS:
+                low = bracket[position - 1]
+                high = best_index + 2*FLOORPLAN_SEARCH_SPAN
+            elif best_index == low and best_index > min_index and current_round < FLOORPLAN_MAX_ROUNDS:
+                high = bracket[position + 1]
+                low = max(best_index - 2*FLOORPLAN_SEARCH_SPAN, min_index)
+            elif best_index == low or best_index == high:
+                break
+            else:
+                low = bracket[position - 1]
+                high = bracket[position + 1]
+                if high - low <= 2:
+                    break
+
+        self.lb_height = start_height*(1 + FLOORPLAN_HEIGHT_STEP*best_index)
+        self.update_area()
+        self.update_wires()
+        self.update_wire_rc()
 
         print("found the best tile height: " + str(self.lb_height))
 
-        
+
+    def _evaluate_heights(self, heights, spice_interface):
+        """ Returns the cost of the FPGA for each logic tile height in 'heights'. If 'spice_interface' can
+            run several SPICE jobs at once, the heights are evaluated at the same time, each on its own copy
+            of the FPGA. Otherwise, they are evaluated one after the other on this FPGA. MTJ BRAMs
+            are always evaluated one after the other, because their delay update rewrites process_data.l,
+            which all the copies share. """
+
+        mtj_bram = self.specs.enable_bram_block == 1 and self.RAM.memory_technology != "SRAM"
+        if len(heights) == 1 or self.spice_interface.num_workers == 1 or mtj_bram:
+            return [self._evaluate_height(height, spice_interface) for height in heights]
+
+        # The copies share the SPICE interfaces (and their worker pools) with the FPGA
+        snapshots = []
+        for height in heights:
+            memo = {id(self.spice_interface): self.spice_interface, id(spice_interface): spice_interface}
+            snapshots.append(copy.deepcopy(self, memo))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(heights)) as executor:
+            futures = [executor.submit(snapshot._evaluate_height, height, spice_interface) 
+                       for snapshot, height in zip(snapshots, heights)]
+            return [future.result() for future in futures]
+
+
+    def _evaluate_height(self, height, spice_interface):
+        """ Sets the logic tile height to 'height', updates area, wires and delays and returns the cost. 
+            The delays are measured with the current stimulus, so that no SPICE file is changed. """
+
+        self.lb_height = height
+        self.update_area()
+        self.update_wires()
+        self.update_wire_rc()
+        self._update_delays(spice_interface)
+
+        return tran_sizing.cost_function(tran_sizing.get_eval_area(self, "global", self.sb_mux, 0, 0), 
+                                         tran_sizing.get_current_delay(self, 0), self.area_opt_weight, self.delay_opt_weight)
+
 
     def update_wires(self):
         """ This function updates self.wire_lengths and self.wire_layers. It passes wire_lengths and wire_layers to member 
-            objects (like sb_mux) to update their wire lengths and layers. """
+            objects (like sb_mux) to update their wire lengths and layers. 
+            Blocks whose ratios didn't change, and that don't read a width that changed since the last
+            call, are skipped. """
+
+        if self._changed_width_keys is None:
+            # Update every block and record the widths and wires they use
+            self._wire_deps = {}
+            self._changed_wires = None
         
         # Update wire lengths and layers for all subcircuits
 
 
 
         if self.lb_height == 0:
-            self.cluster_output_load.update_wires(self.width_dict, self.wire_lengths, self.wire_layers, 0.0, 0.0)
-            self.sb_mux.update_wires(self.width_dict, self.wire_lengths, self.wire_layers, 1.0)
-            self.cb_mux.update_wires(self.width_dict, self.wire_lengths, self.wire_layers, 1.0)
-            self.logic_cluster.update_wires(self.width_dict, self.wire_lengths, self.wire_layers, 1.0, 1.0, 0.0, 0.0)
-            self.routing_wire_load.update_wires(self.width_dict, self.wire_lengths, self.wire_layers, 0.0, 2.0, 2.0)
+            self._update_block_wires(self.cluster_output_load, 0.0, 0.0)
+            self._update_block_wires(self.sb_mux, 1.0)
+            self._update_block_wires(self.cb_mux, 1.0)
+            self._update_block_wires(self.logic_cluster, 1.0, 1.0, 0.0, 0.0)
+            self._update_block_wires(self.routing_wire_load, 0.0, 2.0, 2.0)
         else:
             sb_ratio = (self.lb_height/(self.sb_mux.num_per_tile/self.num_sb_stripes)) / self.dict_real_widths["sb"]
             if sb_ratio < 1.0:
@@ -6112,37 +6593,108 @@ class FPGA:
 
             #this was used for debugging so I commented it
             #print "ratios " + str(sb_ratio) +" "+ str(cb_ratio) +" "+ str(ic_ratio) +" "+ str(lut_ratio)
-            self.cluster_output_load.update_wires(self.width_dict, self.wire_lengths, self.wire_layers, self.d_ffble_to_sb, self.lb_height)
-            self.sb_mux.update_wires(self.width_dict, self.wire_lengths, self.wire_layers, sb_ratio)
-            self.cb_mux.update_wires(self.width_dict, self.wire_lengths, self.wire_layers, cb_ratio)
-            self.logic_cluster.update_wires(self.width_dict, self.wire_lengths, self.wire_layers, ic_ratio, lut_ratio, self.d_ffble_to_ic, self.d_cb_to_ic + self.lb_height)
-            self.routing_wire_load.update_wires(self.width_dict, self.wire_lengths, self.wire_layers, self.lb_height, self.num_sb_stripes, self.num_cb_stripes)
+            self._update_block_wires(self.cluster_output_load, self.d_ffble_to_sb, self.lb_height)
+            self._update_block_wires(self.sb_mux, sb_ratio)
+            self._update_block_wires(self.cb_mux, cb_ratio)
+            self._update_block_wires(self.logic_cluster, ic_ratio, lut_ratio, self.d_ffble_to_ic, self.d_cb_to_ic + self.lb_height)
+            self._update_block_wires(self.routing_wire_load, self.lb_height, self.num_sb_stripes, self.num_cb_stripes)
 
 
         
         if self.specs.enable_carry_chain == 1:
-            self.carrychain.update_wires(self.width_dict, self.wire_lengths, self.wire_layers)
-            self.carrychainperf.update_wires(self.width_dict, self.wire_lengths, self.wire_layers)
-            self.carrychainmux.update_wires(self.width_dict, self.wire_lengths, self.wire_layers)
-            self.carrychaininter.update_wires(self.width_dict, self.wire_lengths, self.wire_layers)
+            self._update_block_wires(self.carrychain)
+            self._update_block_wires(self.carrychainperf)
+            self._update_block_wires(self.carrychainmux)
+            self._update_block_wires(self.carrychaininter)
             if self.specs.carry_chain_type == "skip":
-                self.carrychainand.update_wires(self.width_dict, self.wire_lengths, self.wire_layers)
-                self.carrychainskipmux.update_wires(self.width_dict, self.wire_lengths, self.wire_layers)                
+                self._update_block_wires(self.carrychainand)
+                self._update_block_wires(self.carrychainskipmux)                
         if self.specs.enable_bram_block == 1:
-            self.RAM.update_wires(self.width_dict, self.wire_lengths, self.wire_layers)
+            self._update_block_wires(self.RAM)
 
 
         for hardblock in self.hardblocklist:
-            hardblock.update_wires(self.width_dict, self.wire_lengths, self.wire_layers)  
-            hardblock.mux.update_wires(self.width_dict, self.wire_lengths, self.wire_layers)   
+            self._update_block_wires(hardblock)  
+            self._update_block_wires(hardblock.mux)   
+
+        self._changed_width_keys = set()
 
         #self.debug_print("wire_lengths")  
 
+    def _record_block(self, deps, block, update_function, dicts, args):
+        """ Calls update_function(*dicts, *args), which is the update_area or update_wires method of 'block',
+            and saves the arguments and the dictionary keys it reads and writes in deps[block]. """
+
+        reads = set()
+        writes = set()
+        update_function(*[_DictRecorder(values, reads, writes) for values in dicts], *args)
+        deps[block] = (args, reads, writes)
+
+
+    def _update_block_area(self, block):
+        """ Updates the area of 'block' if it reads a key of self._changed_area_keys,
+            or records its dependencies if self._changed_area_keys is None. """
+
+        if self._changed_area_keys is None:
+            self._record_block(self._area_deps, block, block.update_area, (self.area_dict, self.width_dict), ())
+            return
+
+        args, reads, writes = self._area_deps[block]
+        if not reads.isdisjoint(self._changed_area_keys):
+            block.update_area(self.area_dict, self.width_dict)
+            self._changed_area_keys.update(writes)
+
+
+    def _update_block_wires(self, block, *args):
+        """ Updates the wires of 'block' if its arguments changed or if it reads a key of
+            self._changed_width_keys, or records its dependencies if self._changed_width_keys is None. """
+
+        if self._changed_width_keys is None:
+            self._record_block(self._wire_deps, block, block.update_wires, 
+                               (self.width_dict, self.wire_lengths, self.wire_layers), args)
+            return
+
+        last_args, reads, writes = self._wire_deps[block]
+        if last_args != args or not reads.isdisjoint(self._changed_width_keys):
+            block.update_wires(self.width_dict, self.wire_lengths, self.wire_layers, *args)
+            self._wire_deps[block] = (args, reads, writes)
+            # Later blocks may read these wires
+            self._changed_width_keys.update(writes)
+            if self._changed_wires is not None:
+                self._changed_wires.update(writes)
+
+
+    def get_wire_rc_batch(self, wire_lengths, wire_layers):
+        """ Computes wire resistance and capacitance the same way as update_wire_rc, but for many
+            transistor sizing combinations at once. 'wire_lengths' has one row per combo and one column
+            per wire, 'wire_layers' has the layer of each of these wires. 
+            Returns a float array of shape (combos, wires, 2) that holds (R, C) for each combo and wire. """
+
+        rc = np.array(self.metal_stack, dtype=np.float64)
+        wire_lengths = np.asarray(wire_lengths, dtype=np.float64)
+        wire_layers = np.asarray(wire_layers, dtype=np.intp)
+
+        wire_rc = np.empty(wire_lengths.shape + (2,))
+        np.multiply(rc[wire_layers, 0], wire_lengths, out=wire_rc[:, :, 0])
+        np.multiply(rc[wire_layers, 1], wire_lengths, out=wire_rc[:, :, 1])
+        wire_rc[:, :, 1] /= 2
+
+        return wire_rc
+
+
     def update_wire_rc(self):
-        """ This function updates self.wire_rc_dict based on the FPGA's self.wire_lengths and self.wire_layers."""
+        """ This function updates self.wire_rc_dict based on the FPGA's self.wire_lengths and self.wire_layers.
+            Only the wires whose length or layer changed since the last call are updated. """
+
+        if self._changed_wires is None:
+            changed_wires = self.wire_lengths.keys()
+        else:
+            changed_wires = self._changed_wires
+        self._changed_wires = set()
             
         # Calculate R and C for each wire
-        for wire, length in self.wire_lengths.items():
+        for wire in changed_wires:
+            length = self.wire_lengths[wire]
             # Get wire layer
             layer = self.wire_layers[wire]
             # Get R and C per unit length for wire layer
@@ -6155,28 +6707,328 @@ class FPGA:
 
 
 
-    #TODO: break this into different functions or form a loop out of it; it's too long
-    def update_delays(self, spice_interface):
+    def _get_update_delays_spice_paths(self):
+        """ Returns the top-level SPICE decks simulated by update_delays, in the order update_delays uses them.
+            Two lists are returned. The first contains every deck that only depends on the transistor sizes
+            and wire RC. The second contains the MTJ memory decks that must be simulated after the bitline
+            charging results have been written to process_data.l (it is empty for SRAM memories). """
+
+        spice_paths = []
+        mtj_spice_paths = []
+
+        spice_paths.append(self.sb_mux.top_spice_path)
+        spice_paths.append(self.cb_mux.top_spice_path)
+        spice_paths.append(self.logic_cluster.local_mux.top_spice_path)
+        spice_paths.append(self.logic_cluster.ble.local_output.top_spice_path)
+        spice_paths.append(self.logic_cluster.ble.general_output.top_spice_path)
+        if self.specs.use_fluts:
+            spice_paths.append(self.logic_cluster.ble.fmux.top_spice_path)
+        spice_paths.append(self.logic_cluster.ble.lut.top_spice_path)
+        for lut_input_name, lut_input in self.logic_cluster.ble.lut.input_drivers.items():
+            # These inputs reuse the fracturable LUT mux delay and have no driver_and_lut simulation
+            if not ((lut_input_name == "f" and self.specs.use_fluts and self.specs.K == 6) or (lut_input_name == "e" and self.specs.use_fluts and self.specs.K == 5)):
+                spice_paths.append(lut_input.driver.top_spice_path.replace(".sp", "_with_lut.sp"))
+            spice_paths.append(lut_input.driver.top_spice_path)
+            spice_paths.append(lut_input.not_driver.top_spice_path)
+
+        if self.specs.enable_carry_chain == 1:
+            spice_paths.append(self.carrychain.top_spice_path)
+            spice_paths.append(self.carrychainperf.top_spice_path)
+            spice_paths.append(self.carrychainmux.top_spice_path)
+            spice_paths.append(self.carrychaininter.top_spice_path)
+            if self.specs.carry_chain_type == "skip":
+                spice_paths.append(self.carrychainand.top_spice_path)
+                spice_paths.append(self.carrychainskipmux.top_spice_path)
+
+        for hardblock in self.hardblocklist:
+            spice_paths.append(hardblock.mux.top_spice_path)
+            if hardblock.parameters['num_dedicated_outputs'] > 0:
+                spice_paths.append(hardblock.dedicated.top_spice_path)
+
+        if self.specs.enable_bram_block == 0:
+            return spice_paths, mtj_spice_paths
+
+        spice_paths.append(self.RAM.RAM_local_mux.top_spice_path)
+        spice_paths.append(self.RAM.rowdecoder_stage0.top_spice_path)
+        if self.RAM.valid_row_dec_size2 == 1:
+            spice_paths.append(self.RAM.rowdecoder_stage1_size2.top_spice_path)
+        if self.RAM.valid_row_dec_size3 == 1:
+            spice_paths.append(self.RAM.rowdecoder_stage1_size3.top_spice_path)
+        spice_paths.append(self.RAM.rowdecoder_stage3.top_spice_path)
+
+        if self.RAM.memory_technology == "SRAM":
+            spice_paths.append(self.RAM.precharge.top_spice_path)
+            spice_paths.append(self.RAM.samp_part2.top_spice_path)
+            spice_paths.append(self.RAM.samp.top_spice_path)
+            spice_paths.append(self.RAM.writedriver.top_spice_path)
+            # Nothing changes process_data.l for SRAM, so the remaining decks are independent too
+            remaining_spice_paths = spice_paths
+        else:
+            # The first bitline charging simulation sets target_bl for the second one, which is
+            # run serially. Everything after that uses the updated process data.
+            spice_paths.append(self.RAM.bldischarging.top_spice_path)
+            spice_paths.append(self.RAM.blcharging.top_spice_path)
+            mtj_spice_paths.append(self.RAM.mtjsamp.top_spice_path)
+            remaining_spice_paths = mtj_spice_paths
+
+        remaining_spice_paths.append(self.RAM.columndecoder.top_spice_path)
+        remaining_spice_paths.append(self.RAM.configurabledecoderi.top_spice_path)
+        if self.RAM.cvalidobj1 == 1:
+            remaining_spice_paths.append(self.RAM.configurabledecoder3ii.top_spice_path)
+        if self.RAM.cvalidobj2 == 1:
+            remaining_spice_paths.append(self.RAM.configurabledecoder2ii.top_spice_path)
+        remaining_spice_paths.append(self.RAM.configurabledecoderiii.top_spice_path)
+        remaining_spice_paths.append(self.RAM.pgateoutputcrossbar.top_spice_path)
+        remaining_spice_paths.append(self.RAM.wordlinedriver.top_spice_path)
+
+        return spice_paths, mtj_spice_paths
+
+
+    def _submit_spice_jobs(self, spice_interface, spice_paths, parameter_dict):
+        """ Submits an HSPICE job for each deck in 'spice_paths' and returns a dictionary 
+            that maps each deck to the future holding its measurements. """
+
+        spice_jobs = {}
+        for sp_path in spice_paths:
+            spice_jobs[sp_path] = spice_interface.submit(sp_path, parameter_dict, corners=self._get_run_corners())
+
+        return spice_jobs
+
+
+    def has_variation(self):
+        """ Returns True if the architecture asks for process corners or Monte Carlo samples. """
+
+        return len(self.specs.variation_corners) > 0 or self.specs.monte_carlo_samples > 0
+
+
+    def get_variation_corners(self):
+        """ Returns the process corners of a variation run, as (library path, section) pairs for SpiceInterface. 
+            The corners are sections of the device model library of the architecture. """
+
+        return [(self.specs.model_path, corner) for corner in self.specs.variation_corners]
+
+
+    def _get_run_corners(self):
+        """ Returns the process corners to simulate in the update_delays run in progress. """
+
+        if self._variation_meas is None:
+            return None
+        return self.get_variation_corners()
+
+
+    def get_variation_parameter_dict(self, parameter_dict):
+        """ Returns 'parameter_dict' (see get_parameter_dict) with a row for each Monte Carlo sample after the 
+            nominal row. In each sample, every transistor width and wire resistance and capacitance is scaled by 
+            its own normal random factor of mean 1 and relative sigma monte_carlo_sigma. FinFETs are sized in 
+            fins, so their sizes aren't varied. The samples are drawn from monte_carlo_seed, so every call gives
+            the same samples and variation runs of different sizings can be compared. """
+
+        num_samples = self.specs.monte_carlo_samples
+        if num_samples == 0:
+            return parameter_dict
+
+        varied_names = set()
+        for wire_name in self.wire_rc_dict:
+            varied_names.add(wire_name + "_res")
+            varied_names.add(wire_name + "_cap")
+        if not self.specs.use_finfet:
+            varied_names.update(self.transistor_sizes.names)
+
+        rng = np.random.default_rng(self.specs.monte_carlo_seed)
+        variation_dict = {}
+        for param_name, param_values in parameter_dict.items():
+            nominal = param_values[0]
+            if param_name in varied_names:
+                factors = np.maximum(1 + self.specs.monte_carlo_sigma*rng.standard_normal(num_samples), MONTE_CARLO_MIN_FACTOR)
+                variation_dict[param_name] = [nominal] + (nominal*factors).tolist()
+            else:
+                variation_dict[param_name] = [nominal]*(num_samples + 1)
+
+        return variation_dict
+
+
+    def _get_rep_crit_path(self, get_delay, with_carry_chain):
+        """ Returns the representative critical path delay: the weighted delays of the routing, the BLE outputs,
+            every path through the LUT and, if 'with_carry_chain', the carry chain. 'get_delay' returns the delay 
+            of a subcircuit, or of the path through the LUT for a LUT input. update_delays uses this for the 
+            nominal delays and for the delays of every corner and sample of a variation run (arrays). """
+
+        crit_path_delay = 0
+        for circuit in [self.sb_mux, self.cb_mux, self.logic_cluster.local_mux, 
+                        self.logic_cluster.ble.local_output, self.logic_cluster.ble.general_output]:
+            crit_path_delay = crit_path_delay + get_delay(circuit)*circuit.delay_weight
+
+        for lut_input in self.logic_cluster.ble.lut.input_drivers.values():
+            lut_delay = get_delay(lut_input) + np.maximum(get_delay(lut_input.driver), get_delay(lut_input.not_driver))
+            if self.specs.use_fluts:
+                lut_delay = lut_delay + get_delay(self.logic_cluster.ble.fmux)
+            crit_path_delay = crit_path_delay + lut_delay*lut_input.delay_weight
+
+        if self.specs.use_fluts:
+            crit_path_delay = crit_path_delay + get_delay(self.logic_cluster.ble.fmux)*DELAY_WEIGHT_LUT_FRAC
+
+        if with_carry_chain and self.specs.enable_carry_chain == 1:
+            circuits = [self.carrychain, self.carrychainperf, self.carrychainmux, self.carrychaininter]
+            if self.specs.carry_chain_type == "skip":
+                circuits += [self.carrychainand, self.carrychainskipmux]
+            for circuit in circuits:
+                crit_path_delay = crit_path_delay + get_delay(circuit)*circuit.delay_weight
+
+        return crit_path_delay
+
+
+    def _get_variation_crit_path(self):
+        """ Computes the representative critical path delay (see _get_rep_crit_path) of every device model and 
+            Monte Carlo sample of the variation run in progress. Failed measurements give NaN. """
+
+        # Delays of the paths through the LUT, computed like the lut_input delays in _update_delays
+        lut_input_delays = {}
+        if self.specs.use_fluts:
+            fmux_tfall, fmux_trise = self._variation_meas[self.logic_cluster.ble.fmux.top_spice_path]
+        for lut_input_name, lut_input in self.logic_cluster.ble.lut.input_drivers.items():
+            if (lut_input_name == "f" and self.specs.use_fluts and self.specs.K == 6) or (lut_input_name == "e" and self.specs.use_fluts and self.specs.K == 5):
+                lut_input_delays[lut_input] = np.maximum(fmux_tfall, fmux_trise)
+            else:
+                tfall, trise = self._variation_meas[lut_input.driver.top_spice_path.replace(".sp", "_with_lut.sp")]
+                if self.specs.use_fluts:
+                    tfall = tfall + fmux_tfall
+                    trise = trise + fmux_trise
+                lut_input_delays[lut_input] = np.maximum(tfall, trise)
+
+        def get_delay(circuit):
+            if circuit in lut_input_delays:
+                return lut_input_delays[circuit]
+            tfall, trise = self._variation_meas[circuit.top_spice_path]
+            return np.maximum(tfall, trise)
+
+        # Like the nominal rep_crit_path, the carry chain is only included in architectures with BRAMs
+        return self._get_rep_crit_path(get_delay, self.specs.enable_bram_block == 1)
+
+
+    def _get_sim_window_circuits(self):
+        """ Returns the subcircuits whose top-level SPICE file has a stimulus that can be
+            fit to their delay. Their tfall and trise are measured on a single input pulse. """
+
+        circuits = [self.sb_mux, self.cb_mux, self.logic_cluster.local_mux,
+                    self.logic_cluster.ble.local_output, self.logic_cluster.ble.general_output]
+        for lut_input in self.logic_cluster.ble.lut.input_drivers.values():
+            circuits.append(lut_input.driver)
+            circuits.append(lut_input.not_driver)
+
+        return circuits
+
+
+    def _fit_sim_windows(self, spice_interface):
+        """ Fits the input pulse (and the stop time) of the top-level SPICE files of 
+            _get_sim_window_circuits() to the last tfall and trise of each subcircuit.
+            Subcircuits without a valid delay keep the default stimulus. The default SPICE file is
+            kept next to the fitted one and set as its fallback deck on 'spice_interface', so the sweep
+            rows whose delay doesn't fit in the window are simulated again with the default stimulus. """
+
+        for circuit in self._get_sim_window_circuits():
+            slowest = max(circuit.tfall, circuit.trise)
+            pulse_width = 0
+            if slowest > 0:
+                num_steps = max(math.ceil(ADAPTIVE_WINDOW_MARGIN*slowest/ADAPTIVE_WINDOW_STEP), 
+                                int(round(ADAPTIVE_WINDOW_MIN_PULSE/ADAPTIVE_WINDOW_STEP)))
+                if num_steps*ADAPTIVE_WINDOW_STEP < ADAPTIVE_WINDOW_MAX_PULSE:
+                    pulse_width = num_steps*ADAPTIVE_WINDOW_STEP
+            if pulse_width == circuit.sim_pulse_width:
+                continue
+
+            default_spice_path = circuit.top_spice_path.replace(".sp", "_default_window.sp")
+            if circuit.sim_pulse_width == 0:
+                shutil.copyfile(circuit.top_spice_path, default_spice_path)
+            circuit.sim_pulse_width = pulse_width
+            circuit.generate_window_top()
+            if pulse_width == 0:
+                spice_interface.set_fallback_deck(circuit.top_spice_path, None)
+            else:
+                spice_interface.set_fallback_deck(circuit.top_spice_path, default_spice_path, 
+                                                  ADAPTIVE_WINDOW_MAX_DELAY*pulse_width)
+
+
+    def _reset_sim_windows(self, spice_interface):
+        """ Puts the default stimulus back in the top-level SPICE files changed by _fit_sim_windows(). """
+
+        for circuit in self._get_sim_window_circuits():
+            if circuit.sim_pulse_width != 0:
+                circuit.sim_pulse_width = 0
+                circuit.generate_window_top()
+                spice_interface.set_fallback_deck(circuit.top_spice_path, None)
+
+
+    def _get_spice_job_result(self, spice_interface, spice_jobs, sp_path, parameter_dict):
+        """ Returns the measurements for 'sp_path'. If a job was already submitted for this
+            deck, we wait for it. Otherwise (or if its result was already used), we run HSPICE now. """
+
+        spice_job = spice_jobs.pop(sp_path, None)
+        if spice_job is not None:
+            spice_meas = spice_job.result()
+        else:
+            spice_meas = spice_interface.run(sp_path, parameter_dict, corners=self._get_run_corners())
+
+        # Keep the delays of every device model and sample of a variation run
+        if self._variation_meas is not None and "meas_total_tfall" in spice_meas:
+            num_models = 1 + len(self.specs.variation_corners)
+            self._variation_meas[sp_path] = (spice.measurement_array(spice_meas["meas_total_tfall"]).reshape(num_models, -1),
+                                             spice.measurement_array(spice_meas["meas_total_trise"]).reshape(num_models, -1))
+
+        return spice_meas
+
+
+    def update_delays(self, spice_interface, with_variation=False):
         """ 
         Get the HSPICE delays for each subcircuit. 
         This function returns "False" if any of the HSPICE simulations failed.
+        Afterwards, the stimulus of the single pulse decks is fit to the delays found (see 
+        _fit_sim_windows), which shortens their simulations in the sizing sweeps and in the 
+        next call. Rows that don't fit in the window fall back to the default stimulus.
+
+        If 'with_variation' is True and the architecture has process corners or Monte Carlo samples
+        (see has_variation), each subcircuit is simulated for all of them in the same job as its 
+        nominal simulation: the samples are extra .DATA rows and the corners are .ALTER blocks. The 
+        nominal delays are updated as usual and the delays of every corner and sample are stored in
+        variation_delays and variation_crit_path. These runs use the default stimulus, which leaves
+        room for the slower corners.
         """
+
+        with_variation = with_variation and self.has_variation()
+        if with_variation:
+            self._variation_meas = {}
+            self._reset_sim_windows(spice_interface)
+        try:
+            valid_delay = self._update_delays(spice_interface)
+            if with_variation:
+                self.variation_crit_path = self._get_variation_crit_path()
+                self.variation_delays = {}
+                for sp_path, (tfall, trise) in self._variation_meas.items():
+                    self.variation_delays[os.path.basename(sp_path).replace(".sp", "")] = np.maximum(tfall, trise)
+                self.variation_models = [self.specs.model_library] + list(self.specs.variation_corners)
+            elif valid_delay:
+                self._fit_sim_windows(spice_interface)
+            return valid_delay
+        finally:
+            self._variation_meas = None
+
+
+    #TODO: break this into different functions or form a loop out of it; it's too long
+    def _update_delays(self, spice_interface):
+        """ Runs the HSPICE simulations of update_delays. """
         
         print("*** UPDATING DELAYS ***")
-        crit_path_delay = 0
         valid_delay = True
 
         # Create parameter dict of all current transistor sizes and wire rc
-        parameter_dict = {}
-        for tran_name, tran_size in self.transistor_sizes.items():
-            if not self.specs.use_finfet:
-                parameter_dict[tran_name] = [1e-9*tran_size*self.specs.min_tran_width]
-            else :
-                parameter_dict[tran_name] = [tran_size]
+        # (and of the Monte Carlo samples, in a variation run)
+        parameter_dict = self.get_parameter_dict()
+        if self._variation_meas is not None:
+            parameter_dict = self.get_variation_parameter_dict(parameter_dict)
 
-        for wire_name, rc_data in self.wire_rc_dict.items():
-            parameter_dict[wire_name + "_res"] = [rc_data[0]]
-            parameter_dict[wire_name + "_cap"] = [rc_data[1]*1e-15]
+        # The subcircuits below all use the same parameter_dict and don't depend on each other,
+        # so we submit all of their HSPICE jobs at once and collect the results in the usual order.
+        spice_paths, mtj_spice_paths = self._get_update_delays_spice_paths()
+        spice_jobs = self._submit_spice_jobs(spice_interface, spice_paths, parameter_dict)
 
         # Run HSPICE on all subcircuits and collect the total tfall and trise for that 
         # subcircuit. We are only doing a single run on HSPICE so we expect the result
@@ -6187,7 +7039,7 @@ class FPGA:
 
         # Switch Block MUX 
         print("  Updating delay for " + self.sb_mux.name)
-        spice_meas = spice_interface.run(self.sb_mux.top_spice_path, parameter_dict)
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.sb_mux.top_spice_path, parameter_dict)
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
             tfall = 1
@@ -6200,13 +7052,12 @@ class FPGA:
         self.sb_mux.tfall = tfall
         self.sb_mux.trise = trise
         self.sb_mux.delay = max(tfall, trise)
-        crit_path_delay += self.sb_mux.delay*self.sb_mux.delay_weight
         self.delay_dict[self.sb_mux.name] = self.sb_mux.delay 
         self.sb_mux.power = float(spice_meas["meas_avg_power"][0])
         
         # Connection Block MUX
         print("  Updating delay for " + self.cb_mux.name)
-        spice_meas = spice_interface.run(self.cb_mux.top_spice_path, parameter_dict) 
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.cb_mux.top_spice_path, parameter_dict) 
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
             tfall = 1
@@ -6219,13 +7070,12 @@ class FPGA:
         self.cb_mux.tfall = tfall
         self.cb_mux.trise = trise
         self.cb_mux.delay = max(tfall, trise)
-        crit_path_delay += self.cb_mux.delay*self.cb_mux.delay_weight
         self.delay_dict[self.cb_mux.name] = self.cb_mux.delay
         self.cb_mux.power = float(spice_meas["meas_avg_power"][0])
         
         # Local MUX
         print("  Updating delay for " + self.logic_cluster.local_mux.name)
-        spice_meas = spice_interface.run(self.logic_cluster.local_mux.top_spice_path, 
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.logic_cluster.local_mux.top_spice_path, 
                                          parameter_dict) 
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
@@ -6239,14 +7089,12 @@ class FPGA:
         self.logic_cluster.local_mux.tfall = tfall
         self.logic_cluster.local_mux.trise = trise
         self.logic_cluster.local_mux.delay = max(tfall, trise)
-        crit_path_delay += (self.logic_cluster.local_mux.delay*
-                            self.logic_cluster.local_mux.delay_weight)
         self.delay_dict[self.logic_cluster.local_mux.name] = self.logic_cluster.local_mux.delay
         self.logic_cluster.local_mux.power = float(spice_meas["meas_avg_power"][0])
         
         # Local BLE output
         print("  Updating delay for " + self.logic_cluster.ble.local_output.name) 
-        spice_meas = spice_interface.run(self.logic_cluster.ble.local_output.top_spice_path, 
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.logic_cluster.ble.local_output.top_spice_path, 
                                          parameter_dict) 
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
@@ -6260,14 +7108,12 @@ class FPGA:
         self.logic_cluster.ble.local_output.tfall = tfall
         self.logic_cluster.ble.local_output.trise = trise
         self.logic_cluster.ble.local_output.delay = max(tfall, trise)
-        crit_path_delay += (self.logic_cluster.ble.local_output.delay*
-                            self.logic_cluster.ble.local_output.delay_weight)
         self.delay_dict[self.logic_cluster.ble.local_output.name] = self.logic_cluster.ble.local_output.delay
         self.logic_cluster.ble.local_output.power = float(spice_meas["meas_avg_power"][0])
         
         # General BLE output
         print("  Updating delay for " + self.logic_cluster.ble.general_output.name)
-        spice_meas = spice_interface.run(self.logic_cluster.ble.general_output.top_spice_path, 
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.logic_cluster.ble.general_output.top_spice_path, 
                                          parameter_dict) 
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
@@ -6281,8 +7127,6 @@ class FPGA:
         self.logic_cluster.ble.general_output.tfall = tfall
         self.logic_cluster.ble.general_output.trise = trise
         self.logic_cluster.ble.general_output.delay = max(tfall, trise)
-        crit_path_delay += (self.logic_cluster.ble.general_output.delay*
-                            self.logic_cluster.ble.general_output.delay_weight)
         self.delay_dict[self.logic_cluster.ble.general_output.name] = self.logic_cluster.ble.general_output.delay
         self.logic_cluster.ble.general_output.power = float(spice_meas["meas_avg_power"][0])
         
@@ -6292,7 +7136,7 @@ class FPGA:
         # fracturable lut mux
         if self.specs.use_fluts:
             print("  Updating delay for " + self.logic_cluster.ble.fmux.name)
-            spice_meas = spice_interface.run(self.logic_cluster.ble.fmux.top_spice_path, 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.logic_cluster.ble.fmux.top_spice_path, 
                                              parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
@@ -6312,7 +7156,7 @@ class FPGA:
 
         # LUT delay
         print("  Updating delay for " + self.logic_cluster.ble.lut.name)
-        spice_meas = spice_interface.run(self.logic_cluster.ble.lut.top_spice_path, 
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.logic_cluster.ble.lut.top_spice_path, 
                                          parameter_dict) 
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
@@ -6347,7 +7191,7 @@ class FPGA:
             else:
 
             # Get the delay for a path through the LUT (we do it for each input)
-                spice_meas = spice_interface.run(driver_and_lut_sp_path, parameter_dict) 
+                spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, driver_and_lut_sp_path, parameter_dict) 
                 if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                     valid_delay = False
                     tfall = 1
@@ -6373,7 +7217,7 @@ class FPGA:
             
             # Now, we want to get the delay and power for the driver
             print("  Updating delay for " + driver.name) 
-            spice_meas = spice_interface.run(driver.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, driver.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6395,7 +7239,7 @@ class FPGA:
 
             # ... and the not_driver
             print("  Updating delay for " + not_driver.name)
-            spice_meas = spice_interface.run(not_driver.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, not_driver.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6422,11 +7266,8 @@ class FPGA:
                 print("*** Lut delay is negative : " + str(lut_input.delay) + " ***")
                 exit(2)
             #print lut_delay
-            crit_path_delay += lut_delay*lut_input.delay_weight
         
-        if self.specs.use_fluts:
-            crit_path_delay += self.logic_cluster.ble.fmux.delay * DELAY_WEIGHT_LUT_FRAC
-        self.delay_dict["rep_crit_path"] = crit_path_delay  
+        self.delay_dict["rep_crit_path"] = float(self._get_rep_crit_path(lambda circuit: circuit.delay, False))
 
 
 
@@ -6434,7 +7275,7 @@ class FPGA:
         
         if self.specs.enable_carry_chain == 1:
             print("  Updating delay for " + self.carrychain.name)
-            spice_meas = spice_interface.run(self.carrychain.top_spice_path, 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.carrychain.top_spice_path, 
                                              parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
@@ -6448,13 +7289,11 @@ class FPGA:
             self.carrychain.tfall = tfall
             self.carrychain.trise = trise
             self.carrychain.delay = max(tfall, trise)
-            crit_path_delay += (self.carrychain.delay*
-                                self.carrychain.delay_weight)
             self.delay_dict[self.carrychain.name] = self.carrychain.delay
             self.carrychain.power = float(spice_meas["meas_avg_power"][0])
 
 
-            spice_meas = spice_interface.run(self.carrychainperf.top_spice_path, 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.carrychainperf.top_spice_path, 
                                              parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
@@ -6468,12 +7307,10 @@ class FPGA:
             self.carrychainperf.tfall = tfall
             self.carrychainperf.trise = trise
             self.carrychainperf.delay = max(tfall, trise)
-            crit_path_delay += (self.carrychainperf.delay*
-                                self.carrychainperf.delay_weight)
             self.delay_dict[self.carrychainperf.name] = self.carrychainperf.delay
             self.carrychainperf.power = float(spice_meas["meas_avg_power"][0])
 
-            spice_meas = spice_interface.run(self.carrychainmux.top_spice_path, 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.carrychainmux.top_spice_path, 
                                              parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
@@ -6487,13 +7324,11 @@ class FPGA:
             self.carrychainmux.tfall = tfall
             self.carrychainmux.trise = trise
             self.carrychainmux.delay = max(tfall, trise)
-            crit_path_delay += (self.carrychainmux.delay*
-                                self.carrychainmux.delay_weight)
             self.delay_dict[self.carrychainmux.name] = self.carrychainmux.delay
             self.carrychainmux.power = float(spice_meas["meas_avg_power"][0])
 
 
-            spice_meas = spice_interface.run(self.carrychaininter.top_spice_path, 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.carrychaininter.top_spice_path, 
                                              parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
@@ -6507,15 +7342,13 @@ class FPGA:
             self.carrychaininter.tfall = tfall
             self.carrychaininter.trise = trise
             self.carrychaininter.delay = max(tfall, trise)
-            crit_path_delay += (self.carrychaininter.delay*
-                                self.carrychaininter.delay_weight)
             self.delay_dict[self.carrychaininter.name] = self.carrychaininter.delay
             self.carrychaininter.power = float(spice_meas["meas_avg_power"][0])
 
 
             if self.specs.carry_chain_type == "skip":
 
-                spice_meas = spice_interface.run(self.carrychainand.top_spice_path, 
+                spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.carrychainand.top_spice_path, 
                                                  parameter_dict) 
                 if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                     valid_delay = False
@@ -6529,12 +7362,10 @@ class FPGA:
                 self.carrychainand.tfall = tfall
                 self.carrychainand.trise = trise
                 self.carrychainand.delay = max(tfall, trise)
-                crit_path_delay += (self.carrychainand.delay*
-                                    self.carrychainand.delay_weight)
                 self.delay_dict[self.carrychainand.name] = self.carrychainand.delay
                 self.carrychainand.power = float(spice_meas["meas_avg_power"][0])
 
-                spice_meas = spice_interface.run(self.carrychainskipmux.top_spice_path, 
+                spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.carrychainskipmux.top_spice_path, 
                                                  parameter_dict) 
                 if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                     valid_delay = False
@@ -6548,15 +7379,13 @@ class FPGA:
                 self.carrychainskipmux.tfall = tfall
                 self.carrychainskipmux.trise = trise
                 self.carrychainskipmux.delay = max(tfall, trise)
-                crit_path_delay += (self.carrychainskipmux.delay*
-                                    self.carrychainskipmux.delay_weight)
                 self.delay_dict[self.carrychainskipmux.name] = self.carrychainskipmux.delay
                 self.carrychainskipmux.power = float(spice_meas["meas_avg_power"][0])
         
 
         for hardblock in self.hardblocklist:
 
-            spice_meas = spice_interface.run(hardblock.mux.top_spice_path, 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, hardblock.mux.top_spice_path, 
                                              parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
@@ -6574,7 +7403,7 @@ class FPGA:
             self.delay_dict[hardblock.mux.name] = hardblock.mux.delay
             hardblock.mux.power = float(spice_meas["meas_avg_power"][0])
             if hardblock.parameters['num_dedicated_outputs'] > 0:
-                spice_meas = spice_interface.run(hardblock.dedicated.top_spice_path, parameter_dict) 
+                spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, hardblock.dedicated.top_spice_path, parameter_dict) 
                 if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                     valid_delay = False
                     tfall = 1
@@ -6597,7 +7426,7 @@ class FPGA:
             return valid_delay
         # Local RAM MUX
         print("  Updating delay for " + self.RAM.RAM_local_mux.name)
-        spice_meas = spice_interface.run(self.RAM.RAM_local_mux.top_spice_path, 
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.RAM_local_mux.top_spice_path, 
                                          parameter_dict) 
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
@@ -6616,7 +7445,7 @@ class FPGA:
 
         #RAM decoder units
         print("  Updating delay for " + self.RAM.rowdecoder_stage0.name)
-        spice_meas = spice_interface.run(self.RAM.rowdecoder_stage0.top_spice_path, parameter_dict) 
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.rowdecoder_stage0.top_spice_path, parameter_dict) 
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
             tfall = 1
@@ -6636,7 +7465,7 @@ class FPGA:
 
         if self.RAM.valid_row_dec_size2 == 1:
             print("  Updating delay for " + self.RAM.rowdecoder_stage1_size2.name)
-            spice_meas = spice_interface.run(self.RAM.rowdecoder_stage1_size2.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.rowdecoder_stage1_size2.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6655,7 +7484,7 @@ class FPGA:
 
         if self.RAM.valid_row_dec_size3 == 1:
             print("  Updating delay for " + self.RAM.rowdecoder_stage1_size3.name)
-            spice_meas = spice_interface.run(self.RAM.rowdecoder_stage1_size3.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.rowdecoder_stage1_size3.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6674,7 +7503,7 @@ class FPGA:
 
 
         print("  Updating delay for " + self.RAM.rowdecoder_stage3.name)
-        spice_meas = spice_interface.run(self.RAM.rowdecoder_stage3.top_spice_path, parameter_dict) 
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.rowdecoder_stage3.top_spice_path, parameter_dict) 
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
             tfall = 1
@@ -6693,7 +7522,7 @@ class FPGA:
 
         if self.RAM.memory_technology == "SRAM":
             print("  Updating delay for " + self.RAM.precharge.name)
-            spice_meas = spice_interface.run(self.RAM.precharge.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.precharge.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6711,7 +7540,7 @@ class FPGA:
             self.RAM.precharge.power = float(spice_meas["meas_avg_power"][0])
 
             print("  Updating delay for " + self.RAM.samp_part2.name)
-            spice_meas = spice_interface.run(self.RAM.samp_part2.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.samp_part2.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6729,7 +7558,7 @@ class FPGA:
             self.RAM.samp_part2.power = float(spice_meas["meas_avg_power"][0])
 
             print("  Updating delay for " + self.RAM.samp.name)
-            spice_meas = spice_interface.run(self.RAM.samp.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.samp.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6749,7 +7578,7 @@ class FPGA:
             self.RAM.samp.power = float(spice_meas["meas_avg_power"][0])
 
             print("  Updating delay for " + self.RAM.writedriver.name)
-            spice_meas = spice_interface.run(self.RAM.writedriver.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.writedriver.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6768,7 +7597,7 @@ class FPGA:
 
         else:
             print("  Updating delay for " + self.RAM.bldischarging.name)
-            spice_meas = spice_interface.run(self.RAM.bldischarging.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.bldischarging.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6786,7 +7615,7 @@ class FPGA:
             self.RAM.bldischarging.power = float(spice_meas["meas_avg_power"][0])
 
             print("  Updating delay for " + self.RAM.blcharging.name)
-            spice_meas = spice_interface.run(self.RAM.blcharging.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.blcharging.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6808,7 +7637,7 @@ class FPGA:
             self.RAM._update_process_data()
 
             print("  Updating delay for " + self.RAM.blcharging.name)
-            spice_meas = spice_interface.run(self.RAM.blcharging.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.blcharging.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6828,8 +7657,11 @@ class FPGA:
 
             self.RAM._update_process_data()
 
+            # The remaining MTJ decks depend on the process data we just wrote
+            spice_jobs = self._submit_spice_jobs(spice_interface, mtj_spice_paths, parameter_dict)
+
             print("  Updating delay for " + self.RAM.mtjsamp.name)
-            spice_meas = spice_interface.run(self.RAM.mtjsamp.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.mtjsamp.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6848,7 +7680,7 @@ class FPGA:
 
     
         print("  Updating delay for " + self.RAM.columndecoder.name)
-        spice_meas = spice_interface.run(self.RAM.columndecoder.top_spice_path, parameter_dict) 
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.columndecoder.top_spice_path, parameter_dict) 
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
             tfall = 1
@@ -6867,7 +7699,7 @@ class FPGA:
 
 
         print("  Updating delay for " + self.RAM.configurabledecoderi.name)
-        spice_meas = spice_interface.run(self.RAM.configurabledecoderi.top_spice_path, parameter_dict) 
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.configurabledecoderi.top_spice_path, parameter_dict) 
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
             tfall = 1
@@ -6887,7 +7719,7 @@ class FPGA:
 
         if self.RAM.cvalidobj1 ==1:
             print("  Updating delay for " + self.RAM.configurabledecoder3ii.name)
-            spice_meas = spice_interface.run(self.RAM.configurabledecoder3ii.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.configurabledecoder3ii.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6907,7 +7739,7 @@ class FPGA:
 
         if self.RAM.cvalidobj2 ==1:
             print("  Updating delay for " + self.RAM.configurabledecoder2ii.name)
-            spice_meas = spice_interface.run(self.RAM.configurabledecoder2ii.top_spice_path, parameter_dict) 
+            spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.configurabledecoder2ii.top_spice_path, parameter_dict) 
             if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
                 valid_delay = False
                 tfall = 1
@@ -6925,7 +7757,7 @@ class FPGA:
             self.RAM.configurabledecoder2ii.power = float(spice_meas["meas_avg_power"][0])
 
         print("  Updating delay for " + self.RAM.configurabledecoderiii.name)
-        spice_meas = spice_interface.run(self.RAM.configurabledecoderiii.top_spice_path, parameter_dict) 
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.configurabledecoderiii.top_spice_path, parameter_dict) 
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
             tfall = 1
@@ -6944,7 +7776,7 @@ class FPGA:
   
 
         print("  Updating delay for " + self.RAM.pgateoutputcrossbar.name)
-        spice_meas = spice_interface.run(self.RAM.pgateoutputcrossbar.top_spice_path, parameter_dict) 
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.pgateoutputcrossbar.top_spice_path, parameter_dict) 
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
             tfall = 1
@@ -6960,10 +7792,10 @@ class FPGA:
         #crit_path_delay += (self.RAM.pgateoutputcrossbar.delay* self.RAM.delay_weight)
         self.delay_dict[self.RAM.pgateoutputcrossbar.name] = self.RAM.pgateoutputcrossbar.delay
         self.RAM.pgateoutputcrossbar.power = float(spice_meas["meas_avg_power"][0])
-        self.delay_dict["rep_crit_path"] = crit_path_delay    
+        self.delay_dict["rep_crit_path"] = float(self._get_rep_crit_path(lambda circuit: circuit.delay, True))
 
         print("  Updating delay for " + self.RAM.wordlinedriver.name)
-        spice_meas = spice_interface.run(self.RAM.wordlinedriver.top_spice_path, parameter_dict) 
+        spice_meas = self._get_spice_job_result(spice_interface, spice_jobs, self.RAM.wordlinedriver.top_spice_path, parameter_dict) 
         if spice_meas["meas_total_tfall"][0] == "failed" or spice_meas["meas_total_trise"][0] == "failed" :
             valid_delay = False
             tfall = 1
@@ -6992,17 +7824,7 @@ class FPGA:
         # Several timing parameters need to be updated before power can be measured accurately
         # The following will compute and store the current values for these delays
         # Create parameter dict of all current transistor sizes and wire rc
-
-        parameter_dict = {}
-        for tran_name, tran_size in self.transistor_sizes.items():
-            if not self.specs.use_finfet:
-                parameter_dict[tran_name] = [1e-9*tran_size*self.specs.min_tran_width]
-            else :
-                parameter_dict[tran_name] = [tran_size]
-
-        for wire_name, rc_data in self.wire_rc_dict.items():
-            parameter_dict[wire_name + "_res"] = [rc_data[0]]
-            parameter_dict[wire_name + "_cap"] = [rc_data[1]*1e-15]
+        parameter_dict = self.get_parameter_dict()
 
         # Update the file
         ram_decoder_stage1_delay = 0
@@ -7241,25 +8063,33 @@ class FPGA:
             Transistor area is calculated bsed on 'tran_size' and transistor type, which is determined by tags in 'tran_name'.
             Return valus is the transistor area in minimum width transistor areas. """
     
+        a, b, c = self._area_model_coefficients(get_tran_type(tran_name))
+        area = a + b*tran_size + c*math.sqrt(tran_size)
+    
+        return area    
+
+
+    def _area_model_coefficients(self, tran_type):
+        """ Returns the coefficients (a, b, c) of the transistor area model, area = a + b*size + c*sqrt(size),
+            for transistors of type 'tran_type' (TRAN_TYPE_*). """
+
         # If inverter or transmission gate, use larger area to account for N-well spacing
         # If pass-transistor, use regular area because they don't need N-wells.
-        if "inv_" in tran_name or "tgate_" in tran_name:
+        if tran_type == TRAN_TYPE_INV or tran_type == TRAN_TYPE_TGATE:
             if not self.specs.use_finfet :
-                area = 0.518 + 0.127*tran_size + 0.428*math.sqrt(tran_size)
+                return (0.518, 0.127, 0.428)
             elif (self.specs.min_tran_width == 7):
-                area = 0.3694 + 0.0978*tran_size + 0.5368*math.sqrt(tran_size)
+                return (0.3694, 0.0978, 0.5368)
             else :
-                area = 0.034 + 0.414*tran_size + 0.735*math.sqrt(tran_size)
+                return (0.034, 0.414, 0.735)
 
         else:
             if not self.specs.use_finfet :
-                area = 0.447 + 0.128*tran_size + 0.391*math.sqrt(tran_size)
+                return (0.447, 0.128, 0.391)
             elif (self.specs.min_tran_width == 7):
-                area = 0.3694 + 0.0978*tran_size + 0.5368*math.sqrt(tran_size)
+                return (0.3694, 0.0978, 0.5368)
             else :
-                area = -0.013 + 0.414*tran_size + 0.665*math.sqrt(tran_size)
-    
-        return area    
+                return (-0.013, 0.414, 0.665)
     
      
     def _create_lib_files(self):
@@ -7411,6 +8241,13 @@ class FPGA:
             'combo' is a particular transistor sizing combination for the transistors in 'element_names'
             'inv_ratios' are the inverter P/N ratios for this transistor sizing combination.
             'combo' will typically describe only a small group of transistors. Other transistors retain their current size."""
+
+        # Now, update self.transistor_sizes with these new sizes
+        self.transistor_sizes.update(self._get_new_transistor_sizes(element_names, combo, use_finfet, inv_ratios))
+
+
+    def _get_new_transistor_sizes(self, element_names, combo, use_finfet, inv_ratios=None):
+        """ Returns the transistor sizes {'tran_name': size} that _update_transistor_sizes sets for 'combo'. """
         
         # We start by making a dictionary of the transistor sizes we need to update
         new_sizes = {}
@@ -7451,8 +8288,7 @@ class FPGA:
                             new_sizes[element_name + "_pmos"] = round(combo[i]*inv_ratios[element_name])
                             # new_sizes[element_name + "_pmos"] = combo[i]
 
-        # Now, update self.transistor_sizes with these new sizes
-        self.transistor_sizes.update(new_sizes)
+        return new_sizes
       
       
     def _update_area_per_transistor(self):
@@ -7462,91 +8298,82 @@ class FPGA:
             For each transistor, this data forms a tuple (tran_name, tran_channel_width_nm, tran_drive_strength, tran_area_min_areas, tran_area_nm, tran_width_nm)
             The FPGAs transistor_area_list is updated once these values are computed."""
         
-        # Initialize transistor area list
-        tran_area_list = []
-        
-        # For each transistor, calculate area
-        for tran_name, tran_size in self.transistor_sizes.items():
-                # Get transistor drive strength (drive strength is = xMin width)
-                tran_drive = tran_size
-                # Get tran area in min transistor widths
-                tran_area = self._area_model(tran_name, tran_drive)
-                # Get area in nm square
-                tran_area_nm = tran_area*self.specs.min_width_tran_area
-                # Get width of transistor in nm
-                tran_width = math.sqrt(tran_area_nm)
-                # Add this as a tuple to the tran_area_list
-                # TODO: tran_size and tran_drive are the same thing?!
-                tran_area_list.append((tran_name, tran_size, tran_drive, tran_area, 
-                                                tran_area_nm, tran_width))    
-                                                                                   
+        # Tran area in min transistor widths (drive strength is = xMin width)
+        tran_areas = self.transistor_sizes.get_tran_areas(self._get_area_coefficients())
+        # Get area in nm square
+        tran_areas_nm = tran_areas*self.specs.min_width_tran_area
+        # Get width of transistor in nm
+        tran_widths = np.sqrt(tran_areas_nm)
+        self._tran_areas_nm = tran_areas_nm
+
         # Assign list to FPGA object
-        self.transistor_area_list = tran_area_list
+        # TODO: tran_size and tran_drive are the same thing?!
+        tran_sizes = self.transistor_sizes.values()
+        self.transistor_area_list = list(zip(self.transistor_sizes.names, tran_sizes, tran_sizes, tran_areas.tolist(),
+                                             tran_areas_nm.tolist(), tran_widths.tolist()))
         
 
     def _update_area_and_width_dicts(self):
         """ Calculate area for basic subcircuits like inverters, pass transistor, 
             transmission gates, etc. Update area_dict and width_dict with this data."""
         
-        # Initialize component area list of tuples (component name, component are, component width)
-        comp_area_list = []
-        
-        # Create a dictionary to store component sizes for multi-transistor components
-        comp_dict = {}
-        
-        # For each transistor in the transistor_area_list
-        # tran is a tuple having the following formate (tran_name, tran_channel_width_nm, 
-        # tran_drive_strength, tran_area_min_areas, tran_area_nm, tran_width_nm)
-        for tran in self.transistor_area_list:
-            # those components should have an nmos and a pmos transistors in them
-            if "inv_" in tran[0] or "tgate_" in tran[0]:
-                # Get the component name; transistors full name example: inv_lut_out_buffer_2_nmos.
-                # so the component name after the next two lines will be inv_lut_out_buffe_2.
-                comp_name = tran[0].replace("_nmos", "")
-                comp_name = comp_name.replace("_pmos", "")
-                
-                # If the component is already in the dictionary
-                if comp_name in comp_dict:
-                    if "_nmos" in tran[0]:
-                        # tran[4] is tran_area_nm
-                        comp_dict[comp_name]["nmos"] = tran[4]
-                    else:
-                        comp_dict[comp_name]["pmos"] = tran[4]
-                        
-                    # At this point we should have both NMOS and PMOS sizes in the dictionary
-                    # We can calculate the area of the inverter or tgate by doing the sum
-                    comp_area = comp_dict[comp_name]["nmos"] + comp_dict[comp_name]["pmos"]
-                    comp_width = math.sqrt(comp_area)
-                    comp_area_list.append((comp_name, comp_area, comp_width))                 
-                else:
-                    # Create a dict for this component to store nmos and pmos sizes
-                    comp_area_dict = {}
-                    # Add either the nmos or pmos item
-                    if "_nmos" in tran[0]:
-                        comp_area_dict["nmos"] = tran[4]
-                    else:
-                        comp_area_dict["pmos"] = tran[4]
-                        
-                    # Add this inverter to the inverter dictionary    
-                    comp_dict[comp_name] = comp_area_dict
-            # those components only have one transistor in them
-            elif "ptran_" in tran[0] or "rest_" in tran[0] or "tran_" in tran[0]:   
-                # Get the comp name
-                comp_name = tran[0].replace("_nmos", "")
-                comp_name = comp_name.replace("_pmos", "")               
-                # Add this to comp_area_list directly
-                comp_area_list.append((comp_name, tran[4], tran[5]))            
-        
-        # Convert comp_area_list to area_dict and width_dict
-        area_dict = {}
-        width_dict = {}
-        for component in comp_area_list:
-            area_dict[component[0]] = component[1]
-            width_dict[component[0]] = component[2]
+        # Inverters and tgates are the sum of their NMOS and PMOS areas, ptran, rest and
+        # other transistors are a single transistor. The component names are the transistor
+        # names without _nmos/_pmos, e.g. inv_lut_out_buffer_2.
+        comp_areas = self.transistor_sizes.get_component_areas(self._tran_areas_nm)
+        comp_widths = np.sqrt(comp_areas)
         
         # Set the FPGA object area and width dict
-        self.area_dict = area_dict
-        self.width_dict = width_dict
+        comp_names = self.transistor_sizes.get_component_names()
+        self.area_dict = dict(zip(comp_names, comp_areas.tolist()))
+        self.width_dict = dict(zip(comp_names, comp_widths.tolist()))
   
         return
 
+
+    def _get_area_coefficients(self):
+        """ Returns the area model coefficients as an array with one row (a, b, c) per transistor type. """
+
+        if self._area_coefficients is None:
+            self._area_coefficients = np.array([self._area_model_coefficients(tran_type) for tran_type in range(NUM_TRAN_TYPES)],
+                                               dtype=np.float64)
+
+        return self._area_coefficients
+
+
+    def get_parameter_dict(self):
+        """ Returns the parameter dict (see SpiceInterface.run) of the current transistor sizes and wire RC. """
+
+        parameter_dict = {}
+        tran_sizes = self.transistor_sizes.get_parameter_values(self.specs.min_tran_width, self.specs.use_finfet)
+        for tran_name, tran_size in zip(self.transistor_sizes.names, tran_sizes):
+            parameter_dict[tran_name] = [tran_size]
+
+        for wire_name, rc_data in self.wire_rc_dict.items():
+            parameter_dict[wire_name + "_res"] = [rc_data[0]]
+            parameter_dict[wire_name + "_cap"] = [rc_data[1]*1e-15]
+
+        return parameter_dict
+
+
+    def get_component_areas_batch(self, element_names, sizing_combos, use_finfet, inv_ratios=None):
+        """ Computes the areas and widths of the basic components (inverters, ptran, tgate, etc.) for every
+            transistor sizing combination in 'sizing_combos' at once. Transistors that aren't in 'element_names'
+            keep their current size. The arguments are the same as for _update_transistor_sizes.
+            Returns (areas, widths), two lists with one row per combo (one value per component) whose
+            rows can be passed to update_area. The values are identical to the ones update_area computes. """
+
+        # Transistor size matrix, one row per combo
+        sizes = np.tile(self.transistor_sizes.sizes, (len(sizing_combos), 1))
+        for i, combo in enumerate(sizing_combos):
+            for tran_name, tran_size in self._get_new_transistor_sizes(element_names, combo, use_finfet, inv_ratios).items():
+                sizes[i, self.transistor_sizes.get_id(tran_name)] = tran_size
+
+        # Transistor areas in nm^2
+        tran_areas = self.transistor_sizes.get_tran_areas(self._get_area_coefficients(), sizes)*self.specs.min_width_tran_area
+
+        comp_areas = self.transistor_sizes.get_component_areas(tran_areas)
+        comp_widths = np.sqrt(comp_areas)
+
+        return comp_areas.tolist(), comp_widths.tolist()
+
@@ -0,0 +1,166 @@
+# This file runs the COFFE flow of an FPGA architecture: it creates the FPGA object, generates
+# the SPICE netlists, sizes the transistors and prints the report and the VPR architecture file.
+# coffe.py runs it for the architecture file given on the command line and arch_sweep.py runs it
+# for every point of an architecture sweep.
+
+import os
+import sys
+import math
+import time
+import argparse
+from . import fpga
+from . import spice
+from . import tran_sizing
+from . import utils
+from . import vpr
+
+
+def get_arg_parser():
+    """ Returns the parser of the COFFE command line options. """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('arch_description')
+    parser.add_argument('-n', '--no_sizing', help="don't perform transistor sizing", action='store_true')
+    parser.add_argument('-o', '--opt_type', type=str, choices=["global", "local"], default="global", help="choose optimization type")
+    parser.add_argument('-s', '--initial_sizes', type=str, default="default", help="path to initial transistor sizes")
+    parser.add_argument('-m', '--re_erf', type=int, default=1, help="choose how many sizing combos to re-erf")
+    parser.add_argument('-a', '--area_opt_weight', type=int, default=1, help="area optimization weight")
+    parser.add_argument('-d', '--delay_opt_weight', type=int, default=1, help="delay optimization weight")
+    parser.add_argument('-i', '--max_iterations', type=int, default=6, help="max FPGA sizing iterations")
+    parser.add_argument('-j', '--num_spice_jobs', type=int, default=1, help="max number of HSPICE jobs running concurrently")
+    parser.add_argument('-sc', '--spice_cache', type=str, default="", help="directory of the persistent HSPICE results cache (no caching if not set)")
+    parser.add_argument('-sm', '--spice_cache_size', type=float, default=1024, help="max size of the HSPICE results cache in MB")
+    parser.add_argument('-b', '--spice_backend', type=str, choices=list(spice.SPICE_BACKENDS), default="hspice", help="choose the circuit simulator")
+    parser.add_argument('-sr', '--search_mode', type=str, choices=["grid", "surrogate", "prune"], default="grid", help="simulate every transistor sizing combination (grid), only the most promising ones (surrogate) or skip the ones whose area alone makes them worse than the best ones (prune)")
+    parser.add_argument('-sf', '--screening_fidelity', type=str, choices=list(spice.SPICE_FIDELITY_TIERS), default="full", help="simulation fidelity used to rank transistor sizing combinations (the best ones are always re-simulated at full fidelity)")
+    parser.add_argument('-fp', '--floorplan', help="search for the logic tile height with the lowest cost before each sizing iteration", action='store_true')
+    parser.add_argument('-ps', '--parallel_sizing', type=int, default=1, help="max number of independent subcircuits sized at the same time")
+    parser.add_argument('-rs', '--resume', help="resume transistor sizing from the checkpoint of a stopped run", action='store_true')
+    parser.add_argument('-hi', '--size_hb_interfaces', type=float, help="perform transistor sizing only for hard block interfaces", default=0.0)
+    #arguments for ASIC flow
+    parser.add_argument('-ho',"--hardblock_only",help="run only a single hardblock through the asic flow", action='store_true',default=False)
+    parser.add_argument('-g',"--gen_hb_scripts",help="generates all hardblock scripts which can be run by a user",action='store_true',default=False)
+    parser.add_argument('-p',"--parallel_hb_flow",help="runs the hardblock flow for current parameter selection in a parallel fashion",action='store_true',default=False)
+    parser.add_argument('-r',"--parse_pll_hb_flow",help="parses the hardblock flow from previously generated results",action='store_true',default=False)
+
+    # quick mode is disabled by default. Try passing -q 0.03 for 3% minimum improvement
+    parser.add_argument('-q', '--quick_mode', type=float, default=-1.0, help="minimum cost function improvement for resizing")
+
+    return parser
+
+
+def create_spice_interface(args, simulator_slots=None):
+    """
+    Creates an HSPICE interface using the simulator selected in 'args' (with a results cache if
+    one was requested). 'simulator_slots' is an optional semaphore shared by several interfaces
+    to bound the number of simulations they run at the same time (see spice.SpiceInterface).
+    """
+
+    spice_cache = None
+    if args.spice_cache != "":
+        spice_cache = spice.SpiceCache(args.spice_cache, args.spice_cache_size)
+    spice_backend = spice.SPICE_BACKENDS[args.spice_backend]()
+
+    return spice.SpiceInterface(args.num_spice_jobs, spice_cache, spice_backend, simulator_slots)
+
+
+def run_fpga_flow(args, coffe_params, arch_folder, spice_interface):
+    """
+    Runs the COFFE flow of the FPGA architecture in 'coffe_params' (see utils.load_params) with the
+    run options in 'args'. The SPICE netlists and the report are written to 'arch_folder' and the
+    simulations are run on 'spice_interface'. Returns the FPGA object, with its final area and delays.
+    """
+
+    is_size_transistors = not args.no_sizing
+    size_hb_interfaces = args.size_hb_interfaces
+
+    # Print the options to both terminal and report file
+    report_file_path = os.path.join(arch_folder, "report.txt")
+    utils.print_run_options(args, report_file_path)
+
+    # Print architecture and process details to terminal and report file
+    utils.print_architecture_params(coffe_params["fpga_arch_params"], report_file_path)
+
+    # Default_dir is the dir you ran COFFE from. COFFE will be switching directories
+    # while running HSPICE, this variable is so that we can get back to our starting point
+    default_dir = os.getcwd()
+
+    # Record start time
+    total_start_time = time.time()
+
+    # Create an FPGA instance
+    fpga_inst = fpga.FPGA(coffe_params, args, spice_interface)
+
+    ###############################################################
+    ## GENERATE FILES
+    ###############################################################
+
+    # Change to the architecture directory
+    os.chdir(arch_folder)
+
+    # Generate FPGA and associated SPICE files
+    fpga_inst.generate(is_size_transistors, size_hb_interfaces)
+
+    # Go back to the base directory
+    os.chdir(default_dir)
+
+    # Extract initial transistor sizes from file and overwrite the
+    # default initial sizes if this option was used.
+    if args.initial_sizes != "default" :
+        utils.use_initial_tran_size(args.initial_sizes, fpga_inst, tran_sizing, coffe_params["fpga_arch_params"]['use_tgate'])
+
+    # Print FPGA implementation details
+    report_file = open(report_file_path, 'a')
+    fpga_inst.print_details(report_file)
+    report_file.close()
+
+    # Go to architecture directory
+    os.chdir(arch_folder)
+
+    ###############################################################
+    ## TRANSISTOR SIZING
+    ###############################################################
+
+    sys.stdout.flush()
+
+    # Size FPGA transistors
+    if is_size_transistors:
+        tran_sizing.size_fpga_transistors(fpga_inst, args, spice_interface)
+        # Simulate the final sizes at every process corner and Monte Carlo sample of the architecture
+        if fpga_inst.has_variation():
+            fpga_inst.update_delays(spice_interface, with_variation=True)
+    else:
+        # in case of disabling floorplanning there is no need to
+        # update delays before updating area. Tried both ways and
+        # they give exactly the same results
+        #fpga_inst.update_delays(spice_interface)
+
+        # same thing here no need to update area before calculating
+        # the lb_height value. Also tested and gave same results
+        #fpga_inst.update_area()
+        fpga_inst.lb_height = math.sqrt(fpga_inst.area_dict["tile"])
+        fpga_inst.update_area()
+        fpga_inst.compute_distance()
+        fpga_inst.update_wires()
+        fpga_inst.update_wire_rc()
+
+        # floorplanning is only done for a non-sizing run if asked for
+        if fpga_inst.floorplan_search:
+            fpga_inst.determine_height()
+
+        fpga_inst.update_delays(spice_interface, with_variation=True)
+
+    # Obtain Memory core power
+    if coffe_params["fpga_arch_params"]['enable_bram_module'] == 1:
+        fpga_inst.update_power(spice_interface)
+
+    # Go back to the base directory
+    os.chdir(default_dir)
+
+    # Print out final COFFE report to file
+    utils.print_summary(arch_folder, fpga_inst, total_start_time)
+
+    # Print vpr architecure file
+    vpr.print_vpr_file(fpga_inst, arch_folder, coffe_params["fpga_arch_params"]['enable_bram_module'])
+
+    return fpga_inst
@@ -11,7 +11,13 @@ import shutil
 import math
 import glob
 import multiprocessing as mp
+import concurrent.futures
+import copy
 import csv
+import hashlib
+import json
+import io
+import time
 
 """
 Notes:
@@ -167,6 +173,205 @@ def gen_n_trav(dir_path):
   os.chdir(dir_path)
 ########################################## GENERAL UTILITIES ##########################################
 
+########################################## ARTIFACT CACHE ##########################################
+
+class HardblockCache:
+  """
+  Content addressed cache of synthesis and place and route runs, shared by all COFFE runs pointing to the same hb_cache_folder.
+  The key of a run is a hash of everything the tool reads: the design files, the generated tcl scripts (without the run specific paths), the libraries and the tool installation.
+  An entry <hb_cache_folder>/<key> holds copies of the report, output and work directories of the run (netlists, sdc, spef, reports, logs) and a result.json of the parsed results.
+  When the entries take more than max_size_mb on disk, the least recently used ones are evicted.
+  """
+  #temporary entries older than this (in seconds) are left over from crashed runs, even if their pid was reused or belongs to another host
+  tmp_entry_max_age = 24*60*60
+
+  def __init__(self,cache_folder,max_size_mb):
+    self.cache_folder = os.path.expanduser(cache_folder)
+    self.max_size = int(max_size_mb*1024*1024)
+    if(not os.path.isdir(self.cache_folder)):
+      os.makedirs(self.cache_folder,exist_ok=True)
+
+  def get(self,key,run_dirs):
+    """
+    Restores the directories of a cached run into run_dirs ({name: path} as given to put) and returns its parsed results, or None if the run isn't cached
+    """
+    entry_path = os.path.join(self.cache_folder,key)
+    result_fpath = os.path.join(entry_path,"result.json")
+    try:
+      fd = open(result_fpath,"r")
+      result = json.load(fd)
+      fd.close()
+      for name,path in run_dirs.items():
+        copy_run_dir(os.path.join(entry_path,name),path,keep_dirs=os.listdir(os.path.join(entry_path,name)))
+      #the modification time of result.json is the last time the entry was used
+      os.utime(result_fpath)
+    except (OSError,ValueError):
+      #the entry doesn't exist or was evicted by another run while being restored
+      return None
+    return result
+
+  def put(self,key,run_dirs,result,keep_dirs=[]):
+    """
+    Stores the files in run_dirs ({name: path}) and the subdirectories in keep_dirs along with the parsed results of the run, then evicts old entries if the cache is full
+    """
+    entry_path = os.path.join(self.cache_folder,key)
+    #the entry is written to a temporary directory and renamed so other runs never see a partial entry
+    tmp_entry_path = entry_path + ".tmp" + str(os.getpid())
+    for name,path in run_dirs.items():
+      copy_run_dir(path,os.path.join(tmp_entry_path,name),keep_dirs)
+    fd = open(os.path.join(tmp_entry_path,"result.json"),"w")
+    json.dump(result,fd)
+    fd.close()
+    try:
+      os.rename(tmp_entry_path,entry_path)
+    except OSError:
+      #another run stored the same entry first
+      shutil.rmtree(tmp_entry_path,ignore_errors=True)
+    self.evict()
+
+  def evict(self):
+    """
+    Removes the temporary entries left by crashed runs, then the least recently used entries until the cache fits in its size budget
+    """
+    entries = []
+    total_size = 0
+    for key in os.listdir(self.cache_folder):
+      if(".tmp" in key):
+        if(self.is_stale_tmp_entry(key)):
+          shutil.rmtree(os.path.join(self.cache_folder,key),ignore_errors=True)
+        continue
+      result_fpath = os.path.join(self.cache_folder,key,"result.json")
+      if(not os.path.isfile(result_fpath)):
+        continue
+      entry_size = 0
+      for root,dirnames,fnames in os.walk(os.path.join(self.cache_folder,key)):
+        entry_size += sum([os.path.getsize(os.path.join(root,fname)) for fname in fnames])
+      entries.append((os.path.getmtime(result_fpath),entry_size,key))
+      total_size += entry_size
+    for last_used,entry_size,key in sorted(entries):
+      if(total_size <= self.max_size):
+        break
+      shutil.rmtree(os.path.join(self.cache_folder,key),ignore_errors=True)
+      total_size -= entry_size
+
+  def is_stale_tmp_entry(self,tmp_key):
+    """
+    Returns True if the temporary entry tmp_key (<key>.tmp<pid>, see put) isn't being written anymore: its process is gone or it is older than tmp_entry_max_age
+    """
+    try:
+      if(time.time() - os.path.getmtime(os.path.join(self.cache_folder,tmp_key)) > self.tmp_entry_max_age):
+        return True
+    except OSError:
+      #the run that wrote it renamed or removed it
+      return False
+    pid = tmp_key.split(".tmp")[-1]
+    if(not pid.isdigit()):
+      return False
+    if(int(pid) == os.getpid()):
+      return False
+    try:
+      os.kill(int(pid),0)
+    except ProcessLookupError:
+      return True
+    except OSError:
+      #the process exists but belongs to another user
+      return False
+    return False
+
+
+def get_hb_cache(flow_settings):
+  """
+  Returns the artifact cache of the hardblock flow or None if hb_cache_folder isn't set
+  """
+  if(flow_settings["hb_cache_folder"] == ""):
+    return None
+  return HardblockCache(flow_settings["hb_cache_folder"],float(flow_settings["hb_cache_size"]))
+
+def copy_run_dir(src_path,dest_path,keep_dirs=[]):
+  """
+  Copies the files at the top of src_path and its subdirectories listed in keep_dirs to dest_path
+  """
+  if(not os.path.isdir(dest_path)):
+    os.makedirs(dest_path)
+  for fname in os.listdir(src_path):
+    fpath = os.path.join(src_path,fname)
+    if(os.path.isfile(fpath)):
+      shutil.copy2(fpath,os.path.join(dest_path,fname))
+    elif(os.path.isdir(fpath) and fname in keep_dirs):
+      if(os.path.isdir(os.path.join(dest_path,fname))):
+        shutil.rmtree(os.path.join(dest_path,fname))
+      shutil.copytree(fpath,os.path.join(dest_path,fname))
+
+def get_cache_run_dirs(report_path,output_path,work_path):
+  """
+  Returns the directories a tool run writes to as {name: path}, in the serial flow these are often the same directory which is then only stored once
+  """
+  run_dirs = {}
+  for name,path in [("reports",report_path),("outputs",output_path),("work",work_path)]:
+    if(os.path.abspath(path) not in [os.path.abspath(p) for p in run_dirs.values()]):
+      run_dirs[name] = path
+  return run_dirs
+
+def get_tool_id(tool_name,env_var):
+  """
+  Identifies the installed version of a tool by the resolved path of its executable and the install directory in env_var
+  """
+  tool_path = shutil.which(tool_name)
+  return " ".join([tool_name,os.path.realpath(tool_path) if tool_path is not None else "",str(os.environ.get(env_var))])
+
+def hash_file_contents(digest,fpath,fname):
+  """
+  Adds the name and the contents of a file to a hashlib digest, the name is used instead of the path so the key doesn't depend on where the file is
+  """
+  digest.update(fname.encode())
+  if(os.path.isfile(fpath)):
+    fd = open(fpath,"rb")
+    for block in iter(lambda: fd.read(1 << 20), b""):
+      digest.update(block)
+    fd.close()
+
+def hash_script(digest,script_fpath,path_names):
+  """
+  Adds the contents of a generated tcl script to a hashlib digest, replacing the run specific paths in path_names ({path: name}) by their names
+  """
+  fd = open(script_fpath,"r")
+  script_text = fd.read()
+  fd.close()
+  #longest paths first so a path isn't partially replaced by one of its parents
+  for path in sorted(path_names.keys(),key=len,reverse=True):
+    script_text = script_text.replace(os.path.abspath(path),"<" + path_names[path] + ">")
+  digest.update(script_text.encode())
+
+def get_synth_cache_key(flow_settings,synth_script_fpath,run_dirs):
+  """
+  Returns the cache key of a synthesis run from its dc script, the design files, the libraries and the version of design compiler
+  """
+  digest = hashlib.sha256(("synth\n" + get_tool_id("dc_shell-t","SYNOPSYS")).encode())
+  hash_script(digest,synth_script_fpath,{path: name for name,path in run_dirs.items()})
+  design_folder = os.path.expanduser(flow_settings['design_folder'])
+  for root,dirnames,fnames in sorted(os.walk(design_folder)):
+    for fname in sorted(fnames):
+      hash_file_contents(digest,os.path.join(root,fname),os.path.relpath(os.path.join(root,fname),design_folder))
+  for lib_key in ["search_path","target_library","link_library"]:
+    digest.update(str(flow_settings[lib_key]).encode())
+  return digest.hexdigest()
+
+def get_pnr_cache_key(flow_settings,pnr_script_fpaths,syn_output_path,run_dirs):
+  """
+  Returns the cache key of a place and route run from its scripts, the synthesized netlist and constraints, the libraries and the version of the pnr tool
+  """
+  digest = hashlib.sha256(("pnr\n" + get_tool_id(flow_settings["pnr_tool"],"EDI_HOME")).encode())
+  path_names = {path: name for name,path in run_dirs.items()}
+  path_names[syn_output_path] = "synth_outputs"
+  for script_fpath in pnr_script_fpaths:
+    hash_script(digest,script_fpath,path_names)
+  for fname in ["synthesized_flat.v","synthesized_hier.v","synthesized.sdc"]:
+    hash_file_contents(digest,os.path.join(syn_output_path,fname),fname)
+  for lib_key in ["lef_files","best_case_libs","standard_libs","worst_case_libs"]:
+    digest.update(str(flow_settings[lib_key]).encode())
+  return digest.hexdigest()
+########################################## ARTIFACT CACHE ##########################################
+
 ########################################## SYNTHESIS ##########################################
 def write_synth_tcl(flow_settings,clock_period,wire_selection,rel_outputs=False):
   """
@@ -302,6 +507,51 @@ def check_synth_run(flow_settings,syn_report_path):
       print("In spite of the warning, the rest of the flow will continue to execute.")
   check_file.close()
 
+def parse_synth_reports(syn_report_path):
+  """
+  Reads the total cell area (um^2), delay (ns), worst setup slack (ns) and dynamic power (W) of a synthesis run from its DC reports
+  Values which can't be found in the reports are set to None
+  """
+  synth_results = {"area": None, "delay": None, "slack": None, "power": None}
+  area_fpath = os.path.join(syn_report_path,"area.rpt")
+  if(os.path.isfile(area_fpath)):
+    file = open(area_fpath,"r")
+    for line in file:
+      if line.startswith('Total cell area:'):
+        synth_results["area"] = float(re.findall(r'\d+\.{0,1}\d*', line)[0])
+    file.close()
+  timing_fpath = os.path.join(syn_report_path,"setup_timing.rpt")
+  if(os.path.isfile(timing_fpath)):
+    slack_re = re.compile(r"slack\s*\((?:MET|VIOLATED)[^)]*\)\s+(-?\d+\.{0,1}\d*)")
+    library_setup_time = 0.0
+    data_arrival_time = None
+    file = open(timing_fpath,"r")
+    for line in file:
+      if 'library setup time' in line:
+        library_setup_time = float(re.findall(r'\d+\.{0,1}\d*', line)[0])
+      elif 'data arrival time' in line:
+        data_arrival_time = float(re.findall(r'\d+\.{0,1}\d*', line)[0])
+      #the first path of the report is the critical one
+      slack_match = slack_re.search(line)
+      if(slack_match is not None and synth_results["slack"] is None):
+        synth_results["slack"] = float(slack_match.group(1))
+    file.close()
+    if(data_arrival_time is not None):
+      synth_results["delay"] = data_arrival_time + library_setup_time
+  power_fpath = os.path.join(syn_report_path,"power.rpt")
+  if(os.path.isfile(power_fpath)):
+    file = open(power_fpath,"r")
+    for line in file:
+      if 'Total Dynamic Power' in line:
+        total_dynamic_power = float(re.findall(r'\d+\.{0,1}\d*', line)[0])
+        if 'mW' in line:
+          total_dynamic_power *= 0.001
+        elif 'uW' in line:
+          total_dynamic_power *= 0.000001
+        synth_results["power"] = total_dynamic_power
+    file.close()
+  return synth_results
+
 ########################################## SYNTH UTILS ##########################################
 
 ########################################## SYNTH RUN FUNCS ##########################################
@@ -312,15 +562,27 @@ def run_synth(flow_settings,clock_period,wire_selection):
   Prereqs: flow_settings_pre_process() function to properly format params for scripts
   """
   syn_report_path, syn_output_path = write_synth_tcl(flow_settings,clock_period,wire_selection)
-  # Run the script in design compiler shell
-  synth_run_cmd = "dc_shell-t -f " + "dc_script.tcl" + " | tee dc.log"
-  run_cmd(synth_run_cmd)
-  # clean after DC!
-  subprocess.call('rm -rf command.log', shell=True)
-  subprocess.call('rm -rf default.svf', shell=True)
-  subprocess.call('rm -rf filenames.log', shell=True)
+  # Restore the results of an identical synthesis run if one is cached
+  hb_cache = get_hb_cache(flow_settings)
+  cache_result = None
+  if hb_cache is not None:
+    run_dirs = get_cache_run_dirs(syn_report_path,syn_output_path,os.getcwd())
+    cache_key = get_synth_cache_key(flow_settings,"dc_script.tcl",run_dirs)
+    cache_result = hb_cache.get(cache_key,run_dirs)
+  if cache_result is not None:
+    print(("Restored synthesis results for period %s and wireload model %s from the hardblock cache" % (clock_period,wire_selection)))
+  else:
+    # Run the script in design compiler shell
+    synth_run_cmd = "dc_shell-t -f " + "dc_script.tcl" + " | tee dc.log"
+    run_cmd(synth_run_cmd)
+    # clean after DC!
+    subprocess.call('rm -rf command.log', shell=True)
+    subprocess.call('rm -rf default.svf', shell=True)
+    subprocess.call('rm -rf filenames.log', shell=True)
 
   check_synth_run(flow_settings,syn_report_path)
+  if hb_cache is not None and cache_result is None:
+    hb_cache.put(cache_key,run_dirs,{"synth_results": parse_synth_reports(syn_report_path)})
 
   #Copy synthesis results to a unique dir in synth dir
   synth_report_str = copy_syn_outputs(flow_settings,clock_period,wire_selection,syn_report_path)
@@ -1152,7 +1414,17 @@ def run_pnr(flow_settings,metal_layer,core_utilization,synth_report_str,syn_outp
     innovus_script_fname, pnr_output_path = write_innovus_script(flow_settings,metal_layer,core_utilization,init_script_fname,cts_flag=False)
     run_innovus_cmd = "innovus -no_gui -init " + innovus_script_fname + " | tee inn.log"
     copy_logs_cmd_str = " ".join(["cp", "inn.log", init_script_fname, view_fpath, os.path.join(work_dir,innovus_script_fname), report_dest_str])
-    run_cmd(run_innovus_cmd)
+    # Restore the results of an identical place and route run if one is cached
+    hb_cache = get_hb_cache(flow_settings)
+    cache_result = None
+    if hb_cache is not None:
+      run_dirs = get_cache_run_dirs(flow_settings['pr_folder'],pnr_output_path,work_dir)
+      cache_key = get_pnr_cache_key(flow_settings,[view_fpath,init_script_fname,os.path.join(work_dir,innovus_script_fname)],syn_output_path,run_dirs)
+      cache_result = hb_cache.get(cache_key,run_dirs)
+    if cache_result is not None:
+      print(("Restored place and route results for metal layers %s and utilization %s from the hardblock cache" % (metal_layer,core_utilization)))
+    else:
+      run_cmd(run_innovus_cmd)
 
   # read total area from the report file:
   file = open(os.path.expanduser(flow_settings['pr_folder']) + "/pr_report.txt" ,"r")
@@ -1160,6 +1432,9 @@ def run_pnr(flow_settings,metal_layer,core_utilization,synth_report_str,syn_outp
     if line.startswith('Total area of Core:'):
       total_area = re.findall(r'\d+\.{0,1}\d*', line)
   file.close()
+  if(flow_settings["pnr_tool"] == "innovus" and hb_cache is not None and cache_result is None):
+    #the saved design database is a directory
+    hb_cache.put(cache_key,run_dirs,{"total_area": total_area},keep_dirs=["design.enc.dat"])
   copy_pnr_outputs(flow_settings,copy_logs_cmd_str,report_dest_str)
   return pnr_report_str, pnr_output_path, total_area
 ########################################## PNR RUN FUNCS ############################################
@@ -1622,192 +1897,158 @@ def hardblock_script_gen(flow_settings):
 ########################################## PARALLEL FLOW ##########################################
 ########################################## PLL RUN FUNCS  ##########################################
 
-def run_pll_flow_stage(parallel_work_path):
+def get_pll_flow_stage_dep(param_dir,prev_stage_dirs):
   """
-  Runs a single stage of the parallel flow Ex. synth, pnr, or sta
+  Returns the parameter directory of the previous flow stage that param_dir was generated from or None if there isn't one
+  Ex. period_1.0_wiremdl_WireAreaLowkCon for period_1.0_wiremdl_WireAreaLowkCon_mlayer_8_util_0.70
   """
-  # scripts will be executed in parallel fashion based on parameters in hardblock_settings file and will execute all scripts in parallel
-  os.chdir(parallel_work_path)
-  #setup the scripts to be able to run
-  pll_scripts = glob.glob(os.path.join(parallel_work_path,"scripts","*"))
-  pll_scripts.append("top_level_parallel.sh")
-  for s in pll_scripts:
-    os.chmod(s,stat.S_IRWXU)
+  matches = [d for d in prev_stage_dirs if param_dir == d or param_dir.startswith(d + "_")]
+  if(len(matches) == 0):
+    return None
+  return max(matches,key=len)
 
-  #Runs the parallel synthesis across params
-  top_pll_cmds = ["top_level_parallel.sh"]
-  run_cmd(top_pll_cmds)
-  # parallel_p = subprocess.Popen(top_pll_cmds, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-  # stdout, stderr = parallel_p.communicate()
+def get_ptn_pnr_cmd_series(flow_settings,param_path,scaled_dims):
+  """
+  Groups the partition flow pnr scripts of a parameter directory by floorplan dimension and in order of execution Ex.
+  [[fp_gen_dimx.tcl, ptn_dimx.tcl, [blk1_dimx.tcl, blk2_dimx.tcl, ...],top_lvl_dimx.tcl, assemble_dimx.tcl],[fp_gen_dimy.tcl, ...], ...]
+  """
+  script_path = os.path.join(param_path,"scripts")
+  #First group the scripts according to their floorplan dimensions
+  dim_grouped_scripts = []
+  for dim in scaled_dims:
+    dim_group = [f for f in os.listdir(script_path) if str(dim) in f]
+    dim_grouped_scripts.append(dim_group)
+  #Now group according to order of execution
+  order_of_exec_pnr_per_dim = []
+  for group in dim_grouped_scripts:
+    #TODO create filename data structure to prevent below fname dependancies
+    fp_gen_script = [f for f in group if "fp_gen" in f]
+    ptn_script = [f for f in group if "ptn.tcl" in f]
+    block_scripts = [f for f in group if "block" in f]
+    toplvl_script = [f for f in group if "toplvl" in f]
+    assembly_script = [f for f in group if "assembly" in f]
+    order_of_exec_pnr_scripts = [fp_gen_script,ptn_script,block_scripts,toplvl_script,assembly_script]
+    order_of_exec_pnr_scripts = [e[0] if len(e) == 1 else e for e in order_of_exec_pnr_scripts]
+    order_of_exec_pnr_per_dim.append(order_of_exec_pnr_scripts)
+  return order_of_exec_pnr_per_dim
+
+def run_pll_flow_script(script_path,*dep_results):
+  """
+  Runs the bash script of a parameter directory for one stage of the parallel flow, the stages communicate through their output directories so dep_results are unused
+  """
+  run_cmd(script_path)
+
+def run_ptn_sta_script(script_fname,*dep_results):
+  """
+  Runs the timing script of one floorplan dimension of the partition flow, expects to be in the work directory of the parameter directory
+  """
+  run_cmd(get_sta_cmd(os.path.join("..","scripts",script_fname)))
+
+def run_ptn_pnr_cmd_series(flow_settings,inn_command_series,*dep_results):
+  """
+  Runs the partition flow pnr scripts of one floorplan dimension, expects to be in the work directory of the parameter directory
+  Unless override outputs is set the scripts whose outputs already exist are skipped
+  """
+  output_dir = os.path.join("..","outputs")
+  #cmds = [fp_gen.tcl, ptn.tcl, [blk1.tcl, blk2.tcl, ...],top_lvl.tcl, assemble.tcl]
+  cmds = []
+  for cmd in inn_command_series:
+    if(isinstance(cmd,str)):
+      cmds.append(os.path.join("..","scripts",cmd))
+    elif(isinstance(cmd,list)):
+      blk_cmds = [os.path.join("..","scripts",blk_cmd) for blk_cmd in cmd]
+      cmds.append(blk_cmds)
+  #if override outputs is selected the script will not check for intermediate files in the ptn flow and will start from the beginning
+  if(not flow_settings["hb_run_params"]["pnr"]["override_outputs"]):
+    #if theres already an assembled design saved for the fp flow skip it
+    saved_design = os.path.join(output_dir,os.path.splitext(inn_command_series[1])[0]+"_assembled.dat")
+    if(os.path.exists(saved_design)):
+      print(("found %s, Skipping..." % (saved_design)))
+      return
+    #if top level flow has been run only run the assembly
+    saved_tl_imp = os.path.join(os.path.splitext(inn_command_series[1])[0],flow_settings["top_level"],flow_settings["top_level"]+"_imp")
+    #if partition flow has been run only run top lvl + assembly
+    ptn_dir = os.path.join(os.path.splitext(inn_command_series[1])[0])
+    #if there is a top level implementation, we can delete all commands leading up to assembly script
+    if(os.path.isfile(saved_tl_imp)):
+      print("found top level imp, running only assembly")
+      print((os.getcwd()))
+      del cmds[0:3]
+    #if there is a ptn directory, we can delete all commands leading up to block level flow
+    elif(os.path.isdir(ptn_dir)):
+      print("found ptn dir, running only blocks + toplvl + assembly")
+      print((os.getcwd()))
+      del cmds[0:2]
+  run_inn_dim_specific_pnr_cmd_series(cmds)
 
 
 def hardblock_parallel_flow(flow_settings):
+  """
+  Runs the scripts generated by hardblock_script_gen for every parameter combination on a single pool of mp_num_cores workers
+  Each combination moves through synth -> pnr -> sta on its own, Ex. P&R of a combination starts as soon as its synthesis is done, without waiting for the rest of the synthesis runs
+  """
   pre_flow_dir = os.getcwd()
   #This expects cwd to be asic_work
   hardblock_script_gen(flow_settings)
   #make sure to be in the parallel_hardblock_folder
   os.chdir(flow_settings["parallel_hardblock_folder"])
+  top_abs_path = os.path.join(flow_settings["parallel_hardblock_folder"],flow_settings["top_level"])
   
+  #there is no per tool limit in the parallel flow, all tool runs share the cores of the pool
+  scheduler = FlowScheduler(int(flow_settings["mp_num_cores"]),{})
   flow_stages = ["synth","pnr","sta"] 
-  ########################### PARALLEL SYNTHESIS SECTION ###########################
-  if flow_settings["hb_run_params"]["synth"]["run_flag"]:
-    print("Running synthesis scripts in parallel...")
-    synth_parallel_work_path = os.path.join(flow_settings["parallel_hardblock_folder"],flow_settings["top_level"],"synth","synth_parallel_work")
-    run_pll_flow_stage(synth_parallel_work_path)
-  ########################### PARALLEL SYNTHESIS SECTION ###########################
-  ########################### PARALLEL PNR SECTION #################################
-  if flow_settings["hb_run_params"]["pnr"]["run_flag"]:
-    print("Running pnr scripts in parallel...")
-    #below path should point to pnr directory in pll flow folder
-    pnr_parallel_path = os.path.join(flow_settings["parallel_hardblock_folder"],flow_settings["top_level"],"pnr")
-    if(flow_settings["partition_flag"]):
-      #DEPENDANCY OF PTN PNR SCRIPTS
-      # run_gen_blocks for each ptn block in design [] denotes parallelism
-      # gen_fp(dim) -> gen_ptns(dim) -> [gen_blocks(dim)]  -> pnr(top_lvl) -> assemble(all_parts_of_design) 
-      #if override outputs is set 
-      #pre_processing for filtering ptn commands by specified settings
-      #floorplan x dimension (this is used in the filename of generated scripts/outputs/reports)
-      fp_dim = float(flow_settings["ptn_params"]["top_settings"]["fp_init_dims"][0])
-      #get factors which we are scaling the initial dimension value with
-      scaling_array = [float(fac) for fac in flow_settings["ptn_params"]["top_settings"]["scaling_array"]]
-      #multiplies initial dimension to find the filenames of all dims we wish to run
-      scaled_dims = [fp_dim*fac for fac in scaling_array]
-      os.chdir(pnr_parallel_path)
-      for param_dir in os.listdir(pnr_parallel_path):
-        #traverse into pnr directory for a particular set of run parameters
-        os.chdir(param_dir)
-        #continue flag will skip the parameterized directory if it is outside of the user inputted filtering settings
-        continue_flag = False
-        # TODO this needs to check if the parameter dir is actually a param dir, to be quality it should make sure all parameters in the input param dict are present in filename
-        if("period" not in param_dir): 
-          os.chdir(pnr_parallel_path)
-          continue
-        #Before anything else use filter to only run the selected params:
-        #get a dict of the current directories parameter settings
-        param_dict = get_params_from_str(flow_settings["input_param_options"],param_dir)
-        #we will parse the current directory param dict and check to see if it contains params outside of our run settings, if so skip the directory
-        for cur_key,cur_val in list(param_dict.items()):
-          if cur_key in list(flow_settings["hb_run_params"]["param_filters"].keys()):
-            if all(cur_val != val for val in flow_settings["hb_run_params"]["param_filters"][cur_key]):
-              continue_flag = True
-              break
-
-        #if the cur directory was outside of the run params, continue...
-        if(continue_flag):
-          os.chdir(pnr_parallel_path)
+  #maps the parameter directories of the last stage being run to the names of their nodes, the next stage depends on them
+  prev_stage_nodes = {}
+  for flow_stage in flow_stages:
+    if(not flow_settings["hb_run_params"][flow_stage]["run_flag"]):
+      continue
+    stage_path = os.path.join(top_abs_path,flow_stage)
+    stage_nodes = {}
+    #same parameter directories as the ones write_parallel_scripts wrote scripts for
+    param_dirs = sorted([d for d in os.listdir(stage_path) if compare_run_filt_params_to_str(flow_settings,d) and "period" in d])
+    for param_dir in param_dirs:
+      param_path = os.path.join(stage_path,param_dir)
+      dep_dir = get_pll_flow_stage_dep(param_dir,list(prev_stage_nodes.keys()))
+      deps = prev_stage_nodes[dep_dir] if dep_dir is not None else []
+      stage_nodes[param_dir] = []
+      if(flow_stage == "pnr" and flow_settings["partition_flag"]):
+        #DEPENDANCY OF PTN PNR SCRIPTS
+        # gen_fp(dim) -> gen_ptns(dim) -> [gen_blocks(dim)]  -> pnr(top_lvl) -> assemble(all_parts_of_design) 
+        #floorplan x dimension (this is used in the filename of generated scripts/outputs/reports)
+        fp_dim = float(flow_settings["ptn_params"]["top_settings"]["fp_init_dims"][0])
+        #get factors which we are scaling the initial dimension value with
+        scaling_array = [float(fac) for fac in flow_settings["ptn_params"]["top_settings"]["scaling_array"]]
+        #multiplies initial dimension to find the filenames of all dims we wish to run
+        scaled_dims = [fp_dim*fac for fac in scaling_array]
+        #each floorplan dimension is a separate run
+        for dim, inn_command_series in zip(scaled_dims,get_ptn_pnr_cmd_series(flow_settings,param_path,scaled_dims)):
+          node_name = "/".join([flow_stage,param_dir,str(dim)])
+          scheduler.add_node(FlowNode(node_name,flow_stage,os.path.join(param_path,"work"),run_ptn_pnr_cmd_series,[flow_settings,inn_command_series],deps=deps))
+          stage_nodes[param_dir].append(node_name)
+      elif(flow_stage == "sta" and flow_settings["partition_flag"]):
+        #each floorplan dimension has its own timing script using the netlist of that dimension, they are separate runs
+        for script in sorted(os.listdir(os.path.join(param_path,"scripts"))):
+          if("dimlen" not in script):
+            continue
+          node_name = "/".join([flow_stage,param_dir,script])
+          scheduler.add_node(FlowNode(node_name,flow_stage,os.path.join(param_path,"work"),run_ptn_sta_script,[script],deps=deps))
+          stage_nodes[param_dir].append(node_name)
+      else:
+        #the script generated for this parameter directory changes to its work directory and runs the tool
+        script_path = os.path.join(stage_path,flow_stage + "_parallel_work","scripts",param_dir + "_" + flow_stage + "_run_parallel.sh")
+        if(not os.path.isfile(script_path)):
           continue
-
-        #First group the scripts according to their floorplan dimensions
-        dim_grouped_scripts = []
-        for dim in scaled_dims:
-          dim_group = [f for f in os.listdir("scripts") if str(dim) in f]
-          dim_grouped_scripts.append(dim_group)
-        #Now group according to order of execution
-        order_of_exec_pnr_per_dim = []
-        for group in dim_grouped_scripts:
-          #TODO create filename data structure to prevent below fname dependancies
-          fp_gen_script = [f for f in group if "fp_gen" in f]
-          ptn_script = [f for f in group if "ptn.tcl" in f]
-          block_scripts = [f for f in group if "block" in f]
-          toplvl_script = [f for f in group if "toplvl" in f]
-          assembly_script = [f for f in group if "assembly" in f]
-          order_of_exec_pnr_scripts = [fp_gen_script,ptn_script,block_scripts,toplvl_script,assembly_script]
-          order_of_exec_pnr_scripts = [e[0] if len(e) == 1 else e for e in order_of_exec_pnr_scripts]
-          order_of_exec_pnr_per_dim.append(order_of_exec_pnr_scripts)
-
-        #change to work directory to prepare to execute scripts
-        os.chdir("work")
-        output_dir = os.path.join("..","outputs")
-
-        cmd_series_list = []
-        
-        #Filter out innovus commands if the intermediary files already exist
-        for inn_command_series in order_of_exec_pnr_per_dim:
-          
-          #filter out commands which are out of bounds of our dims we want to evaluate
-          # if not any(str(dim) in inn_command_series[0] for dim in scaled_dims):
-            # print("dim out of dimension list, not running %s... " % (inn_command_series[0]))
-            # continue
-
-          #if override outputs is selected the script will not check for intermediate files in the ptn flow and will start from the beginning
-          if(not flow_settings["hb_run_params"]["pnr"]["override_outputs"]):
-            #if theres already an assembled design saved for the fp flow skip it
-            saved_design = os.path.join(output_dir,os.path.splitext(inn_command_series[1])[0]+"_assembled.dat")
-            if(os.path.exists(saved_design)):
-              print(("found %s, Skipping..." % (saved_design)))
-              # print(os.getcwd())
-              continue
-
-            #if top level flow has been run only run the assembly
-            saved_tl_imp = os.path.join(os.path.splitext(inn_command_series[1])[0],flow_settings["top_level"],flow_settings["top_level"]+"_imp")
-
-            #if partition flow has been run only run top lvl + assembly
-            ptn_dir = os.path.join(os.path.splitext(inn_command_series[1])[0])
-            
-            cmds = []
-            #loop through commands for this fp size and group the lists s.t they are in the following format:
-            #cmds = [fp_gen.tcl, ptn.tcl, [blk1.tcl, blk2.tcl, ...],top_lvl.tcl, assemble.tcl]
-            for cmd in inn_command_series:
-              if(isinstance(cmd,str)):
-                cmds.append(os.path.join("..","scripts",cmd))
-              elif(isinstance(cmd,list)):
-                blk_cmds = [os.path.join("..","scripts",blk_cmd) for blk_cmd in cmd]
-                cmds.append(blk_cmds)
-            #if there is a top level implementation, we can delete all commands leading up to assembly script
-            if(os.path.isfile(saved_tl_imp)):
-              print("found top level imp, running only assembly")
-              print((os.getcwd()))
-              del cmds[0:3]
-            #if there is a ptn directory, we can delete all commands leading up to block level flow
-            elif(os.path.isdir(ptn_dir)):
-              print("found ptn dir, running only blocks + toplvl + assembly")
-              print((os.getcwd()))
-              del cmds[0:2]
-            cmd_series_list.append(cmds)
-          else:
-            #if the user selected to override all outputs
-            cmd_series_list = []
-            for cmd_series in order_of_exec_pnr_per_dim:
-              cmds = []
-              for cmd in cmd_series:
-                if(isinstance(cmd,str)):
-                  cmds.append(os.path.join("..","scripts",cmd))
-                elif(isinstance(cmd,list)):
-                  blk_cmds = [os.path.join("..","scripts",blk_cmd) for blk_cmd in cmd]
-                  cmds.append(blk_cmds)
-              cmd_series_list.append(cmds)
-              
-        #At this point the cmd_series_list should be in the following format
-        #cmd_series_list = [[fp_gen_dimx.tcl, ptn_dimx.tcl, [blk1_dimx.tcl, blk2_dimx.tcl, ...],top_lvl_dimx.tcl, assemble_dimx.tcl],[fp_gen_dimx.tcl, ...], ...]
-        pool = mp.Pool(int(flow_settings["mp_num_cores"]))
-        #execute all scripts according to order in list
-        pool.map(run_inn_dim_specific_pnr_cmd_series,cmd_series_list)
-        pool.close()
-        os.chdir(pnr_parallel_path)
-    else:
-      #If not running partitioning, pnr scripts will be executed in parallel fashion based on parameters in hardblock_settings file and will execute all scripts in parallel
-      pnr_parallel_work_path = os.path.join(flow_settings["parallel_hardblock_folder"],flow_settings["top_level"],"pnr","pnr_parallel_work")
-      run_pll_flow_stage(pnr_parallel_work_path)
-  ########################### PARALLEL PNR SECTION #################################
-  ########################### PARALLEL STA SECTION #################################
-  if(flow_settings["hb_run_params"]["sta"]["run_flag"]):
-    print("Running sta scripts in parallel...")
-    sta_parallel_work_path = os.path.join(flow_settings["parallel_hardblock_folder"],flow_settings["top_level"],"sta","sta_parallel_work")
-    run_pll_flow_stage(sta_parallel_work_path)
-  ########################### PARALLEL STA SECTION #################################
-  
-
-  # TODO integrate parallel output parsing function and lowest cost function to return the best parameter run for parallel flow
-
-  #hardblock flow stuff
-  # lowest_cost = sys.float_info.max
-  # lowest_cost_area = 1.0
-  # lowest_cost_delay = 1.0
-  # lowest_cost_power = 1.0
-  
+        os.chmod(script_path,stat.S_IRWXU)
+        node_name = "/".join([flow_stage,param_dir])
+        scheduler.add_node(FlowNode(node_name,flow_stage,os.path.join(param_path,"work"),run_pll_flow_script,[script_path],deps=deps))
+        stage_nodes[param_dir].append(node_name)
+    prev_stage_nodes = stage_nodes
+
+  print(("Running %s scripts in parallel..." % (", ".join([stage for stage in flow_stages if flow_settings["hb_run_params"][stage]["run_flag"]]))))
+  scheduler.run(lambda node: print(("Finished %s run %s" % (node.tool," ".join(node.name.split("/")[1:])))))
   os.chdir(pre_flow_dir)
-  # return (float(lowest_cost_area), float(lowest_cost_delay), float(lowest_cost_power))
 
+  # TODO integrate parallel output parsing function and lowest cost function to return the best parameter run for parallel flow
 
 def run_inn_dim_specific_pnr_cmd_series(inn_command_series):
   """
@@ -2052,9 +2293,65 @@ def parse_report(flow_settings,report_file,flow_dir,parameterized_dir,out_dict,l
       if(e in list(param_dtype_dict.keys())):
         out_dict[flow_dir][dict_entry][e] = decode_dict_dtypes(param_dtype_dict,e,dict_ent_params[idx+1]) 
 
+def get_pll_report_files(flow_settings,parallel_results_path):
+  """
+  Returns (report_path, flow_dir, parameterized_dir, check_valid) for every report of the top level module in the parallel results tree
+  check_valid is set for the reports which should be skipped if they contain errors
+  """
+  valid_rpt_dir_re = re.compile("^dimlen_[0-9]+|\.[0-9]+_ptn$",re.MULTILINE)
+  report_files = []
+  top_level_mod_path = os.path.join(parallel_results_path,flow_settings["top_level"])
+  if(not os.path.isdir(top_level_mod_path)):
+    return report_files
+  for flow_dir in sorted(os.listdir(top_level_mod_path)):
+    flow_path = os.path.join(top_level_mod_path,flow_dir)
+    if(not os.path.isdir(flow_path)):
+      continue
+    for parameterized_dir in sorted(os.listdir(flow_path)):
+      if("period" not in parameterized_dir): #TODO fix dir name dependancy
+        continue
+      reports_path = os.path.join(flow_path,parameterized_dir,"reports")
+      if(not os.path.isdir(reports_path)):
+        continue
+      for report_file in sorted(os.listdir(reports_path)):
+        report_path = os.path.join(reports_path,report_file)
+        #partitioned flow reports are in a sub directory for each floorplan dimension
+        if(valid_rpt_dir_re.search(report_file) and os.path.isdir(report_path)):
+          for sub_report_file in sorted(os.listdir(report_path)):
+            if(os.path.isfile(os.path.join(report_path,sub_report_file))):
+              report_files.append((os.path.join(report_path,sub_report_file),flow_dir,parameterized_dir,False))
+        elif(os.path.isfile(report_path)):
+          report_files.append((report_path,flow_dir,parameterized_dir,True))
+  return report_files
+
+def get_report_hash(report_path):
+  """
+  Returns the sha256 hex digest of the contents of a report
+  """
+  digest = hashlib.sha256()
+  hash_file_contents(digest,report_path,"")
+  return digest.hexdigest()
+
+def parse_pll_report(flow_settings,report_path,flow_dir,parameterized_dir,check_valid,param_dtype_dict):
+  """
+  Parses a single report of the parallel results tree in a worker process of parse_parallel_outputs
+  Returns the values found in the report as {dict_entry: {key: value}} along with the lines it logged
+  """
+  #the parsing functions find the parameters of the report from the directory they are run in
+  os.chdir(os.path.dirname(report_path))
+  report_file = os.path.basename(report_path)
+  out_dict = {flow_dir: {}}
+  log_fd = io.StringIO()
+  #checks to see if "Error" string is in the file, if so skip...
+  if(not check_valid or check_for_valid_report(report_file)):
+    parse_report(flow_settings,report_file,flow_dir,parameterized_dir,out_dict,log_fd,param_dtype_dict)
+  return out_dict[flow_dir], log_fd.getvalue()
+
 def parse_parallel_outputs(flow_settings):
   """
   This function parses the ASIC results directory created after running scripts generated from option of coffe flow
+  The reports parsed by previous calls are recorded with their mtime and hash in a manifest in the condensed results folder,
+  only new or changed reports are parsed again (in parallel on mp_num_cores processes) and merged with the recorded ones into the condensed results csv
   """
   #Directory structure of the parallel results is as follows:
   #results_dir: 
@@ -2072,7 +2369,7 @@ def parse_parallel_outputs(flow_settings):
   report_csv_fname = "condensed_pll_results.csv"
   gen_dir(flow_settings["condensed_results_folder"])
   parse_pll_outputs_log_file = os.path.join(flow_settings["condensed_results_folder"],"parse_pll_outputs.log")
-  log_fd = open(parse_pll_outputs_log_file,"w")
+  manifest_fpath = os.path.join(flow_settings["condensed_results_folder"],"parse_pll_outputs_manifest.json")
   #this dict will contain values parsed from pll outputs
   out_dict = {
     "pnr": {},
@@ -2099,66 +2396,78 @@ def parse_parallel_outputs(flow_settings):
   
 
   parallel_results_path = os.path.expanduser(flow_settings["parallel_hardblock_folder"])
-  #for parsing decimal values in report directories
+  report_files = get_pll_report_files(flow_settings,parallel_results_path)
 
-  valid_rpt_dir_re = re.compile("^dimlen_[0-9]+|\.[0-9]+_ptn$",re.MULTILINE)
-  os.chdir(parallel_results_path)
-  results_path = os.getcwd()
-  #list containing an output dict for each top level module
-  top_lvl_dicts = []
-  for top_level_mod in os.listdir(os.getcwd()):
-    if(top_level_mod != flow_settings["top_level"]):
+  #the recorded results are only valid if they were parsed with the same settings
+  manifest_settings = {"top_level": flow_settings["top_level"], "partition_flag": flow_settings["partition_flag"], "parallel_hardblock_folder": parallel_results_path}
+  manifest = {"settings": manifest_settings, "reports": {}}
+  if(os.path.isfile(manifest_fpath)):
+    fd = open(manifest_fpath,"r")
+    try:
+      prev_manifest = json.load(fd)
+    except ValueError:
+      prev_manifest = {}
+    fd.close()
+    if(prev_manifest.get("settings") == manifest_settings):
+      manifest = prev_manifest
+
+  #find the reports which are new or have changed since they were parsed, reports which were deleted are dropped from the manifest
+  report_records = {}
+  reports_to_parse = []
+  for report_path, flow_dir, parameterized_dir, check_valid in report_files:
+    report_stat = os.stat(report_path)
+    record = manifest["reports"].get(report_path)
+    if(record is not None and record["mtime_ns"] == report_stat.st_mtime_ns and record["size"] == report_stat.st_size):
+      report_records[report_path] = record
       continue
-    #filter out to only look at a single top level mod
-    os.chdir(os.path.join(results_path,top_level_mod))
-    top_level_mod_path = os.getcwd()
-    for flow_dir in os.listdir(os.getcwd()):
-      os.chdir(os.path.join(top_level_mod_path,flow_dir))
-      flow_path = os.getcwd()
-      for parameterized_dir in os.listdir(os.getcwd()):
-        if("period" not in parameterized_dir): #TODO fix dir name dependancy
-          continue
-        # This would filter out any params that werent in current run set
-        # if(not compare_run_filt_params_to_str(flow_settings,parameterized_dir)):
-        #   continue
-        os.chdir(os.path.join(flow_path,parameterized_dir))
-        parameterized_path = os.getcwd()
-        for dir in os.listdir(os.getcwd()):
-          os.chdir(os.path.join(parameterized_path,dir))
-          dir_path = os.getcwd()
-          if(os.path.basename(dir_path) == "reports" and len(dir_path) > 0):
-            for report_file in os.listdir(os.getcwd()):
-              if(valid_rpt_dir_re.search(report_file) and os.path.isdir(report_file) and len(os.listdir(report_file)) > 0):
-                os.chdir(report_file)
-                for sub_report_file in os.listdir(os.getcwd()):
-                  if(os.path.isfile(sub_report_file)):
-                    parse_report(flow_settings,sub_report_file,flow_dir,parameterized_dir,out_dict,log_fd,param_dtype_dict)
-                  else:
-                    continue
-                os.chdir(dir_path)
-                continue                
-              #checks to see if "Error" string is in the file, if so skip...
-              elif(os.path.isfile(report_file) and not check_for_valid_report(report_file)):
-                continue
-              elif(os.path.isfile(report_file)):
-                parse_report(flow_settings,report_file,flow_dir,parameterized_dir,out_dict,log_fd,param_dtype_dict)
+    report_hash = get_report_hash(report_path)
+    if(record is not None and record["hash"] == report_hash):
+      record["mtime_ns"] = report_stat.st_mtime_ns
+      report_records[report_path] = record
+      continue
+    report_records[report_path] = {"mtime_ns": report_stat.st_mtime_ns, "size": report_stat.st_size, "hash": report_hash, "flow_dir": flow_dir}
+    reports_to_parse.append((report_path,flow_dir,parameterized_dir,check_valid))
+
+  print(("Parsing %d new or changed reports out of %d..." % (len(reports_to_parse),len(report_files))))
+  if(len(reports_to_parse) > 0):
+    try:
+      num_workers = int(flow_settings["mp_num_cores"])
+    except ValueError:
+      num_workers = -1
+    if(num_workers < 1):
+      num_workers = os.cpu_count()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as pool:
+      futures = [pool.submit(parse_pll_report,flow_settings,report_path,flow_dir,parameterized_dir,check_valid,param_dtype_dict) for report_path,flow_dir,parameterized_dir,check_valid in reports_to_parse]
+      for (report_path,flow_dir,parameterized_dir,check_valid), future in zip(reports_to_parse,futures):
+        report_records[report_path]["entries"], report_records[report_path]["log"] = future.result()
+  manifest["reports"] = report_records
+
+  #merge the values of every report into the output dict
+  log_fd = open(parse_pll_outputs_log_file,"w")
+  for report_path, flow_dir, parameterized_dir, check_valid in report_files:
+    record = report_records[report_path]
+    for dict_entry, entry_vals in record["entries"].items():
+      if(dict_entry not in out_dict[flow_dir]):
+        out_dict[flow_dir][dict_entry] = {}
+      out_dict[flow_dir][dict_entry].update(entry_vals)
+    log_fd.write(record["log"])
+  log_fd.close()
   
   #remove the old str format files (they are old runs which dont have relevant results)
   for flow_key,flow_dict in list(out_dict.items()):
-    # print("############################# %s :" %(flow_key))
     for param_key, val_out_dict in list(flow_dict.items()):
-      # print("########### %s :" %(param_key))
       if( (("_ptn_" not in param_key or "mlayers" in param_key) and flow_key == "pnr" and flow_settings["partition_flag"] == True) or ()):
-        # print("deleted %s" % (param_key))
         del out_dict[flow_key][param_key]
-      # else:
-        # for out_key, out_val in val_out_dict.items():
-          # print( "%s : %s" % (out_key,out_val))
   #pass area and other params from pnr to sta
 
-  #Generate output csv file which can be used by plotting script
-  log_fd.close()
-  write_pll_results_csv(param_dtype_dict,out_dict,os.path.join(flow_settings["condensed_results_folder"],report_csv_fname))
+  #Generate output csv file which can be used by plotting script, the csv and manifest are replaced at once as they may be read while the flow is still running
+  csv_fpath = os.path.join(flow_settings["condensed_results_folder"],report_csv_fname)
+  write_pll_results_csv(param_dtype_dict,out_dict,csv_fpath + ".tmp")
+  os.replace(csv_fpath + ".tmp",csv_fpath)
+  fd = open(manifest_fpath + ".tmp","w")
+  json.dump(manifest,fd)
+  fd.close()
+  os.replace(manifest_fpath + ".tmp",manifest_fpath)
   os.chdir(pre_func_dir)
   return report_csv_fname,out_dict
 
@@ -2212,11 +2521,169 @@ def run_plot_script(flow_settings,report_csv_fname):
 
 
 
+########################################## FLOW SCHEDULER ##########################################
+
+class FlowNode:
+  """
+  A single tool run of the hardblock flow, Ex. synthesis for one clock period and wireload model.
+  The node runs func(*args, *dep_results) in its work_dir once the nodes it depends on are done, dep_results are the results of those nodes in the order of deps
+  """
+  def __init__(self,name,tool,work_dir,func,args,deps=[]):
+    self.name = name
+    self.tool = tool
+    self.work_dir = work_dir
+    self.func = func
+    self.args = list(args)
+    self.deps = list(deps)
+    self.result = None
+    self.skipped = False
+
+
+def run_flow_node(work_dir,func,args):
+  """
+  Runs the function of a flow node in its work directory
+  This is executed in a worker process of the scheduler, so changing directory doesn't affect the other nodes
+  """
+  if(not os.path.isdir(work_dir)):
+    os.makedirs(work_dir)
+  os.chdir(work_dir)
+  return func(*args)
+
+
+class FlowScheduler:
+  """
+  Runs the nodes of a hardblock flow dependency graph on a pool of worker processes.
+  A node starts as soon as all of its dependencies are done, at most max_jobs nodes run at once and at most tool_limits[tool] of them run the same tool.
+  Ex. P&R of a synthesis result starts while the other synthesis runs are still going
+  """
+  def __init__(self,max_jobs,tool_limits):
+    self.max_jobs = max_jobs
+    self.tool_limits = tool_limits
+    self.nodes = {}
+    self.children = {}
+
+  def add_node(self,node):
+    """
+    Adds a node to the graph, its dependencies have to be added before it
+    """
+    assert node.name not in self.nodes
+    assert all(dep in self.nodes for dep in node.deps)
+    self.nodes[node.name] = node
+    self.children[node.name] = []
+    for dep in node.deps:
+      self.children[dep].append(node.name)
+    return node
+
+  def get_ready_children(self,node,pending_deps):
+    """
+    Returns the children of a finished or skipped node which have no pending dependencies left
+    """
+    ready_children = []
+    for child in self.children[node.name]:
+      pending_deps[child] -= 1
+      if(pending_deps[child] == 0):
+        ready_children.append(child)
+    return ready_children
+
+  def run(self,node_done_callback=None,node_skip_check=None):
+    """
+    Runs all nodes of the graph, node_done_callback(node) is called as soon as each node is done
+    node_skip_check(node) is called right before a node would be started, if it returns True the node and all nodes depending on it are skipped (node.skipped is set)
+    If a node fails, the nodes already running are waited for and its exception is raised
+    """
+    pending_deps = {name: len(node.deps) for name,node in self.nodes.items()}
+    ready = [name for name in self.nodes if pending_deps[name] == 0]
+    tool_jobs = {}
+    running = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_jobs) as pool:
+      while(len(ready) > 0 or len(running) > 0):
+        #start as many ready nodes as the pool and the tool limits allow
+        for name in list(ready):
+          if(len(running) >= self.max_jobs):
+            break
+          node = self.nodes[name]
+          if(tool_jobs.get(node.tool,0) >= self.tool_limits.get(node.tool,self.max_jobs)):
+            continue
+          ready.remove(name)
+          if(any(self.nodes[dep].skipped for dep in node.deps) or (node_skip_check is not None and node_skip_check(node))):
+            node.skipped = True
+            ready = self.get_ready_children(node,pending_deps) + ready
+            continue
+          dep_results = [self.nodes[dep].result for dep in node.deps]
+          future = pool.submit(run_flow_node,node.work_dir,node.func,node.args + dep_results)
+          running[future] = node
+          tool_jobs[node.tool] = tool_jobs.get(node.tool,0) + 1
+        #skipped nodes may have made new nodes ready without anything running
+        if(len(running) == 0):
+          continue
+        done, _ = concurrent.futures.wait(list(running.keys()),return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+          node = running.pop(future)
+          tool_jobs[node.tool] -= 1
+          try:
+            node.result = future.result()
+          except BaseException:
+            print(("hardblock flow %s run %s failed, refer to the logs in %s" % (node.tool,node.name,node.work_dir)))
+            raise
+          if(node_done_callback is not None):
+            node_done_callback(node)
+          #the next stages of a finished node are put first so each combination moves on to the next tool before new ones are started
+          ready = self.get_ready_children(node,pending_deps) + ready
+
+
+def get_flow_scheduler(flow_settings):
+  """
+  Returns an empty flow scheduler using the per tool concurrency limits of the hardblock settings
+  The pool is bounded by mp_num_cores if it is set, otherwise each tool can run up to its own limit at the same time
+  """
+  tool_limits = {}
+  for tool in ["synth","pnr","sta"]:
+    tool_limits[tool] = int(flow_settings[tool + "_max_jobs"])
+    if(tool_limits[tool] < 1):
+      print(("%s_max_jobs has to be at least 1" % (tool)))
+      sys.exit(1)
+  try:
+    max_jobs = int(flow_settings["mp_num_cores"])
+  except ValueError:
+    max_jobs = -1
+  if(max_jobs < 1):
+    max_jobs = sum(tool_limits.values())
+  return FlowScheduler(max_jobs,tool_limits)
+########################################## FLOW SCHEDULER ##########################################
+
 ########################################## SERIAL FLOW ##########################################
 
+def get_hb_cost(flow_settings,area,delay):
+  """
+  Returns the cost of a hardblock flow result, the same metric is used to pick the best combination and to prune combinations
+  """
+  return math.pow(float(area), float(flow_settings['area_cost_exp'])) * math.pow(float(delay), float(flow_settings['delay_cost_exp']))
+
+def run_pnr_node(flow_settings,metal_layer,core_utilization,synth_result):
+  """
+  P&R node of the serial flow, synth_result is the result of run_synth for the netlist being placed
+  """
+  synth_report_str, syn_output_path = synth_result
+  return run_pnr(flow_settings,metal_layer,core_utilization,synth_report_str,syn_output_path)
+
+def run_sta_node(flow_settings,mode_enabled,clock_period,x,synth_result,pnr_result):
+  """
+  STA node of the serial flow, synth_result and pnr_result are the results of run_synth and run_pnr for the design being analyzed
+  """
+  synth_report_str, syn_output_path = synth_result
+  pnr_report_str, pnr_output_path, total_area = pnr_result
+  # Optional: use modelsim to generate an activity file for the design:
+  if flow_settings['generate_activity_file'] is True:
+    run_sim()
+  return run_power_timing(flow_settings,mode_enabled,clock_period,x,syn_output_path,pnr_report_str,pnr_output_path)
+
 def hardblock_flow(flow_settings): 
   """
   This function will write and run asic flow scripts for each stage of the asic flow and for each combination of user inputted parameters  
+  Each (synth -> pnr -> sta) chain is a set of nodes in a dependency graph, ready nodes are run concurrently (limited per tool by synth/pnr/sta_max_jobs)
+  and every node works in its own parameterized subdirectory of the synth, pr and primetime folders
+  If prune_flag is set, the P&R and STA of a combination are skipped when its synthesis results show it can't beat the lowest cost found so far
+  The results of all combinations are written to <top_level>_flow_results.csv
   """
   pre_func_dir = os.getcwd()
   cur_env = os.environ.copy()
@@ -2227,45 +2694,128 @@ def hardblock_flow(flow_settings):
   lowest_cost_area = 1.0
   lowest_cost_delay = 1.0
   lowest_cost_power = 1.0
-  subprocess.call("mkdir -p " + flow_settings['synth_folder'] + "\n", shell=True)
-  subprocess.call("mkdir -p " + flow_settings['pr_folder'] + "\n", shell=True)
-  subprocess.call("mkdir -p " + flow_settings['primetime_folder'] + "\n", shell=True)
+  #the nodes run in worker processes with their own working directories so the folders have to be absolute
+  for folder_key in ['synth_folder','pr_folder','primetime_folder']:
+    processed_flow_settings[folder_key] = os.path.abspath(processed_flow_settings[folder_key])
+    subprocess.call("mkdir -p " + flow_settings[folder_key] + "\n", shell=True)
   # Make sure we managed to read the design files
   assert len(processed_flow_settings["design_files"]) >= 1
+  mode_enabled = True if len(flow_settings['mode_signal']) > 0 else False
+
+  #build the dependency graph of the flow, pnr nodes depend on their synthesis node and sta nodes on both
+  scheduler = get_flow_scheduler(processed_flow_settings)
+  sta_runs = []
   for clock_period in flow_settings['clock_period']:
     for wire_selection in flow_settings['wire_selection']:
-      synth_report_str,syn_output_path = run_synth(processed_flow_settings,clock_period,wire_selection)
+      synth_dir = "_".join(["period",clock_period,"wiremdl",wire_selection])
+      synth_settings = copy.deepcopy(processed_flow_settings)
+      synth_settings['synth_folder'] = os.path.join(processed_flow_settings['synth_folder'],synth_dir)
+      synth_node = scheduler.add_node(FlowNode(synth_dir,"synth",synth_settings['synth_folder'],run_synth,[synth_settings,clock_period,wire_selection]))
       for metal_layer in flow_settings['metal_layers']:
         for core_utilization in flow_settings['core_utilization']:
-          #set the pnr flow to accept the correct name for flattened netlist
-          pnr_report_str, pnr_output_path, total_area = run_pnr(processed_flow_settings,metal_layer,core_utilization,synth_report_str,syn_output_path)
-          mode_enabled = True if len(flow_settings['mode_signal']) > 0 else False
-          the_power = 0.0
-          # Optional: use modelsim to generate an activity file for the design:
-          if flow_settings['generate_activity_file'] is True:
-            run_sim()
+          pnr_dir = synth_dir + "_" + "_".join(["mlayer",metal_layer,"util",core_utilization])
+          pnr_settings = copy.deepcopy(processed_flow_settings)
+          pnr_settings['pr_folder'] = os.path.join(processed_flow_settings['pr_folder'],pnr_dir)
+          pnr_node = scheduler.add_node(FlowNode(pnr_dir,"pnr",pnr_settings['pr_folder'],run_pnr_node,[pnr_settings,metal_layer,core_utilization],deps=[synth_node.name]))
           #loops over every combination of user inputted modes to set the set_case_analysis value (determines value of mode mux)
           for x in range(0, 2**len(flow_settings['mode_signal']) + 1):
-            library_setup_time, data_arrival_time, total_delay, total_dynamic_power = run_power_timing(flow_settings,mode_enabled,clock_period,x,syn_output_path,pnr_report_str,pnr_output_path)
-            # write the final report file:
-            if mode_enabled and x <2**len(flow_settings['mode_signal']):
-              file = open("report_mode" + str(x) + "_" + str(flow_settings['top_level']) + "_" + str(clock_period) + "_" + str(wire_selection) + "_wire_" + str(metal_layer) + "_" + str(core_utilization) + ".txt" ,"w")
-            else:
-              file = open("report_" + str(flow_settings['top_level']) + "_" + str(clock_period) + "_" + str(wire_selection) + "_wire_" + str(metal_layer) + "_" + str(core_utilization) + ".txt" ,"w")
-            file.write("total area = "  + str(total_area[0]) +  " um^2 \n")
-            file.write("total delay = " + str(total_delay) + " ns \n")
-            file.write("total power = " + str(total_dynamic_power[0]) + " W \n")
-            file.close()
-            if total_dynamic_power[0] > the_power:
-              the_power = total_dynamic_power[0]
-            if lowest_cost > math.pow(float(total_area[0]), float(flow_settings['area_cost_exp'])) * math.pow(float(total_delay), float(flow_settings['delay_cost_exp'])):
-              lowest_cost = math.pow(float(total_area[0]), float(flow_settings['area_cost_exp'])) * math.pow(float(total_delay), float(flow_settings['delay_cost_exp']))
-              lowest_cost_area = float(total_area[0])
-              lowest_cost_delay = float(total_delay)
-              lowest_cost_power = float(the_power)
-            del total_dynamic_power[:]
-            del library_setup_time[:]
-            del data_arrival_time[:]
+            sta_dir = pnr_dir + "_" + "_".join(["mode",str(x)])
+            sta_settings = copy.deepcopy(processed_flow_settings)
+            sta_settings['primetime_folder'] = os.path.join(processed_flow_settings['primetime_folder'],sta_dir)
+            sta_node = scheduler.add_node(FlowNode(sta_dir,"sta",sta_settings['primetime_folder'],run_sta_node,[sta_settings,mode_enabled,clock_period,x],deps=[synth_node.name,pnr_node.name]))
+            sta_runs.append((sta_node,pnr_node,[clock_period,wire_selection,metal_layer,core_utilization,x]))
+  sta_run_params = {sta_node.name: (pnr_node,params) for sta_node,pnr_node,params in sta_runs}
+  pnr_run_params = {pnr_node.name: (pnr_node.deps[0],params[3]) for sta_node,pnr_node,params in sta_runs}
+  #results of the synthesis reports for each synthesis node, used to prune the pnr runs and in the results csv
+  synth_results = {}
+  evaluated_cost = {"lowest": sys.float_info.max}
+
+  def write_sta_report(node):
+    """
+    Writes the final report file of an sta node as soon as it is done
+    """
+    pnr_node, (clock_period,wire_selection,metal_layer,core_utilization,x) = sta_run_params[node.name]
+    total_area = pnr_node.result[2]
+    library_setup_time, data_arrival_time, total_delay, total_dynamic_power = node.result
+    if mode_enabled and x <2**len(flow_settings['mode_signal']):
+      report_fname = "report_mode" + str(x) + "_" + str(flow_settings['top_level']) + "_" + str(clock_period) + "_" + str(wire_selection) + "_wire_" + str(metal_layer) + "_" + str(core_utilization) + ".txt"
+    else:
+      report_fname = "report_" + str(flow_settings['top_level']) + "_" + str(clock_period) + "_" + str(wire_selection) + "_wire_" + str(metal_layer) + "_" + str(core_utilization) + ".txt"
+    file = open(os.path.join(pre_func_dir,report_fname),"w")
+    file.write("total area = "  + str(total_area[0]) +  " um^2 \n")
+    file.write("total delay = " + str(total_delay) + " ns \n")
+    file.write("total power = " + str(total_dynamic_power[0]) + " W \n")
+    file.close()
+    evaluated_cost["lowest"] = min(evaluated_cost["lowest"],get_hb_cost(flow_settings,total_area[0],total_delay))
+
+  def flow_node_done(node):
+    if(node.tool == "synth"):
+      synth_results[node.name] = parse_synth_reports(node.work_dir)
+    elif(node.tool == "sta"):
+      write_sta_report(node)
+
+  def get_pnr_cost_bound(pnr_node_name):
+    """
+    Returns the lowest cost P&R could reach for a pnr node from the results of its synthesis, or None if the synthesis reports couldn't be read
+    The core area is the cell area divided by the core utilization, and P&R can recover at most prune_area_recovery of the area and prune_delay_recovery of the delay
+    """
+    synth_node_name, core_utilization = pnr_run_params[pnr_node_name]
+    synth_result = synth_results.get(synth_node_name,{})
+    if(synth_result.get("area") is None or synth_result.get("delay") is None):
+      return None
+    area_bound = synth_result["area"] * (1.0 - float(flow_settings['prune_area_recovery'])) / float(core_utilization)
+    delay_bound = synth_result["delay"] * (1.0 - float(flow_settings['prune_delay_recovery']))
+    return get_hb_cost(flow_settings,area_bound,delay_bound)
+
+  def prune_pnr_run(node):
+    """
+    Skips the pnr run (and its sta runs) of a combination whose cost can't get below the lowest cost evaluated so far
+    """
+    if(not flow_settings['prune_flag'] or node.tool != "pnr"):
+      return False
+    cost_bound = get_pnr_cost_bound(node.name)
+    if(cost_bound is None or cost_bound < evaluated_cost["lowest"]):
+      return False
+    print(("Pruning P&R and STA of %s, its cost after synthesis can't go below %f which is above the lowest cost found %f" % (node.name,cost_bound,evaluated_cost["lowest"])))
+    return True
+
+  scheduler.run(flow_node_done,prune_pnr_run)
+
+  #find the lowest cost combination, going through the results in the same order as the parameter loops
+  the_power = 0.0
+  prev_pnr_node = None
+  for sta_node, pnr_node, params in sta_runs:
+    if(sta_node.skipped):
+      continue
+    if(pnr_node is not prev_pnr_node):
+      the_power = 0.0
+      prev_pnr_node = pnr_node
+    total_area = pnr_node.result[2]
+    library_setup_time, data_arrival_time, total_delay, total_dynamic_power = sta_node.result
+    if total_dynamic_power[0] > the_power:
+      the_power = total_dynamic_power[0]
+    if lowest_cost > get_hb_cost(flow_settings,total_area[0],total_delay):
+      lowest_cost = get_hb_cost(flow_settings,total_area[0],total_delay)
+      lowest_cost_area = float(total_area[0])
+      lowest_cost_delay = float(total_delay)
+      lowest_cost_power = float(the_power)
+
+  #write the results of every combination, including the ones which were pruned after synthesis
+  fd = open(os.path.join(pre_func_dir,flow_settings['top_level'] + "_flow_results.csv"),"w")
+  w = csv.writer(fd)
+  w.writerow(["clock_period","wire_selection","metal_layer","core_utilization","mode","synth_area","synth_delay","synth_slack","synth_power","area","delay","power","cost","cost_bound","pruned"])
+  for sta_node, pnr_node, params in sta_runs:
+    synth_result = synth_results.get(pnr_node.deps[0],{})
+    synth_vals = [synth_result.get(key) for key in ["area","delay","slack","power"]]
+    cost_bound = get_pnr_cost_bound(pnr_node.name)
+    if(sta_node.skipped):
+      flow_vals = ["NA"]*4
+    else:
+      total_area = pnr_node.result[2]
+      library_setup_time, data_arrival_time, total_delay, total_dynamic_power = sta_node.result
+      flow_vals = [float(total_area[0]),float(total_delay),float(total_dynamic_power[0]),get_hb_cost(flow_settings,total_area[0],total_delay)]
+    w.writerow(params + ["NA" if val is None else val for val in synth_vals + flow_vals + [cost_bound]] + [sta_node.skipped])
+  fd.close()
 
   os.chdir(pre_func_dir)  
   return (float(lowest_cost_area), float(lowest_cost_delay), float(lowest_cost_power))
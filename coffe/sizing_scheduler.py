@@ -0,0 +1,478 @@
+# This file defines the scheduler that sizes independent subcircuits at the same time during
+# an FPGA sizing iteration (see tran_sizing.size_fpga_transistors).
+#
+# Within a sizing iteration, subcircuits are sized one after the other in a fixed order, and the
+# delays of the other subcircuits are the ones measured at the start of the iteration. So, sizing
+# a subcircuit only depends on the subcircuits sized before it through the transistors and wires
+# of those subcircuits that appear in its SPICE netlist (e.g. the loads it drives), and through
+# tile area. The scheduler builds these dependencies from the netlists. When every subcircuit a
+# subcircuit depends on has been sized, it starts sizing it in the background on a snapshot of
+# the FPGA. When the sizing iteration gets to this subcircuit, the new transistor sizes are merged
+# back into the FPGA.
+#
+# It also defines the checkpoint of a sizing run. The state of the run is saved after every
+# subcircuit is sized, so that a run that was stopped can be resumed from the next subcircuit.
+
+import os
+import re
+import copy
+import json
+import concurrent.futures
+from . import spice
+
+# Matches the names used in a netlist (subcircuits, transistor sizes, wire parameters, etc.)
+NETLIST_NAME_REGEX = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+# Matches the first line of a subcircuit definition
+SUBCKT_REGEX = re.compile(r'^\s*\.SUBCKT\s+(\S+)', re.IGNORECASE)
+
+# Matches the end of a subcircuit definition
+ENDS_REGEX = re.compile(r'^\s*\.ENDS', re.IGNORECASE)
+
+# Delays of a subcircuit left set by sizing it (they are part of the cost of the subcircuits sized after it)
+SUBCIRCUIT_DELAY_ATTRS = ["delay", "trise", "tfall"]
+
+# Run options (see fpga_flow.get_arg_parser) that change the sizing results. A run can only be resumed
+# from a checkpoint made with the same values. The others (number of iterations, SPICE jobs, cache,
+# parallel sizing) can change between the stopped run and the resumed one.
+CHECKPOINT_RUN_OPTIONS = ["opt_type", "re_erf", "area_opt_weight", "delay_opt_weight", "search_mode",
+                          "screening_fidelity", "quick_mode", "floorplan", "size_hb_interfaces", "spice_backend"]
+
+
+class SizingScheduler(object):
+    """
+    Sizes the subcircuits of an FPGA sizing iteration, starting the ones that don't depend on the
+    subcircuits still being sized ahead of time.
+
+    'size_function' is the function used to size one subcircuit (tran_sizing.size_subcircuit_transistors).
+    'num_workers' is the max number of subcircuits sized at the same time. With 1 worker, every subcircuit
+    is sized in order on the FPGA object itself, like without a scheduler.
+    If 'checkpoint' (a SizingCheckpoint) is given, the results of each subcircuit are saved to it once
+    merged, and the subcircuits it holds results for are not sized again.
+    """
+
+    def __init__(self, size_function, num_workers=1, checkpoint=None):
+
+        self.size_function = size_function
+        self.num_workers = max(1, num_workers)
+        self.checkpoint = checkpoint
+
+        self._executor = None
+        if self.num_workers > 1:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers)
+
+        # Subcircuits sized in this iteration, in order, and the arguments they are sized with
+        self._plan = []
+        self._size_args = None
+        # Names of the subcircuits each subcircuit of the plan depends on
+        self._dependencies = {}
+        # Subcircuits sized (and merged) in this iteration
+        self._done = set()
+        # Background sizing jobs. Maps subcircuit name -> (future, starting sizes, transistor sizes of the snapshot)
+        self._jobs = {}
+
+        # Netlist names reachable from each top-level SPICE file
+        self._netlist_names = NetlistNames()
+
+
+    def start_iteration(self, fpga_inst, plan, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, spice_interface):
+        """
+        Start a sizing iteration. 'plan' lists the subcircuits that will be sized in this iteration, in
+        order, as (subcircuit, starting_transistor_sizes, is_ram_component, is_cc_component) tuples.
+        The other arguments are the ones every subcircuit is sized with.
+        """
+
+        self.end_iteration()
+        if self._executor is None:
+            return
+
+        self._plan = plan
+        self._size_args = (opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, spice_interface)
+        self._dependencies = self._get_dependencies(plan)
+        self._done = set()
+        self._start_ready_jobs(fpga_inst)
+
+
+    def end_iteration(self):
+        """ Wait for the background jobs of the iteration (there shouldn't be any left) and drop them. """
+
+        for future, _, _ in self._jobs.values():
+            future.cancel()
+            if not future.cancelled():
+                future.exception()
+        self._jobs = {}
+        self._plan = []
+        self._done = set()
+
+
+    def shutdown(self):
+        """ Stop the worker threads. """
+
+        self.end_iteration()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+    def size_subcircuit_transistors(self, fpga_inst, subcircuit, opt_type, re_erf, area_opt_weight, delay_opt_weight,
+                                    outer_iter, initial_transistor_sizes, spice_interface, is_ram_component, is_cc_component):
+        """
+        Size transistors for one subcircuit. Same arguments and return value as tran_sizing.size_subcircuit_transistors.
+        If the subcircuit was sized in the background, its results are merged into 'fpga_inst'.
+        Otherwise it is sized now.
+        """
+
+        job = self._jobs.pop(subcircuit.name, None)
+        size_args = (opt_type, re_erf, area_opt_weight, delay_opt_weight, outer_iter, spice_interface)
+        saved_results = None
+        if self.checkpoint is not None:
+            saved_results = self.checkpoint.get_saved_results(subcircuit.name)
+
+        if saved_results is not None:
+            # Sized before the run was stopped, restore the results
+            sizing_results, transistor_sizes, subcircuit_delays = saved_results
+            fpga_inst.transistor_sizes.update(transistor_sizes)
+            _set_subcircuit_delays(subcircuit, subcircuit_delays)
+            fpga_inst.update_area()
+            fpga_inst.update_wires()
+            fpga_inst.update_wire_rc()
+        elif job is not None and job[1] == initial_transistor_sizes and size_args == self._size_args:
+            future, _, snapshot_sizes = job
+            sizing_results, sized_inst, subcircuit_delays = future.result()
+            _set_subcircuit_delays(subcircuit, subcircuit_delays)
+            self._merge(fpga_inst, sized_inst, snapshot_sizes)
+        else:
+            if job is not None:
+                job[0].result()
+            sizing_results = self.size_function(fpga_inst, subcircuit, opt_type, re_erf, area_opt_weight, delay_opt_weight,
+                                                outer_iter, initial_transistor_sizes, spice_interface, is_ram_component, is_cc_component)
+
+        if self.checkpoint is not None and saved_results is None:
+            self.checkpoint.save_results(subcircuit.name, sizing_results, fpga_inst.transistor_sizes,
+                                         _get_subcircuit_delays(subcircuit))
+
+        self._done.add(subcircuit.name)
+        if self._executor is not None and len(self._plan) > 0:
+            self._start_ready_jobs(fpga_inst)
+
+        return sizing_results
+
+
+    def _start_ready_jobs(self, fpga_inst):
+        """ Start sizing, on a snapshot of 'fpga_inst', the subcircuits whose dependencies are all sized. """
+
+        for subcircuit, starting_sizes, is_ram_component, is_cc_component in self._plan:
+            name = subcircuit.name
+            if name in self._done or name in self._jobs:
+                continue
+            if self.checkpoint is not None and self.checkpoint.has_saved_results(name):
+                continue
+            if not self._dependencies[name].issubset(self._done):
+                continue
+
+            # The snapshot shares the SPICE interface (and its worker pool) with the FPGA.
+            # After the copy, 'memo' maps the id of every copied object to its copy.
+            spice_interface = self._size_args[5]
+            memo = {id(spice_interface): spice_interface}
+            snapshot = copy.deepcopy(fpga_inst, memo)
+            snapshot_sizes = snapshot.transistor_sizes.copy()
+            snapshot_subcircuit = memo[id(subcircuit)]
+            future = self._executor.submit(self._size_snapshot, snapshot, snapshot_subcircuit, starting_sizes,
+                                           is_ram_component, is_cc_component, self._size_args)
+            self._jobs[name] = (future, starting_sizes, snapshot_sizes)
+
+
+    def _size_snapshot(self, snapshot, subcircuit, starting_sizes, is_ram_component, is_cc_component, size_args):
+        """
+        Size 'subcircuit' on the FPGA snapshot it belongs to.
+        Returns the sizing results, the snapshot and the delays of the sized subcircuit.
+        """
+
+        opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, spice_interface = size_args
+        sizing_results = self.size_function(snapshot, subcircuit, opt_type, re_erf, area_opt_weight, delay_opt_weight,
+                                            iteration, starting_sizes, spice_interface, is_ram_component, is_cc_component)
+
+        return sizing_results, snapshot, _get_subcircuit_delays(subcircuit)
+
+
+    def _merge(self, fpga_inst, sized_inst, snapshot_sizes):
+        """ Copy the transistor sizes changed by sizing a snapshot into 'fpga_inst' and update area and wires. """
+
+        for tran_name, tran_size in sized_inst.transistor_sizes.items():
+            if snapshot_sizes.get(tran_name) != tran_size:
+                fpga_inst.transistor_sizes[tran_name] = tran_size
+
+        fpga_inst.update_area()
+        fpga_inst.update_wires()
+        fpga_inst.update_wire_rc()
+
+
+    def _get_dependencies(self, plan):
+        """
+        Returns the names of the subcircuits that each subcircuit of 'plan' depends on: the subcircuits
+        sized before it whose transistors or wires appear in its netlist, or that have its transistors
+        or wires in their netlist.
+        """
+
+        owned_names = {}
+        netlist_names = {}
+        for subcircuit, _, _, _ in plan:
+            names = set(subcircuit.transistor_names)
+            for wire_name in subcircuit.wire_names:
+                names.add(wire_name + "_res")
+                names.add(wire_name + "_cap")
+            owned_names[subcircuit.name] = names
+            netlist_names[subcircuit.name] = self._netlist_names.get(subcircuit.top_spice_path)
+
+        dependencies = {}
+        for i, (subcircuit, _, _, _) in enumerate(plan):
+            name = subcircuit.name
+            dependencies[name] = set()
+            for earlier_subcircuit, _, _, _ in plan[:i]:
+                earlier_name = earlier_subcircuit.name
+                if (not owned_names[earlier_name].isdisjoint(netlist_names[name]) or
+                    not owned_names[name].isdisjoint(netlist_names[earlier_name])):
+                    dependencies[name].add(earlier_name)
+
+        return dependencies
+
+
+class NetlistNames(object):
+    """
+    Finds the names used by top-level SPICE files (subcircuits, transistor sizes, wire parameters, etc.),
+    including the names used by the subcircuits they instantiate. Each library is only read once.
+    """
+
+    def __init__(self):
+
+        # Netlist names reachable from each top-level SPICE file, and the subcircuit definitions of each library
+        self._names = {}
+        self._library_subckts = {}
+
+
+    def get(self, sp_path):
+        """ Returns the set of names used by the top-level SPICE file at 'sp_path' and the subcircuits it instantiates. """
+
+        if sp_path in self._names:
+            return self._names[sp_path]
+
+        # Read the top-level file and the subcircuit libraries it includes
+        top_names = set()
+        subckts = {}
+        visited = set()
+        files_to_read = [os.path.abspath(sp_path)]
+        while len(files_to_read) > 0:
+            file_path = files_to_read.pop()
+            if file_path in visited or not os.path.isfile(file_path):
+                continue
+            visited.add(file_path)
+            if file_path not in self._library_subckts:
+                self._library_subckts[file_path] = self._read_netlist(file_path)
+            file_names, file_subckts, includes = self._library_subckts[file_path]
+            top_names.update(file_names)
+            subckts.update(file_subckts)
+            files_to_read.extend(includes)
+
+        # Add the names used by the subcircuits instantiated (recursively)
+        names = set(top_names)
+        subckts_to_visit = [subckt for subckt in top_names if subckt in subckts]
+        visited_subckts = set()
+        while len(subckts_to_visit) > 0:
+            subckt = subckts_to_visit.pop()
+            if subckt in visited_subckts:
+                continue
+            visited_subckts.add(subckt)
+            names.update(subckts[subckt])
+            subckts_to_visit.extend(name for name in subckts[subckt] if name in subckts)
+
+        self._names[sp_path] = names
+
+        return names
+
+
+    def _read_netlist(self, file_path):
+        """
+        Reads the netlist at 'file_path'. Returns the names used outside of subcircuit definitions,
+        the names used by each subcircuit defined in the file and the relative includes of the file.
+        Absolute includes (device models) are not followed.
+        """
+
+        top_names = set()
+        subckts = {}
+        includes = []
+        current_subckt = None
+        with open(file_path, 'r', errors='ignore') as netlist_file:
+            for line in netlist_file:
+                if line.lstrip().startswith("*"):
+                    continue
+                include_match = spice.INCLUDE_REGEX.match(line)
+                if include_match is not None:
+                    if not os.path.isabs(include_match.group(3)):
+                        includes.append(os.path.normpath(os.path.join(os.path.dirname(file_path), include_match.group(3))))
+                    continue
+                subckt_match = SUBCKT_REGEX.match(line)
+                if subckt_match is not None:
+                    current_subckt = subckt_match.group(1)
+                    subckts[current_subckt] = set()
+                    continue
+                if ENDS_REGEX.match(line) is not None:
+                    current_subckt = None
+                    continue
+                names = NETLIST_NAME_REGEX.findall(line)
+                if current_subckt is None:
+                    top_names.update(names)
+                else:
+                    subckts[current_subckt].update(names)
+
+        return top_names, subckts, includes
+
+
+def _get_subcircuit_delays(subcircuit):
+    """ Returns the delays of 'subcircuit' (see SUBCIRCUIT_DELAY_ATTRS) as a dictionary. """
+
+    delays = {}
+    for attr in SUBCIRCUIT_DELAY_ATTRS:
+        if hasattr(subcircuit, attr):
+            delays[attr] = getattr(subcircuit, attr)
+
+    return delays
+
+
+def _set_subcircuit_delays(subcircuit, delays):
+    """ Set the delays of 'subcircuit' returned by _get_subcircuit_delays. """
+
+    for attr, value in delays.items():
+        setattr(subcircuit, attr, value)
+
+
+class SizingCheckpoint(object):
+    """
+    Checkpoint of a transistor sizing run (see tran_sizing.size_fpga_transistors), saved in the JSON file
+    at 'path'. It holds the state of the run at the start of the current sizing iteration (iteration
+    number, transistor sizes, logic block height, quick mode state and the results of the previous
+    iterations) plus the results of each subcircuit sized since then. The file is rewritten after every
+    subcircuit, through a temporary file so that a run stopped while writing it doesn't corrupt it.
+    It also holds the architecture parameters and the CHECKPOINT_RUN_OPTIONS of the run, so that a
+    checkpoint isn't resumed with different ones (see get_mismatches).
+    """
+
+    def __init__(self, path, fpga_inst, run_options):
+
+        self.path = path
+        # Saved as they are read back from the file, so that they can be compared with a loaded checkpoint
+        self.run_config = json.loads(json.dumps({
+            "arch_params": vars(fpga_inst.specs),
+            "run_options": {name: getattr(run_options, name, None) for name in CHECKPOINT_RUN_OPTIONS}
+        }, default=str))
+        self._state = None
+        # Results loaded from the file for the iteration being resumed.
+        # Maps subcircuit name -> (sizing results, transistor sizes, subcircuit delays)
+        self._saved_results = {}
+
+
+    def load(self):
+        """ Read the checkpoint file. Returns the state saved at the start of the iteration to resume, or None. """
+
+        if not os.path.isfile(self.path):
+            return None
+
+        with open(self.path, 'r') as checkpoint_file:
+            self._state = json.load(checkpoint_file)
+
+        self._saved_results = {}
+        for name, sizing_results, transistor_sizes, subcircuit_delays in self._state["subcircuits"]:
+            self._saved_results[name] = (tuple(sizing_results), transistor_sizes, subcircuit_delays)
+
+        return self._state
+
+
+    def get_mismatches(self):
+        """
+        Returns the architecture parameters and run options of the loaded checkpoint that differ from
+        the ones of this run, as "<name> (<checkpoint value> != <value>)" strings.
+        """
+
+        saved_config = self._state.get("run_config")
+        if saved_config is None:
+            return ["architecture parameters and run options (not in the checkpoint)"]
+
+        mismatches = []
+        for group in ["arch_params", "run_options"]:
+            saved_values = saved_config.get(group, {})
+            values = self.run_config[group]
+            for name in sorted(set(saved_values) | set(values)):
+                if saved_values.get(name) != values.get(name):
+                    mismatches.append(name + " (" + str(saved_values.get(name)) + " != " + str(values.get(name)) + ")")
+
+        return mismatches
+
+
+    def start_iteration(self, fpga_inst, iteration, quick_mode_dict, sizing_results_list, sizing_results_detailed_list,
+                        area_results_list, delay_results_list):
+        """ Save the state of the run at the start of sizing iteration 'iteration'. """
+
+        # When resuming, the results of the subcircuits sized in this iteration are kept
+        if self._state is not None and self._state["iteration"] == iteration:
+            subcircuits = self._state["subcircuits"]
+        else:
+            subcircuits = []
+            self._saved_results = {}
+
+        self._state = {
+            "run_config": self.run_config,
+            "iteration": iteration,
+            "lb_height": fpga_inst.lb_height,
+            "transistor_sizes": dict(fpga_inst.transistor_sizes),
+            "quick_mode_dict": dict(quick_mode_dict),
+            "sizing_results_list": list(sizing_results_list),
+            "sizing_results_detailed_list": list(sizing_results_detailed_list),
+            "area_results_list": list(area_results_list),
+            "delay_results_list": list(delay_results_list),
+            "subcircuits": subcircuits
+        }
+        self._write()
+
+
+    def save_results(self, name, sizing_results, transistor_sizes, subcircuit_delays):
+        """
+        Save the results of sizing subcircuit 'name', the transistor sizes of the FPGA after it and the
+        delays of the subcircuit (see _get_subcircuit_delays).
+        """
+
+        self._state["subcircuits"].append([name, list(sizing_results), dict(transistor_sizes), subcircuit_delays])
+        self._write()
+
+
+    def has_saved_results(self, name):
+        """ True if subcircuit 'name' was sized in the iteration being resumed and wasn't restored yet. """
+
+        return name in self._saved_results
+
+
+    def get_saved_results(self, name):
+        """ 
+        Returns (sizing results, transistor sizes, subcircuit delays) saved for subcircuit 'name' in the
+        iteration being resumed or None. Results are only returned once.
+        """
+
+        return self._saved_results.pop(name, None)
+
+
+    def remove(self):
+        """ Delete the checkpoint file (once sizing is complete). """
+
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+        self._state = None
+        self._saved_results = {}
+
+
+    def _write(self):
+        """ Atomically replace the checkpoint file with the current state. """
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as checkpoint_file:
+            # Sizes and delays may be NumPy scalars
+            json.dump(self._state, checkpoint_file, default=float)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(tmp_path, self.path)
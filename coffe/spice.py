@@ -1,8 +1,24 @@
 # This file defines an HSPICE interface class. An object if this class is can be used to 
 # run HSPICE jobs and parse the output of those jobs.
+# The simulator itself is a pluggable backend: HSPICE, ngspice or an in-process analytic stand-in,
+# optionally behind a long-lived session server (see SessionBackend and spice_server.py).
 
 import os
+import re
+import sys
+import pty
+import select
+import math
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import itertools
+import threading
 import subprocess
+import concurrent.futures
+import numpy as np
 import coffe.utils as utils
 
 # All .sp files should be created to use sweep_data.l to set parameters.
@@ -11,34 +27,345 @@ HSPICE_DATA_SWEEP_PATH = "sweep_data.l"
 # The contents of 
 DATA_SWEEP_PATH = "data.txt"
 
+# Each HSPICE job runs in its own scratch directory, created inside the directory of
+# the .sp file being simulated. Scratch directories are removed once the job succeeds.
+SPICE_JOB_DIR = "spice_jobs"
 
-class SpiceInterface(object):
+# Matches .LIB and .INCLUDE statements that point to a quoted file path. 
+# .LIB statements that only name a library section (no path) are not matched.
+INCLUDE_REGEX = re.compile(r'^(\s*\.(?:LIB|INCLUDE|INC)\s+)(["\'])([^"\']+)\2(.*)$', re.IGNORECASE)
+
+# When the HSPICE results cache grows beyond its size cap, least recently used entries
+# are evicted until it is back under this fraction of the cap.
+SPICE_CACHE_LOW_WATERMARK = 0.9
+
+# Matches .MEASURE statements and captures the name of the measurement
+MEASURE_REGEX = re.compile(r'^\s*\.MEAS(?:URE)?\s+TRAN\s+(\S+)', re.IGNORECASE)
+
+# Matches the .DATA sweep of a .TRAN statement (removed for simulators that don't support it)
+SWEEP_REGEX = re.compile(r'\s+SWEEP\s+DATA\s*=\s*\w+', re.IGNORECASE)
+
+# Matches a measurement result printed by ngspice, e.g. "meas_total_tfall = 1.234e-10 targ= ... trig= ..."
+NGSPICE_MEASURE_REGEX = re.compile(r'^\s*(\w+)\s*=\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|failed)')
+
+# Matches the per inverter delay measurements (e.g. meas_inv_sb_mux_1_tfall)
+STAGE_MEASURE_REGEX = re.compile(r'^mea[sz]\d*_(.+)_(tfall|trise)$')
+
+# Matches a .TRAN statement and captures its time step
+TRAN_REGEX = re.compile(r'^(\s*\.TRAN\s+)(\S+)(.*)$', re.IGNORECASE | re.DOTALL)
+
+# Matches a number with an optional SPICE scale factor (e.g. 1p, 2.5n, 1e-12)
+SPICE_NUMBER_REGEX = re.compile(r'^([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)([a-zA-Z]*)$')
+
+# Matches the .END statement of a deck
+END_REGEX = re.compile(r'^\s*\.END\s*$', re.IGNORECASE)
+
+# Simulation fidelity tiers (see SpiceInterface.run). "full" simulates the decks as they are written.
+# "coarse" is meant for screening sweeps whose results are only used to rank sizing combinations:
+# the time step of the .TRAN statement is multiplied by 'step_factor' and 'options' are added to
+# the deck to relax the simulator tolerances.
+SPICE_FIDELITY_TIERS = {
+    "full": {"step_factor": 1, "options": ""},
+    "coarse": {"step_factor": 5, "options": "RELTOL=1e-2 ABSTOL=1e-10 VNTOL=1e-4"}
+}
+
+# Device parameters of the analytic stand-in backend. Resistances are for a minimum width
+# transistor (in ohms), capacitances are per minimum width (in farads).
+ANALYTIC_NMOS_RES = 10e3
+ANALYTIC_PMOS_RES = 20e3
+ANALYTIC_GATE_CAP = 0.2e-15
+ANALYTIC_DIFF_CAP = 0.1e-15
+# Load on the last stage of a circuit, in minimum width gates (on top of the wire load)
+ANALYTIC_OUTPUT_LOAD = 4
+ANALYTIC_SUPPLY_V = 0.8
+ANALYTIC_FREQUENCY = 250e6
+
+# Number of times in a row a session backend restarts a simulator session that died before giving up
+SESSION_MAX_RESTARTS = 10
+
+# Seconds an ngspice session gets to simulate one row before it is considered hung and restarted
+# (a row is one transient simulation of a subcircuit, which takes seconds)
+NGSPICE_SESSION_TIMEOUT = 5*60
+
+
+def measurement_array(values):
     """
-    Defines an HSPICE interface class. 
-    An object of this class can be used to run HSPICE jobs and parse the output of those jobs.
+    Returns a list of measurement values (numbers, or strings as printed by the simulator) as a
+    float array. Failed measurements are NaN.
     """
 
-    def __init__(self):
+    return np.array([np.nan if value == "failed" else float(value) for value in values], dtype=np.float64)
 
-        # This simulation counter keeps track of number of HSPICE sims performed.
-        self.simulation_counter = 0
+
+def measurement_strings(values):
+    """ Inverse of measurement_array: returns the values of a float array as strings, "failed" for NaN. """
+
+    return ["failed" if math.isnan(value) else repr(value) for value in values.tolist()]
+
+
+class SpiceCache(object):
+    """
+    Persistent cache of SPICE measurements.
+
+    Every row of a .DATA sweep is cached on its own. The key of a row is a hash of the 
+    top-level .sp file, of all the files it includes (except the sweep data file) and 
+    of the parameter values of that row. Entries are stored in an SQLite database inside
+    'cache_dir' so that they survive between COFFE runs. When the stored measurements 
+    exceed 'max_size_mb', the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir, max_size_mb):
+
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_size = int(max_size_mb*1024*1024)
+
+        # Number of sweep rows found in (hits) and missing from (misses) the cache
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        # The database is shared by the HSPICE worker threads
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.cache_dir, "spice_cache.db"), 
+                                   check_same_thread=False, isolation_level=None, timeout=60)
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, data TEXT, size INTEGER, last_used REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._total_size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+        # Hashes of external (absolute path) netlist files such as device model libraries.
+        # These are large and don't change during a run so we only rehash them if they are modified.
+        # Maps path -> (mtime, size, digest)
+        self._file_digests = {}
 
         return
 
 
-    def get_num_simulations_performed(self):
+    def _hash_netlist_file(self, file_path, digest, visited):
         """
-        Returns the total number of HSPICE sims performed by this SpiceInterface object.
+        Add the contents of the netlist at 'file_path' and of all the files it includes
+        to 'digest'. The sweep data file is skipped: the parameter values are hashed 
+        separately for each row.
         """
 
-        return self.simulation_counter
+        if file_path in visited or os.path.basename(file_path) == HSPICE_DATA_SWEEP_PATH:
+            return
+        visited.add(file_path)
+
+        digest.update(file_path.encode())
+        if not os.path.isfile(file_path):
+            return
+
+        with open(file_path, 'rb') as netlist_file:
+            contents = netlist_file.read()
+        digest.update(hashlib.sha256(contents).digest())
+
+        file_dir = os.path.dirname(file_path)
+        for line in contents.decode(errors='ignore').splitlines():
+            match = INCLUDE_REGEX.match(line)
+            if match is None:
+                continue
+            include_path = match.group(3)
+            if os.path.isabs(include_path):
+                digest.update(include_path.encode())
+                digest.update(self._hash_external_file(include_path))
+            else:
+                self._hash_netlist_file(os.path.normpath(os.path.join(file_dir, include_path)), digest, visited)
+
+
+    def _hash_external_file(self, file_path):
+        """ Returns the digest of an external library file, reusing the previous digest if the file is unchanged. """
+
+        if not os.path.isfile(file_path):
+            return b""
+
+        file_stat = os.stat(file_path)
+        cached = self._file_digests.get(file_path)
+        if cached is not None and cached[0] == file_stat.st_mtime_ns and cached[1] == file_stat.st_size:
+            return cached[2]
+
+        file_digest = hashlib.sha256()
+        with open(file_path, 'rb') as lib_file:
+            for block in iter(lambda: lib_file.read(1 << 20), b""):
+                file_digest.update(block)
+        file_digest = file_digest.digest()
+        self._file_digests[file_path] = (file_stat.st_mtime_ns, file_stat.st_size, file_digest)
+
+        return file_digest
+
+
+    def get_row_keys(self, sp_path, parameter_dict, backend_name, fidelity="full"):
+        """ 
+        Returns the cache key of every row of 'parameter_dict' for the deck at 'sp_path'. 
+        Results of different simulator backends and fidelity tiers are kept apart.
+        """
+
+        netlist_digest = hashlib.sha256(backend_name.encode())
+        if fidelity != "full":
+            netlist_digest.update(("\nfidelity=" + fidelity).encode())
+        self._hash_netlist_file(os.path.abspath(sp_path), netlist_digest, set())
+        netlist_digest = netlist_digest.hexdigest()
+
+        param_names = sorted(parameter_dict.keys())
+        num_rows = len(parameter_dict[param_names[0]])
+        row_keys = []
+        for i in range(num_rows):
+            row_digest = hashlib.sha256(netlist_digest.encode())
+            for param_name in param_names:
+                row_digest.update(("\n" + param_name + "=" + str(parameter_dict[param_name][i])).encode())
+            row_keys.append(row_digest.hexdigest())
+
+        return row_keys
+
+
+    def get_many(self, keys):
+        """ 
+        Returns the measurements stored for each key of 'keys', None for the keys that have none.
+        The lookups and the update of their last use time are done in one transaction.
+        """
+
+        rows = []
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for key in keys:
+                    rows.append(self._db.execute("SELECT data FROM entries WHERE key = ?", (key,)).fetchone())
+                now = time.time()
+                self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", 
+                                     [(now, key) for key, row in zip(keys, rows) if row is not None])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            num_hits = sum(1 for row in rows if row is not None)
+            self.hits += num_hits
+            self.misses += len(rows) - num_hits
+
+        return [json.loads(row[0]) if row is not None else None for row in rows]
+
+
+    def put_many(self, entries):
+        """ 
+        Stores the measurements of several sweep rows, given as (key, measurements) pairs, in one 
+        transaction and evicts old entries if the cache is full. 
+        """
+
+        entries = [(key, json.dumps(measurements)) for key, measurements in entries]
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                now = time.time()
+                for key, data in entries:
+                    old_row = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                    if old_row is not None:
+                        self._total_size -= old_row[0]
+                    self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, data, len(data), now))
+                    self._total_size += len(data)
+                if self._total_size > self.max_size:
+                    self._evict()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                self._total_size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+                raise
+
+
+    def _evict(self):
+        """ Removes least recently used entries until the cache is below its low watermark. Caller holds the lock. """
 
+        # Other COFFE runs may share this cache, so get the actual size first
+        self._total_size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        target_size = self.max_size*SPICE_CACHE_LOW_WATERMARK
+        evicted_keys = []
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            if self._total_size <= target_size:
+                break
+            evicted_keys.append((key,))
+            self._total_size -= size
+        self._db.executemany("DELETE FROM entries WHERE key = ?", evicted_keys)
 
-    def _setup_data_sweep_file(self, parameter_dict):
+
+class SpiceBackend(object):
+    """
+    Base class of the simulators SpiceInterface can run jobs on.
+
+    A backend runs one job with simulate(), which takes the top-level .sp file, a
+    parameter_dict (see SpiceInterface.run) and the scratch directory of the job. It
+    returns the measurements in the same format as SpiceInterface.run_columns: a float
+    array per measurement, NaN where the measurement failed. If process corners are
+    given, the array holds the rows of the nominal model followed by the rows of each
+    corner (see SpiceInterface.run). The netlist helpers shared by the backends are 
+    also defined here.
+    """
+
+    # Name of the backend, as selected on the command line
+    name = ""
+
+    # If False, SpiceInterface doesn't create a scratch directory for the jobs of this backend
+    needs_job_dir = True
+
+    def __init__(self):
+
+        # Cache of whether a netlist file (transitively) includes the sweep data file.
+        # Maps absolute path -> (mtime, bool)
+        self._sweep_include_cache = {}
+
+        # Cache of the measurement names of top-level .sp files.
+        # Maps absolute path -> (mtime, list of names)
+        self._measure_names_cache = {}
+
+        return
+
+
+    def simulate(self, sp_path, parameter_dict, job_dir, fidelity="full", corners=None):
+        """ 
+        Runs one job and returns its measurements. Implemented by each backend. 
+        'fidelity' is one of SPICE_FIDELITY_TIERS. 'corners' is a list of (library path, 
+        section) pairs, the device model libraries to simulate on top of the nominal one.
+        """
+
+        raise NotImplementedError
+
+
+    def shutdown(self):
+        """ Releases what the backend keeps between jobs (e.g. simulator sessions). Nothing by default. """
+
+        return
+
+
+    def _apply_fidelity(self, job_sp_path, fidelity):
+        """ Change the private copy of a top-level deck at 'job_sp_path' to simulate it at fidelity tier 'fidelity'. """
+
+        tier = SPICE_FIDELITY_TIERS[fidelity]
+        if tier["step_factor"] == 1 and tier["options"] == "":
+            return
+
+        with open(job_sp_path, 'r') as sp_file:
+            lines = sp_file.readlines()
+
+        with open(job_sp_path, 'w') as sp_file:
+            for line in lines:
+                match = TRAN_REGEX.match(line)
+                if match is None:
+                    sp_file.write(line)
+                    continue
+                # Scale the time step if it is a plain number (it is "1p" in all our decks)
+                step = match.group(2)
+                step_match = SPICE_NUMBER_REGEX.match(step)
+                if step_match is not None:
+                    step = repr(float(step_match.group(1))*tier["step_factor"]) + step_match.group(2)
+                sp_file.write(match.group(1) + step + match.group(3))
+                if tier["options"] != "":
+                    sp_file.write(".OPTIONS " + tier["options"] + "\n")
+
+
+    def _setup_data_sweep_file(self, parameter_dict, job_dir="."):
         """
         Create an HSPICE .DATA statement with the data from parameter_dict.
         The .DATA file is hard to read. So, we also write out the parameters to a text file
         in an easy to read format. This makes it easier to debug.
+        Both files are written to 'job_dir'.
         """
         
         max_items_per_line = 4
@@ -47,7 +374,7 @@ class SpiceInterface(object):
         param_list = list(parameter_dict.keys())
 
         # Write out parameters to a "easy to read format" file (this just helps for debug) 
-        data_file = open(DATA_SWEEP_PATH, 'w')
+        data_file = open(os.path.join(job_dir, DATA_SWEEP_PATH), 'w')
         data_file.write("param".ljust(40) + "value".ljust(20) + "\n")
         dashes = "-"*60
         data_file.write(dashes+ "\n")
@@ -60,7 +387,7 @@ class SpiceInterface(object):
         data_file.close()
 
         # Write the .DATA HPSICE file. This first part writes out the header.
-        hspice_data_file = open(HSPICE_DATA_SWEEP_PATH, 'w')
+        hspice_data_file = open(os.path.join(job_dir, HSPICE_DATA_SWEEP_PATH), 'w')
         hspice_data_file.write(".DATA sweep_data")
         item_counter = 0
         for param_name in param_list:
@@ -93,66 +420,189 @@ class SpiceInterface(object):
         return
     
 
-    def run(self, sp_path, parameter_dict):    
+    def _includes_sweep_data(self, file_path):
+        """
+        Returns True if the netlist file at 'file_path' includes the sweep data file, either 
+        directly or through one of the files it includes. Only relative include paths are 
+        followed: these are the files COFFE generates. Absolute paths point to external 
+        libraries (e.g. device models) which never include the sweep data.
         """
-        This function runs HSPICE on the .sp file at 'sp_path' and returns a dictionary that 
-        contains the HSPICE measurements.
 
-        'parameter_dict' is a dictionary that contains the sizes of transistors and wire RC. 
-        It has the following format:
-        parameter_dict = {param1_name: [val1, val2, etc...],
-                          param2_name: [val1, val2, etc...],
-                          etc...}
+        if os.path.basename(file_path) == HSPICE_DATA_SWEEP_PATH:
+            return True
+        if not os.path.isfile(file_path):
+            return False
 
-        You need to make sure that 'parameter_dict' has a key-value pair for each parameter
-        in your HSPICE netlists. Otherwise, the simulation will fail because of missing 
-        parameters. That is, only the parameters found in 'parameter_dict' will be given a
-        value. 
-        
-        This is important when we consider the fact that, the 'value' in the key value 
-        pair is a list of different parameter values that you want to run HSPICE on.
-        The lists must be of the same length for all params in 'parameter_dict' (param1_name's
-        list has the same number of elements as param2_name). Here's what is going to happen:
-        We will start by setting all the parameters to their 'val1' and we'll run HSPICE. 
-        Then, we'll set all the params to 'val2' and we'll run HSPICE. And so on (that's 
-        actually not exactly what happens, but you get the idea). So, you can run HSPICE on 
-        different transistor size conbinations by adding elements to these lists. Transistor 
-        sizing combination i is ALL the vali in the parameter_dict. So, even if you never 
-        want to change param1_name, you still need a list (who's elements will all be the 
-        same in this case).
-        If you only want to run HSPICE for one transistor sizing combination, your lists will
-        only have one element (but it still needs to be a list).
+        mtime = os.path.getmtime(file_path)
+        cached = self._sweep_include_cache.get(file_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
 
-        Ok, so 'parameter_dict' contains a key-value pair for each transistor where the 'value'
-        is a list of transistor sizes to use. A transistor sizing combination consists of all 
-        the elements at a particular index in these lists. You also need to provide a key-value
-        (or key-list we could say) for all your wire RC parameters. The wire RC data in the 
-        lists corresponds to each transistor sizing combination. You'll need to calculate what
-        the wire RC is for a particular transistor sizing combination outside this function 
-        though. Here, we'll only set the paramters to the appropriate values. 
+        result = False
+        file_dir = os.path.dirname(file_path)
+        with open(file_path, 'r') as netlist_file:
+            for line in netlist_file:
+                match = INCLUDE_REGEX.match(line)
+                if match is None or os.path.isabs(match.group(3)):
+                    continue
+                if self._includes_sweep_data(os.path.normpath(os.path.join(file_dir, match.group(3)))):
+                    result = True
+                    break
 
-        Finally, what we'll return is a dictionary similar to 'parameter_dict' but containing
-        all of the of the SPICE measurements. The return value will have this format: 
+        self._sweep_include_cache[file_path] = (mtime, result)
 
-        measurements = {meas_name1: [value1, value2, value3, etc...], 
-                        meas_name2: [value1, value2, value3, etc...],
-                        etc...}
+        return result
+
+
+    def _isolate_netlist(self, src_path, job_dir, private_copies):
+        """
+        Write a private copy of the netlist at 'src_path' into 'job_dir' and return its path. 
+        In the copy, every include of the sweep data file points to the private sweep file 
+        of 'job_dir' and every other relative include path is made absolute. Included files 
+        that pull in the sweep data file are made private the same way (recursively). 
+        'private_copies' maps the source paths already copied for this job to their copy.
         """
 
-        sp_dir = os.path.dirname(sp_path)
-        sp_filename = os.path.basename(sp_path)
-  
-        # Setup the .DATA sweep file with parameters in 'parameter_dict' 
-        self._setup_data_sweep_file(parameter_dict)
- 
-        # Change working dir so that SPICE output files are created in circuit subdirectory
-        saved_cwd = os.getcwd()
-        os.chdir(sp_dir)
-         
+        if src_path in private_copies:
+            return private_copies[src_path]
+
+        src_dir = os.path.dirname(src_path)
+        dst_path = os.path.join(job_dir, str(len(private_copies)) + "_" + os.path.basename(src_path))
+        private_copies[src_path] = dst_path
+
+        dst_lines = []
+        with open(src_path, 'r') as src_file:
+            for line in src_file:
+                match = INCLUDE_REGEX.match(line)
+                if match is not None and not os.path.isabs(match.group(3)):
+                    include_path = os.path.normpath(os.path.join(src_dir, match.group(3)))
+                    if os.path.basename(include_path) == HSPICE_DATA_SWEEP_PATH:
+                        include_path = os.path.join(job_dir, HSPICE_DATA_SWEEP_PATH)
+                    elif self._includes_sweep_data(include_path):
+                        include_path = self._isolate_netlist(include_path, job_dir, private_copies)
+                    newline = "\n" if line.endswith("\n") else ""
+                    line = (match.group(1) + match.group(2) + include_path + match.group(2) 
+                            + match.group(4).rstrip("\n") + newline)
+                dst_lines.append(line)
+
+        with open(dst_path, 'w') as dst_file:
+            dst_file.writelines(dst_lines)
+
+        return dst_path
+
+
+    def _get_measure_names(self, sp_path):
+        """
+        Returns the names of the .MEASURE statements of the .sp file at 'sp_path', in order.
+        Names are lower case, like in the simulator output files.
+        """
+
+        mtime = os.path.getmtime(sp_path)
+        cached = self._measure_names_cache.get(sp_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        meas_names = []
+        with open(sp_path, 'r') as sp_file:
+            for line in sp_file:
+                match = MEASURE_REGEX.match(line)
+                if match is not None and match.group(1).lower() not in meas_names:
+                    meas_names.append(match.group(1).lower())
+
+        self._measure_names_cache[sp_path] = (mtime, meas_names)
+
+        return meas_names
+
+
+    def _combine_meaz_measurements(self, measurements, meas_names):
+        """
+        Some circuits have more than one path to measure (e.g. ram rowdecoder, carry chains).
+        Their delays are named meaz1_, meaz2_, etc. instead of meas_. Here we add the meas_
+        version of these measurements to 'measurements' (float arrays): the slowest of the
+        paths of each row. If one of the paths failed, the meas_ version fails as well.
+        """
+
+        meaz1_names = [meas_name for meas_name in meas_names if "meaz1" in meas_name]
+        meaz2_names = [meas_name for meas_name in meas_names if "meaz2" in meas_name]
+        meaz3_names = [meas_name for meas_name in meas_names if "meaz3" in meas_name]
+
+        # This part is added to support having tow different fanins (e.g. ram rowdecoder)
+        # If this happens to any other circuit, you should name the delays with mez1 and meaz2
+        # the rest is simply the same.
+        if len(meaz3_names) != 0:
+            for x in range(0,len(meaz1_names)):
+                newname = meaz3_names[x].replace("meaz3_", "meas_")
+                measurements[newname] = np.maximum(np.maximum(measurements[meaz1_names[x]], measurements[meaz2_names[x]]),
+                                                   measurements[meaz3_names[x]])
+            return measurements
+        if len(meaz1_names) !=0 and len(meaz2_names) != 0:
+            if len(meaz1_names) != len(meaz2_names):
+                    sys.exit(-1)
+            for x in range(0,len(meaz1_names)):
+                newname = meaz1_names[x].replace("meaz1_", "meas_")
+                measurements[newname] = np.maximum(measurements[meaz1_names[x]], measurements[meaz2_names[x]])
+        elif len(meaz1_names) !=0:
+            for x in range(0,len(meaz1_names)):
+                newname = meaz1_names[x].replace("meaz1_", "meas_")
+                measurements[newname] = measurements[meaz1_names[x]]
+        elif len(meaz2_names) !=0:
+            for x in range(0,len(meaz2_names)):
+                newname = meaz2_names[x].replace("meaz2_", "meas_")
+                measurements[newname] = measurements[meaz2_names[x]]
+
+        return measurements
+
+
+class HspiceBackend(SpiceBackend):
+    """
+    Runs jobs with Synopsys HSPICE. All the rows of parameter_dict are simulated in a
+    single HSPICE run through a .DATA sweep, and the measurements are read from the .mt0 file.
+    Process corners are .ALTER blocks of the same run that swap the model library section:
+    corner i is measured in the .mt<i> file.
+    """
+
+    name = "hspice"
+
+    def _add_corners(self, job_sp_path, corners):
+        """ Add an .ALTER block for each corner in 'corners' to the private copy of a top-level deck at 'job_sp_path'. """
+
+        with open(job_sp_path, 'r') as sp_file:
+            lines = sp_file.readlines()
+
+        alter_lines = []
+        for i, (library_path, section) in enumerate(corners):
+            alter_lines.append(".ALTER corner_" + str(i + 1) + "_" + section + "\n")
+            alter_lines.append(".LIB \"" + library_path + "\" " + section + "\n")
+
+        # The .ALTER blocks go right before the .END statement
+        end_index = len(lines)
+        for i, line in enumerate(lines):
+            if END_REGEX.match(line):
+                end_index = i
+        if end_index > 0 and not lines[end_index - 1].endswith("\n"):
+            lines[end_index - 1] += "\n"
+
+        with open(job_sp_path, 'w') as sp_file:
+            sp_file.writelines(lines[:end_index] + alter_lines + lines[end_index:])
+
+
+    def simulate(self, sp_path, parameter_dict, job_dir, fidelity="full", corners=None):
+
+        # Setup the private .DATA sweep file with parameters in 'parameter_dict'
+        self._setup_data_sweep_file(parameter_dict, job_dir)
+
+        # Make a private copy of the top-level deck (and of the includes that pull in the sweep file)
+        job_sp_path = self._isolate_netlist(sp_path, job_dir, {})
+        job_sp_filename = os.path.basename(job_sp_path)
+        self._apply_fidelity(job_sp_path, fidelity)
+        if corners:
+            self._add_corners(job_sp_path, corners)
+
         # Creat an output file having the ending .lis
         # Run the SPICE simulation and capture output
-        output_filename = sp_filename.rstrip(".sp") + ".lis"
-        output_file = open(output_filename, "w")
+        # SPICE output files are created in the job directory
+        output_filename = job_sp_filename.replace(".sp", "") + ".lis"
+        output_file = open(os.path.join(job_dir, output_filename), "w")
 
         hspice_success = False
         hspice_runs = 0
@@ -160,46 +610,43 @@ class SpiceInterface(object):
         # HSPICE simulations might fail for some reasons:
         # 1- The input file is incorrect, which would be a bug within COFFE.
         # 2- HSPICE fails to checheck out the license, assuming the license exists, it is likely due
-        #    to many instances checking out the license at the same time or license going down temporarly. 
-        #    In this case, we check if the ".mt0" exists, if not, we run hspice again. 
+        #    to many instances checking out the license at the same time or license going down temporarly.
+        #    In this case, we check if the ".mt0" exists, if not, we run hspice again.
         while (not hspice_success) :
             # last I checked the license is available during the night, so we can try to run hspice uncomment below if this is untrue
             #utils.check_for_time()
-            subprocess.call(["hspice", sp_filename], stdout=output_file, stderr=output_file)
+            subprocess.call(["hspice", job_sp_filename], stdout=output_file, stderr=output_file, cwd=job_dir)
 
-            # how come this file is closed here, it should be closed only if there is a success
-            # since else the call process will write in a closed file
-            ##output_file.close()
-             
             # HSPICE should print the measurements in a file having the same
             # name as the output file with .mt0 ending
-            mt0_path = output_filename.replace(".lis", ".mt0")
+            mt0_path = os.path.join(job_dir, output_filename.replace(".lis", ".mt0"))
 
             # check that the ".mt0" file is there
             if os.path.isfile(mt0_path) :
                 # store the measurments in a dictionary
                 spice_measurements = self.parse_mt0(mt0_path)
-                # delete results file to avoid confusion in future runs
-                os.remove(mt0_path)
                 hspice_success = True
                 output_file.close()
+                # The measurements of each corner follow the nominal ones
+                if corners:
+                    for i in range(len(corners)):
+                        mt_path = mt0_path.replace(".mt0", ".mt" + str(i + 1))
+                        corner_measurements = self.parse_mt0(mt_path)
+                        for meas_name in spice_measurements:
+                            spice_measurements[meas_name] = np.concatenate((spice_measurements[meas_name], 
+                                                                            corner_measurements[meas_name]))
             # HSPICE failed to run
             else :
                 hspice_runs = hspice_runs + 1
                 if hspice_runs > 10 :
+                    output_file.close()
                     print("----------------------------------------------------------")
                     print("                  HSPICE failed to run                    ")
                     print("----------------------------------------------------------")
+                    print("Job directory: " + job_dir)
                     print("")
                     exit(2)
-  
-        # Update simulation counter with the number of simulations done by 
-        # adding the length of the list of parameter values inside the dictionary
-        self.simulation_counter += len(next(iter(parameter_dict.values())))
 
-        # Return to saved cwd
-        os.chdir(saved_cwd)
-           
         return spice_measurements
 
 
@@ -209,123 +656,876 @@ class SpiceInterface(object):
         This function works on .mt0 files generated from single HSPICE runs,
         .sweep runs or .data runs. 
         
-        Returns a dictionary that maps measurement names to a list of values.
-        If this was a single HSPICE run, the list will only have one element.
-        But, if this was a HSPICE sweep, the list will have multiple elements,
+        Returns a dictionary that maps measurement names to a float array of values.
+        If this was a single HSPICE run, the array will only have one element.
+        But, if this was a HSPICE sweep, the array will have multiple elements,
         one for each sweep setting. The same goes for .data sweeps.
+        Failed measurements are NaN.
     
-        measurements = {meas_name1: [value1, value2, value3, etc...], 
-                        meas_name2: [value1, value2, value3, etc...],
+        measurements = {meas_name1: array([value1, value2, value3, etc...]), 
+                        meas_name2: array([value1, value2, value3, etc...]),
                         etc...}
         """
-    
-        # The measurements data structure is what we will be building.
-        # It's a dictionary that maps measurement names to a list of values. 
-        # If this was a simple HSPICE run, the list will only have one element. 
-        # But, if this was a HSPICE sweep, the list will have multiple elements,
-        # one for each sweep setting.
-        # measurements = {meas_name1: [value1, value2, value3, etc...], 
-        #                 meas_name2: [value1, value2, value3, etc...],
-        #                 etc...}
+
+        # Lines starting with '$' or '.' are comments and the title of the run, the
+        # rest of the file is a stream of tokens: first the measurement names, up to
+        # and including 'alter#', then the values of each sweep row in the same order.
+        # Rows may wrap over several lines, so we tokenize the whole file at once.
+        with open(filepath, 'r') as mt0_file:
+            text = "".join([line for line in mt0_file if not line.startswith("$") and not line.startswith(".")])
+
+        names_end = text.index("alter#")
+        names_end += len(text[names_end:].split(None, 1)[0])
+        meas_names = text[:names_end].split()
+        num_measurements = len(meas_names)
+
+        # Convert all the values in one go, one row per sweep setting
+        values = np.array(list(map(float, text[names_end:].replace("failed", "nan").split())), dtype=np.float64)
+        values = values.reshape(-1, num_measurements)
+
         measurements = {}
-        meas_names = []
+        for i, meas_name in enumerate(meas_names):
+            measurements[meas_name] = values[:, i]
 
-        #parse should be changed for ram block
-        meaz1_names = []
-        meaz2_names = []
-        meaz1counter = 0
-        meaz2counter = 0
-
-        #I'll need an aittional 4 to test carry chains:
-        meaz3_names = []
-        meaz4_names = []
-        meaz5_names = []
-        meaz6_names = []
-        meaz3counter = 0
-        meaz4counter = 0
-        meaz5counter = 0
-        meaz6counter = 0
-    
-        # Open the file for reading
-        mt0_file = open(filepath, 'r')
-    
-        # The first thing we expect to find is the measurement names.
-        # We use the 'parsing_names' flag to show that we are parsing the names.
-        # Once we find 'alter#' we are done parsing the measurement names. 
-        # Then, we start parsing the values themselves.
-        parsing_names = True
-        for line in mt0_file:
-            # Ignore these lines
-            if line.startswith("$"):
-                continue
-            if line.startswith("."):
-                continue
-    
-            if parsing_names:
-                words = line.split()
-                for meas_name in words:
-                    meas_names.append(meas_name)
-                    measurements[meas_name] = []
-                    if "meaz1" in meas_name:
-                        meaz1counter += 1
-                        meaz1_names.append(meas_name)
-                    if "meaz2" in meas_name:
-                        meaz2counter += 1
-                        meaz2_names.append(meas_name)
-                    if "meaz3" in meas_name:
-                        meaz3counter += 1
-                        meaz3_names.append(meas_name)
-                    if "meaz4" in meas_name:
-                        meaz4counter += 1
-                        meaz4_names.append(meas_name)
-                    if "meaz5" in meas_name:
-                        meaz5counter += 1
-                        meaz5_names.append(meas_name)
-                    if "meaz6" in meas_name:
-                        meaz6counter += 1
-                        meaz6_names.append(meas_name)
-                    # When we find 'alter#' we are done parsing measurement names.
-                    if meas_name.startswith("alter#"):
-                        num_measurements = len(meas_names)
-                        current_meas = 0
-                        parsing_names = False
+        return self._combine_meaz_measurements(measurements, meas_names)
+
+
+class NgspiceBackend(SpiceBackend):
+    """
+    Runs jobs with ngspice (in HSPICE compatibility mode). ngspice doesn't support .DATA sweeps,
+    so each row of parameter_dict is simulated on its own: the private sweep data file holds
+    the .PARAM statements of the current row and the SWEEP is removed from the .TRAN statement.
+    The measurements are read from the ngspice log.
+    """
+
+    name = "ngspice"
+
+    def _setup_param_file(self, parameter_dict, row, job_dir):
+        """ Write the parameters of 'row' as .PARAM statements in the private sweep data file. """
+
+        param_file = open(os.path.join(job_dir, HSPICE_DATA_SWEEP_PATH), 'w')
+        for param_name, param_values in parameter_dict.items():
+            param_file.write(".PARAM " + param_name + " = " + str(param_values[row]) + "\n")
+        param_file.close()
+
+
+    def _remove_data_sweep(self, sp_path):
+        """ Remove the .DATA sweep and the HSPICE only options from the .sp file at 'sp_path'. """
+
+        with open(sp_path, 'r') as sp_file:
+            lines = sp_file.readlines()
+
+        with open(sp_path, 'w') as sp_file:
+            for line in lines:
+                if line.upper().startswith(".OPTIONS"):
+                    line = "*" + line
+                sp_file.write(SWEEP_REGEX.sub("", line))
+
+
+    def parse_measure_output(self, log_path, meas_names):
+        """
+        Parse the measurement results printed in an ngspice log.
+        Returns a dictionary that maps each name in 'meas_names' to its value.
+        Measurements that ngspice couldn't evaluate are "failed", like in HSPICE.
+        """
+
+        measurements = {}
+        with open(log_path, 'r', errors='ignore') as log_file:
+            for line in log_file:
+                match = NGSPICE_MEASURE_REGEX.match(line)
+                if match is not None and match.group(1).lower() in meas_names:
+                    measurements[match.group(1).lower()] = match.group(2)
+
+        for meas_name in meas_names:
+            if meas_name not in measurements:
+                measurements[meas_name] = "failed"
+
+        return measurements
+
+
+    def _run_row(self, job_sp_filename, job_dir, log_path):
+        """ Simulate the .sp file 'job_sp_filename' of 'job_dir' and write the ngspice output to 'log_path'. """
+
+        subprocess.call(["ngspice", "-b", "-o", log_path, job_sp_filename],
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=job_dir)
+
+
+    def simulate(self, sp_path, parameter_dict, job_dir, fidelity="full", corners=None):
+
+        if corners:
+            raise ValueError("The ngspice backend doesn't support process corners (they need HSPICE .ALTER blocks)")
+
+        # Make a private copy of the top-level deck (and of the includes that pull in the sweep file)
+        job_sp_path = self._isolate_netlist(sp_path, job_dir, {})
+        job_sp_filename = os.path.basename(job_sp_path)
+        self._remove_data_sweep(job_sp_path)
+        self._apply_fidelity(job_sp_path, fidelity)
+
+        # The device models and the subcircuit libraries are written for HSPICE
+        spiceinit_file = open(os.path.join(job_dir, ".spiceinit"), 'w')
+        spiceinit_file.write("set ngbehavior=hsa\n")
+        spiceinit_file.close()
+
+        meas_names = self._get_measure_names(sp_path)
+        measurements = {meas_name: [] for meas_name in meas_names}
+
+        num_rows = len(next(iter(parameter_dict.values())))
+        for row in range(num_rows):
+            self._setup_param_file(parameter_dict, row, job_dir)
+
+            log_path = os.path.join(job_dir, job_sp_filename.replace(".sp", "") + "_" + str(row) + ".log")
+            self._run_row(job_sp_filename, job_dir, log_path)
+
+            if not os.path.isfile(log_path):
+                print("----------------------------------------------------------")
+                print("                  ngspice failed to run                   ")
+                print("----------------------------------------------------------")
+                print("Job directory: " + job_dir)
+                print("")
+                exit(2)
+
+            row_measurements = self.parse_measure_output(log_path, meas_names)
+            for meas_name in meas_names:
+                measurements[meas_name].append(row_measurements[meas_name])
+
+        for meas_name in meas_names:
+            measurements[meas_name] = measurement_array(measurements[meas_name])
+
+        return self._combine_meaz_measurements(measurements, meas_names)
+
+
+class AnalyticBackend(SpiceBackend):
+    """
+    Fast in-process stand-in for a SPICE simulator. No external tool is needed, so the whole
+    sizing flow can be run (e.g. to benchmark it or for regression tests) on any machine.
+
+    Delays come from an RC (Elmore) model built from the transistor sizes and wire RC in
+    parameter_dict. The stages of a circuit are the inverters with a meas_<inv>_tfall/trise
+    measurement in its top-level .sp file. Transistor widths are normalized to the smallest
+    width of the row and each stage drives the gates of the next stage. The last stage also
+    drives the wires of the circuit (the wires with the circuit name in their name) through
+    its pass transistors. This is only a stand-in: the absolute numbers don't match a real
+    simulation, but they respond to sizing the way real delays do. The model has no device
+    libraries, so every process corner gets the nominal measurements.
+    """
+
+    name = "analytic"
+    needs_job_dir = False
+
+    def _get_stage_names(self, meas_names):
+        """ Returns the names of the inverter stages measured in a circuit, in order. """
+
+        stage_names = []
+        for meas_name in meas_names:
+            match = STAGE_MEASURE_REGEX.match(meas_name)
+            if match is not None and match.group(1) != "total" and match.group(1) not in stage_names:
+                stage_names.append(match.group(1))
+
+        return stage_names
+
+
+    def _simulate_row(self, circuit_name, stage_names, meas_names, parameter_dict, row):
+        """ Returns the measurements {meas_name: value} of one row of parameter_dict. """
+
+        # Normalize transistor widths to the smallest one
+        tran_widths = {}
+        wire_res = 0.0
+        wire_cap = 0.0
+        for param_name, param_values in parameter_dict.items():
+            if param_name.endswith("_nmos") or param_name.endswith("_pmos"):
+                tran_widths[param_name] = float(param_values[row])
+            elif circuit_name in param_name and param_name.endswith("_res"):
+                wire_res += float(param_values[row])
+            elif circuit_name in param_name and param_name.endswith("_cap"):
+                wire_cap += float(param_values[row])
+        positive_widths = [width for width in tran_widths.values() if width > 0]
+        min_width = min(positive_widths) if len(positive_widths) > 0 else 1.0
+        for tran_name in tran_widths:
+            tran_widths[tran_name] = max(tran_widths[tran_name]/min_width, 1.0)
+
+        # Series resistance of the pass transistors (or transmission gates) of this circuit
+        pass_res = 0.0
+        for tran_name, width in tran_widths.items():
+            if circuit_name in tran_name and (tran_name.startswith("ptran_") or tran_name.startswith("tgate_")):
+                pass_res += ANALYTIC_NMOS_RES/width
+
+        # Elmore delay of each inverter stage
+        stage_widths = [(tran_widths.get(stage_name + "_nmos", 1.0), tran_widths.get(stage_name + "_pmos", 1.0))
+                        for stage_name in stage_names]
+        stage_delays = {}
+        total_cap = wire_cap
+        for i, (nmos_width, pmos_width) in enumerate(stage_widths):
+            self_cap = ANALYTIC_DIFF_CAP*(nmos_width + pmos_width)
+            if i + 1 < len(stage_widths):
+                load_cap = ANALYTIC_GATE_CAP*(stage_widths[i+1][0] + stage_widths[i+1][1])
             else:
-                line = line.replace("\n", "")
-                words = line.split()
-                for meas in words:
-                    # Append each measurement value to the right list.
-                    # We use current_meas and meas_names to keep track of where we 
-                    # need to add the measurement value.
-                    measurements[meas_names[current_meas]].append(meas)
-                    current_meas += 1
-                    if current_meas == num_measurements:
-                        current_meas = 0
+                load_cap = ANALYTIC_GATE_CAP*ANALYTIC_OUTPUT_LOAD + wire_cap
+            tfall = math.log(2)*(ANALYTIC_NMOS_RES/nmos_width)*(self_cap + load_cap)
+            trise = math.log(2)*(ANALYTIC_PMOS_RES/pmos_width)*(self_cap + load_cap)
+            stage_delays[stage_names[i]] = (tfall, trise)
+            total_cap += self_cap + ANALYTIC_GATE_CAP*(nmos_width + pmos_width)
 
+        # Stages alternate between rising and falling outputs.
+        # The output of the last stage has the same transition as the circuit output.
+        wire_delay = math.log(2)*(pass_res + wire_res/2)*wire_cap
+        total_tfall = wire_delay
+        total_trise = wire_delay
+        for i, stage_name in enumerate(stage_names):
+            if (len(stage_names) - 1 - i) % 2 == 0:
+                total_tfall += stage_delays[stage_name][0]
+                total_trise += stage_delays[stage_name][1]
+            else:
+                total_tfall += stage_delays[stage_name][1]
+                total_trise += stage_delays[stage_name][0]
+        if len(stage_names) == 0:
+            total_tfall += math.log(2)*ANALYTIC_NMOS_RES*total_cap
+            total_trise += math.log(2)*ANALYTIC_PMOS_RES*total_cap
 
-        
-        mt0_file.close()
+        avg_power = total_cap*ANALYTIC_SUPPLY_V*ANALYTIC_SUPPLY_V*ANALYTIC_FREQUENCY
 
-        # This part is added to support having tow different fanins (e.g. ram rowdecoder)
-        # If this happens to any other circuit, you should name the delays with mez1 and meaz2
-        # the rest is simply the same.
-        if meaz3counter != 0:
-            for x in range(0,len(meaz1_names)):
-                newname = meaz3_names[x].replace("meaz3_", "meas_")
-                measurements[newname] = max(measurements[meaz1_names[x]],measurements[meaz2_names[x]],measurements[meaz3_names[x]])
-            return measurements             
-        if len(meaz1_names) !=0 and len(meaz2_names) != 0:
-            if len(meaz1_names) != len(meaz2_names):
-                    sys.exit(-1)
-            for x in range(0,len(meaz1_names)):
-                newname = meaz1_names[x].replace("meaz1_", "meas_")
-                measurements[newname] = max(measurements[meaz1_names[x]],measurements[meaz2_names[x]])
-        elif len(meaz1_names) !=0:
-            for x in range(0,len(meaz1_names)):
-                newname = meaz1_names[x].replace("meaz1_", "meas_")
-                measurements[newname] = measurements[meaz1_names[x]]
-        elif len(meaz2_names) !=0:
-            for x in range(0,len(meaz2_names)):
-                newname = meaz2_names[x].replace("meaz2_", "meas_")
-                measurements[newname] = measurements[meaz2_names[x]]
+        measurements = {}
+        for meas_name in meas_names:
+            match = STAGE_MEASURE_REGEX.match(meas_name)
+            if match is not None and match.group(1) in stage_delays:
+                value = stage_delays[match.group(1)][0 if match.group(2) == "tfall" else 1]
+            elif meas_name.endswith("tfall"):
+                value = total_tfall
+            elif meas_name.endswith("trise"):
+                value = total_trise
+            elif meas_name.endswith("delay"):
+                value = max(total_tfall, total_trise)
+            elif "power" in meas_name:
+                value = avg_power
+            elif "current" in meas_name:
+                value = -avg_power/ANALYTIC_SUPPLY_V/ANALYTIC_FREQUENCY
+            else:
+                value = 0.0
+            measurements[meas_name] = "%.6e" % value
+
+        return measurements
+
+
+    def simulate(self, sp_path, parameter_dict, job_dir, fidelity="full", corners=None):
+
+        # The model has no time step or tolerances, all tiers give the same results
+        meas_names = self._get_measure_names(sp_path)
+        stage_names = self._get_stage_names(meas_names)
+        circuit_name = os.path.basename(os.path.dirname(sp_path))
+
+        measurements = {meas_name: [] for meas_name in meas_names}
+        num_rows = len(next(iter(parameter_dict.values())))
+        for row in range(num_rows):
+            row_measurements = self._simulate_row(circuit_name, stage_names, meas_names, parameter_dict, row)
+            for meas_name in meas_names:
+                measurements[meas_name].append(row_measurements[meas_name])
+
+        num_models = 1 + (len(corners) if corners else 0)
+        for meas_name in meas_names:
+            measurements[meas_name] = np.tile(measurement_array(measurements[meas_name]), num_models)
+
+        return self._combine_meaz_measurements(measurements, meas_names)
+
+
+class SessionBackend(SpiceBackend):
+    """
+    Runs jobs on long-lived simulator sessions instead of starting the simulator for every job.
+
+    Each worker thread of SpiceInterface gets its own session: a server process (see spice_server.py)
+    that loads the simulator once and then reads jobs from its stdin, one JSON line per job with the
+    top-level .sp file, the parameter_dict, the job directory, the fidelity tier and the process
+    corners. It writes the measurements of each job back on its stdout, as a JSON line. A session
+    that dies is restarted, at most SESSION_MAX_RESTARTS times in a row.
+
+    'served_backend' is the name of the backend the server runs the jobs on.
+    """
+
+    served_backend = ""
+
+    def __init__(self):
+
+        super(SessionBackend, self).__init__()
+
+        # The jobs run on the served backend, so they need a scratch directory if it does
+        self.needs_job_dir = SPICE_BACKENDS[self.served_backend].needs_job_dir
+
+        # Session of each worker thread, and all the sessions started (to stop them)
+        self._thread_session = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+
+
+    def _get_server_command(self):
+        """ Returns the command that starts a session server. """
+
+        return [sys.executable, "-m", "coffe.spice_server", self.served_backend]
+
+
+    def _get_session(self):
+        """ Returns the session of the calling thread, starting it if needed. """
+
+        session = getattr(self._thread_session, "session", None)
+        if session is not None and session.poll() is None:
+            return session
+
+        # The server imports COFFE, wherever the current directory is
+        env = dict(os.environ)
+        coffe_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env["PYTHONPATH"] = coffe_root + os.pathsep + env.get("PYTHONPATH", "")
+        session = subprocess.Popen(self._get_server_command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE, 
+                                   universal_newlines=True, env=env)
+        self._thread_session.session = session
+        with self._sessions_lock:
+            self._sessions.append(session)
+
+        return session
+
+
+    def _stop_session(self, session):
+        """ Stops 'session' and waits for its server to exit. """
+
+        try:
+            session.stdin.close()
+        except OSError:
+            pass
+        try:
+            session.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            session.kill()
+            session.wait()
+
+
+    def shutdown(self):
+
+        with self._sessions_lock:
+            sessions = self._sessions
+            self._sessions = []
+        for session in sessions:
+            self._stop_session(session)
+
+
+    def simulate(self, sp_path, parameter_dict, job_dir, fidelity="full", corners=None):
+
+        request = json.dumps({"sp_path": os.path.abspath(sp_path),
+                              "parameter_dict": parameter_dict,
+                              "job_dir": os.path.abspath(job_dir),
+                              "fidelity": fidelity,
+                              "corners": corners}, default=lambda value: value.item()) + "\n"
+
+        response = ""
+        session_restarts = 0
+        while response == "":
+            session = self._get_session()
+            try:
+                session.stdin.write(request)
+                session.stdin.flush()
+                response = session.stdout.readline()
+            except OSError:
+                response = ""
+
+            # The server died, start a new one
+            if response == "":
+                self._stop_session(session)
+                session_restarts = session_restarts + 1
+                if session_restarts > SESSION_MAX_RESTARTS:
+                    print("----------------------------------------------------------")
+                    print("              Simulator session failed to run             ")
+                    print("----------------------------------------------------------")
+                    print("Job directory: " + job_dir)
+                    print("")
+                    exit(2)
+
+        response = json.loads(response)
+        if "error" in response:
+            raise RuntimeError("Simulator session failed to run " + sp_path + ":\n" + response["error"])
+
+        return {meas_name: np.array(values, dtype=np.float64) for meas_name, values in response["measurements"].items()}
+
+
+class AnalyticSessionBackend(SessionBackend):
+    """
+    Runs the analytic stand-in backend behind a session server. The analytic model itself has no 
+    startup cost, so this is not faster than the analytic backend. It is there to run and test the
+    session machinery (and to measure its overhead) without a simulator.
+    """
+
+    name = "analytic-session"
+    served_backend = "analytic"
+
+
+class NgspiceSession(object):
+    """
+    An ngspice process in pipe mode (ngspice -p), that reads its commands from stdin and keeps the 
+    simulator loaded between jobs. Its output goes to a pseudo-terminal rather than to a pipe, so that 
+    ngspice writes it out line by line instead of holding it in its stdio buffer.
+    """
+
+    def __init__(self):
+
+        master_fd, slave_fd = pty.openpty()
+        try:
+            self.process = subprocess.Popen(["ngspice", "-p"], stdin=subprocess.PIPE, stdout=slave_fd, stderr=slave_fd,
+                                            universal_newlines=True)
+        finally:
+            os.close(slave_fd)
+        self.master_fd = master_fd
+        self.num_commands = 0
+
+        # The device models and the subcircuit libraries are written for HSPICE. ngspice reads 
+        # ngbehavior each time it loads a netlist, so setting it once covers every job of the session.
+        self.process.stdin.write("set noaskquit\nset ngbehavior=hsa\n")
+        self.process.stdin.flush()
+
+
+    def poll(self):
+        return self.process.poll()
+
+
+    def run(self, commands, timeout):
+        """
+        Sends 'commands' to ngspice and returns what it printed while running them.
+        Raises OSError if ngspice died, and subprocess.TimeoutExpired if it didn't finish within 'timeout' seconds.
+        """
+
+        # ngspice echoes this marker once it has run all the commands. The line it's printed on 
+        # may start with a prompt or with the end of output that had no newline, so the marker 
+        # is looked for at the end of the lines (the echo command itself doesn't count).
+        self.num_commands = self.num_commands + 1
+        marker = "coffe_commands_done_" + str(self.num_commands)
+        echo_command = "echo " + marker
+        self.process.stdin.write("\n".join(commands) + "\n" + echo_command + "\n")
+        self.process.stdin.flush()
+
+        output = ""
+        deadline = time.time() + timeout
+        while True:
+            lines = output.split("\n")
+            for line_index, line in enumerate(lines):
+                line = line.strip()
+                if line.endswith(marker) and not line.endswith(echo_command):
+                    output_lines = lines[:line_index]
+                    # Keep the output printed before the marker on its line
+                    if len(line) > len(marker):
+                        output_lines.append(line[:-len(marker)])
+                    return "\n".join(output_lines) + "\n"
+
+            remaining_time = deadline - time.time()
+            if remaining_time <= 0 or not select.select([self.master_fd], [], [], remaining_time)[0]:
+                raise subprocess.TimeoutExpired(self.process.args, timeout)
+
+            # Reading the pseudo-terminal of a process that exited raises OSError (EIO) on Linux
+            data = os.read(self.master_fd, 65536)
+            if not data:
+                raise OSError("ngspice session exited")
+            output = output + data.decode(errors="ignore").replace("\r", "")
+
+
+    def stop(self):
+        """ Stops ngspice and waits for it to exit. """
+
+        try:
+            self.process.stdin.write("quit\n")
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        os.close(self.master_fd)
+
+
+class NgspiceSessionBackend(NgspiceBackend):
+    """
+    Runs the ngspice jobs on long-lived ngspice sessions (see NgspiceSession) instead of starting 
+    ngspice for every row. Each worker thread of SpiceInterface gets its own session, which sources 
+    the netlist of each row, runs it and then removes the circuit and its plots again. A session 
+    that dies or hangs is restarted, at most SESSION_MAX_RESTARTS times in a row.
+    """
+
+    name = "ngspice-session"
+
+    def __init__(self):
+
+        super(NgspiceSessionBackend, self).__init__()
+
+        # Session of each worker thread, and all the sessions started (to stop them)
+        self._thread_session = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+
+
+    def _get_session(self):
+        """ Returns the session of the calling thread, starting it if needed. """
+
+        session = getattr(self._thread_session, "session", None)
+        if session is not None and session.poll() is None:
+            return session
+
+        session = NgspiceSession()
+        self._thread_session.session = session
+        with self._sessions_lock:
+            self._sessions.append(session)
+
+        return session
+
+
+    def shutdown(self):
+
+        with self._sessions_lock:
+            sessions = self._sessions
+            self._sessions = []
+        for session in sessions:
+            session.stop()
+
+
+    def _run_row(self, job_sp_filename, job_dir, log_path):
+
+        commands = ['cd "' + os.path.abspath(job_dir) + '"', 
+                    'source "' + job_sp_filename + '"', 
+                    "run", 
+                    "remcirc", 
+                    "destroy all"]
+
+        session_restarts = 0
+        while True:
+            session = self._get_session()
+            try:
+                output = session.run(commands, NGSPICE_SESSION_TIMEOUT)
+                break
+            except (OSError, subprocess.TimeoutExpired):
+                # The session died or hung, start a new one
+                with self._sessions_lock:
+                    if session in self._sessions:
+                        self._sessions.remove(session)
+                session.stop()
+                session_restarts = session_restarts + 1
+                if session_restarts > SESSION_MAX_RESTARTS:
+                    print("----------------------------------------------------------")
+                    print("              Simulator session failed to run             ")
+                    print("----------------------------------------------------------")
+                    print("Job directory: " + job_dir)
+                    print("")
+                    exit(2)
+
+        with open(log_path, 'w') as log_file:
+            log_file.write(output)
+
+
+# Simulator backends that can be selected on the command line
+SPICE_BACKENDS = {
+    HspiceBackend.name: HspiceBackend,
+    NgspiceBackend.name: NgspiceBackend,
+    NgspiceSessionBackend.name: NgspiceSessionBackend,
+    AnalyticBackend.name: AnalyticBackend,
+    AnalyticSessionBackend.name: AnalyticSessionBackend
+}
+
+
+class SpiceInterface(object):
+    """
+    Defines an HSPICE interface class. 
+    An object of this class can be used to run HSPICE jobs and parse the output of those jobs.
+
+    Jobs are executed on a bounded pool of 'num_workers' worker threads. Every job gets a private 
+    copy of the top-level .sp file, of the include files that pull in the .DATA sweep and of the 
+    sweep file itself, all inside its own scratch directory. Jobs therefore never share files and 
+    never change the working directory of the process, so any number of them can be in flight.
+
+    The simulator is a SpiceBackend (HSPICE by default, see SPICE_BACKENDS).
+
+    If a SpiceCache is given, each sweep row is first looked up in the cache and only the rows 
+    that are not found are simulated. Jobs with process corners are not cached.
+
+    'simulator_slots' is an optional semaphore (e.g. a multiprocessing.BoundedSemaphore) that every
+    job holds while the simulator runs. Interfaces that share it, possibly in different processes,
+    never run more simulations at the same time than the semaphore allows.
+    """
+
+    def __init__(self, num_workers=1, cache=None, backend=None, simulator_slots=None):
+
+        # This simulation counter keeps track of number of HSPICE sims performed.
+        self.simulation_counter = 0
+
+        # Optional SpiceCache. Sweep rows found in the cache are not simulated again.
+        self.cache = cache
+
+        # Simulator used to run the jobs (HSPICE unless another SpiceBackend is given)
+        if backend is None:
+            backend = HspiceBackend()
+        self.backend = backend
+
+        # Maximum number of HSPICE jobs running at the same time
+        self.num_workers = max(1, int(num_workers))
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers)
+
+        # Bounds the number of simulations running at the same time across interfaces (optional)
+        self.simulator_slots = simulator_slots
+
+        # Protects the simulation counter and the job id generator, which are shared by all workers
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count()
+
+        # Fallback deck of some decks (see set_fallback_deck). Maps sp_path -> (fallback sp_path, max_delay)
+        self._fallback_decks = {}
+
+        return
+
+
+    def set_fallback_deck(self, sp_path, fallback_sp_path, max_delay=None):
+        """
+        Rows of the jobs on 'sp_path' whose meas_total_tfall or meas_total_trise failed or is larger
+        than 'max_delay' seconds are simulated again on 'fallback_sp_path', and the measurements of 
+        those rows come from the fallback deck. This is meant for decks whose simulation window was
+        fit to the delay of the subcircuit (see FPGA.update_delays): the rows that don't fit in the 
+        window get the default window. A 'fallback_sp_path' of None removes the fallback.
+        Jobs with process corners don't use the fallback. With a SpiceCache, the cached rows of 
+        'sp_path' are the ones after the fallback.
+        """
+
+        sp_path = os.path.abspath(sp_path)
+        with self._lock:
+            if fallback_sp_path is None:
+                self._fallback_decks.pop(sp_path, None)
+            else:
+                self._fallback_decks[sp_path] = (os.path.abspath(fallback_sp_path), max_delay)
+
+
+    def get_num_simulations_performed(self):
+        """
+        Returns the total number of HSPICE sims performed by this SpiceInterface object.
+        """
+
+        return self.simulation_counter
+
+
+    def shutdown(self):
+        """
+        Waits for all submitted jobs to finish and releases the worker pool and the backend.
+        """
+
+        self._executor.shutdown(wait=True)
+        self.backend.shutdown()
+
+
+    def submit(self, sp_path, parameter_dict, columns=False, fidelity="full", corners=None):
+        """
+        Queue an HSPICE run of the .sp file at 'sp_path' on the worker pool and return 
+        a concurrent.futures.Future. The result of the future is the measurements 
+        dictionary described in run(), or in run_columns() if 'columns' is True. 
+        'parameter_dict' is copied before this function returns, so the caller is free 
+        to modify it afterwards.
+        """
+
+        if fidelity not in SPICE_FIDELITY_TIERS:
+            raise ValueError("Unknown simulation fidelity tier: " + str(fidelity))
+
+        parameter_dict = {name: list(values) for name, values in parameter_dict.items()}
+        sp_path = os.path.abspath(sp_path)
+
+        with self._lock:
+            job_id = next(self._job_ids)
+
+        if corners:
+            corners = [(os.path.abspath(library_path), section) for library_path, section in corners]
+
+        if self.cache is None or corners:
+            return self._executor.submit(self._run_job, sp_path, parameter_dict, job_id, columns, fidelity, corners)
+
+        # Look up every sweep row in the cache
+        row_keys = self.cache.get_row_keys(sp_path, parameter_dict, self.backend.name, fidelity)
+        row_measurements = self.cache.get_many(row_keys)
+        missing_rows = [i for i, measurements in enumerate(row_measurements) if measurements is None]
+
+        future = concurrent.futures.Future()
+        if len(missing_rows) == 0:
+            future.set_result(self._merge_rows(row_measurements, columns))
+            return future
+
+        # Only simulate the rows that were not found
+        missing_parameter_dict = {name: [values[i] for i in missing_rows] for name, values in parameter_dict.items()}
+        spice_job = self._executor.submit(self._run_job, sp_path, missing_parameter_dict, job_id, True, fidelity, None)
+
+        def complete(spice_job):
+            if spice_job.exception() is not None:
+                future.set_exception(spice_job.exception())
+                return
+            # Nobody waits on spice_job, so any error must go to the future or .result() never returns
+            try:
+                spice_measurements = spice_job.result()
+                for job_row, i in enumerate(missing_rows):
+                    row_measurements[i] = {name: float(values[job_row]) for name, values in spice_measurements.items()}
+                self.cache.put_many([(row_keys[i], row_measurements[i]) for i in missing_rows])
+                measurements = self._merge_rows(row_measurements, columns)
+            except Exception as error:
+                future.set_exception(error)
+                return
+            future.set_result(measurements)
+
+        spice_job.add_done_callback(complete)
+
+        return future
+
+
+    def _merge_rows(self, row_measurements, columns):
+        """
+        Turns a list of per-row measurement dictionaries {meas_name: value} into the 
+        measurements format returned by run_columns() (or run() if 'columns' is False).
+        Values are numbers (NaN if failed), or strings in entries cached by older versions.
+        """
+
+        measurements = {}
+        for meas_name in row_measurements[0]:
+            measurements[meas_name] = measurement_array([row[meas_name] for row in row_measurements])
+            if not columns:
+                measurements[meas_name] = measurement_strings(measurements[meas_name])
+
+        return measurements
+
+
+    def _run_job(self, sp_path, parameter_dict, job_id, columns, fidelity, corners):
+        """
+        Runs a single job in its own scratch directory. This is what the worker 
+        threads execute. See run() for the description of the arguments and return value.
+        """
+
+        sp_dir = os.path.dirname(sp_path)
+        sp_filename = os.path.basename(sp_path)
+
+        # Create a scratch directory for this job inside the circuit subdirectory
+        job_dir = os.path.join(sp_dir, SPICE_JOB_DIR, sp_filename.replace(".sp", "") + "_" + str(job_id))
+        if self.backend.needs_job_dir:
+            if os.path.exists(job_dir):
+                shutil.rmtree(job_dir)
+            os.makedirs(job_dir)
+
+        if self.simulator_slots is None:
+            spice_measurements = self.backend.simulate(sp_path, parameter_dict, job_dir, fidelity, corners)
+        else:
+            with self.simulator_slots:
+                spice_measurements = self.backend.simulate(sp_path, parameter_dict, job_dir, fidelity, corners)
+
+        # Delete the job directory to avoid confusion in future runs
+        if self.backend.needs_job_dir:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+        with self._lock:
+            fallback = self._fallback_decks.get(sp_path)
+        if fallback is not None and not corners:
+            self._run_fallback_rows(fallback, parameter_dict, spice_measurements, job_id, fidelity)
+  
+        # Update simulation counter with the number of simulations done by 
+        # adding the length of the list of parameter values inside the dictionary
+        # (once for the nominal model and once for each corner)
+        with self._lock:
+            self.simulation_counter += len(next(iter(parameter_dict.values())))*(1 + (len(corners) if corners else 0))
+
+        if not columns:
+            for meas_name, values in spice_measurements.items():
+                spice_measurements[meas_name] = measurement_strings(values)
+           
+        return spice_measurements
+
+
+    def _run_fallback_rows(self, fallback, parameter_dict, spice_measurements, job_id, fidelity):
+        """
+        Simulates the rows of 'spice_measurements' (float arrays) whose total delay failed or is
+        above the max_delay of 'fallback' again on its fallback deck and replaces their measurements.
+        """
+
+        fallback_sp_path, max_delay = fallback
+        num_rows = len(next(iter(parameter_dict.values())))
+        slow_rows = np.zeros(num_rows, dtype=bool)
+        for meas_name in ("meas_total_tfall", "meas_total_trise"):
+            if meas_name in spice_measurements:
+                delays = spice_measurements[meas_name]
+                slow_rows |= np.isnan(delays)
+                if max_delay is not None:
+                    slow_rows |= delays > max_delay
+
+        rows = np.flatnonzero(slow_rows)
+        if len(rows) == 0:
+            return
+
+        fallback_parameter_dict = {name: [values[i] for i in rows] for name, values in parameter_dict.items()}
+        fallback_measurements = self._run_job(fallback_sp_path, fallback_parameter_dict, job_id, True, fidelity, None)
+        for meas_name, values in spice_measurements.items():
+            values[rows] = fallback_measurements[meas_name]
+
+
+    def run(self, sp_path, parameter_dict, fidelity="full", corners=None):    
+        """
+        This function runs HSPICE on the .sp file at 'sp_path' and returns a dictionary that 
+        contains the HSPICE measurements.
+
+        'parameter_dict' is a dictionary that contains the sizes of transistors and wire RC. 
+        It has the following format:
+        parameter_dict = {param1_name: [val1, val2, etc...],
+                          param2_name: [val1, val2, etc...],
+                          etc...}
+
+        You need to make sure that 'parameter_dict' has a key-value pair for each parameter
+        in your HSPICE netlists. Otherwise, the simulation will fail because of missing 
+        parameters. That is, only the parameters found in 'parameter_dict' will be given a
+        value. 
+        
+        This is important when we consider the fact that, the 'value' in the key value 
+        pair is a list of different parameter values that you want to run HSPICE on.
+        The lists must be of the same length for all params in 'parameter_dict' (param1_name's
+        list has the same number of elements as param2_name). Here's what is going to happen:
+        We will start by setting all the parameters to their 'val1' and we'll run HSPICE. 
+        Then, we'll set all the params to 'val2' and we'll run HSPICE. And so on (that's 
+        actually not exactly what happens, but you get the idea). So, you can run HSPICE on 
+        different transistor size conbinations by adding elements to these lists. Transistor 
+        sizing combination i is ALL the vali in the parameter_dict. So, even if you never 
+        want to change param1_name, you still need a list (who's elements will all be the 
+        same in this case).
+        If you only want to run HSPICE for one transistor sizing combination, your lists will
+        only have one element (but it still needs to be a list).
+
+        Ok, so 'parameter_dict' contains a key-value pair for each transistor where the 'value'
+        is a list of transistor sizes to use. A transistor sizing combination consists of all 
+        the elements at a particular index in these lists. You also need to provide a key-value
+        (or key-list we could say) for all your wire RC parameters. The wire RC data in the 
+        lists corresponds to each transistor sizing combination. You'll need to calculate what
+        the wire RC is for a particular transistor sizing combination outside this function 
+        though. Here, we'll only set the paramters to the appropriate values. 
+
+        Finally, what we'll return is a dictionary similar to 'parameter_dict' but containing
+        all of the of the SPICE measurements. The return value will have this format: 
+
+        measurements = {meas_name1: [value1, value2, value3, etc...], 
+                        meas_name2: [value1, value2, value3, etc...],
+                        etc...}
+
+        Values are strings, "failed" if the simulator couldn't evaluate the measurement.
+        See run_columns() for the same measurements as float arrays.
+
+        'fidelity' is the simulation fidelity tier (see SPICE_FIDELITY_TIERS). Screening sweeps
+        whose results only rank sizing combinations can use "coarse", which runs faster but
+        gives less accurate delays. Delays that are kept should always come from "full".
+
+        'corners' is an optional list of process corners to simulate on top of the nominal model,
+        each a (library path, section) pair that replaces the .LIB statement of the device models
+        (e.g. (model_path, "ss")). All of them are simulated in the same job. The measurement lists
+        then hold the rows of 'parameter_dict' for the nominal model, followed by the rows for each 
+        corner in order: row i of corner c is at index c*num_rows + i, the nominal model being c = 0.
+        Not every backend supports corners (see SPICE_BACKENDS).
+        """
+
+        return self.submit(sp_path, parameter_dict, fidelity=fidelity, corners=corners).result()
+
+
+    def run_columns(self, sp_path, parameter_dict, fidelity="full", corners=None):
+        """
+        Same as run(), but each measurement is a float array with one element per row of
+        'parameter_dict' and NaN where the measurement failed:
+
+        measurements = {meas_name1: array([value1, value2, value3, etc...]), 
+                        meas_name2: array([value1, value2, value3, etc...]),
+                        etc...}
+
+        This lets the caller process all the rows of a sweep at once.
+        """
 
-        return measurements         
+        return self.submit(sp_path, parameter_dict, columns=True, fidelity=fidelity, corners=corners).result()
@@ -0,0 +1,51 @@
+# This file is the session server used by the session backends of spice.py (see spice.SessionBackend).
+#
+# The server runs the jobs it receives on one of the simulator backends of spice.py. It reads one job 
+# per line from its stdin, as a JSON object with the top-level .sp file ("sp_path"), the parameter_dict,
+# the job directory ("job_dir"), the fidelity tier and the process corners, and writes the measurements
+# of each job back on its stdout as a JSON line: {"measurements": {meas_name: [values]}}, NaN where a 
+# measurement failed. 
+# If a job raises an exception, the line is {"error": traceback} instead. The server exits when its 
+# stdin is closed.
+#
+# Usage: python -m coffe.spice_server <backend name>
+
+import sys
+import json
+import traceback
+import numpy as np
+from coffe import spice
+
+
+def serve(backend, requests, responses):
+    """ Runs the jobs read from 'requests' on 'backend' and writes their measurements to 'responses'. """
+
+    for line in requests:
+        if line.strip() == "":
+            continue
+        request = json.loads(line)
+        try:
+            measurements = backend.simulate(request["sp_path"], request["parameter_dict"], request["job_dir"], 
+                                            request["fidelity"], request.get("corners"))
+            response = {"measurements": {meas_name: np.asarray(values, dtype=np.float64).tolist() 
+                                         for meas_name, values in measurements.items()}}
+        except Exception:
+            response = {"error": traceback.format_exc()}
+        responses.write(json.dumps(response) + "\n")
+        responses.flush()
+
+
+def main():
+
+    backend = spice.SPICE_BACKENDS[sys.argv[1]]()
+
+    # stdout carries the responses, anything the backend prints goes to stderr
+    responses = sys.stdout
+    sys.stdout = sys.stderr
+
+    serve(backend, sys.stdin, responses)
+    backend.shutdown()
+
+
+if __name__ == "__main__":
+    main()
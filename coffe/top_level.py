@@ -1,7 +1,19 @@
 import os
 
-def generate_switch_block_top(mux_name):
-    """ Generate the top level switch block SPICE file """
+
+def _spice_time(seconds):
+    """ Returns a time in seconds as a SPICE number, in ns if it is a whole number of ns and in ps otherwise. """
+
+    picoseconds = int(round(seconds*1e12))
+    if picoseconds % 1000 == 0:
+        return str(picoseconds//1000) + "n"
+
+    return str(picoseconds) + "p"
+
+
+def generate_switch_block_top(mux_name, pulse_width=2e-9, stop_time=8e-9):
+    """ Generate the top level switch block SPICE file.
+        The input is high for 'pulse_width' seconds, the simulation stops at 'stop_time' seconds. """
     
     # Create directories
     if not os.path.exists(mux_name):
@@ -21,10 +33,10 @@ def generate_switch_block_top(mux_name):
     sb_file.write("********************************************************************************\n")
     sb_file.write("** Setup and input\n")
     sb_file.write("********************************************************************************\n\n")
-    sb_file.write(".TRAN 1p 8n SWEEP DATA=sweep_data\n")
+    sb_file.write(".TRAN 1p " + _spice_time(stop_time) + " SWEEP DATA=sweep_data\n")
     sb_file.write(".OPTIONS BRIEF=1\n\n")
     sb_file.write("* Input signal\n")
-    sb_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 2n 8n)\n\n")
+    sb_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 " + _spice_time(pulse_width) + " " + _spice_time(stop_time) + ")\n\n")
 
     sb_file.write("* Power rail for the circuit under test.\n")
     sb_file.write("* This allows us to measure power of a circuit under test without measuring the power of wave shaping and load circuitry.\n")
@@ -50,10 +62,10 @@ def generate_switch_block_top(mux_name):
     sb_file.write(".MEASURE TRAN meas_total_trise TRIG V(Xrouting_wire_load_1.Xrouting_wire_load_tile_1.Xsb_mux_on_out.n_in) VAL='supply_v/2' RISE=1\n")
     sb_file.write("+    TARG V(Xrouting_wire_load_2.Xrouting_wire_load_tile_1.Xsb_mux_on_out.n_in) VAL='supply_v/2' RISE=1\n\n")
 
-    sb_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(Xrouting_wire_load_2.Xrouting_wire_load_tile_1.Xsb_mux_on_out.n_in) AT=7nn\n\n")
+    sb_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(Xrouting_wire_load_2.Xrouting_wire_load_tile_1.Xsb_mux_on_out.n_in) AT=" + _spice_time(stop_time - pulse_width/2) + "\n\n")
 
     sb_file.write("* Measure the power required to propagate a rise and a fall transition through the subcircuit at 250MHz.\n")
-    sb_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_SB_MUX) FROM=0ns TO=4ns\n")
+    sb_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_SB_MUX) FROM=0ns TO=" + _spice_time(2*pulse_width) + "\n")
     sb_file.write(".MEASURE TRAN meas_avg_power PARAM = '-(meas_current/4n)*supply_v'\n\n")
 
     sb_file.write("********************************************************************************\n")
@@ -71,8 +83,9 @@ def generate_switch_block_top(mux_name):
     return (mux_name + "/" + mux_name + ".sp")
     
     
-def generate_connection_block_top(mux_name):
-    """ Generate the top level switch block SPICE file """
+def generate_connection_block_top(mux_name, pulse_width=2e-9, stop_time=4e-9):
+    """ Generate the top level switch block SPICE file.
+        The input is high for 'pulse_width' seconds, the simulation stops at 'stop_time' seconds. """
     
     # Create directories
     if not os.path.exists(mux_name):
@@ -92,10 +105,10 @@ def generate_connection_block_top(mux_name):
     cb_file.write("********************************************************************************\n")
     cb_file.write("** Setup and input\n")
     cb_file.write("********************************************************************************\n\n")
-    cb_file.write(".TRAN 1p 4n SWEEP DATA=sweep_data\n")
+    cb_file.write(".TRAN 1p " + _spice_time(stop_time) + " SWEEP DATA=sweep_data\n")
     cb_file.write(".OPTIONS BRIEF=1\n\n")
     cb_file.write("* Input signal\n")
-    cb_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 2n 4n)\n\n")
+    cb_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 " + _spice_time(pulse_width) + " " + _spice_time(stop_time) + ")\n\n")
     
     cb_file.write("* Power rail for the circuit under test.\n")
     cb_file.write("* This allows us to measure power of a circuit under test without measuring the power of wave shaping and load circuitry.\n")
@@ -120,10 +133,10 @@ def generate_connection_block_top(mux_name):
     cb_file.write(".MEASURE TRAN meas_total_trise TRIG V(Xrouting_wire_load_1.Xrouting_wire_load_tile_1.Xcb_load_on_1.n_in) VAL='supply_v/2' RISE=1\n")
     cb_file.write("+    TARG V(Xlocal_routing_wire_load_1.Xlocal_mux_on_1.n_in) VAL='supply_v/2' RISE=1\n\n")
 
-    cb_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(Xlocal_routing_wire_load_1.Xlocal_mux_on_1.n_in) AT=3n\n\n")
+    cb_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(Xlocal_routing_wire_load_1.Xlocal_mux_on_1.n_in) AT=" + _spice_time(stop_time - pulse_width/2) + "\n\n")
     
     cb_file.write("* Measure the power required to propagate a rise and a fall transition through the subcircuit at 250MHz.\n")
-    cb_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_CB_MUX) FROM=0ns TO=4ns\n")
+    cb_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_CB_MUX) FROM=0ns TO=" + _spice_time(2*pulse_width) + "\n")
     cb_file.write(".MEASURE TRAN meas_avg_power PARAM = '-(meas_current/4n)*supply_v'\n\n")
 
     cb_file.write("********************************************************************************\n")
@@ -142,8 +155,9 @@ def generate_connection_block_top(mux_name):
     return (mux_name + "/" + mux_name + ".sp")
 
 
-def generate_local_mux_top(mux_name):
-    """ Generate the top level local mux SPICE file """
+def generate_local_mux_top(mux_name, pulse_width=2e-9, stop_time=4e-9):
+    """ Generate the top level local mux SPICE file.
+        The input is high for 'pulse_width' seconds, the simulation stops at 'stop_time' seconds. """
     
     # Create directories
     if not os.path.exists(mux_name):
@@ -163,10 +177,10 @@ def generate_local_mux_top(mux_name):
     local_mux_file.write("********************************************************************************\n")
     local_mux_file.write("** Setup and input\n")
     local_mux_file.write("********************************************************************************\n\n")
-    local_mux_file.write(".TRAN 1p 4n SWEEP DATA=sweep_data\n")
+    local_mux_file.write(".TRAN 1p " + _spice_time(stop_time) + " SWEEP DATA=sweep_data\n")
     local_mux_file.write(".OPTIONS BRIEF=1\n\n")
     local_mux_file.write("* Input signal\n")
-    local_mux_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 2n 4n)\n\n")
+    local_mux_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 " + _spice_time(pulse_width) + " " + _spice_time(stop_time) + ")\n\n")
     
     local_mux_file.write("* Power rail for the circuit under test.\n")
     local_mux_file.write("* This allows us to measure power of a circuit under test without measuring the power of wave shaping and load circuitry.\n")
@@ -186,10 +200,10 @@ def generate_local_mux_top(mux_name):
     local_mux_file.write(".MEASURE TRAN meas_total_trise TRIG V(Xlocal_routing_wire_load_1.Xlocal_mux_on_1.n_in) VAL='supply_v/2' FALL=1\n")
     local_mux_file.write("+    TARG V(n_1_4) VAL='supply_v/2' RISE=1\n\n")
 
-    local_mux_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(n_1_1) AT=3n\n\n")
+    local_mux_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(n_1_1) AT=" + _spice_time(stop_time - pulse_width/2) + "\n\n")
 
     local_mux_file.write("* Measure the power required to propagate a rise and a fall transition through the subcircuit at 250MHz.\n")
-    local_mux_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_LOCAL_MUX) FROM=0ns TO=4ns\n")
+    local_mux_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_LOCAL_MUX) FROM=0ns TO=" + _spice_time(2*pulse_width) + "\n")
     local_mux_file.write(".MEASURE TRAN meas_avg_power PARAM = '-(meas_current/4n)*supply_v'\n\n")
     
     local_mux_file.write("********************************************************************************\n")
@@ -4271,8 +4285,9 @@ def generate_lut4_top(lut_name, use_tgate):
     return (lut_name + "/" + lut_name + ".sp")
     
  
-def generate_lut_driver_top(input_driver_name, input_driver_type):
-    """ Generate the top level lut input driver SPICE file """
+def generate_lut_driver_top(input_driver_name, input_driver_type, pulse_width=2e-9, stop_time=4e-9):
+    """ Generate the top level lut input driver SPICE file.
+        The input is high for 'pulse_width' seconds, the simulation stops at 'stop_time' seconds. """
     
     # Create directories
     if not os.path.exists(input_driver_name):
@@ -4292,10 +4307,10 @@ def generate_lut_driver_top(input_driver_name, input_driver_type):
     input_driver_file.write("********************************************************************************\n")
     input_driver_file.write("** Setup and input\n")
     input_driver_file.write("********************************************************************************\n\n")
-    input_driver_file.write(".TRAN 1p 4n SWEEP DATA=sweep_data\n")
+    input_driver_file.write(".TRAN 1p " + _spice_time(stop_time) + " SWEEP DATA=sweep_data\n")
     input_driver_file.write(".OPTIONS BRIEF=1\n\n")
     input_driver_file.write("* Input signal\n")
-    input_driver_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 2n 4n)\n\n")
+    input_driver_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 " + _spice_time(pulse_width) + " " + _spice_time(stop_time) + ")\n\n")
     input_driver_file.write("* Power rail for the circuit under test.\n")
     input_driver_file.write("* This allows us to measure power of a circuit under test without measuring the power of wave shaping and load circuitry.\n")
     input_driver_file.write("V_LUT_DRIVER vdd_lut_driver gnd supply_v\n\n")
@@ -4326,10 +4341,10 @@ def generate_lut_driver_top(input_driver_name, input_driver_type):
     input_driver_file.write(".MEASURE TRAN meas_total_trise TRIG V(n_1_2) VAL='supply_v/2' FALL=1\n")
     input_driver_file.write("+    TARG V(n_out) VAL='supply_v/2' RISE=1\n\n")
 
-    input_driver_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(n_out) AT=3n\n\n")
+    input_driver_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(n_out) AT=" + _spice_time(stop_time - pulse_width/2) + "\n\n")
 
     input_driver_file.write("* Measure the power required to propagate a rise and a fall transition through the lut driver at 250MHz.\n")
-    input_driver_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_LUT_DRIVER) FROM=0ns TO=4ns\n")
+    input_driver_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_LUT_DRIVER) FROM=0ns TO=" + _spice_time(2*pulse_width) + "\n")
     input_driver_file.write(".MEASURE TRAN meas_avg_power PARAM = '-((meas_current)/4n)*supply_v'\n\n")
 
     input_driver_file.write("********************************************************************************\n")
@@ -4353,8 +4368,9 @@ def generate_lut_driver_top(input_driver_name, input_driver_type):
     return (input_driver_name + "/" + input_driver_name + ".sp")
     
 
-def generate_lut_driver_not_top(input_driver_name, input_driver_type):
-    """ Generate the top level lut input not driver SPICE file """
+def generate_lut_driver_not_top(input_driver_name, input_driver_type, pulse_width=2e-9, stop_time=4e-9):
+    """ Generate the top level lut input not driver SPICE file.
+        The input is high for 'pulse_width' seconds, the simulation stops at 'stop_time' seconds. """
     
     # Create directories
     input_driver_name_no_not = input_driver_name.replace("_not", "")
@@ -4375,10 +4391,10 @@ def generate_lut_driver_not_top(input_driver_name, input_driver_type):
     input_driver_file.write("********************************************************************************\n")
     input_driver_file.write("** Setup and input\n")
     input_driver_file.write("********************************************************************************\n\n")
-    input_driver_file.write(".TRAN 1p 4n SWEEP DATA=sweep_data\n")
+    input_driver_file.write(".TRAN 1p " + _spice_time(stop_time) + " SWEEP DATA=sweep_data\n")
     input_driver_file.write(".OPTIONS BRIEF=1\n\n")
     input_driver_file.write("* Input signal\n")
-    input_driver_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 2n 4n)\n\n")
+    input_driver_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 " + _spice_time(pulse_width) + " " + _spice_time(stop_time) + ")\n\n")
     input_driver_file.write("* Power rail for the circuit under test.\n")
     input_driver_file.write("* This allows us to measure power of a circuit under test without measuring the power of wave shaping and load circuitry.\n")
     input_driver_file.write("V_LUT_DRIVER vdd_lut_driver gnd supply_v\n\n")
@@ -4402,10 +4418,10 @@ def generate_lut_driver_not_top(input_driver_name, input_driver_type):
     input_driver_file.write(".MEASURE TRAN meas_total_trise TRIG V(n_1_2) VAL='supply_v/2' RISE=1\n")
     input_driver_file.write("+    TARG V(n_out_n) VAL='supply_v/2' RISE=1\n\n")
 
-    input_driver_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(n_out) AT=3n\n\n")
+    input_driver_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(n_out) AT=" + _spice_time(stop_time - pulse_width/2) + "\n\n")
     
     input_driver_file.write("* Measure the power required to propagate a rise and a fall transition through the lut driver at 250MHz.\n")
-    input_driver_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_LUT_DRIVER) FROM=0ns TO=4ns\n")
+    input_driver_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_LUT_DRIVER) FROM=0ns TO=" + _spice_time(2*pulse_width) + "\n")
     input_driver_file.write(".MEASURE TRAN meas_avg_power PARAM = '-((meas_current)/4n)*supply_v'\n\n")
 
     input_driver_file.write("********************************************************************************\n")
@@ -4523,8 +4539,9 @@ def generate_lut_and_driver_top(input_driver_name, input_driver_type, use_tgate,
     os.chdir("../")  
   
     
-def generate_local_ble_output_top(name, use_tgate):
-    """ Generate the top level local ble output SPICE file """
+def generate_local_ble_output_top(name, use_tgate, pulse_width=2e-9, stop_time=4e-9):
+    """ Generate the top level local ble output SPICE file.
+        The input is high for 'pulse_width' seconds, the simulation stops at 'stop_time' seconds. """
     
     # Create directories
     if not os.path.exists(name):
@@ -4544,10 +4561,10 @@ def generate_local_ble_output_top(name, use_tgate):
     top_file.write("********************************************************************************\n")
     top_file.write("** Setup and input\n")
     top_file.write("********************************************************************************\n\n")
-    top_file.write(".TRAN 1p 4n SWEEP DATA=sweep_data\n")
+    top_file.write(".TRAN 1p " + _spice_time(stop_time) + " SWEEP DATA=sweep_data\n")
     top_file.write(".OPTIONS BRIEF=1\n\n")
     top_file.write("* Input signal\n")
-    top_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 2n 4n)\n\n")
+    top_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 " + _spice_time(pulse_width) + " " + _spice_time(stop_time) + ")\n\n")
     top_file.write("* Power rail for the circuit under test.\n")
     top_file.write("* This allows us to measure power of a circuit under test without measuring the power of wave shaping and load circuitry.\n")
     top_file.write("V_LOCAL_OUTPUT vdd_local_output gnd supply_v\n\n")
@@ -4571,10 +4588,10 @@ def generate_local_ble_output_top(name, use_tgate):
     top_file.write(".MEASURE TRAN meas_total_trise TRIG V(n_1_1) VAL='supply_v/2' RISE=1\n")
     top_file.write("+    TARG V(Xlocal_ble_output_load.n_1_2) VAL='supply_v/2' FALL=1\n\n")
 
-    top_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(n_local_out) AT=3n\n\n")
+    top_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(n_local_out) AT=" + _spice_time(stop_time - pulse_width/2) + "\n\n")
 
     top_file.write("* Measure the power required to propagate a rise and a fall transition through the subcircuit at 250MHz.\n")
-    top_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_LOCAL_OUTPUT) FROM=0ns TO=4ns\n")
+    top_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_LOCAL_OUTPUT) FROM=0ns TO=" + _spice_time(2*pulse_width) + "\n")
     top_file.write(".MEASURE TRAN meas_avg_power PARAM = '-((meas_current)/4n)*supply_v'\n\n")
 
     top_file.write("********************************************************************************\n")
@@ -4597,8 +4614,9 @@ def generate_local_ble_output_top(name, use_tgate):
     return (name + "/" + name + ".sp")
     
     
-def generate_general_ble_output_top(name, use_tgate):
-    """ """
+def generate_general_ble_output_top(name, use_tgate, pulse_width=2e-9, stop_time=4e-9):
+    """ Generate the top level general ble output SPICE file.
+        The input is high for 'pulse_width' seconds, the simulation stops at 'stop_time' seconds. """
     
     # Create directories
     if not os.path.exists(name):
@@ -4618,10 +4636,10 @@ def generate_general_ble_output_top(name, use_tgate):
     top_file.write("********************************************************************************\n")
     top_file.write("** Setup and input\n")
     top_file.write("********************************************************************************\n\n")
-    top_file.write(".TRAN 1p 4n SWEEP DATA=sweep_data\n")
+    top_file.write(".TRAN 1p " + _spice_time(stop_time) + " SWEEP DATA=sweep_data\n")
     top_file.write(".OPTIONS BRIEF=1\n\n")
     top_file.write("* Input signal\n")
-    top_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 2n 4n)\n\n")
+    top_file.write("VIN n_in gnd PULSE (0 supply_v 0 0 0 " + _spice_time(pulse_width) + " " + _spice_time(stop_time) + ")\n\n")
     top_file.write("* Power rail for the circuit under test.\n")
     top_file.write("* This allows us to measure power of a circuit under test without measuring the power of wave shaping and load circuitry.\n")
     top_file.write("V_GENERAL_OUTPUT vdd_general_output gnd supply_v\n\n")
@@ -4645,10 +4663,10 @@ def generate_general_ble_output_top(name, use_tgate):
     top_file.write(".MEASURE TRAN meas_total_trise TRIG V(n_1_1) VAL='supply_v/2' RISE=1\n")
     top_file.write("+    TARG V(Xgeneral_ble_output_load.n_meas_point) VAL='supply_v/2' RISE=1\n\n")
 
-    top_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(n_general_out) AT=3n\n\n")
+    top_file.write(".MEASURE TRAN meas_logic_low_voltage FIND V(n_general_out) AT=" + _spice_time(stop_time - pulse_width/2) + "\n\n")
 
     top_file.write("* Measure the power required to propagate a rise and a fall transition through the subcircuit at 250MHz.\n")
-    top_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_GENERAL_OUTPUT) FROM=0ns TO=4ns\n")
+    top_file.write(".MEASURE TRAN meas_current INTEGRAL I(V_GENERAL_OUTPUT) FROM=0ns TO=" + _spice_time(2*pulse_width) + "\n")
     top_file.write(".MEASURE TRAN meas_avg_power PARAM = '-((meas_current)/4n)*supply_v'\n\n")
 
     top_file.write("********************************************************************************\n")
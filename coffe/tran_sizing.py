@@ -9,7 +9,9 @@
 import os
 import math
 import time
+import numpy as np
 from . import spice
+from . import sizing_scheduler
 from itertools import product
 import sys
 
@@ -21,6 +23,37 @@ ERF_ERROR_TOLERANCE = 0.1
 # Maximum number of times the algorithm will try to meet ERF_ERROR_TOLERANCE before quitting.
 ERF_MAX_ITERATIONS = 4
 
+# If True, all the inverters of a circuit are ERFed together with one HSPICE sweep per ERF iteration
+# (see erf_inverters_batched). If False, each inverter is ERFed on its own with erf_inverter.
+ERF_BATCHED_SWEEP = True
+# P/N skews tried by the batched ERF sweep. A skew s > 0 means PMOS = (1+s)*NMOS and a skew
+# s < 0 means NMOS = (1-s)*PMOS. The largest ratio is 4, like in erf_inverter_balance_trise_tfall.
+ERF_SKEW_GRID = [0.25*i for i in range(-12, 13)]
+
+# Surrogate search (search_mode "surrogate"). Instead of simulating every combo of the sizing ranges,
+# a model of the cost is fit to a few simulated combos and more combos are simulated, in batches,
+# by expected improvement of the cost.
+# Number of combos simulated before the first model is fit
+SURROGATE_INITIAL_COMBOS = 12
+# Number of combos simulated per batch after that
+SURROGATE_BATCH_SIZE = 8
+# Maximum number of combos simulated per call to search_ranges
+SURROGATE_MAX_COMBOS = 250
+# The search stops when the best expected improvement is below this fraction of the cost. E.g. 0.002 means 0.2%.
+SURROGATE_EI_THRESHOLD = 0.002
+# Length scales (in normalized sizing range units) tried when fitting the model
+SURROGATE_LENGTH_SCALES = [0.1, 0.2, 0.35, 0.5, 0.75, 1.0, 1.5]
+# Noise added to the model to keep it numerically stable
+SURROGATE_NOISE = 1e-6
+
+# Branch-and-bound search (search_mode "prune"). Combos are simulated in order of a lower bound of their
+# cost, and the ones whose bound is above the cost of the combos already simulated are never simulated.
+# Number of combos simulated per HSPICE sweep
+PRUNE_BATCH_SIZE = 200
+
+# Checkpoint of transistor sizing, written in the architecture folder (see sizing_scheduler.SizingCheckpoint)
+SIZING_CHECKPOINT_PATH = "sizing_checkpoint.json"
+
 
 
 def expand_ranges(sizing_ranges):
@@ -1012,6 +1045,139 @@ def erf_inverter(sp_path,
 	return 
    
 
+def _erf_skew_to_sizes(inv_size, skew):
+	""" 
+	Converts a P/N skew into NMOS and PMOS sizes for an inverter of size 'inv_size'.
+	A positive skew makes the PMOS bigger (PMOS = (1+skew)*inv_size), a negative skew
+	makes the NMOS bigger (NMOS = (1-skew)*inv_size). A skew of 0 gives NMOS = PMOS.
+	"""
+
+	if skew >= 0:
+		return inv_size, inv_size*(1 + skew)
+	else:
+		return inv_size*(1 - skew), inv_size
+
+
+def _interpolate_erf_skew(skew_list, diff_list):
+	""" 
+	Returns the skew where tfall - trise crosses zero, found by linear interpolation between
+	the two sweep points around the crossing. If tfall - trise never changes sign in the sweep,
+	the skew of the point with the smallest difference is returned.
+	"""
+
+	for i in range(1, len(skew_list)):
+		if (diff_list[i-1] <= 0 <= diff_list[i]) or (diff_list[i-1] >= 0 >= diff_list[i]):
+			if diff_list[i] == diff_list[i-1]:
+				return skew_list[i-1]
+			return skew_list[i-1] + (0 - diff_list[i-1])*(skew_list[i] - skew_list[i-1])/(diff_list[i] - diff_list[i-1])
+
+	best_index = min(range(len(diff_list)), key=lambda i: abs(diff_list[i]))
+
+	return skew_list[best_index]
+
+
+def erf_inverters_batched(sp_path,
+						  inv_names,
+						  inv_drive_strengths,
+						  parameter_dict,
+						  fpga_inst,
+						  spice_interface):
+	"""
+	Equalize the rise and fall delays of all the inverters in 'inv_names' with a single HSPICE sweep.
+
+	Each inverter gets a block of rows in the sweep, one row per P/N skew in ERF_SKEW_GRID, in
+	which only that inverter's NMOS and PMOS sizes differ from 'parameter_dict'. The ERF skew of
+	an inverter is where its tfall - trise crosses zero, which we interpolate from its rows. 
+	Like erf_inverter, this mutates 'parameter_dict' and the transistor sizes of 'fpga_inst'.
+	Since all inverters are ERFed at the same time, the loading of each inverter by its neighbours
+	is only updated on the next call (erf iterates until the ERF tolerance is met).
+
+	sp_path 
+		The path to the top level spice file for these inverters
+	inv_names
+		The names of the inverters
+	inv_drive_strengths
+		The drive strength of the smallest transistor of each inverter.
+	fpga_inst
+		An FPGA object
+	spice_interface
+		A spice interface object
+	"""
+
+	# The sizes are the transistor diffusion width in nanometers for bulk
+	# and the number of fins for FinFETs.
+	if not fpga_inst.specs.use_finfet :
+		inv_sizes = [drive_strength*fpga_inst.specs.min_tran_width for drive_strength in inv_drive_strengths]
+		size_to_param = 1e-9
+	else :
+		inv_sizes = list(inv_drive_strengths)
+		size_to_param = 1
+
+	# Build the sweep: all parameters keep their value from parameter_dict, 
+	# except the inverter being ERFed in each block of rows.
+	num_rows = len(inv_names)*len(ERF_SKEW_GRID)
+	sweep_parameter_dict = {}
+	for name, values in parameter_dict.items():
+		sweep_parameter_dict[name] = [values[0]]*num_rows
+	row = 0
+	for inv_name, inv_size in zip(inv_names, inv_sizes):
+		for skew in ERF_SKEW_GRID:
+			nmos_size, pmos_size = _erf_skew_to_sizes(inv_size, skew)
+			sweep_parameter_dict[inv_name + "_nmos"][row] = size_to_param*nmos_size
+			sweep_parameter_dict[inv_name + "_pmos"][row] = size_to_param*pmos_size
+			row += 1
+
+	if ERF_MONITOR_VERBOSE:
+		print("Running batched ERF sweep (" + str(num_rows) + " rows) on: " + sp_path)
+	spice_meas = spice_interface.run_columns(sp_path, sweep_parameter_dict)
+
+	num_skews = len(ERF_SKEW_GRID)
+	skew_grid = np.array(ERF_SKEW_GRID)
+	for i, (inv_name, inv_size) in enumerate(zip(inv_names, inv_sizes)):
+		# Collect tfall - trise for each skew of this inverter. Failed measurements (NaN) and negative 
+		# delays (output transition faster than input transition) are left out of the interpolation.
+		tfall = spice_meas["meas_" + inv_name + "_tfall"][i*num_skews:(i+1)*num_skews]
+		trise = spice_meas["meas_" + inv_name + "_trise"][i*num_skews:(i+1)*num_skews]
+		valid = (tfall >= 0) & (trise >= 0)
+		skew_list = skew_grid[valid].tolist()
+		diff_list = (tfall - trise)[valid].tolist()
+
+		# Check if the HSPICE measurement failed. If it did, this might mean that the level
+		# restorers are too strong which messes up one of the transitions. Making the gate
+		# length for the level restorers larger could solve this problem.
+		# Note that it's also possible that something else is causing the failure...
+		if len(skew_list) == 0:
+			print("ERROR: HSPICE measurement failed.")
+			print("Consider increasing level-restorers gate length by increasing the 'rest_length_factor' parameter in the input file.")
+			exit(1)
+
+		erf_skew = _interpolate_erf_skew(skew_list, diff_list)
+		nmos_size, pmos_size = _erf_skew_to_sizes(inv_size, erf_skew)
+
+		# Bulk sizes have a 1 nm granularity and FinFET sizes a 1 fin granularity
+		nmos_size = max(round(nmos_size), inv_size)
+		pmos_size = max(round(pmos_size), inv_size)
+
+		if ERF_MONITOR_VERBOSE:
+			print("ERF MONITOR: " + inv_name + " NMOS=" + str(nmos_size) + " PMOS=" + str(pmos_size))
+
+		# Update the parameter dict
+		parameter_dict[inv_name + "_nmos"][0] = size_to_param*nmos_size
+		parameter_dict[inv_name + "_pmos"][0] = size_to_param*pmos_size
+
+		# Update fpga_inst transistor sizes with new NMOS & PMOS sizes
+		if not fpga_inst.specs.use_finfet :
+			fpga_inst.transistor_sizes[inv_name + "_nmos"] = (nmos_size/fpga_inst.specs.min_tran_width)
+			fpga_inst.transistor_sizes[inv_name + "_pmos"] = (pmos_size/fpga_inst.specs.min_tran_width)
+		else :
+			fpga_inst.transistor_sizes[inv_name + "_nmos"] = (nmos_size)
+			fpga_inst.transistor_sizes[inv_name + "_pmos"] = (pmos_size)
+
+	sys.stdout.flush()
+
+	return
+
+
 def erf(sp_path, 
 		element_names, 
 		element_sizes, 
@@ -1031,19 +1197,7 @@ def erf(sp_path,
    
 	# Generate the parameter dict needed by the spice_interface. 
 	# The parameter dict contains the sizes of all transistors and RC of all wires.
-	parameter_dict = {}
-	if not fpga_inst.specs.use_finfet :
-		for tran_name, tran_size in fpga_inst.transistor_sizes.items():
-			parameter_dict[tran_name] = [1e-9*tran_size*fpga_inst.specs.min_tran_width]
-		for wire_name, rc_data in fpga_inst.wire_rc_dict.items():
-			parameter_dict[wire_name + "_res"] = [rc_data[0]]
-			parameter_dict[wire_name + "_cap"] = [rc_data[1]*1e-15]
-	else :
-		for tran_name, tran_size in fpga_inst.transistor_sizes.items():
-			parameter_dict[tran_name] = [tran_size]
-		for wire_name, rc_data in fpga_inst.wire_rc_dict.items():
-			parameter_dict[wire_name + "_res"] = [rc_data[0]]
-			parameter_dict[wire_name + "_cap"] = [rc_data[1]*1e-15]
+	parameter_dict = fpga_inst.get_parameter_dict()
 
 	# Set ERF tolerance flag to False so that we can enter the while loop
 	erf_tolerance_met = False
@@ -1052,20 +1206,36 @@ def erf(sp_path,
 		# Start by assuming that ERF tolerance will be met.
 		erf_tolerance_met = True
 
-		# ERF each inverter in the circuit
-		for i in range(len(element_names)):
-			circuit_element = element_names[i]
-			element_size = element_sizes[i]
-	
-			# If the element is an inverter, equalize its rise and fall delays
-			# 'erf_inverter' will mutate parameter dict and the fpga object with ERFed sizes.
-			if element_names[i].startswith("inv_"):
-				erf_inverter(sp_path, 
-							 circuit_element, 
-							 element_size, 
-							 parameter_dict, 
-							 fpga_inst, 
-							 spice_interface)
+		# ERF all inverters of the circuit in one sweep
+		if ERF_BATCHED_SWEEP:
+			inv_names = []
+			inv_drive_strengths = []
+			for i in range(len(element_names)):
+				if element_names[i].startswith("inv_"):
+					inv_names.append(element_names[i])
+					inv_drive_strengths.append(element_sizes[i])
+			if len(inv_names) > 0:
+				erf_inverters_batched(sp_path, 
+									  inv_names, 
+									  inv_drive_strengths, 
+									  parameter_dict, 
+									  fpga_inst, 
+									  spice_interface)
+		else:
+			# ERF each inverter in the circuit
+			for i in range(len(element_names)):
+				circuit_element = element_names[i]
+				element_size = element_sizes[i]
+	
+				# If the element is an inverter, equalize its rise and fall delays
+				# 'erf_inverter' will mutate parameter dict and the fpga object with ERFed sizes.
+				if element_names[i].startswith("inv_"):
+					erf_inverter(sp_path, 
+								 circuit_element, 
+								 element_size, 
+								 parameter_dict, 
+								 fpga_inst, 
+								 spice_interface)
 				
 	
 		# At this point, all inverters have been ERFed.
@@ -1177,19 +1347,7 @@ def run_combo(fpga_inst, sp_path, element_names, combo, erf_ratios, spice_interf
 	#fpga_inst.update_wire_rc_file()
 
 	# Make parameter dict
-	parameter_dict = {}
-	if not fpga_inst.specs.use_finfet :
-		for tran_name, tran_size in fpga_inst.transistor_sizes.items():
-			parameter_dict[tran_name] = [1e-9*tran_size*fpga_inst.specs.min_tran_width]
-		for wire_name, rc_data in fpga_inst.wire_rc_dict.items():
-			parameter_dict[wire_name + "_res"] = [rc_data[0]]
-			parameter_dict[wire_name + "_cap"] = [rc_data[1]*1e-15]
-	else :
-		for tran_name, tran_size in fpga_inst.transistor_sizes.items():
-			parameter_dict[tran_name] = [tran_size]
-		for wire_name, rc_data in fpga_inst.wire_rc_dict.items():
-			parameter_dict[wire_name + "_res"] = [rc_data[0]]
-			parameter_dict[wire_name + "_cap"] = [rc_data[1]*1e-15]
+	parameter_dict = fpga_inst.get_parameter_dict()
 
 	# Run HSPICE with the current transistor size
 	spice_meas = spice_interface.run(sp_path, parameter_dict)                                           
@@ -1203,6 +1361,268 @@ def run_combo(fpga_inst, sp_path, element_names, combo, erf_ratios, spice_interf
 	return tfall, trise
 
 	
+def _simulate_combos(fpga_inst, sizable_circuit, opt_type, element_names, sizing_combos, erf_ratios,
+					 wire_names, wire_rc, combo_ids, spice_interface, is_ram_component, is_cc_component,
+					 tfall_trise_list, eval_delay_list):
+	""" 
+		Runs one HSPICE sweep over the transistor sizing combinations in 'combo_ids' (indices into 
+		'sizing_combos'). 'wire_rc' holds the wire R and C of every combo, see search_ranges.
+		The results are written to 'tfall_trise_list' and 'eval_delay_list' at the index of each combo.
+		The sweep runs at the screening fidelity of the FPGA: these results only rank the combos, the 
+		best ones are simulated again at full fidelity by run_combo.
+	"""
+
+	# We have to make a parameter dict for HSPICE. Transistors that aren't being sized
+	# keep their current size in every combo.
+	tran_sizes = fpga_inst.transistor_sizes
+	current_tran_sizes = tran_sizes.get_parameter_values(fpga_inst.specs.min_tran_width, fpga_inst.specs.use_finfet)
+	parameter_dict = {}
+	for tran_name, tran_size in zip(tran_sizes.names, current_tran_sizes):
+		parameter_dict[tran_name] = [tran_size]*len(combo_ids)
+	for wire_id, wire_name in enumerate(wire_names):
+		parameter_dict[wire_name + "_res"] = wire_rc[combo_ids, wire_id, 0].tolist()
+		parameter_dict[wire_name + "_cap"] = (wire_rc[combo_ids, wire_id, 1]*1e-15).tolist()
+
+	# The sizes of the transistors of each element we are sweeping, for all combos at once
+	for element_id, element_name in enumerate(element_names):
+		# If the element appears more than once, the first one sets its size
+		if element_names.index(element_name) != element_id:
+			continue
+
+		# Let's calculate the size of the transistors of this element
+		element_sizes = np.array([sizing_combos[i][element_id] for i in combo_ids])
+		if not fpga_inst.specs.use_finfet :
+			element_sizes = 1e-9*(element_sizes*fpga_inst.specs.min_tran_width)
+
+		for tran_id in tran_sizes.get_component_tran_ids(element_name):
+			tran_name = tran_sizes.names[tran_id]
+			# If transistor is an inverter, we need to do some stuff to calc sizes for
+			# both the NMOS and PMOS, if it is anything else (eg. ptran), we can just add 
+			# it directly.
+			if tran_name.startswith("inv_"):
+				if tran_name.endswith("_nmos"):
+					# If the NMOS is bigger than the PMOS
+					if erf_ratios[element_name] < 1:
+						parameter_dict[tran_name] = (element_sizes/erf_ratios[element_name]).tolist()
+					# If the PMOS is bigger than the NMOS
+					else:
+						parameter_dict[tran_name] = element_sizes.tolist()
+				else:
+					# If the NMOS is bigger than the PMOS
+					if erf_ratios[element_name] < 1:
+						parameter_dict[tran_name] = element_sizes.tolist()
+					# If the PMOS is bigger than the NMOS
+					else:
+						parameter_dict[tran_name] = (element_sizes*erf_ratios[element_name]).tolist()
+			else: 
+				parameter_dict[tran_name] = element_sizes.tolist()
+   
+	# Run HSPICE data sweep
+	print(("Running HSPICE for " + str(len(combo_ids)) + 
+		   " transistor sizing combinations..."))
+	spice_meas = spice_interface.run_columns(sizable_circuit.top_spice_path, parameter_dict, fpga_inst.screening_fidelity)
+
+	# Now we need to create a list of tfall_trise to be compatible with old code
+	# Row j of the sweep is combo combo_ids[j]. Failed measurements (NaN) count as 1.
+	tfall_array = np.nan_to_num(spice_meas["meas_total_tfall"], nan=1.0)
+	trise_array = np.nan_to_num(spice_meas["meas_total_trise"], nan=1.0)
+	meas_logic_low_voltage = np.nan_to_num(spice_meas["meas_logic_low_voltage"], nan=1.0).tolist()
+	for j, tfall_trise in enumerate(zip(tfall_array.tolist(), trise_array.tolist())):
+		tfall_trise_list[combo_ids[j]] = tfall_trise
+  
+	# Get delay metric used for evaluation for each transistor sizing combo as well as 
+	# ERF error
+	for j, i in enumerate(combo_ids):    
+		# Calculate evaluation delay
+		tfall_trise = tfall_trise_list[i]
+
+
+		delay = get_eval_delay(fpga_inst, opt_type, sizable_circuit, tfall_trise[0], tfall_trise[1], meas_logic_low_voltage[j], is_ram_component, is_cc_component)
+
+
+		eval_delay_list[i] = delay
+
+
+def _fit_gaussian_process(points, values):
+	""" 
+		Fits a Gaussian process with a squared exponential kernel to 'values' sampled at 'points' 
+		(one point per row). The length scale is chosen from SURROGATE_LENGTH_SCALES by marginal likelihood.
+		Returns a function that gives the predicted mean and standard deviation at new points.
+	"""
+
+	def squared_distances(a, b):
+		dist = np.sum(a*a, axis=1)[:, None] + np.sum(b*b, axis=1)[None, :] - 2*np.dot(a, b.T)
+		return np.maximum(dist, 0)
+
+	value_mean = np.mean(values)
+	value_std = np.std(values)
+	if value_std == 0:
+		value_std = 1.0
+	norm_values = (values - value_mean)/value_std
+	sample_dist = squared_distances(points, points)
+
+	best_fit = None
+	for length_scale in SURROGATE_LENGTH_SCALES:
+		kernel = np.exp(-sample_dist/(2*length_scale*length_scale)) + SURROGATE_NOISE*np.eye(len(points))
+		try:
+			chol = np.linalg.cholesky(kernel)
+		except np.linalg.LinAlgError:
+			continue
+		alpha = np.linalg.solve(chol.T, np.linalg.solve(chol, norm_values))
+		log_likelihood = -0.5*np.dot(norm_values, alpha) - np.sum(np.log(np.diag(chol)))
+		if best_fit is None or log_likelihood > best_fit[0]:
+			best_fit = (log_likelihood, length_scale, chol, alpha)
+
+	_, length_scale, chol, alpha = best_fit
+
+	def predict(new_points):
+		kernel_star = np.exp(-squared_distances(new_points, points)/(2*length_scale*length_scale))
+		mean = np.dot(kernel_star, alpha)
+		v = np.linalg.solve(chol, kernel_star.T)
+		variance = np.maximum(1 + SURROGATE_NOISE - np.sum(v*v, axis=0), 1e-12)
+		return value_mean + value_std*mean, value_std*np.sqrt(variance)
+
+	return predict
+
+
+def _expected_improvement(mean, std, best):
+	""" Expected improvement over 'best' of normally distributed values to be minimized. """
+
+	std = np.maximum(std, 1e-12)
+	improvement = best - mean
+	z = improvement/std
+	cdf = 0.5*(1 + np.vectorize(math.erf)(z/math.sqrt(2)))
+	pdf = np.exp(-0.5*z*z)/math.sqrt(2*math.pi)
+
+	return np.maximum(improvement*cdf + std*pdf, 0)
+
+
+def _surrogate_search(fpga_inst, sizable_circuit, opt_type, element_names, sizing_combos, erf_ratios, area_list,
+					  wire_names, wire_rc, area_opt_weight, delay_opt_weight, spice_interface, 
+					  is_ram_component, is_cc_component, tfall_trise_list, eval_delay_list):
+	""" 
+		Searches the sizing combos of search_ranges without simulating all of them.
+		Area is known for every combo, so only the delay is modeled: a Gaussian process of log(delay)
+		versus the (normalized) transistor sizes is fit to the simulated combos. Since 
+		log(cost) = b*log(area) + c*log(delay), this gives a prediction of log(cost) for every combo.
+		We start with combos spread over the sizing ranges, then simulate batches of the combos with the
+		highest expected improvement of log(cost) until it is below SURROGATE_EI_THRESHOLD, every combo
+		was simulated or SURROGATE_MAX_COMBOS is reached.
+		The results are written to 'tfall_trise_list' and 'eval_delay_list' like in _simulate_combos.
+		Returns the indices of the simulated combos.
+	"""
+
+	num_combos = len(sizing_combos)
+	max_combos = min(num_combos, SURROGATE_MAX_COMBOS)
+
+	# Transistor sizes normalized to the sizing ranges
+	points = np.array(sizing_combos, dtype=np.float64)
+	points_min = points.min(axis=0)
+	points_span = points.max(axis=0) - points_min
+	points_span[points_span == 0] = 1.0
+	points = (points - points_min)/points_span
+	log_area_cost = area_opt_weight*np.log(np.array(area_list, dtype=np.float64))
+
+	# Initial combos: the middle of the ranges, then the combo farthest from the ones already picked
+	min_dist = np.sum((points - 0.5)**2, axis=1)
+	batch = [int(np.argmin(min_dist))]
+	min_dist = np.sum((points - points[batch[0]])**2, axis=1)
+	while len(batch) < min(SURROGATE_INITIAL_COMBOS, max_combos) and np.max(min_dist) > 0:
+		batch.append(int(np.argmax(min_dist)))
+		min_dist = np.minimum(min_dist, np.sum((points - points[batch[-1]])**2, axis=1))
+
+	simulated_ids = []
+	while len(batch) > 0:
+		_simulate_combos(fpga_inst, sizable_circuit, opt_type, element_names, sizing_combos, erf_ratios, 
+						 wire_names, wire_rc, batch, spice_interface, is_ram_component, is_cc_component, 
+						 tfall_trise_list, eval_delay_list)
+		simulated_ids.extend(batch)
+		num_to_simulate = min(SURROGATE_BATCH_SIZE, max_combos - len(simulated_ids))
+		if num_to_simulate <= 0:
+			break
+
+		# Failed simulations (delay of 1 s or more) are left out of the model
+		valid_ids = [i for i in simulated_ids if 0 < eval_delay_list[i] < 1]
+		not_simulated = np.ones(num_combos, dtype=bool)
+		not_simulated[simulated_ids] = False
+		if len(valid_ids) < 2:
+			# Not enough data for a model, keep spreading combos over the ranges
+			for i in simulated_ids:
+				min_dist = np.minimum(min_dist, np.sum((points - points[i])**2, axis=1))
+			scores = np.where(not_simulated, min_dist, -1)
+		else:
+			predict = _fit_gaussian_process(points[valid_ids], np.log([eval_delay_list[i] for i in valid_ids]))
+			delay_mean, delay_std = predict(points)
+			best_log_cost = min(log_area_cost[i] + delay_opt_weight*math.log(eval_delay_list[i]) for i in valid_ids)
+			scores = _expected_improvement(log_area_cost + delay_opt_weight*delay_mean, delay_opt_weight*delay_std, best_log_cost)
+			scores[~not_simulated] = -1
+			# Expected improvement of log(cost) is the expected relative improvement of the cost
+			if np.max(scores) < SURROGATE_EI_THRESHOLD:
+				print("Expected cost improvement is below " + str(SURROGATE_EI_THRESHOLD*100) + "%, stopping surrogate search")
+				break
+
+		batch = [int(i) for i in np.argsort(-scores)[:num_to_simulate] if scores[i] >= 0]
+
+	print("Surrogate search simulated " + str(len(simulated_ids)) + " of " + str(num_combos) + " transistor sizing combinations")
+	print("")
+
+	return simulated_ids
+
+
+def _pruned_search(fpga_inst, sizable_circuit, opt_type, element_names, sizing_combos, erf_ratios, area_list,
+				   wire_names, wire_rc, area_opt_weight, delay_opt_weight, re_erf, spice_interface, 
+				   is_ram_component, is_cc_component, tfall_trise_list, eval_delay_list):
+	""" 
+		Branch-and-bound search of the sizing combos of search_ranges.
+		The evaluation delay of a combo can't be smaller than the one we get when the circuit being sized
+		has no delay at all (the delays of the other subcircuits don't change), so area^b * min_delay^c
+		is a lower bound of the cost of a combo. Combos are simulated in batches by increasing bound, and
+		we stop as soon as the bound of the next combo is above the cost of the 're_erf'-th best combo
+		simulated so far. The combos that are never simulated can't be among the top 're_erf' combos,
+		so the combos re-ERFed by search_ranges (and the selected combo) are the same as with the grid search.
+		The results are written to 'tfall_trise_list' and 'eval_delay_list' like in _simulate_combos.
+		Returns the indices of the simulated combos.
+	"""
+
+	num_combos = len(sizing_combos)
+	num_kept = max(1, min(re_erf, num_combos))
+
+	# get_eval_delay sets the delay of the subcircuit, so restore it after computing the bound
+	saved_delays = {attr: getattr(sizable_circuit, attr) for attr in ["delay", "trise", "tfall"] if hasattr(sizable_circuit, attr)}
+	min_delay = get_eval_delay(fpga_inst, opt_type, sizable_circuit, 0, 0, 0, is_ram_component, is_cc_component)
+	for attr, value in saved_delays.items():
+		setattr(sizable_circuit, attr, value)
+
+	lower_bounds = [cost_function(area, min_delay, area_opt_weight, delay_opt_weight) for area in area_list]
+	order = sorted(range(num_combos), key=lambda i: (lower_bounds[i], i))
+
+	simulated_ids = []
+	cost_list = []
+	threshold = float("inf")
+	while len(simulated_ids) < num_combos:
+		# 'order' is sorted by bound, so the combos left to simulate are a prefix of the rest of it
+		batch = []
+		for i in order[len(simulated_ids):len(simulated_ids) + PRUNE_BATCH_SIZE]:
+			if lower_bounds[i] > threshold:
+				break
+			batch.append(i)
+		if len(batch) == 0:
+			break
+
+		_simulate_combos(fpga_inst, sizable_circuit, opt_type, element_names, sizing_combos, erf_ratios, 
+						 wire_names, wire_rc, batch, spice_interface, is_ram_component, is_cc_component, 
+						 tfall_trise_list, eval_delay_list)
+		simulated_ids.extend(batch)
+		for i in batch:
+			cost_list.append(cost_function(area_list[i], eval_delay_list[i], area_opt_weight, delay_opt_weight))
+		if len(cost_list) >= num_kept:
+			threshold = sorted(cost_list)[num_kept - 1]
+
+	print("Pruned " + str(num_combos - len(simulated_ids)) + " of " + str(num_combos) + " transistor sizing combinations")
+
+	return simulated_ids
+
+
 def search_ranges(sizing_ranges, fpga_inst, sizable_circuit, opt_type, re_erf, area_opt_weight, 
 				  delay_opt_weight, outer_iter, inner_iter, bunch_num, spice_interface, is_ram_component, is_cc_component):
 	""" 
@@ -1251,129 +1671,52 @@ def search_ranges(sizing_ranges, fpga_inst, sizable_circuit, opt_type, re_erf, a
 	print("Calculating area and wire data for all transistor sizing combinations...")
 	
 	area_list = []
-	wire_rc_list = []
-	eval_delay_list = []
 
-	for combo in sizing_combos:
+	# The areas of the basic components (inverters, ptran, etc.) of all combos are computed at once.
+	# Only the area of the bigger blocks and the wire lengths are left to compute for each combo.
+	comp_areas, comp_widths = fpga_inst.get_component_areas_batch(element_names, sizing_combos, fpga_inst.specs.use_finfet, erf_ratios)
+
+	# Wire lengths of each combo, one column per wire in 'wire_names'
+	wire_names = list(fpga_inst.wire_lengths.keys())
+	wire_lengths = np.empty((len(sizing_combos), len(wire_names)))
+
+	for i, combo in enumerate(sizing_combos):
 		# Update FPGA transistor sizes
 		fpga_inst._update_transistor_sizes(element_names, combo, fpga_inst.specs.use_finfet, erf_ratios)
 		# Calculate area of everything
-		fpga_inst.update_area()
+		fpga_inst.update_area((comp_areas[i], comp_widths[i]))
 		# Get evaluation area
 		area_list.append(get_eval_area(fpga_inst, opt_type, sizable_circuit, is_ram_component, is_cc_component))
 		# Re-calculate wire lengths
 		fpga_inst.update_wires()
-		# Update wire resistance and capacitance
-		fpga_inst.update_wire_rc()
-		wire_rc = fpga_inst.wire_rc_dict
-		wire_rc_list.append(wire_rc)
+		wire_lengths[i] = list(fpga_inst.wire_lengths.values())
 
-	
-	# We have to make a parameter dict for HSPICE
-	current_tran_sizes = {}
-	if not fpga_inst.specs.use_finfet :
-		for tran_name, tran_size in fpga_inst.transistor_sizes.items():
-			current_tran_sizes[tran_name] = 1e-9*tran_size*fpga_inst.specs.min_tran_width
-	else :
-		for tran_name, tran_size in fpga_inst.transistor_sizes.items():
-			current_tran_sizes[tran_name] = tran_size
+	# Update wire resistance and capacitance of all combos. 
+	# Wire layers don't depend on transistor sizes.
+	# wire_rc[combo, wire] holds (R, C) of the wire for that combo
+	wire_layers = [fpga_inst.wire_layers[wire_name] for wire_name in wire_names]
+	wire_rc = fpga_inst.get_wire_rc_batch(wire_lengths, wire_layers)
+	fpga_inst.update_wire_rc()
 
-	# Initialize the parameter dict to all empty lists
-	parameter_dict = {}
-	for tran_name in list(current_tran_sizes.keys()):
-		parameter_dict[tran_name] = []
-	for wire_name in list(wire_rc_list[0].keys()):
-		parameter_dict[wire_name + "_res"] = []
-		parameter_dict[wire_name + "_cap"] = []
-
-	for i in range(len(sizing_combos)):
-		for tran_name, tran_size in current_tran_sizes.items():
-			# We need this temp value to compare agains 'element_names'
-			tmp_tran_name = tran_name.replace("_nmos", "")
-			tmp_tran_name = tmp_tran_name.replace("_pmos", "")
-		   
-			# If this transistor is one of the transistor sizes that we are sweeping,
-			# we have to properly compute the size, if we aren't sweeping it, just add
-			# the current size to the list.
-			if tmp_tran_name in element_names:
-				# We need this id to pick the right data from sizing combo
-				element_id = element_names.index(tmp_tran_name)
-
-				# Let's calculate the size of this transistor
-				if not fpga_inst.specs.use_finfet :
-					tran_size = 1e-9*(sizing_combos[i][element_id]*fpga_inst.specs.min_tran_width)
-				else :
-					tran_size = (sizing_combos[i][element_id])
-
-				# If transistor is an inverter, we need to do some stuff to calc sizes for
-				# both the NMOS and PMOS, if it is anything else (eg. ptran), we can just add 
-				# it directly.
-				if tran_name.startswith("inv_"):
-					if tran_name.endswith("_nmos"):
-						# If the NMOS is bigger than the PMOS
-						if erf_ratios[tmp_tran_name] < 1:
-							nmos_size = tran_size/erf_ratios[tmp_tran_name]
-						# If the PMOS is bigger than the NMOS
-						else:
-							nmos_size = tran_size
-						parameter_dict[tran_name].append(nmos_size)
-					else:
-						# If the NMOS is bigger than the PMOS
-						if erf_ratios[tmp_tran_name] < 1:
-							pmos_size = tran_size
-						# If the PMOS is bigger than the NMOS
-						else:
-							pmos_size = tran_size*erf_ratios[tmp_tran_name]
-						parameter_dict[tran_name].append(pmos_size)
-
-				else: 
-					parameter_dict[tran_name].append(tran_size) 
-			else:
-				parameter_dict[tran_name].append(tran_size)
 	
-		# Now add the wire information for this wire
-		for wire_name, rc_data in wire_rc_list[i].items():
-			parameter_dict[wire_name + "_res"].append(rc_data[0])
-			parameter_dict[wire_name + "_cap"].append(rc_data[1]*1e-15)
-   
-	# Run HSPICE data sweep
-	print(("Running HSPICE for " + str(len(sizing_combos)) + 
-		   " transistor sizing combinations..."))
-	spice_meas = spice_interface.run(sizable_circuit.top_spice_path, parameter_dict)
-
-	# Now we need to create a list of tfall_trise to be compatible with old code
-	tfall_trise_list = []
-	meas_logic_low_voltage = []
-	for i in range(len(sizing_combos)):
-		tfall_str = spice_meas["meas_total_tfall"][i]
-		trise_str = spice_meas["meas_total_trise"][i]
-		if spice_meas["meas_logic_low_voltage"][i] == "failed" :
-			meas_logic_low_voltage.append(1)
-		else :
-			meas_logic_low_voltage.append(float(spice_meas["meas_logic_low_voltage"][i]))
-
-		if tfall_str == "failed":
-			tfall = 1
-		else:
-			tfall = float(tfall_str)
-		if trise_str == "failed":
-			trise = 1
-		else:
-			trise = float(trise_str)
-		tfall_trise_list.append((tfall, trise))
-  
-	# Get delay metric used for evaluation for each transistor sizing combo as well as 
-	# ERF error
-	for i in range(len(tfall_trise_list)):    
-		# Calculate evaluation delay
-		tfall_trise = tfall_trise_list[i]
-
-
-		delay = get_eval_delay(fpga_inst, opt_type, sizable_circuit, tfall_trise[0], tfall_trise[1], meas_logic_low_voltage[i], is_ram_component, is_cc_component)
-
+	# Simulate the sizing combinations. The grid search simulates all of them, the surrogate 
+	# search only the ones its model of the cost expects to be the best.
+	tfall_trise_list = [None]*len(sizing_combos)
+	eval_delay_list = [None]*len(sizing_combos)
+	if fpga_inst.search_mode == "surrogate":
+		simulated_ids = _surrogate_search(fpga_inst, sizable_circuit, opt_type, element_names, sizing_combos, 
+										  erf_ratios, area_list, wire_names, wire_rc, area_opt_weight, delay_opt_weight,
+										  spice_interface, is_ram_component, is_cc_component, tfall_trise_list, eval_delay_list)
+	elif fpga_inst.search_mode == "prune":
+		simulated_ids = _pruned_search(fpga_inst, sizable_circuit, opt_type, element_names, sizing_combos, 
+									   erf_ratios, area_list, wire_names, wire_rc, area_opt_weight, delay_opt_weight, re_erf,
+									   spice_interface, is_ram_component, is_cc_component, tfall_trise_list, eval_delay_list)
+	else:
+		simulated_ids = list(range(len(sizing_combos)))
+		_simulate_combos(fpga_inst, sizable_circuit, opt_type, element_names, sizing_combos, erf_ratios, 
+						 wire_names, wire_rc, simulated_ids, spice_interface, is_ram_component, is_cc_component, 
+						 tfall_trise_list, eval_delay_list)
 
-		eval_delay_list.append(delay)
-		
 	# len(area_list) should be equal to len(delay_list), make sure...
 	assert len(area_list) == len(eval_delay_list)
 	
@@ -1382,7 +1725,7 @@ def search_ranges(sizing_ranges, fpga_inst, sizable_circuit, opt_type, re_erf, a
 	print("Calculating cost for each transistor sizing combinations...")
 	print("")
 	cost_list = []
-	for i in range(len(eval_delay_list)):
+	for i in simulated_ids:
 		area = area_list[i]
 		delay = eval_delay_list[i]
 		cost = cost_function(area, delay, area_opt_weight, delay_opt_weight)
@@ -2148,6 +2491,77 @@ def check_if_done(sizing_results_list, area_results_list, delay_results_list, ar
 
 	
 
+def _get_sizing_plan(fpga_inst, size_hb_interfaces, iteration, quick_mode_dict, sizing_results_list):
+	""" 
+		Returns the subcircuits that size_fpga_transistors sizes in this sizing iteration, in the same order,
+		as (subcircuit, starting_transistor_sizes, is_ram_component, is_cc_component) tuples.
+		Subcircuits that quick mode doesn't resize are left out.
+	"""
+
+	# (subcircuit, quick mode key, is_ram_component, is_cc_component)
+	subcircuits = []
+	for hardblock in fpga_inst.hardblocklist:
+		if hardblock.parameters['num_dedicated_outputs'] > 0:
+			subcircuits.append((hardblock.dedicated, hardblock.dedicated.name, 0, 0))
+		subcircuits.append((hardblock.mux, hardblock.mux.name, 0, 0))
+
+	if size_hb_interfaces == 0.0:
+		subcircuits.append((fpga_inst.sb_mux, fpga_inst.sb_mux.name, 0, 0))
+		subcircuits.append((fpga_inst.cb_mux, fpga_inst.cb_mux.name, 0, 0))
+		subcircuits.append((fpga_inst.logic_cluster.local_mux, fpga_inst.logic_cluster.local_mux.name, 0, 0))
+		subcircuits.append((fpga_inst.logic_cluster.ble.lut, fpga_inst.logic_cluster.ble.lut.name, 0, 0))
+		if fpga_inst.specs.use_fluts:
+			subcircuits.append((fpga_inst.logic_cluster.ble.fmux, fpga_inst.logic_cluster.ble.fmux.name, 0, 0))
+		for input_driver_name, input_driver in fpga_inst.logic_cluster.ble.lut.input_drivers.items():
+			subcircuits.append((input_driver.driver, "input_drivers", 0, 0))
+			subcircuits.append((input_driver.not_driver, "input_drivers", 0, 0))
+		subcircuits.append((fpga_inst.logic_cluster.ble.local_output, fpga_inst.logic_cluster.ble.local_output.name, 0, 0))
+		subcircuits.append((fpga_inst.logic_cluster.ble.general_output, fpga_inst.logic_cluster.ble.general_output.name, 0, 0))
+
+		if fpga_inst.specs.enable_carry_chain == 1:
+			subcircuits.append((fpga_inst.carrychain, fpga_inst.carrychain.name, 0, 1))
+			subcircuits.append((fpga_inst.carrychainperf, fpga_inst.carrychainperf.name, 0, 1))
+			subcircuits.append((fpga_inst.carrychaininter, fpga_inst.carrychaininter.name, 0, 1))
+			if fpga_inst.specs.carry_chain_type == "skip":
+				subcircuits.append((fpga_inst.carrychainand, fpga_inst.carrychainand.name, 0, 1))
+				subcircuits.append((fpga_inst.carrychainskipmux, fpga_inst.carrychainskipmux.name, 0, 1))
+			subcircuits.append((fpga_inst.carrychainmux, fpga_inst.carrychainmux.name, 0, 0))
+
+		if fpga_inst.specs.enable_bram_block == 1:
+			subcircuits.append((fpga_inst.RAM.pgateoutputcrossbar, fpga_inst.RAM.pgateoutputcrossbar.name, 1, 0))
+			subcircuits.append((fpga_inst.RAM.wordlinedriver, fpga_inst.RAM.wordlinedriver.name, 1, 0))
+			if fpga_inst.RAM.memory_technology == "SRAM":
+				subcircuits.append((fpga_inst.RAM.precharge, fpga_inst.RAM.precharge.name, 1, 0))
+			else:
+				subcircuits.append((fpga_inst.RAM.bldischarging, fpga_inst.RAM.bldischarging.name, 1, 0))
+			subcircuits.append((fpga_inst.RAM.rowdecoder_stage3, "rowdecoder", 1, 0))
+			if fpga_inst.RAM.valid_row_dec_size3 == 1:
+				subcircuits.append((fpga_inst.RAM.rowdecoder_stage1_size3, "rowdecoder", 1, 0))
+			if fpga_inst.RAM.valid_row_dec_size2 == 1:
+				subcircuits.append((fpga_inst.RAM.rowdecoder_stage1_size2, "rowdecoder", 1, 0))
+			subcircuits.append((fpga_inst.RAM.rowdecoder_stage0, "rowdecoder", 1, 0))
+			subcircuits.append((fpga_inst.RAM.RAM_local_mux, fpga_inst.RAM.RAM_local_mux.name, 1, 0))
+			subcircuits.append((fpga_inst.RAM.configurabledecoderiii, "confdec", 1, 0))
+			if fpga_inst.RAM.cvalidobj1 == 1:
+				subcircuits.append((fpga_inst.RAM.configurabledecoder3ii, "confdec", 1, 0))
+			if fpga_inst.RAM.cvalidobj2 == 1:
+				subcircuits.append((fpga_inst.RAM.configurabledecoder2ii, "confdec", 1, 0))
+			subcircuits.append((fpga_inst.RAM.configurabledecoderi, "confdec", 1, 0))
+			subcircuits.append((fpga_inst.RAM.columndecoder, fpga_inst.RAM.columndecoder.name, 1, 0))
+
+	plan = []
+	for subcircuit, quick_mode_key, is_ram_component, is_cc_component in subcircuits:
+		if iteration == 1:
+			starting_transistor_sizes = format_transistor_sizes_to_basic_subciruits(subcircuit.initial_transistor_sizes)
+		elif quick_mode_dict.get(quick_mode_key, 0) == 1:
+			starting_transistor_sizes = sizing_results_list[len(sizing_results_list)-1][subcircuit.name]
+		else:
+			continue
+		plan.append((subcircuit, starting_transistor_sizes, is_ram_component, is_cc_component))
+
+	return plan
+
+
 def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 	""" Size FPGA transistors. 
 	
@@ -2158,6 +2572,8 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 					max_iterations   - maximum number of 'FPGA sizing iterations' (see [1])
 					area_opt_weight  - the 'b' in (cost = area^b * delay^c)
 					delay_opt_weight - the 'c' in (cost = area^b * delay^c)
+					parallel_sizing  - max number of subcircuits sized at the same time
+					resume           - resume sizing from the checkpoint of a stopped run
 				spice_interface - an object that is used to run HSPICE and parse its outputs
 		
 		One 'FPGA sizing iteration' means sizing each subcircuits once.
@@ -2186,6 +2602,12 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 	area_opt_weight  = run_options.area_opt_weight 
 	delay_opt_weight = run_options.delay_opt_weight
 	size_hb_interfaces = run_options.size_hb_interfaces
+
+	# The state of sizing is saved after each subcircuit so that a stopped run can be resumed
+	checkpoint = sizing_scheduler.SizingCheckpoint(SIZING_CHECKPOINT_PATH, fpga_inst, run_options)
+
+	# Sizes subcircuits that don't depend on each other at the same time (if parallel_sizing > 1)
+	scheduler = sizing_scheduler.SizingScheduler(size_subcircuit_transistors, run_options.parallel_sizing, checkpoint)
    
 	# Create results folder if it doesn't exist
 	if not os.path.exists("sizing_results"):
@@ -2204,18 +2626,50 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 	area_results_list = []
 	delay_results_list = []
 	quick_mode_dict = {}
+	iteration = 1
+
+	# Restore the state of a stopped run
+	checkpoint_state = None
+	if run_options.resume:
+		checkpoint_state = checkpoint.load()
+		if checkpoint_state is None:
+			print("No sizing checkpoint found, transistor sizing will start from the beginning\n")
+	if checkpoint_state is not None:
+		if set(checkpoint_state["transistor_sizes"]) != set(fpga_inst.transistor_sizes):
+			print("ERROR: The sizing checkpoint (" + SIZING_CHECKPOINT_PATH + ") was made for a different architecture")
+			sys.exit(1)
+		checkpoint_mismatches = checkpoint.get_mismatches()
+		if len(checkpoint_mismatches) > 0:
+			print("ERROR: The sizing checkpoint (" + SIZING_CHECKPOINT_PATH + ") was made with different architecture parameters or run options:")
+			for mismatch in checkpoint_mismatches:
+				print("  " + mismatch)
+			print("Run without --resume to start transistor sizing from the beginning")
+			sys.exit(1)
+		sizing_results_list = checkpoint_state["sizing_results_list"]
+		sizing_results_detailed_list = checkpoint_state["sizing_results_detailed_list"]
+		area_results_list = checkpoint_state["area_results_list"]
+		delay_results_list = checkpoint_state["delay_results_list"]
+		quick_mode_dict = checkpoint_state["quick_mode_dict"]
+		iteration = checkpoint_state["iteration"]
+		fpga_inst.lb_height = checkpoint_state["lb_height"]
+		fpga_inst.transistor_sizes.update(checkpoint_state["transistor_sizes"])
+		print("Resuming transistor sizing from iteration " + str(iteration) + " (" + 
+			  str(len(checkpoint_state["subcircuits"])) + " subcircuits already sized)\n")
+
 	# Keep performing FPGA sizing iterations until algorithm terminates
 	# Two conditions can make it terminate:
 	# 1 - Cost stops improving ('is_done')
 	# 2 - The max number of iterations of this while loop have been performed (max_iterations)
 	is_done = False
-	iteration = 1
 	while not is_done:
 	
 		if iteration > max_iterations:
 			print(("Algorithm is terminating: maximum number of iterations has been " +
 				   "reached (" + str(max_iterations) + ")\n"))
 			break
+
+		checkpoint.start_iteration(fpga_inst, iteration, quick_mode_dict, sizing_results_list, sizing_results_detailed_list,
+								   area_results_list, delay_results_list)
 	
 		print("FPGA TRANSISTOR SIZING ITERATION #" + str(iteration) + "\n")
 
@@ -2239,7 +2693,8 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 
 		fpga_inst.update_wires()
 		fpga_inst.update_wire_rc()
-		#fpga_inst.determine_height()
+		if fpga_inst.floorplan_search:
+			fpga_inst.determine_height()
 		fpga_inst.update_area()
 		fpga_inst.compute_distance()
 		fpga_inst.update_wires()
@@ -2248,6 +2703,9 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 		
 		
 		print("Sizing will begin now.")
+		scheduler.start_iteration(fpga_inst, 
+								  _get_sizing_plan(fpga_inst, size_hb_interfaces, iteration, quick_mode_dict, sizing_results_list),
+								  opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, spice_interface)
 		# Useful for debugging
 		# tmp_area = get_eval_area(fpga_inst, "global", fpga_inst.sb_mux, 0, 0)
 		# tmp_delay = get_current_delay(fpga_inst, 0)
@@ -2280,7 +2738,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 				# Size the transistors of this subcircuit
 				if quick_mode_dict[name] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, hardblock.dedicated, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, hardblock.dedicated, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2296,7 +2754,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 			
 			# Size the transistors of this subcircuit
 			if quick_mode_dict[name] == 1:
-				sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, hardblock.mux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
+				sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, hardblock.mux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
 			else:
 				sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 				sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2322,7 +2780,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 
 			# Size the transistors of this subcircuit
 			if quick_mode_dict[name] == 1:
-				sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.sb_mux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
+				sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.sb_mux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
 			else:
 				sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 				sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]
@@ -2355,7 +2813,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 			# Size the transistors of this subcircuit
 			if quick_mode_dict[name] == 1:
-				sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.cb_mux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
+				sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.cb_mux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
 			else:
 				sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 				sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]
@@ -2389,7 +2847,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 			
 			# Size the transistors of this subcircuit
 			if quick_mode_dict[name] == 1:
-				sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.logic_cluster.local_mux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
+				sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.logic_cluster.local_mux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
 			else:
 				sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 				sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]        
@@ -2425,7 +2883,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 			
 			# Size the transistors of this subcircuit
 			if quick_mode_dict[name] == 1:
-				sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.logic_cluster.ble.lut, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
+				sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.logic_cluster.ble.lut, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
 			else:
 				sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 				sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]      
@@ -2459,7 +2917,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 				# Size the transistors of this subcircuit
 				if quick_mode_dict[name] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.logic_cluster.ble.fmux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.logic_cluster.ble.fmux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]      
@@ -2493,7 +2951,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 				# Size the transistors of this subcircuit
 				if quick_mode_dict["input_drivers"] == 1:
-					sizing_results_dict[input_driver.driver.name], sizing_results_detailed_dict[input_driver.driver.name] = size_subcircuit_transistors(fpga_inst, input_driver.driver, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
+					sizing_results_dict[input_driver.driver.name], sizing_results_detailed_dict[input_driver.driver.name] = scheduler.size_subcircuit_transistors(fpga_inst, input_driver.driver, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
 				else:
 					sizing_results_dict[input_driver.driver.name]= sizing_results_list[len(sizing_results_list)-1][input_driver.driver.name]
 					sizing_results_detailed_dict[input_driver.driver.name] = sizing_results_detailed_list[len(sizing_results_list)-1][input_driver.driver.name]   
@@ -2508,7 +2966,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 				# Size the transistors of this subcircuit
 				if quick_mode_dict["input_drivers"] == 1:
-					sizing_results_dict[input_driver.not_driver.name], sizing_results_detailed_dict[input_driver.not_driver.name] = size_subcircuit_transistors(fpga_inst, input_driver.not_driver, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
+					sizing_results_dict[input_driver.not_driver.name], sizing_results_detailed_dict[input_driver.not_driver.name] = scheduler.size_subcircuit_transistors(fpga_inst, input_driver.not_driver, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
 				else:
 					sizing_results_dict[input_driver.not_driver.name]= sizing_results_list[len(sizing_results_list)-1][input_driver.not_driver.name]
 					sizing_results_detailed_dict[input_driver.not_driver.name] = sizing_results_detailed_list[len(sizing_results_list)-1][input_driver.not_driver.name]      
@@ -2540,7 +2998,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 			
 			# Size the transistors of this subcircuit
 			if quick_mode_dict[name] == 1:
-				sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.logic_cluster.ble.local_output, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
+				sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.logic_cluster.ble.local_output, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
 			else:
 				sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 				sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2572,7 +3030,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 			
 			# Size the transistors of this subcircuit
 			if quick_mode_dict[name] == 1:
-				sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.logic_cluster.ble.general_output, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
+				sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.logic_cluster.ble.general_output, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
 			else:
 				sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 				sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2608,7 +3066,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 				# Size the transistors of this subcircuit
 				if quick_mode_dict[name] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.carrychain, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 1)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.carrychain, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 1)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2643,7 +3101,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 				# Size the transistors of this subcircuit
 				if quick_mode_dict[name] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.carrychainperf, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 1)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.carrychainperf, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 1)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2678,7 +3136,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 				# Size the transistors of this subcircuit
 				if quick_mode_dict[name] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.carrychaininter, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 1)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.carrychaininter, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 1)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2714,7 +3172,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 					
 					# Size the transistors of this subcircuit
 					if quick_mode_dict[name] == 1:
-						sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.carrychainand, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 1)
+						sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.carrychainand, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 1)
 					else:
 						sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 						sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2746,7 +3204,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 					
 					# Size the transistors of this subcircuit
 					if quick_mode_dict[name] == 1:
-						sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.carrychainskipmux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 1)
+						sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.carrychainskipmux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 1)
 					else:
 						sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 						sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2781,7 +3239,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 				# Size the transistors of this subcircuit
 				if quick_mode_dict[name] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.carrychainmux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.carrychainmux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 0, 0)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2820,7 +3278,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 				# Size the transistors of this subcircuit
 				if quick_mode_dict[name] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.pgateoutputcrossbar, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.pgateoutputcrossbar, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2853,7 +3311,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 					
 				# Size the transistors of this subcircuit
 				if quick_mode_dict[name] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.wordlinedriver, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.wordlinedriver, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2888,7 +3346,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 					
 					# Size the transistors of this subcircuit
 					if quick_mode_dict[name] == 1:
-						sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.precharge, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+						sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.precharge, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 					else:
 						sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 						sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2905,7 +3363,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 					
 					# Size the transistors of this subcircuit
 					if quick_mode_dict[name] == 1:
-						sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.bldischarging, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+						sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.bldischarging, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 					else:
 						sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 						sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2938,7 +3396,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 					
 				# Size the transistors of this subcircuit
 				if quick_mode_dict["rowdecoder"] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.rowdecoder_stage3, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.rowdecoder_stage3, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2954,7 +3412,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 					
 					# Size the transistors of this subcircuit
 					if quick_mode_dict["rowdecoder"] == 1:
-						sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.rowdecoder_stage1_size3, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+						sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.rowdecoder_stage1_size3, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 					else:
 						sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 						sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2970,7 +3428,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 					
 					# Size the transistors of this subcircuit
 					if quick_mode_dict["rowdecoder"] == 1:
-						sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.rowdecoder_stage1_size2, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+						sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.rowdecoder_stage1_size2, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 					else:
 						sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 						sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -2985,7 +3443,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 				# Size the transistors of this subcircuit
 				if quick_mode_dict["rowdecoder"] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.rowdecoder_stage0, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.rowdecoder_stage0, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name]   
@@ -3020,7 +3478,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 					#starting_transistor_sizes = sizing_results_list[len(sizing_results_list)-1][name]
 				
 				# Size the transistors of this subcircuit
-				#sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.writedriver, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface)
+				#sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.writedriver, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface)
 
 				############################################
 				## Size memory local mux
@@ -3037,7 +3495,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 				# Size the transistors of this subcircuit
 				if quick_mode_dict[name] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.RAM_local_mux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.RAM_local_mux, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name] 
@@ -3070,7 +3528,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 				# Size the transistors of this subcircuit
 				if quick_mode_dict["confdec"] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.configurabledecoderiii, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.configurabledecoderiii, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name] 
@@ -3087,7 +3545,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 					# Size the transistors of this subcircuit
 					if quick_mode_dict["confdec"] == 1:
-						sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.configurabledecoder3ii, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+						sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.configurabledecoder3ii, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 					else:
 						sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 						sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name] 
@@ -3103,7 +3561,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 					# Size the transistors of this subcircuit
 					if quick_mode_dict["confdec"] == 1:
-						sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.configurabledecoder2ii, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+						sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.configurabledecoder2ii, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 					else:
 						sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 						sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name] 
@@ -3118,7 +3576,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 				
 				# Size the transistors of this subcircuit
 				if quick_mode_dict["confdec"] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.configurabledecoderi, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.configurabledecoderi, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name] 
@@ -3150,7 +3608,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 					starting_transistor_sizes = sizing_results_list[len(sizing_results_list)-1][name]
 				
 				if quick_mode_dict[name] == 1:
-					sizing_results_dict[name], sizing_results_detailed_dict[name] = size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.columndecoder, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
+					sizing_results_dict[name], sizing_results_detailed_dict[name] = scheduler.size_subcircuit_transistors(fpga_inst, fpga_inst.RAM.columndecoder, opt_type, re_erf, area_opt_weight, delay_opt_weight, iteration, starting_transistor_sizes, spice_interface, 1, 0)
 				else:
 					sizing_results_dict[name]= sizing_results_list[len(sizing_results_list)-1][name]
 					sizing_results_detailed_dict[name] = sizing_results_detailed_list[len(sizing_results_list)-1][name] 
@@ -3172,6 +3630,7 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 			## Done sizing, update results lists
 			############################################
 
+		scheduler.end_iteration()
 		print("FPGA transistor sizing iteration complete!\n")
 		
 		sizing_results_list.append(sizing_results_dict.copy())
@@ -3221,6 +3680,8 @@ def size_fpga_transistors(fpga_inst, run_options, spice_interface):
 	if not is_done:
 		final_result_index = len(sizing_results_list) - 1
 
+	scheduler.shutdown()
+	checkpoint.remove()
 
 	# final_result_index are the results we need to use
 	final_transistor_sizes = sizing_results_list[final_result_index]
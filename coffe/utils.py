@@ -6,6 +6,7 @@ import datetime
 
 import re
 import yaml
+import numpy as np
 
 # Constants used for formatting the subcircuit area/delay/power table. 
 # These denote the widths of various columns - first (FIRS), last (LAST) and the rest (MIDL).
@@ -559,6 +560,14 @@ def load_params(filename,run_options):
         'parallel_hardblock_folder': "",
         'condensed_results_folder': "",
         'coffe_repo_path': "~/COFFE",
+        'synth_max_jobs': 1,
+        'pnr_max_jobs': 1,
+        'sta_max_jobs': 1,
+        'prune_flag': False,
+        'prune_area_recovery': 0.1,
+        'prune_delay_recovery': 0.1,
+        'hb_cache_folder': "",
+        'hb_cache_size': 10240.0,
         'hb_run_params': {},
         'ptn_params': {}
     }
@@ -599,6 +608,10 @@ def load_params(filename,run_options):
         'trans_diffusion_length' : -1,
         'model_path': "",
         'model_library': "",
+        'variation_corners': [],
+        'monte_carlo_samples': 0,
+        'monte_carlo_sigma': 0.05,
+        'monte_carlo_seed': 1,
         'metal' : [],
         'row_decoder_bits': 8,
         'col_decoder_bits': 1,
@@ -775,6 +788,16 @@ def load_params(filename,run_options):
             param_dict["fpga_arch_params"]['metal'] = tmp_list
         elif param == 'model_library':
             param_dict["fpga_arch_params"]['model_library'] = str(value)
+        elif param == 'variation_corners':
+            if isinstance(value, str):
+                value = value.split(",")
+            param_dict["fpga_arch_params"]['variation_corners'] = [str(corner).strip() for corner in value]
+        elif param == 'monte_carlo_samples':
+            param_dict["fpga_arch_params"]['monte_carlo_samples'] = int(value)
+        elif param == 'monte_carlo_sigma':
+            param_dict["fpga_arch_params"]['monte_carlo_sigma'] = float(value)
+        elif param == 'monte_carlo_seed':
+            param_dict["fpga_arch_params"]['monte_carlo_seed'] = int(value)
         elif param == 'arch_out_folder':
             param_dict["fpga_arch_params"]['arch_out_folder'] = str(value)
         elif param == 'gen_routing_metal_pitch':
@@ -894,6 +917,16 @@ def load_params(filename,run_options):
                     hb_param["condensed_results_folder"] = os.path.expanduser(str(value))
                 elif param == "coffe_repo_path":
                     hb_param["coffe_repo_path"] = os.path.expanduser(str(value))
+                elif param in ["synth_max_jobs","pnr_max_jobs","sta_max_jobs"]:
+                    hb_param[param] = int(value)
+                elif param == "prune_flag":
+                    hb_param["prune_flag"] = bool(value)
+                elif param in ["prune_area_recovery","prune_delay_recovery"]:
+                    hb_param[param] = float(value)
+                elif param == "hb_cache_folder":
+                    hb_param["hb_cache_folder"] = os.path.expanduser(str(value))
+                elif param == "hb_cache_size":
+                    hb_param["hb_cache_size"] = float(value)
                 #To allow for the legacy way of inputting process specific params I'll keep these in (the only reason for having a seperate file is for understandability)
                 if param == "process_lib_paths":
                     hb_param["process_lib_paths"] = (value)
@@ -987,6 +1020,10 @@ def load_arch_params(filename):
         'trans_diffusion_length' : -1,
         'model_path': "",
         'model_library': "",
+        'variation_corners': [],
+        'monte_carlo_samples': 0,
+        'monte_carlo_sigma': 0.05,
+        'monte_carlo_seed': 1,
         'metal' : [],
         'row_decoder_bits': 8,
         'col_decoder_bits': 1,
@@ -1141,6 +1178,14 @@ def load_arch_params(filename):
             arch_params['model_path'] = os.path.abspath(value)
         elif param == 'model_library':
             arch_params['model_library'] = value
+        elif param == 'variation_corners':
+            arch_params['variation_corners'] = [corner for corner in value.split(',') if corner != ""]
+        elif param == 'monte_carlo_samples':
+            arch_params['monte_carlo_samples'] = int(value)
+        elif param == 'monte_carlo_sigma':
+            arch_params['monte_carlo_sigma'] = float(value)
+        elif param == 'monte_carlo_seed':
+            arch_params['monte_carlo_seed'] = int(value)
         elif param == 'metal':
             value_words = value.split(',')
             r = value_words[0].replace(' ', '')
@@ -1196,7 +1241,7 @@ def check_hard_params(hard_params,run_options):
     checking for unset values
     """
     #These are optional parameters which have been determined to be optional for all run options
-    optional_params = ["process_params_file","mode_signal","condensed_results_folder"]
+    optional_params = ["process_params_file","mode_signal","condensed_results_folder","hb_cache_folder"]
     if(hard_params["partition_flag"] == False):
         optional_params.append("ptn_settings_file")
         #ungrouping regex is required to partition design
@@ -1492,7 +1537,15 @@ def load_hard_params(filename,run_options):
         'parallel_hardblock_folder': "",
         'condensed_results_folder': "",
         'coffe_repo_path': "~/COFFE",
-        'run_settings_file': ""
+        'run_settings_file': "",
+        'synth_max_jobs': 1,
+        'pnr_max_jobs': 1,
+        'sta_max_jobs': 1,
+        'prune_flag': False,
+        'prune_area_recovery': 0.1,
+        'prune_delay_recovery': 0.1,
+        'hb_cache_folder': "",
+        'hb_cache_size': 10240.0
     }
     
 
@@ -1619,6 +1672,16 @@ def load_hard_params(filename,run_options):
             hard_params["condensed_results_folder"] = os.path.expanduser(str(value))
         elif param == "coffe_repo_path":
             hard_params["coffe_repo_path"] = os.path.expanduser(str(value))
+        elif param in ["synth_max_jobs","pnr_max_jobs","sta_max_jobs"]:
+            hard_params[param] = int(value)
+        elif param == "prune_flag":
+            hard_params["prune_flag"] = (value == "True")
+        elif param in ["prune_area_recovery","prune_delay_recovery"]:
+            hard_params[param] = float(value)
+        elif param == "hb_cache_folder":
+            hard_params["hb_cache_folder"] = os.path.expanduser(str(value))
+        elif param == "hb_cache_size":
+            hard_params["hb_cache_size"] = float(value)
 
 
         #To allow for the legacy way of inputting process specific params I'll keep these in (the only reason for having a seperate file is for understandability)
@@ -1835,6 +1898,10 @@ def check_arch_params (arch_params, filename):
         print_error (str(arch_params['trans_diffusion_length']), "trans_diffusion_length", filename)  
     if arch_params['enable_bram_module'] == 1 and arch_params['use_finfet'] == True:
         print_error_not_compatable("finfet", "BRAM")           
+    if arch_params['monte_carlo_samples'] < 0 :
+        print_error (str(arch_params['monte_carlo_samples']), "monte_carlo_samples", filename)
+    if arch_params['monte_carlo_sigma'] < 0 :
+        print_error (str(arch_params['monte_carlo_sigma']), "monte_carlo_sigma", filename)
     # if arch_params['use_finfet'] == True and arch_params['use_fluts'] == True:
     #    print_error_not_compatable("finfet", "flut")      
     # if arch_params['coffe_repo_path'].split("/")[-1] != "COFFE" or os.path.isdir(arch_params['coffe_repo_path']):
@@ -1876,9 +1943,18 @@ def print_run_options(args, report_file_path):
     
     
     print_and_write(report_file, "  Number of top combos to re-ERF: " + str(args.re_erf))
+    print_and_write(report_file, "  Transistor sizing search: " + args.search_mode)
+    print_and_write(report_file, "  Screening simulation fidelity: " + args.screening_fidelity)
+    print_and_write(report_file, "  Tile height search: " + str(args.floorplan))
+    print_and_write(report_file, "  Number of subcircuits sized at the same time: " + str(args.parallel_sizing))
+    print_and_write(report_file, "  Resume sizing from checkpoint: " + str(args.resume))
     print_and_write(report_file, "  Area optimization weight: " + str(args.area_opt_weight))
     print_and_write(report_file, "  Delay optimization weight: " + str(args.delay_opt_weight))
     print_and_write(report_file, "  Maximum number of sizing iterations: " + str(args.max_iterations))
+    print_and_write(report_file, "  Circuit simulator: " + args.spice_backend)
+    print_and_write(report_file, "  Number of concurrent HSPICE jobs: " + str(args.num_spice_jobs))
+    if args.spice_cache != "":
+        print_and_write(report_file, "  HSPICE results cache: " + args.spice_cache + " (" + str(args.spice_cache_size) + " MB)")
     print_and_write(report_file, "")
     print_and_write(report_file, "")
 
@@ -1931,6 +2007,12 @@ def print_architecture_params(arch_params_dict, report_file_path):
     print_and_write(report_file, "  sram_cell_area = " + str( arch_params_dict['sram_cell_area']) )
     print_and_write(report_file, "  model_path = " + str( arch_params_dict['model_path']) )
     print_and_write(report_file, "  model_library = " + str( arch_params_dict['model_library']) )
+    if len(arch_params_dict['variation_corners']) > 0 :
+        print_and_write(report_file, "  variation_corners = " + str( arch_params_dict['variation_corners']) )
+    if arch_params_dict['monte_carlo_samples'] > 0 :
+        print_and_write(report_file, "  monte_carlo_samples = " + str( arch_params_dict['monte_carlo_samples']) )
+        print_and_write(report_file, "  monte_carlo_sigma = " + str( arch_params_dict['monte_carlo_sigma']) )
+        print_and_write(report_file, "  monte_carlo_seed = " + str( arch_params_dict['monte_carlo_seed']) )
     print_and_write(report_file, "  metal = " + str( arch_params_dict['metal']) )
     print_and_write(report_file, "")
     print_and_write(report_file, "")
@@ -2032,7 +2114,7 @@ def print_and_write(file, string):
     file.write(string + "\n")
 
 
-def create_output_dir(arch_file_name, arch_out_folder):
+def create_output_dir(arch_file_name, arch_out_folder, resume=False):
     """
     This function creates the architecture folder and returns its name.
     It also deletes the content of the folder in case it's already created
@@ -2040,6 +2122,7 @@ def create_output_dir(arch_file_name, arch_out_folder):
     If arch_out_folder is specified in the input params file, then that is
     used as the architecture folder, otherwise the folder containing the arch
     params file is used.
+    If 'resume' is set (--resume), the sizing results of the stopped run are kept.
     """
     
     if arch_out_folder == "" or arch_out_folder == "None":
@@ -2057,11 +2140,75 @@ def create_output_dir(arch_file_name, arch_out_folder):
         # more than once.
         dir_contents = os.listdir(arch_folder)
         for content in dir_contents:
+            if resume and content == "sizing_results":
+                continue
             if os.path.isdir(arch_folder + "/" + content):
                 shutil.rmtree(arch_folder + "/" + content)
 
     return arch_folder  
 
+def _get_variation_stats(delays):
+    """ Returns the mean, sigma, min and max (in ps, as strings) of the valid values of 'delays', 
+        followed by the number of failed values. """
+
+    valid_delays = delays[~np.isnan(delays)]
+    if len(valid_delays) == 0:
+        return ["failed"]*4 + [str(len(delays))]
+
+    stats = [np.mean(valid_delays), np.std(valid_delays), np.min(valid_delays), np.max(valid_delays)]
+
+    return [str(round(stat/1e-12,4)) for stat in stats] + [str(len(delays) - len(valid_delays))]
+
+
+def print_variation_delays(report_file, fpga_inst):
+    """ Print the delay distribution of each subcircuit and of the representative critical path 
+        for each device model (nominal and process corners) of the last update_delays run with variation. 
+        The statistics are over the Monte Carlo samples, or the nominal sizes if there are none. """
+
+    print_and_write(report_file, "  PROCESS VARIATION DELAYS")
+    print_and_write(report_file, "  ------------------------")
+
+    num_samples = fpga_inst.variation_crit_path.shape[1] - 1
+    print_and_write(report_file, "  Device models: " + ", ".join(fpga_inst.variation_models) + " (" + fpga_inst.variation_models[0] + " is nominal)")
+    print_and_write(report_file, "  Monte Carlo samples per model: " + str(num_samples))
+    print_and_write(report_file, "")
+
+    # Print the header
+    header = "  Subcircuit".ljust(42) + "Model".ljust(LAST_COL_WIDTH)
+    for column_name in ["Nominal (ps)", "Mean (ps)", "Sigma (ps)", "Min (ps)", "Max (ps)", "Failed"]:
+        header += column_name.ljust(MIDL_COL_WIDTH)
+    print_and_write(report_file, header)
+
+    def get_row(name, model_name, delays):
+        row = "  " + name.ljust(40) + model_name.ljust(LAST_COL_WIDTH)
+        nominal = "failed" if np.isnan(delays[0]) else str(round(delays[0]/1e-12,4))
+        samples = delays[1:] if len(delays) > 1 else delays
+        for value in [nominal] + _get_variation_stats(samples):
+            row += value.ljust(MIDL_COL_WIDTH)
+        return row
+
+    for name in sorted(fpga_inst.variation_delays):
+        for model_index, model_name in enumerate(fpga_inst.variation_models):
+            print_and_write(report_file, get_row(name, model_name, fpga_inst.variation_delays[name][model_index]))
+    print_and_write(report_file, "")
+
+    # The representative critical path and its worst corner
+    for model_index, model_name in enumerate(fpga_inst.variation_models):
+        print_and_write(report_file, get_row("Representative Critical Path", model_name, fpga_inst.variation_crit_path[model_index]))
+    nominal_crit_paths = fpga_inst.variation_crit_path[:, 0]
+    if np.all(np.isnan(nominal_crit_paths)):
+        print_and_write(report_file, "  Worst corner: none (all the critical path simulations failed)")
+    else:
+        worst_index = int(np.nanargmax(nominal_crit_paths))
+        worst_crit_path = fpga_inst.variation_crit_path[worst_index]
+        print_and_write(report_file, "  Worst corner: " + fpga_inst.variation_models[worst_index] + ", critical path " + 
+                        str(round(nominal_crit_paths[worst_index]/1e-12,4)) + " ps (" + 
+                        str(round(nominal_crit_paths[worst_index]/nominal_crit_paths[0],4)) + "x nominal)")
+        if num_samples > 0 and not np.all(np.isnan(worst_crit_path[1:])):
+            print_and_write(report_file, "  Slowest Monte Carlo sample at the worst corner: " + str(round(np.nanmax(worst_crit_path[1:])/1e-12,4)) + " ps")
+    print_and_write(report_file, "")
+
+
 def print_summary(arch_folder, fpga_inst, start_time):
 
     report_file = open(arch_folder + "/report.txt", 'a')
@@ -2087,6 +2234,10 @@ def print_summary(arch_folder, fpga_inst, start_time):
     
     # Print VPR areas (to be used to make architecture file)
     print_vpr_areas(report_file, fpga_inst)
+
+    # Print delays across process corners and Monte Carlo samples (if update_delays was run with variation)
+    if fpga_inst.variation_delays is not None:
+        print_variation_delays(report_file, fpga_inst)
           
     # Print area and delay summary
     final_cost = fpga_inst.area_dict["tile"]*fpga_inst.delay_dict["rep_crit_path"]
@@ -2097,6 +2248,8 @@ def print_summary(arch_folder, fpga_inst, start_time):
     print_and_write(report_file, "  Representative Critical Path Delay   " + str(round(fpga_inst.delay_dict["rep_crit_path"]*1e12,2)) + " ps")
     print_and_write(report_file, "  Cost (area^" + str(fpga_inst.area_opt_weight) + " x delay^" + str(fpga_inst.delay_opt_weight) + ")              " 
            + str(round(final_cost,5)))
+    print_and_write(report_file, "  HSPICE simulations                   " + str(fpga_inst.spice_interface.get_num_simulations_performed()) 
+           + " (" + fpga_inst.search_mode + " search)")
     
     print_and_write(report_file, "")
     print_and_write(report_file, "|--------------------------------------------------------------------------------------------------|")
@@ -2110,6 +2263,9 @@ def print_summary(arch_folder, fpga_inst, start_time):
     total_seconds_elapsed = int(total_time_elapsed - 3600*total_hours_elapsed - 60*total_minutes_elapsed)
     
     print_and_write(report_file, "Number of HSPICE simulations performed: " + str(fpga_inst.spice_interface.get_num_simulations_performed()))
+    if fpga_inst.spice_interface.cache is not None:
+        print_and_write(report_file, "HSPICE results cache hits: " + str(fpga_inst.spice_interface.cache.hits))
+        print_and_write(report_file, "HSPICE results cache misses: " + str(fpga_inst.spice_interface.cache.misses))
     print_and_write(report_file, "Total time elapsed: " + str(total_hours_elapsed) + " hours " + str(total_minutes_elapsed) + " minutes " + str(total_seconds_elapsed) + " seconds\n") 
     
     report_file.write("\n")
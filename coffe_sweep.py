@@ -0,0 +1,15 @@
+###############################################################
+### COFFE ARCHITECTURE SWEEP
+###############################################################
+# Runs COFFE for every point of a grid of architecture parameters
+# on top of a base architecture file, e.g.:
+#
+#   python coffe_sweep.py input_files/bulk_example.txt -sg N=8,10 -sg K=4,6 -sd sweep_out -i 2
+#
+# See coffe/arch_sweep.py for the options and the results table.
+###############################################################
+
+import coffe.arch_sweep as arch_sweep
+
+if __name__ == "__main__":
+    arch_sweep.main()
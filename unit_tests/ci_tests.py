@@ -5,6 +5,9 @@ import shlex
 
 import yaml
 
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+import test_flow
+
 
 def run_bash_cmd(cmd_str):
   """
@@ -38,7 +41,7 @@ def run_shell_cmd(cmd_str):
     return cmd_stdout, cmd_stderr
 
 ### CUSTOM FLOW TESTS ###
-def run_custom_flow(in_config_fpath, mode="quick"):
+def run_custom_flow(in_config_fpath, mode="quick", spice_backend=None):
     ## init run options ##
     run_opts = {}
     if mode == "quick":
@@ -50,11 +53,27 @@ def run_custom_flow(in_config_fpath, mode="quick"):
     log_out = os.path.join(unit_test_home,f"{config_name}.log")
     print(f"Running custom flow with input config: {in_config_fpath} ...")
     iters = run_opts["iters"]
-    coffe_cmd = f"python3 coffe.py -i {iters} {in_config_fpath} | tee {log_out}"
+    backend_opt = f"-b {spice_backend} " if spice_backend is not None else ""
+    coffe_cmd = f"python3 coffe.py {backend_opt}-i {iters} {in_config_fpath} | tee {log_out}"
     run_bash_cmd(coffe_cmd)
     return log_out
 
 
+def compare_custom_flow(in_config_fpath):
+    """
+    Compares the report of a quick analytic run of in_config_fpath with the golden results of test_flow.py
+    Returns True if they match
+    """
+    config_name = os.path.splitext(os.path.split(in_config_fpath)[-1])[0]
+    with open(in_config_fpath) as fd:
+        arch_out_folder = yaml.safe_load(fd)["fpga_arch_params"]["arch_out_folder"]
+    results = test_flow.parse_report(os.path.join(os.path.expanduser(arch_out_folder),"report.txt"))
+    golden_results = test_flow.load_golden_results().get(config_name,{})
+    matches = all(results.get(result_name) == golden_results.get(result_name) for result_name in test_flow.result_regexes)
+    print(f"{config_name}: {results} {'matches' if matches else 'does not match'} the golden results {golden_results}")
+    return matches
+
+
 ### STDCELL FLOW TESTS ###
 def run_stdcell_flow(in_config_fpath):
     ## init run options ##
@@ -83,6 +102,7 @@ def main():
                     default='~/COFFE',
                     help='Top level of your COFFE installation')
     parser.add_argument('-o', '--test_opts', type=str, choices=["custom", "stdcell", "all"], default="custom", help="choose test type")
+    parser.add_argument('-b', '--spice_backend', type=str, default=None, help="SPICE backend of the custom flow runs (see coffe.py -b), with 'analytic' the results are compared with the golden results of test_flow.py")
     args = parser.parse_args()
 
     # Get paths needed for script
@@ -103,20 +123,29 @@ def main():
     # List of Standard Cell flow tests
     stdcell_flow_input_fpaths = [os.path.join(stdcell_flow_inputs_path,f) for f in os.listdir(stdcell_flow_inputs_path) if f.endswith(".yaml")]
 
+    # Custom flow runs compared with archived results
+    compared_fpaths = []
     if args.test_opts == "custom":
         for custom_flow_input_fpath in custom_flow_input_fpaths:
-            coffe_log = run_custom_flow(custom_flow_input_fpath)
+            coffe_log = run_custom_flow(custom_flow_input_fpath, spice_backend=args.spice_backend)
+            compared_fpaths.append(custom_flow_input_fpath)
             break
     elif args.test_opts == "stdcell":
         for stdcell_flow_input_fpath in stdcell_flow_input_fpaths:
             coffe_log = run_stdcell_flow(stdcell_flow_input_fpath)
     elif args.test_opts == "all":
         for custom_flow_input_fpath in custom_flow_input_fpaths:
-            coffe_log = run_custom_flow(custom_flow_input_fpath)
+            coffe_log = run_custom_flow(custom_flow_input_fpath, spice_backend=args.spice_backend)
+            compared_fpaths.append(custom_flow_input_fpath)
         for stdcell_flow_input_fpath in stdcell_flow_input_fpaths:
             coffe_log = run_stdcell_flow(stdcell_flow_input_fpath)
 
-    # TODO compare with archived results
+    # Only the analytic backend has golden results (see test_flow.py), other backends are compared by hand
+    # TODO compare the other backends with archived results
+    if args.spice_backend == "analytic":
+        mismatches = [fpath for fpath in compared_fpaths if not compare_custom_flow(fpath)]
+        if len(mismatches) > 0:
+            sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+Helpers shared by the unit tests (test_*.py). They build FPGA objects from the architecture files of
+input_files/custom_flow and simulate them with the analytic backend of spice.py, so the tests don't
+need HSPICE.
+"""
+import os,sys
+import copy
+import math
+import tempfile
+
+unit_test_home = os.path.dirname(os.path.abspath(__file__))
+coffe_home = os.path.dirname(unit_test_home)
+sys.path.insert(0,coffe_home)
+from coffe import fpga
+from coffe import fpga_flow
+from coffe import utils
+
+custom_flow_inputs_path = os.path.join(unit_test_home,"input_files","custom_flow")
+
+
+def get_arch_path(arch_name):
+  """ Returns the path of the architecture file input_files/custom_flow/<arch_name>.yaml """
+  return os.path.join(custom_flow_inputs_path,arch_name + ".yaml")
+
+
+def parse_coffe_args(arch_path, coffe_options=()):
+  """ Returns the COFFE command line options 'coffe_options' for 'arch_path', with the analytic backend. """
+  return fpga_flow.get_arg_parser().parse_args(["-b","analytic"] + list(coffe_options) + [arch_path])
+
+
+def load_arch_params(arch_path, args, out_dir):
+  """ Loads the architecture file at 'arch_path' with its output folder moved to 'out_dir'. """
+  coffe_params = utils.load_params(arch_path,args)
+  coffe_params["fpga_arch_params"]["arch_out_folder"] = out_dir
+  return coffe_params
+
+
+def build_fpga(arch_name, out_dir, coffe_options=()):
+  """
+  Builds the FPGA of input_files/custom_flow/<arch_name>.yaml in 'out_dir' and updates its area, wires
+  and delays like transistor sizing does before its first iteration. The current directory is
+  left in 'out_dir' (the SPICE file paths of the FPGA are relative to it).
+  Returns (fpga_inst, spice_interface).
+  """
+  arch_path = get_arch_path(arch_name)
+  args = parse_coffe_args(arch_path,coffe_options)
+  coffe_params = load_arch_params(arch_path,args,out_dir)
+  arch_folder = utils.create_output_dir(arch_path,out_dir)
+  spice_interface = fpga_flow.create_spice_interface(args)
+  fpga_inst = fpga.FPGA(coffe_params,args,spice_interface)
+
+  os.chdir(arch_folder)
+  fpga_inst.generate(True,0)
+  fpga_inst.update_area()
+  fpga_inst.lb_height = math.sqrt(fpga_inst.area_dict["tile"])
+  fpga_inst.update_area()
+  fpga_inst.compute_distance()
+  fpga_inst.update_wires()
+  fpga_inst.update_wire_rc()
+  fpga_inst.update_delays(spice_interface)
+
+  return fpga_inst, spice_interface
+
+
+def copy_fpga(fpga_inst, spice_interface):
+  """ Returns a deep copy of 'fpga_inst' that shares its SPICE interfaces (like FPGA._evaluate_heights). """
+  memo = {id(fpga_inst.spice_interface): fpga_inst.spice_interface, id(spice_interface): spice_interface}
+  return copy.deepcopy(fpga_inst,memo)
+
+
+def make_out_dir(test_name):
+  """ Returns an empty output directory for 'test_name' in the temporary directory. """
+  return tempfile.mkdtemp(prefix="coffe_" + test_name + "_")
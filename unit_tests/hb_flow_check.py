@@ -0,0 +1,390 @@
+"""
+Checks the hardblock (standard cell) flow without the ASIC tools: the flow runs against the stand-in
+dc_shell-t, pt_shell and innovus scripts of hb_fake_tools, which write canned reports and log when each
+of their runs starts and ends. From that log and the flow outputs this checks:
+    - the stand-in tools print no errors (e.g. about an output file parsed from a script)
+    - serial flow: synthesis -> P&R -> STA order of every combination, synth/pnr/sta_max_jobs and the
+      contents of <top_level>_flow_results.csv
+    - pruning: pruned combinations could not beat the best cost and their P&R isn't run
+    - artifact cache: a second run restores synthesis and P&R from hb_cache_folder with the same results
+    - parallel flow: stage order of every combination and mp_num_cores
+    - parallel results parsing: only new or changed reports are parsed again
+
+Usage: python3 unit_tests/hb_flow_check.py [-o <output dir>]
+Exits with status 1 if any check fails.
+"""
+import argparse
+import os,sys
+import csv
+import io
+import shutil
+import tempfile
+import contextlib
+
+unit_test_home = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0,os.path.dirname(unit_test_home))
+from coffe import utils
+from coffe import hardblock_functions
+
+fake_tools_path = os.path.join(unit_test_home,"hb_fake_tools")
+
+# Parameter sweep of the checked flows, the stand-in tools derive the delay from the period and the area from the utilization
+clock_periods = [1.0, 2.0]
+core_utilizations = [0.5, 0.8]
+# Values written by the stand-in tools
+fake_synth_area = 900.0
+fake_setup_time = 0.05
+fake_power = 0.0015
+
+hb_settings_lines = [
+    "design_language=verilog",
+    "delay_cost_exp=1.0",
+    "area_cost_exp=1.0",
+    "clock_pin_name=clk",
+    "top_level=top",
+    "show_warnings=True",
+    "synthesis_only=False",
+    "read_saif_file=False",
+    "static_probability=0.5",
+    "toggle_rate=25",
+    "generate_activity_file=False",
+    "pnr_tool=innovus",
+    "map_file=streamOut.map",
+    "tilehi_tielo_cells_between_power_gnd=True",
+    "power_ring_width=1.8",
+    "power_ring_spacing=1.8",
+    "height_to_width_ratio=4.0",
+    "space_around_core=10",
+    "process_lib_paths=\"/lib\"",
+    "target_libraries=\"a.db\"",
+    "lef_files=\"a.lef\"",
+    "best_case_libs=\"a.lib\"",
+    "standard_libs=\"a.lib\"",
+    "worst_case_libs=\"a.lib\"",
+    "primetime_libs=\"a.db\"",
+    "core_site_name=core",
+    "inv_footprint=inv",
+    "buf_footprint=buf",
+    "delay_footprint=dly",
+    "filler_cell_names=[\"FILL\"]",
+    "metal_layer_names=[\"M1\",\"M2\",\"M3\",\"M4\"]",
+    "power_ring_metal_layer_names=[\"M1\",\"M2\",\"M3\",\"M4\"]",
+    "metal_layers=2",
+    "gnd_net=VSS",
+    "gnd_pin=VSS",
+    "pwr_net=VDD",
+    "pwr_pin=VDD",
+    "wire_selection=WireAreaLowkCon",
+    "process_size=65",
+    "name=hard_block",
+    "num_gen_inputs=288",
+    "crossbar_population=0.5",
+    "height=1",
+    "num_gen_outputs=288",
+    "num_dedicated_outputs=0",
+    "soft_logic_per_block=0.1",
+    "area_scale_factor=0.12",
+    "freq_scale_factor=1.35",
+    "power_scale_factor=0.3",
+    "input_usage=0.8",
+    "num_crossbars=1",
+    "crossbar_modelling=optimistic",
+]
+
+failures = []
+
+def check(condition,msg):
+    """
+    Prints the result of one check, failed checks are collected in failures
+    """
+    if condition:
+        print("Passed: %s" % (msg))
+    else:
+        print("**FAIL: %s" % (msg))
+        failures.append(msg)
+
+
+def load_flow_settings(run_dir,settings):
+    """
+    Writes a hardblock settings file with the sweep parameters and 'settings' ({param: value}) to run_dir and loads it
+    The design is shared by all the checked flows, as its path is part of the synthesis cache key
+    """
+    design_dir = os.path.join(os.path.dirname(run_dir),"rtl")
+    os.makedirs(design_dir,exist_ok=True)
+    with open(os.path.join(design_dir,"top.v"),"w") as fd:
+        fd.write("module top(input clk); endmodule\n")
+    lines = hb_settings_lines + ["design_folder=" + design_dir]
+    lines += ["clock_period=" + str(period) for period in clock_periods]
+    lines += ["core_utilization=" + str(util) for util in core_utilizations]
+    for folder_param, folder in [("synth_folder","synth"),("pr_folder","pr"),("primetime_folder","pt")]:
+        lines.append(folder_param + "=" + os.path.join(run_dir,folder))
+    lines += [param + "=" + str(value) for param, value in settings.items()]
+    settings_fpath = os.path.join(run_dir,"hb_settings.txt")
+    with open(settings_fpath,"w") as fd:
+        fd.write("\n".join(lines) + "\n")
+    run_options = argparse.Namespace(parallel_hb_flow=False, parse_pll_hb_flow=False, gen_hb_scripts=False)
+    return utils.load_hard_params(settings_fpath,run_options)
+
+
+def read_tool_runs(log_fpath):
+    """
+    Returns the runs of the stand-in tools logged to log_fpath as a list of {"tool", "dir", "start", "end"}
+    """
+    runs = []
+    open_runs = {}
+    if not os.path.isfile(log_fpath):
+        return runs
+    with open(log_fpath) as fd:
+        for line in fd:
+            time_str, event, tool, run_dir = line.split()
+            if event == "start":
+                run = {"tool": tool, "dir": run_dir, "start": float(time_str), "end": None}
+                runs.append(run)
+                open_runs.setdefault((tool,run_dir),[]).append(run)
+            else:
+                open_runs[(tool,run_dir)].pop(0)["end"] = float(time_str)
+    return runs
+
+
+def set_tool_logs(run_dir):
+    """
+    Sets the files the stand-in tools log their runs and errors to, in run_dir
+    """
+    os.environ["HB_FAKE_TOOLS_LOG"] = os.path.join(run_dir,"fake_tools.log")
+    os.environ["HB_FAKE_TOOLS_STDERR"] = os.path.join(run_dir,"fake_tools.stderr")
+
+
+def check_tool_errors():
+    """
+    Checks that the stand-in tools of the last flow didn't print any error, e.g. about the files they were asked to write
+    """
+    stderr_fpath = os.environ["HB_FAKE_TOOLS_STDERR"]
+    errors = ""
+    if os.path.isfile(stderr_fpath):
+        with open(stderr_fpath) as fd:
+            errors = fd.read()
+    check(errors == "","the stand-in tools run without errors" + ("" if errors == "" else " (see %s)" % (stderr_fpath)))
+
+
+def get_max_concurrent_runs(runs):
+    """
+    Returns the highest number of runs that were running at the same time
+    """
+    events = sorted([(run["start"],1) for run in runs] + [(run["end"],-1) for run in runs])
+    max_running = 0
+    running = 0
+    for event_time, change in events:
+        running += change
+        max_running = max(max_running,running)
+    return max_running
+
+
+def check_stage_order(runs,prev_runs,stage,prev_stage):
+    """
+    Checks that each run starts after the end of the run of the previous stage it was generated from
+    The parameter directory of a run is the one of the previous stage run, or starts with it followed by the parameters of its stage
+    """
+    ordered = True
+    for run in runs:
+        param_dir = get_param_dir(run["dir"])
+        deps = [prev_run for prev_run in prev_runs if param_dir == get_param_dir(prev_run["dir"]) or param_dir.startswith(get_param_dir(prev_run["dir"]) + "_")]
+        if len(deps) == 0:
+            ordered = False
+            print("no %s run for %s run %s" % (prev_stage,stage,run["dir"]))
+        for prev_run in deps:
+            if prev_run["end"] > run["start"]:
+                ordered = False
+                print("%s run %s started before %s run %s ended" % (stage,run["dir"],prev_stage,prev_run["dir"]))
+    check(ordered,"every %s run starts after its %s run ended" % (stage,prev_stage))
+
+
+def get_param_dir(run_dir):
+    """
+    Returns the name of the parameter directory of a run, the parallel flow runs the tools in <param dir>/work
+    """
+    if os.path.basename(run_dir) == "work":
+        run_dir = os.path.dirname(run_dir)
+    return os.path.basename(run_dir)
+
+
+def get_stage_runs(runs,stage_path):
+    return [run for run in runs if run["dir"].startswith(stage_path + os.sep)]
+
+
+def read_flow_results(run_dir):
+    with open(os.path.join(run_dir,"top_flow_results.csv")) as fd:
+        return list(csv.DictReader(fd))
+
+
+def run_serial_flow(run_dir,settings):
+    """
+    Runs the serial hardblock flow in run_dir and returns its best result, the flow settings and the runs of the stand-in tools
+    """
+    shutil.rmtree(run_dir,ignore_errors=True)
+    os.makedirs(run_dir)
+    flow_settings = load_flow_settings(run_dir,settings)
+    set_tool_logs(run_dir)
+    pre_func_dir = os.getcwd()
+    os.chdir(run_dir)
+    try:
+        result = hardblock_functions.hardblock_flow(flow_settings)
+    finally:
+        os.chdir(pre_func_dir)
+    check_tool_errors()
+    return result, flow_settings, read_tool_runs(os.environ["HB_FAKE_TOOLS_LOG"])
+
+
+def check_serial_flow(out_dir):
+    print("\n### Serial flow ###")
+    cache_dir = os.path.join(out_dir,"hb_cache")
+    shutil.rmtree(cache_dir,ignore_errors=True)
+    tool_limits = {"synth": 2, "pnr": 1, "sta": 2}
+    settings = {"synth_max_jobs": tool_limits["synth"], "pnr_max_jobs": tool_limits["pnr"], "sta_max_jobs": tool_limits["sta"], "hb_cache_folder": cache_dir}
+    run_dir = os.path.join(out_dir,"serial")
+    result, flow_settings, runs = run_serial_flow(run_dir,settings)
+    stage_runs = {}
+    for stage, folder in [("synth","synth"),("pnr","pr"),("sta","pt")]:
+        stage_runs[stage] = get_stage_runs(runs,os.path.join(run_dir,folder))
+        max_running = get_max_concurrent_runs(stage_runs[stage])
+        check(max_running <= tool_limits[stage],"at most %d %s runs at once (%d)" % (tool_limits[stage],stage,max_running))
+    check(len(stage_runs["synth"]) == len(clock_periods),"one synthesis run per clock period")
+    check(len(stage_runs["pnr"]) == len(clock_periods)*len(core_utilizations),"one P&R run per clock period and utilization")
+    check_stage_order(stage_runs["pnr"],stage_runs["synth"],"pnr","synth")
+    check_stage_order(stage_runs["sta"],stage_runs["pnr"],"sta","pnr")
+
+    rows = read_flow_results(run_dir)
+    check(len(rows) == len(stage_runs["sta"]),"one flow results row per STA run")
+    rows_ok = True
+    for row in rows:
+        delay = float(row["clock_period"]) + fake_setup_time
+        area = 1000/float(row["core_utilization"])
+        expected = {"synth_area": fake_synth_area, "synth_delay": delay, "synth_power": fake_power, "area": area, "delay": delay, "power": fake_power, "cost": area*delay}
+        for column, value in expected.items():
+            if abs(float(row[column]) - value) > 1e-9*value:
+                rows_ok = False
+                print("%s of %s is %s, expected %s" % (column,row,row[column],value))
+        rows_ok = rows_ok and row["pruned"] == "False"
+    check(rows_ok,"flow results match the reports of the stand-in tools")
+    best_row = min(rows,key=lambda row: float(row["cost"]))
+    check([float(best_row[column]) for column in ["area","delay","power"]] == list(result),"the flow returns the lowest cost combination")
+    return run_dir, settings
+
+
+def check_pruned_flow(out_dir):
+    print("\n### Pruning ###")
+    #on a single core the combinations run one after the other, the first clock period sets the best cost before the second is placed and routed
+    settings = {"prune_flag": True, "mp_num_cores": 1}
+    run_dir = os.path.join(out_dir,"pruned")
+    result, flow_settings, runs = run_serial_flow(run_dir,settings)
+    rows = read_flow_results(run_dir)
+    done_rows = [row for row in rows if row["pruned"] == "False"]
+    pruned_rows = [row for row in rows if row["pruned"] == "True"]
+    best_cost = min([float(row["cost"]) for row in done_rows])
+    check(len(pruned_rows) > 0,"some combinations are pruned (%d of %d)" % (len(pruned_rows),len(rows)))
+    check(all([float(row["cost_bound"]) > best_cost for row in pruned_rows]),"pruned combinations can't beat the best cost")
+    pnr_runs = get_stage_runs(runs,os.path.join(run_dir,"pr"))
+    done_pnr_dirs = set([(row["clock_period"],row["core_utilization"]) for row in done_rows])
+    check(len(pnr_runs) == len(done_pnr_dirs),"P&R only runs for combinations which aren't pruned")
+
+
+def check_cached_flow(out_dir,serial_run_dir,settings):
+    print("\n### Artifact cache ###")
+    run_dir = os.path.join(out_dir,"cached")
+    result, flow_settings, runs = run_serial_flow(run_dir,settings)
+    check(len(get_stage_runs(runs,os.path.join(run_dir,"synth"))) == 0,"synthesis is restored from the cache")
+    check(len(get_stage_runs(runs,os.path.join(run_dir,"pr"))) == 0,"P&R is restored from the cache")
+    check(read_flow_results(run_dir) == read_flow_results(serial_run_dir),"cached runs give the same flow results")
+
+
+def check_parallel_flow(out_dir):
+    print("\n### Parallel flow ###")
+    num_cores = 2
+    run_dir = os.path.join(out_dir,"parallel")
+    shutil.rmtree(run_dir,ignore_errors=True)
+    os.makedirs(run_dir)
+    flow_settings = load_flow_settings(run_dir,{})
+    flow_settings["parallel_hardblock_folder"] = run_dir
+    flow_settings["condensed_results_folder"] = os.path.join(run_dir,"condensed_results")
+    flow_settings["mp_num_cores"] = num_cores
+    flow_settings["hb_run_params"] = {"param_filters": {}, "synth": {"run_flag": True}, "pnr": {"run_flag": True, "override_outputs": False}, "sta": {"run_flag": True}}
+    flow_settings["input_param_options"] = {}
+    set_tool_logs(run_dir)
+    pre_func_dir = os.getcwd()
+    os.chdir(run_dir)
+    try:
+        hardblock_functions.hardblock_parallel_flow(flow_settings)
+    finally:
+        os.chdir(pre_func_dir)
+    check_tool_errors()
+    runs = read_tool_runs(os.environ["HB_FAKE_TOOLS_LOG"])
+    max_running = get_max_concurrent_runs(runs)
+    check(max_running <= num_cores,"at most %d tool runs at once (%d)" % (num_cores,max_running))
+    stage_runs = {}
+    for stage in ["synth","pnr","sta"]:
+        stage_runs[stage] = get_stage_runs(runs,os.path.join(run_dir,"top",stage))
+    check(len(stage_runs["synth"]) == len(clock_periods),"one synthesis run per clock period")
+    check(len(stage_runs["pnr"]) == len(clock_periods)*len(core_utilizations),"one P&R run per clock period and utilization")
+    check_stage_order(stage_runs["pnr"],stage_runs["synth"],"pnr","synth")
+    check_stage_order(stage_runs["sta"],stage_runs["pnr"],"sta","pnr")
+    return flow_settings
+
+
+def parse_parallel_outputs(flow_settings):
+    """
+    Parses the parallel flow results and returns the number of reports parsed and the condensed results csv
+    """
+    parse_out = io.StringIO()
+    with contextlib.redirect_stdout(parse_out):
+        hardblock_functions.parse_parallel_outputs(flow_settings)
+    num_parsed = None
+    for line in parse_out.getvalue().splitlines():
+        if line.startswith("Parsing ") and "new or changed reports" in line:
+            num_parsed = int(line.split()[1])
+    with open(os.path.join(flow_settings["condensed_results_folder"],"condensed_pll_results.csv")) as fd:
+        return num_parsed, fd.read()
+
+
+def check_parallel_parse(flow_settings):
+    print("\n### Parallel results parsing ###")
+    num_parsed, results_csv = parse_parallel_outputs(flow_settings)
+    check(num_parsed is not None and num_parsed > 0,"the first parse parses every report (%s)" % (num_parsed))
+    num_reparsed, reparsed_csv = parse_parallel_outputs(flow_settings)
+    check(num_reparsed == 0,"unchanged reports aren't parsed again (%s)" % (num_reparsed))
+    check(reparsed_csv == results_csv,"reports recorded in the manifest give the same results")
+    report_fpath = sorted([report[0] for report in hardblock_functions.get_pll_report_files(flow_settings,flow_settings["parallel_hardblock_folder"])])[0]
+    with open(report_fpath,"a") as fd:
+        fd.write("\n")
+    num_reparsed, reparsed_csv = parse_parallel_outputs(flow_settings)
+    check(num_reparsed == 1,"only the changed report is parsed again (%s)" % (num_reparsed))
+    check(reparsed_csv == results_csv,"merging the changed report gives the same results")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o",
+                    "--out_dir",
+                    action='store',
+                    default=os.path.join(tempfile.gettempdir(),"coffe_hb_flow_check"),
+                    help='directory the checked flows run in')
+    args = parser.parse_args()
+    out_dir = os.path.abspath(os.path.expanduser(args.out_dir))
+
+    os.environ["PATH"] = fake_tools_path + os.pathsep + os.environ["PATH"]
+    # The flow identifies the tool installations by these
+    os.environ.setdefault("SYNOPSYS",fake_tools_path)
+    os.environ.setdefault("EDI_HOME",fake_tools_path)
+
+    serial_run_dir, serial_settings = check_serial_flow(out_dir)
+    check_pruned_flow(out_dir)
+    check_cached_flow(out_dir,serial_run_dir,serial_settings)
+    parallel_flow_settings = check_parallel_flow(out_dir)
+    check_parallel_parse(parallel_flow_settings)
+
+    print("")
+    if len(failures) > 0:
+        print("%d checks failed" % (len(failures)))
+        sys.exit(1)
+    print("All checks passed")
+
+if __name__ == "__main__":
+    main()
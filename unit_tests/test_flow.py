@@ -0,0 +1,98 @@
+"""
+Regression test of the whole custom flow (transistor sizing included) with the analytic backend: COFFE
+is run for one sizing iteration on every architecture file of input_files/custom_flow and the tile
+area and representative critical path of its report must match the golden results in
+test_results_archive/custom_flow_results/analytic_results.csv (to the precision of the report).
+
+The analytic backend isn't a circuit simulator, so these numbers only catch changes to the sizing
+flow (search, area, wires, delays bookkeeping), not to the accuracy of the delays. When a change is
+meant to alter them, regenerate the golden results with:
+    python3 unit_tests/test_flow.py --update_golden
+
+Each architecture takes a few minutes, they run in separate COFFE processes.
+
+Usage: python3 -m unittest discover -s unit_tests (or python3 -m pytest unit_tests)
+"""
+import os,sys
+import re
+import csv
+import shutil
+import subprocess as sp
+import unittest
+
+import coffe_test_utils
+from coffe import arch_sweep
+
+golden_results_path = os.path.join(coffe_test_utils.unit_test_home,"test_results_archive","custom_flow_results","analytic_results.csv")
+# COFFE options of the flow runs
+flow_options = ["-b","analytic","-i","1"]
+result_regexes = {"tile_area_um2": re.compile(r'^\s*Tile Area\s+([\d.]+) um\^2'),
+                  "rep_crit_path_ps": re.compile(r'^\s*Representative Critical Path Delay\s+([\d.]+) ps')}
+
+
+def get_arch_names():
+  """ Returns the names of the architecture files of input_files/custom_flow. """
+  return sorted(os.path.splitext(f)[0] for f in os.listdir(coffe_test_utils.custom_flow_inputs_path) if f.endswith(".yaml"))
+
+
+def run_flow(arch_name, out_dir):
+  """ Runs COFFE on input_files/custom_flow/<arch_name>.yaml in 'out_dir' and returns the results of its report. """
+  arch_path = arch_sweep.write_point_arch_file(coffe_test_utils.get_arch_path(arch_name),{},out_dir)
+  with open(os.path.join(out_dir,"coffe.log"),'w') as log_file:
+    sp.check_call([sys.executable,os.path.join(coffe_test_utils.coffe_home,"coffe.py")] + flow_options + [arch_path],
+                  cwd=coffe_test_utils.coffe_home,stdout=log_file,stderr=sp.STDOUT)
+  return parse_report(os.path.join(out_dir,"report.txt"))
+
+
+def parse_report(report_path):
+  """ Returns the final tile area and representative critical path of a COFFE report, as printed. """
+  results = {}
+  with open(report_path,'r') as report_file:
+    for line in report_file:
+      for result_name, result_regex in result_regexes.items():
+        match = result_regex.match(line)
+        if match is not None:
+          results[result_name] = match.group(1)
+  return results
+
+
+def load_golden_results():
+  with open(golden_results_path,'r',newline='') as golden_file:
+    return {row["arch"]: row for row in csv.DictReader(golden_file)}
+
+
+def update_golden_results():
+  rows = []
+  for arch_name in get_arch_names():
+    out_dir = coffe_test_utils.make_out_dir("flow_" + arch_name)
+    print("Running " + arch_name + " ...")
+    results = run_flow(arch_name,out_dir)
+    results["arch"] = arch_name
+    rows.append(results)
+    shutil.rmtree(out_dir,ignore_errors=True)
+  with open(golden_results_path,'w',newline='') as golden_file:
+    writer = csv.DictWriter(golden_file,fieldnames=["arch"] + list(result_regexes))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+class FlowTest(unittest.TestCase):
+
+  def test_custom_flow(self):
+    golden_results = load_golden_results()
+    self.assertEqual(sorted(golden_results),get_arch_names())
+    for arch_name in get_arch_names():
+      with self.subTest(arch=arch_name):
+        out_dir = coffe_test_utils.make_out_dir("flow_" + arch_name)
+        results = run_flow(arch_name,out_dir)
+        for result_name in result_regexes:
+          self.assertEqual(results.get(result_name),golden_results[arch_name][result_name],
+                           arch_name + " " + result_name + " (see " + out_dir + ")")
+        shutil.rmtree(out_dir,ignore_errors=True)
+
+
+if __name__ == "__main__":
+  if "--update_golden" in sys.argv:
+    update_golden_results()
+  else:
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Tests of the incremental area and wire updates of the FPGA (update_area with component areas,
+update_wires and update_wire_rc only update the blocks and wires affected by a sizing combo).
+After random size changes, they must give the same results as a full update.
+
+Usage: python3 -m unittest discover -s unit_tests (or python3 -m pytest unit_tests)
+"""
+import os,sys
+import math
+import random
+import shutil
+import unittest
+
+import coffe_test_utils
+from coffe import fpga
+from coffe import tran_sizing
+
+# Number of random sizing combos applied to each architecture
+num_size_changes = 40
+
+
+class IncrementalUpdateTest(unittest.TestCase):
+
+  def setUp(self):
+    self.start_dir = os.getcwd()
+    self.out_dirs = []
+
+  def tearDown(self):
+    os.chdir(self.start_dir)
+    for out_dir in self.out_dirs:
+      shutil.rmtree(out_dir,ignore_errors=True)
+
+  def assertDictsClose(self, incremental, full, dict_name):
+    self.assertEqual(set(incremental),set(full),dict_name + " keys")
+    for key, full_value in full.items():
+      incremental_value = incremental[key]
+      if isinstance(full_value,tuple):
+        for incremental_item, full_item in zip(incremental_value,full_value):
+          self.assertTrue(math.isclose(incremental_item,full_item,rel_tol=1e-9,abs_tol=1e-30),
+                          dict_name + "[" + str(key) + "]: " + str(incremental_value) + " != " + str(full_value))
+      elif isinstance(full_value,float):
+        self.assertTrue(math.isclose(incremental_value,full_value,rel_tol=1e-9,abs_tol=1e-30),
+                        dict_name + "[" + str(key) + "]: " + str(incremental_value) + " != " + str(full_value))
+      else:
+        self.assertEqual(incremental_value,full_value,dict_name + "[" + str(key) + "]")
+
+  def check_arch(self, arch_name):
+    out_dir = coffe_test_utils.make_out_dir("incremental_" + arch_name)
+    self.out_dirs.append(out_dir)
+    fpga_inst, spice_interface = coffe_test_utils.build_fpga(arch_name,out_dir)
+    try:
+      subcircuits = [subcircuit for subcircuit, starting_sizes, is_ram_component, is_cc_component in
+                     tran_sizing._get_sizing_plan(fpga_inst,0,1,{},[])]
+      use_finfet = fpga_inst.specs.use_finfet
+      rng = random.Random(arch_name)
+      for change in range(num_size_changes):
+        # Size a random subcircuit the way search_ranges does
+        subcircuit = rng.choice(subcircuits)
+        element_names = tran_sizing.format_transistor_names_to_basic_subcircuits(subcircuit.transistor_names)
+        combo = [rng.randint(1,12) for element_name in element_names]
+        erf_ratios = {element_name: rng.choice([0.5,0.8,1.0,1.5,2.2]) for element_name in element_names if "inv_" in element_name}
+        fpga_inst._update_transistor_sizes(element_names,combo,use_finfet,erf_ratios)
+        comp_areas, comp_widths = fpga_inst.get_component_areas_batch(element_names,[combo],use_finfet,erf_ratios)
+        fpga_inst.update_area((comp_areas[0],comp_widths[0]))
+        fpga_inst.update_wires()
+        fpga_inst.update_wire_rc()
+
+        # Full update of a copy
+        full_inst = coffe_test_utils.copy_fpga(fpga_inst,spice_interface)
+        full_inst.update_area()
+        full_inst.update_wires()
+        full_inst.update_wire_rc()
+
+        with self.subTest(arch=arch_name,change=change,subcircuit=subcircuit.name):
+          self.assertDictsClose(fpga_inst.area_dict,full_inst.area_dict,"area_dict")
+          self.assertDictsClose(fpga_inst.width_dict,full_inst.width_dict,"width_dict")
+          self.assertDictsClose(fpga_inst.wire_lengths,full_inst.wire_lengths,"wire_lengths")
+          self.assertDictsClose(fpga_inst.wire_layers,full_inst.wire_layers,"wire_layers")
+          self.assertDictsClose(fpga_inst.wire_rc_dict,full_inst.wire_rc_dict,"wire_rc_dict")
+    finally:
+      spice_interface.shutdown()
+
+  def test_flut0(self):
+    # Fracturable LUTs with a carry skip chain
+    self.check_arch("flut0")
+
+  def test_sram0(self):
+    # SRAM BRAM, no carry chain
+    self.check_arch("sram0")
+
+  def test_mtj0(self):
+    # Ripple carry chain and MTJ BRAM
+    self.check_arch("mtj0")
+
+
+class DictRecorderTest(unittest.TestCase):
+  """ The dependency recorder must refuse the accesses whose dependencies it can't record. """
+
+  def test_unsupported_access(self):
+    reads = set()
+    writes = set()
+    recorder = fpga._DictRecorder({"a": 1.0},reads,writes)
+    recorder["b"] = recorder["a"]
+    self.assertEqual(reads,{"a"})
+    self.assertEqual(writes,{"b"})
+    with self.assertRaises(TypeError):
+      recorder.get("a")
+    with self.assertRaises(TypeError):
+      "a" in recorder
+    with self.assertRaises(TypeError):
+      list(recorder)
+    with self.assertRaises(TypeError):
+      recorder.items()
+
+
+if __name__ == "__main__":
+  unittest.main()
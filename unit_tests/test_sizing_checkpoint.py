@@ -0,0 +1,127 @@
+"""
+Tests of the sizing checkpoint (sizing_scheduler.SizingCheckpoint) and of resuming transistor sizing
+(--resume): a checkpoint is only resumed with the architecture parameters and run options it was
+made with, and the output folder keeps the sizing results of the stopped run.
+
+Usage: python3 -m unittest discover -s unit_tests (or python3 -m pytest unit_tests)
+"""
+import os,sys
+import json
+import shutil
+import unittest
+
+import coffe_test_utils
+from coffe import sizing_scheduler
+from coffe import tran_sizing
+from coffe import utils
+
+# Fastest architecture of input_files/custom_flow
+arch_name = "finfet_example"
+
+
+class SizingCheckpointTest(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.start_dir = os.getcwd()
+    cls.out_dir = coffe_test_utils.make_out_dir("checkpoint")
+    cls.fpga_inst, cls.spice_interface = coffe_test_utils.build_fpga(arch_name,cls.out_dir)
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.spice_interface.shutdown()
+    os.chdir(cls.start_dir)
+    shutil.rmtree(cls.out_dir,ignore_errors=True)
+
+  def setUp(self):
+    self.checkpoint_path = os.path.join(self.out_dir,tran_sizing.SIZING_CHECKPOINT_PATH)
+    if os.path.isfile(self.checkpoint_path):
+      os.remove(self.checkpoint_path)
+
+  def make_checkpoint(self, coffe_options=()):
+    args = coffe_test_utils.parse_coffe_args(coffe_test_utils.get_arch_path(arch_name),coffe_options)
+    return sizing_scheduler.SizingCheckpoint(self.checkpoint_path,self.fpga_inst,args)
+
+  def save_checkpoint(self, coffe_options=()):
+    checkpoint = self.make_checkpoint(coffe_options)
+    checkpoint.start_iteration(self.fpga_inst,2,{},[],[],[],[])
+    checkpoint.save_results("sb_mux",[1.0,2.0],self.fpga_inst.transistor_sizes,{"delay": 1e-11})
+
+  def load_mismatches(self, coffe_options=()):
+    checkpoint = self.make_checkpoint(coffe_options)
+    self.assertIsNotNone(checkpoint.load())
+    return checkpoint.get_mismatches()
+
+  def test_round_trip(self):
+    self.save_checkpoint()
+    checkpoint = self.make_checkpoint()
+    state = checkpoint.load()
+    self.assertEqual(state["iteration"],2)
+    self.assertEqual(state["lb_height"],self.fpga_inst.lb_height)
+    self.assertEqual(checkpoint.get_mismatches(),[])
+    self.assertTrue(checkpoint.has_saved_results("sb_mux"))
+    sizing_results, transistor_sizes, subcircuit_delays = checkpoint.get_saved_results("sb_mux")
+    self.assertEqual(sizing_results,(1.0,2.0))
+    self.assertEqual(transistor_sizes,dict(self.fpga_inst.transistor_sizes))
+    self.assertEqual(subcircuit_delays,{"delay": 1e-11})
+    self.assertIsNone(checkpoint.get_saved_results("sb_mux"))
+
+  def test_run_option_mismatch(self):
+    self.save_checkpoint(["-a","1","-d","1"])
+    mismatches = self.load_mismatches(["-a","2","-d","1","-sr","prune"])
+    self.assertEqual([mismatch.split()[0] for mismatch in mismatches],["area_opt_weight","search_mode"])
+    # Options that don't change the sizing results can change
+    self.assertEqual(self.load_mismatches(["-i","8","-j","4","-ps","2"]),[])
+
+  def test_arch_param_mismatch(self):
+    self.save_checkpoint()
+    with open(self.checkpoint_path,'r') as checkpoint_file:
+      state = json.load(checkpoint_file)
+    state["run_config"]["arch_params"]["W"] = state["run_config"]["arch_params"]["W"] + 10
+    with open(self.checkpoint_path,'w') as checkpoint_file:
+      json.dump(state,checkpoint_file)
+    self.assertEqual([mismatch.split()[0] for mismatch in self.load_mismatches()],["W"])
+
+  def test_checkpoint_without_run_config(self):
+    self.save_checkpoint()
+    with open(self.checkpoint_path,'r') as checkpoint_file:
+      state = json.load(checkpoint_file)
+    del state["run_config"]
+    with open(self.checkpoint_path,'w') as checkpoint_file:
+      json.dump(state,checkpoint_file)
+    self.assertEqual(len(self.load_mismatches()),1)
+
+  def test_resume_refuses_mismatch(self):
+    self.save_checkpoint(["-m","2"])
+    args = coffe_test_utils.parse_coffe_args(coffe_test_utils.get_arch_path(arch_name),["-rs","-m","1"])
+    sizes = dict(self.fpga_inst.transistor_sizes)
+    with self.assertRaises(SystemExit) as context:
+      tran_sizing.size_fpga_transistors(self.fpga_inst,args,self.spice_interface)
+    self.assertEqual(context.exception.code,1)
+    self.assertEqual(dict(self.fpga_inst.transistor_sizes),sizes)
+
+
+class CreateOutputDirTest(unittest.TestCase):
+
+  def setUp(self):
+    self.out_dir = coffe_test_utils.make_out_dir("output_dir")
+    for folder in ["sizing_results","lut"]:
+      os.makedirs(os.path.join(self.out_dir,folder))
+      with open(os.path.join(self.out_dir,folder,"results.txt"),'w') as results_file:
+        results_file.write("results\n")
+
+  def tearDown(self):
+    shutil.rmtree(self.out_dir,ignore_errors=True)
+
+  def test_resume_keeps_sizing_results(self):
+    utils.create_output_dir("arch.yaml",self.out_dir,True)
+    self.assertEqual(os.listdir(self.out_dir),["sizing_results"])
+    self.assertTrue(os.path.isfile(os.path.join(self.out_dir,"sizing_results","results.txt")))
+
+  def test_new_run_deletes_sizing_results(self):
+    utils.create_output_dir("arch.yaml",self.out_dir)
+    self.assertEqual(os.listdir(self.out_dir),[])
+
+
+if __name__ == "__main__":
+  unittest.main()
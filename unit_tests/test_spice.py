@@ -0,0 +1,252 @@
+"""
+Tests of the SPICE interface (spice.py): parsing of HSPICE .mt0 files, merging of the meaz paths, the
+persistent results cache and the ngspice sessions (skipped when ngspice isn't on the PATH).
+
+Usage: python3 -m unittest discover -s unit_tests (or python3 -m pytest unit_tests)
+"""
+import os,sys
+import json
+import time
+import shutil
+import stat
+import tempfile
+import unittest
+
+import numpy as np
+
+import coffe_test_utils
+from coffe import spice
+
+
+class CountingBackend(spice.SpiceBackend):
+  """ Backend whose delay is the 'w' parameter of each row (in ps). It counts the rows it simulates. """
+
+  name = "test"
+  needs_job_dir = False
+
+  def __init__(self):
+    super(CountingBackend,self).__init__()
+    self.num_rows = 0
+
+  def simulate(self, sp_path, parameter_dict, job_dir, fidelity="full", corners=None):
+    delays = np.array(parameter_dict["w"],dtype=np.float64)*1e-12
+    self.num_rows += len(delays)
+    return {"meas_total_tfall": delays, "meas_total_trise": delays.copy()}
+
+
+class ParseMt0Test(unittest.TestCase):
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp(prefix="coffe_mt0_")
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir,ignore_errors=True)
+
+  def parse(self, text):
+    mt0_path = os.path.join(self.tmp_dir,"test.mt0")
+    with open(mt0_path,'w') as mt0_file:
+      mt0_file.write(text)
+    return spice.HspiceBackend().parse_mt0(mt0_path)
+
+  def test_wrapped_rows_and_failed_values(self):
+    measurements = self.parse("$DATA1 SOURCE='HSPICE' VERSION='P-2019.06'\n"
+                              ".TITLE '* test'\n"
+                              " meas_total_tfall meas_total_trise\n"
+                              " meas_logic_low_voltage temper alter#\n"
+                              " 1.0e-11 2.0e-11\n 0.01 25.0 1\n"
+                              " failed 3.5e-11\n 0.02 25.0 1\n")
+    np.testing.assert_array_equal(measurements["meas_total_tfall"],[1.0e-11,np.nan])
+    np.testing.assert_array_equal(measurements["meas_total_trise"],[2.0e-11,3.5e-11])
+    np.testing.assert_array_equal(measurements["meas_logic_low_voltage"],[0.01,0.02])
+    self.assertEqual(measurements["meas_total_tfall"].dtype,np.float64)
+
+  def test_meaz_paths(self):
+    # Two paths: the meas_ delay of each row is the slowest path, and fails if one of the paths failed
+    measurements = self.parse(" meaz1_total_tfall meaz2_total_tfall temper alter#\n"
+                              " 1.0e-11 2.0e-11 25.0 1\n"
+                              " 4.0e-11 3.0e-11 25.0 1\n"
+                              " failed 3.0e-11 25.0 1\n")
+    np.testing.assert_array_equal(measurements["meas_total_tfall"],[2.0e-11,4.0e-11,np.nan])
+
+  def test_three_meaz_paths(self):
+    measurements = self.parse(" meaz1_total_trise meaz2_total_trise meaz3_total_trise temper alter#\n"
+                              " 1.0e-11 2.0e-11 5.0e-11 25.0 1\n")
+    np.testing.assert_array_equal(measurements["meas_total_trise"],[5.0e-11])
+
+  def test_measurement_strings(self):
+    values = spice.measurement_array(["1e-11","failed",2.5e-11])
+    np.testing.assert_array_equal(values,[1e-11,np.nan,2.5e-11])
+    self.assertEqual(spice.measurement_strings(values),[repr(1e-11),"failed",repr(2.5e-11)])
+
+
+class SpiceCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp(prefix="coffe_cache_")
+    self.sp_path = os.path.join(self.tmp_dir,"test.sp")
+    self.include_path = os.path.join(self.tmp_dir,"include.l")
+    with open(self.sp_path,'w') as sp_file:
+      sp_file.write(".TITLE test\n.INCLUDE \"include.l\"\n.INCLUDE \"sweep_data.l\"\n.END\n")
+    with open(self.include_path,'w') as include_file:
+      include_file.write("* include\n")
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir,ignore_errors=True)
+
+  def make_cache(self, max_size_mb=1):
+    return spice.SpiceCache(os.path.join(self.tmp_dir,"cache"),max_size_mb)
+
+  def test_get_put(self):
+    cache = self.make_cache()
+    keys = cache.get_row_keys(self.sp_path,{"w": [1,2]},"test")
+    self.assertEqual(cache.get_many(keys),[None,None])
+    cache.put_many([(keys[0],{"meas_total_tfall": 1e-12})])
+    self.assertEqual(cache.get_many(keys),[{"meas_total_tfall": 1e-12},None])
+    self.assertEqual((cache.hits,cache.misses),(1,3))
+
+    # Entries survive between runs
+    self.assertEqual(self.make_cache().get_many(keys[:1]),[{"meas_total_tfall": 1e-12}])
+
+  def test_keys(self):
+    cache = self.make_cache()
+    key = cache.get_row_keys(self.sp_path,{"w": [1]},"test")[0]
+    self.assertEqual(cache.get_row_keys(self.sp_path,{"w": [1]},"test")[0],key)
+    self.assertNotEqual(cache.get_row_keys(self.sp_path,{"w": [2]},"test")[0],key)
+    self.assertNotEqual(cache.get_row_keys(self.sp_path,{"w": [1]},"hspice")[0],key)
+    self.assertNotEqual(cache.get_row_keys(self.sp_path,{"w": [1]},"test","coarse")[0],key)
+
+    # The sweep data file isn't part of the key, the other includes are
+    with open(os.path.join(self.tmp_dir,"sweep_data.l"),'w') as sweep_file:
+      sweep_file.write(".DATA sweep_data w 3 .ENDDATA\n")
+    self.assertEqual(cache.get_row_keys(self.sp_path,{"w": [1]},"test")[0],key)
+    with open(self.include_path,'w') as include_file:
+      include_file.write("* changed include\n")
+    self.assertNotEqual(cache.get_row_keys(self.sp_path,{"w": [1]},"test")[0],key)
+
+  def test_eviction(self):
+    # The cache holds 10 entries and a half
+    measurements = {"meas_total_tfall": 1e-12, "padding": "x"*60}
+    entry_size = len(json.dumps(measurements))
+    cache = self.make_cache(max_size_mb=(10.5*entry_size)/(1024*1024))
+    keys = cache.get_row_keys(self.sp_path,{"w": list(range(30))},"test")
+    for key in keys[:10]:
+      cache.put_many([(key,measurements)])
+      time.sleep(0.002)
+    # The first entry is used again, so the second one is now the least recently used
+    time.sleep(0.002)
+    self.assertIsNotNone(cache.get_many(keys[:1])[0])
+    time.sleep(0.002)
+    cache.put_many([(keys[20],measurements)])
+
+    self.assertIsNotNone(cache.get_many(keys[:1])[0])
+    self.assertIsNone(cache.get_many(keys[1:2])[0])
+    self.assertIsNotNone(cache.get_many(keys[20:21])[0])
+    stored_size = cache._db.execute("SELECT SUM(size) FROM entries").fetchone()[0]
+    self.assertLessEqual(stored_size,cache.max_size)
+    self.assertEqual(stored_size,cache._total_size)
+
+  def test_interface_uses_cache(self):
+    backend = CountingBackend()
+    spice_interface = spice.SpiceInterface(2,self.make_cache(),backend)
+    try:
+      first = spice_interface.run_columns(self.sp_path,{"w": [1,2,3]})
+      # Only the new row is simulated
+      second = spice_interface.run(self.sp_path,{"w": [3,4,1]})
+    finally:
+      spice_interface.shutdown()
+    np.testing.assert_array_equal(first["meas_total_tfall"],[1e-12,2e-12,3e-12])
+    self.assertEqual(second["meas_total_trise"],[repr(3e-12),repr(4e-12),repr(1e-12)])
+    self.assertEqual(backend.num_rows,4)
+    self.assertEqual(spice_interface.get_num_simulations_performed(),4)
+
+
+# RC stage simulated by the ngspice tests: the 50% delay is ln(2)*rval*1pF
+rc_deck = """* RC stage
+.INCLUDE "sweep_data.l"
+V1 n_in gnd PULSE (0 0.8 0 1p 1p 1n 2n)
+R1 n_in n_out rval
+C1 n_out gnd 1p
+.TRAN 1p 2n SWEEP DATA=sweep_data
+.MEASURE TRAN meas_total_trise TRIG V(n_in) VAL=0.4 RISE=1 TARG V(n_out) VAL=0.4 RISE=1
+.MEASURE TRAN meas_total_tfall TRIG V(n_in) VAL=0.4 FALL=1 TARG V(n_out) VAL=0.4 FALL=1
+.END
+"""
+
+# Stand-in for "ngspice -p" that prints a prompt before the output of each command and no newline
+# after the output of echo, like ngspice does at an interactive prompt
+fake_ngspice = """#!/bin/bash
+num=1
+while read -r cmd; do
+  printf "ngspice $num -> "
+  case "$cmd" in
+    echo*) printf "%s" "${cmd#echo }" ;;
+    quit) exit 0 ;;
+    *) echo "ran $cmd" ;;
+  esac
+  num=$((num+1))
+done
+"""
+
+
+class NgspiceSessionMarkerTest(unittest.TestCase):
+  """ The end of the output of each run is found when the marker doesn't have a line of its own. """
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp(prefix="coffe_ngspice_")
+    fake_path = os.path.join(self.tmp_dir,"ngspice")
+    with open(fake_path,'w') as fake_file:
+      fake_file.write(fake_ngspice)
+    os.chmod(fake_path,os.stat(fake_path).st_mode | stat.S_IEXEC)
+    self.path = os.environ["PATH"]
+    os.environ["PATH"] = self.tmp_dir + os.pathsep + self.path
+
+  def tearDown(self):
+    os.environ["PATH"] = self.path
+    shutil.rmtree(self.tmp_dir,ignore_errors=True)
+
+  def test_marker_after_prompt(self):
+    session = spice.NgspiceSession()
+    try:
+      first = session.run(["run"],10)
+      second = session.run(["run","remcirc"],10)
+    finally:
+      session.stop()
+    self.assertIn("ran run",first)
+    self.assertNotIn("coffe_commands_done",first)
+    self.assertIn("ran remcirc",second)
+    self.assertNotIn("coffe_commands_done",second)
+
+
+@unittest.skipIf(shutil.which("ngspice") is None,"ngspice isn't on the PATH")
+class NgspiceSessionTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp(prefix="coffe_ngspice_")
+    self.sp_path = os.path.join(self.tmp_dir,"rc.sp")
+    with open(self.sp_path,'w') as sp_file:
+      sp_file.write(rc_deck)
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir,ignore_errors=True)
+
+  def simulate(self, backend, parameter_dict):
+    spice_interface = spice.SpiceInterface(2,None,backend)
+    try:
+      return spice_interface.run_columns(self.sp_path,parameter_dict)
+    finally:
+      spice_interface.shutdown()
+
+  def test_session_rows(self):
+    # More rows than workers, so each session runs several rows
+    parameter_dict = {"rval": [100,200,300,100,400]}
+    measurements = self.simulate(spice.NgspiceSessionBackend(),parameter_dict)
+    for meas_name in ["meas_total_trise","meas_total_tfall"]:
+      np.testing.assert_allclose(measurements[meas_name],np.log(2)*np.array(parameter_dict["rval"])*1e-12,rtol=0.05)
+    # Same results as starting ngspice for each row
+    batch_measurements = self.simulate(spice.NgspiceBackend(),parameter_dict)
+    for meas_name in ["meas_total_trise","meas_total_tfall"]:
+      np.testing.assert_allclose(measurements[meas_name],batch_measurements[meas_name],rtol=1e-6)
+
+
+if __name__ == "__main__":
+  unittest.main()
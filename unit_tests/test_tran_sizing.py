@@ -0,0 +1,93 @@
+"""
+Tests of the transistor sizing search modes (tran_sizing.search_ranges), with the analytic backend.
+
+Usage: python3 -m unittest discover -s unit_tests (or python3 -m pytest unit_tests)
+"""
+import os,sys
+import shutil
+import unittest
+from unittest import mock
+
+import coffe_test_utils
+from coffe import tran_sizing
+
+
+def get_sizing_ranges(subcircuit):
+  """ Returns the sizing ranges of the first set of transistors that size_subcircuit_transistors sizes in 'subcircuit'. """
+  tran_names = tran_sizing.format_transistor_names_to_basic_subcircuits(subcircuit.transistor_names)
+  tran_names_set = tran_sizing._divide_problem_into_sets(tran_names)[0]
+  initial_sizes = tran_sizing.format_transistor_sizes_to_basic_subciruits(subcircuit.initial_transistor_sizes)
+  return tran_sizing._find_initial_sizing_ranges(tran_names_set,initial_sizes)
+
+
+class PrunedSearchTest(unittest.TestCase):
+  """ The prune search mode must select the same sizing combo as the grid search. """
+
+  @classmethod
+  def setUpClass(cls):
+    cls.start_dir = os.getcwd()
+    cls.out_dir = coffe_test_utils.make_out_dir("prune")
+    cls.fpga_inst, cls.spice_interface = coffe_test_utils.build_fpga("flut0",cls.out_dir)
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.spice_interface.shutdown()
+    os.chdir(cls.start_dir)
+    shutil.rmtree(cls.out_dir,ignore_errors=True)
+
+  def search(self, search_mode, subcircuit_name, re_erf, area_opt_weight, delay_opt_weight):
+    """ Runs search_ranges on a copy of the FPGA and returns what it returns. """
+    fpga_inst = coffe_test_utils.copy_fpga(self.fpga_inst,self.spice_interface)
+    fpga_inst.search_mode = search_mode
+    subcircuit = {"sb_mux": fpga_inst.sb_mux, "cb_mux": fpga_inst.cb_mux,
+                  "local_mux": fpga_inst.logic_cluster.local_mux}[subcircuit_name]
+    return tran_sizing.search_ranges(get_sizing_ranges(subcircuit),fpga_inst,subcircuit,"global",re_erf,
+                                     area_opt_weight,delay_opt_weight,1,1,0,self.spice_interface,0,0)
+
+  def test_same_combo_as_grid(self):
+    for subcircuit_name in ["sb_mux","cb_mux","local_mux"]:
+      for re_erf, area_opt_weight, delay_opt_weight in [(1,1,1),(2,1,1),(1,1,2)]:
+        with self.subTest(subcircuit=subcircuit_name,re_erf=re_erf,weights=(area_opt_weight,delay_opt_weight)):
+          grid_result = self.search("grid",subcircuit_name,re_erf,area_opt_weight,delay_opt_weight)
+          prune_result = self.search("prune",subcircuit_name,re_erf,area_opt_weight,delay_opt_weight)
+          self.assertEqual(prune_result[0],grid_result[0])
+          self.assertEqual(prune_result[1],grid_result[1])
+          self.assertEqual(prune_result[2][:4],grid_result[2][:4])
+
+
+class PrunedSearchTieTest(unittest.TestCase):
+  """
+  A combo whose cost bound equals the threshold can still tie with the best combo and win on its
+  index, so it must be simulated. The simulations and delays are replaced by fixed values here.
+  """
+
+  def test_tie_at_threshold(self):
+    # Combo 1 has the lowest bound and sets the threshold to its cost, 2. Combo 0's bound is 2 as well,
+    # and its cost ties with combo 1's. The grid search selects combo 0 (lower index on equal costs).
+    area_list = [2.0,1.0,3.0]
+    delays = [1.0,2.0,1.0]
+    min_delay = 1.0
+
+    def simulate_combos(fpga_inst, sizable_circuit, opt_type, element_names, sizing_combos, erf_ratios, wire_names, wire_rc,
+                        combo_ids, spice_interface, is_ram_component, is_cc_component, tfall_trise_list, eval_delay_list):
+      for i in combo_ids:
+        tfall_trise_list[i] = (delays[i],delays[i])
+        eval_delay_list[i] = delays[i]
+
+    tfall_trise_list = [None]*len(area_list)
+    eval_delay_list = [None]*len(area_list)
+    with mock.patch.object(tran_sizing,"PRUNE_BATCH_SIZE",1), \
+         mock.patch.object(tran_sizing,"_simulate_combos",simulate_combos), \
+         mock.patch.object(tran_sizing,"get_eval_delay",return_value=min_delay):
+      simulated_ids = tran_sizing._pruned_search(None,object(),"global",[],[()]*len(area_list),{},area_list,[],None,
+                                                 1,1,1,None,0,0,tfall_trise_list,eval_delay_list)
+
+    self.assertEqual(sorted(simulated_ids),[0,1])
+    grid_best = min(range(len(area_list)),key=lambda i: (tran_sizing.cost_function(area_list[i],delays[i],1,1),i))
+    prune_best = min(simulated_ids,key=lambda i: (tran_sizing.cost_function(area_list[i],delays[i],1,1),i))
+    self.assertEqual(prune_best,grid_best)
+    self.assertEqual(prune_best,0)
+
+
+if __name__ == "__main__":
+  unittest.main()
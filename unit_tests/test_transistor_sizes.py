@@ -0,0 +1,85 @@
+"""
+Tests of fpga.TransistorSizes, the dictionary of transistor sizes that also keeps them in a float64
+array with the types and components of the transistors.
+
+Usage: python3 -m unittest discover -s unit_tests (or python3 -m pytest unit_tests)
+"""
+import os,sys
+import unittest
+
+import numpy as np
+
+import coffe_test_utils
+from coffe import fpga
+
+# One transistor (or NMOS/PMOS pair) of each type, in the order the FPGA adds them
+test_sizes = [("ptran_sb_mux_L1_nmos",3),
+              ("inv_sb_mux_1_nmos",2),
+              ("inv_sb_mux_1_pmos",4),
+              ("rest_sb_mux_pmos",1),
+              ("tgate_lut_L1_nmos",2),
+              ("tgate_lut_L1_pmos",2),
+              ("tran_ff_nmos",5),
+              ("wire_sb_mux",7)]
+
+
+class TransistorSizesTest(unittest.TestCase):
+
+  def setUp(self):
+    self.sizes = fpga.TransistorSizes(dict(test_sizes))
+
+  def test_dict(self):
+    self.assertEqual(dict(self.sizes),dict(test_sizes))
+    self.assertEqual(list(self.sizes),[name for name, size in test_sizes])
+    self.sizes["inv_sb_mux_1_pmos"] = 6
+    self.assertEqual(self.sizes["inv_sb_mux_1_pmos"],6)
+    self.assertEqual(self.sizes.sizes[self.sizes.get_id("inv_sb_mux_1_pmos")],6.0)
+    self.assertEqual(len(self.sizes),len(test_sizes))
+
+  def test_array_follows_changes(self):
+    # Enough transistors to grow the array
+    for i in range(100):
+      self.sizes["ptran_extra_" + str(i) + "_nmos"] = i + 1
+    del self.sizes["rest_sb_mux_pmos"]
+    self.assertNotIn("rest_sb_mux_pmos",self.sizes)
+    np.testing.assert_array_equal(self.sizes.sizes,[float(self.sizes[name]) for name in self.sizes.names])
+    self.assertEqual([self.sizes.get_id(name) for name in self.sizes.names],list(range(len(self.sizes))))
+
+  def test_copy(self):
+    sizes_copy = self.sizes.copy()
+    sizes_copy["inv_sb_mux_1_nmos"] = 9
+    self.assertEqual(self.sizes["inv_sb_mux_1_nmos"],2)
+    self.assertEqual(self.sizes.sizes[self.sizes.get_id("inv_sb_mux_1_nmos")],2.0)
+
+  def test_types_and_components(self):
+    self.assertEqual(self.sizes.get_types().tolist(),
+                     [fpga.TRAN_TYPE_PTRAN,fpga.TRAN_TYPE_INV,fpga.TRAN_TYPE_INV,fpga.TRAN_TYPE_REST,
+                      fpga.TRAN_TYPE_TGATE,fpga.TRAN_TYPE_TGATE,fpga.TRAN_TYPE_TRAN,fpga.TRAN_TYPE_OTHER])
+    self.assertEqual(self.sizes.get_component_names(),
+                     ["ptran_sb_mux_L1","inv_sb_mux_1","rest_sb_mux","tgate_lut_L1","tran_ff"])
+    self.assertEqual(self.sizes.get_component_tran_ids("inv_sb_mux_1"),[1,2])
+
+  def test_component_areas(self):
+    # area = a + b*size + c*sqrt(size), with different coefficients for each type
+    coefficients = np.array([[0.0,0.0,0.0],[1.0,2.0,0.0],[0.5,1.0,1.0],[2.0,0.0,1.0],[0.0,3.0,0.0],[1.0,1.0,0.0]])
+    tran_areas = self.sizes.get_tran_areas(coefficients)
+    for tran_name, tran_size in test_sizes:
+      a, b, c = coefficients[fpga.get_tran_type(tran_name)]
+      self.assertAlmostEqual(tran_areas[self.sizes.get_id(tran_name)],a + b*tran_size + c*np.sqrt(tran_size))
+    comp_areas = self.sizes.get_component_areas(tran_areas)
+    for comp_name, comp_area in zip(self.sizes.get_component_names(),comp_areas):
+      self.assertAlmostEqual(comp_area,sum(tran_areas[self.sizes.get_component_tran_ids(comp_name)]))
+
+    # One row of areas per sizing combo
+    combo_sizes = np.vstack([self.sizes.sizes,2*self.sizes.sizes])
+    combo_areas = self.sizes.get_component_areas(self.sizes.get_tran_areas(coefficients,combo_sizes))
+    np.testing.assert_allclose(combo_areas[0],comp_areas)
+    self.assertEqual(combo_areas.shape,(2,len(comp_areas)))
+
+  def test_parameter_values(self):
+    self.assertEqual(self.sizes.get_parameter_values(45,True),[size for name, size in test_sizes])
+    np.testing.assert_allclose(self.sizes.get_parameter_values(45,False),[1e-9*45*size for name, size in test_sizes])
+
+
+if __name__ == "__main__":
+  unittest.main()